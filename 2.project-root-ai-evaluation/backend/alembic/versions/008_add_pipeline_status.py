@@ -0,0 +1,32 @@
+"""add pipeline status
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加处理流水线使用的状态"""
+    op.execute("""
+        ALTER TYPE examstatus ADD VALUE IF NOT EXISTS 'ocr_processing';
+        ALTER TYPE examstatus ADD VALUE IF NOT EXISTS 'report_generating';
+        ALTER TYPE examstatus ADD VALUE IF NOT EXISTS 'report_generated';
+        ALTER TYPE examstatus ADD VALUE IF NOT EXISTS 'report_generation_failed';
+    """)
+
+
+def downgrade():
+    """回滚流水线状态"""
+    # PostgreSQL 不支持删除枚举值，需要重建枚举类型
+    pass
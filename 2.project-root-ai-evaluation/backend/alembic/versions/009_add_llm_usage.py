@@ -0,0 +1,27 @@
+"""add llm usage
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加 LLM 调用用量汇总字段"""
+    op.add_column('exams', sa.Column('llm_usage', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    """删除 LLM 调用用量汇总字段"""
+    op.drop_column('exams', 'llm_usage')
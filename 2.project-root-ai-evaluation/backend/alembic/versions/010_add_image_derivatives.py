@@ -0,0 +1,27 @@
+"""add image derivatives
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加派生图 URL 字段（缩略图 / 预览图 / OCR 灰度图）"""
+    op.add_column('exams', sa.Column('image_derivatives', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    """删除派生图 URL 字段"""
+    op.drop_column('exams', 'image_derivatives')
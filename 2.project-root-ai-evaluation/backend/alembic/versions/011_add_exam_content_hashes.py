@@ -0,0 +1,33 @@
+"""add exam content hashes
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加上传去重使用的原图 SHA-256 和 dHash"""
+    op.add_column('exams', sa.Column('content_sha256', sa.String(length=64), nullable=True))
+    op.add_column('exams', sa.Column('image_dhash', sa.String(length=16), nullable=True))
+    op.create_index('ix_exams_content_sha256', 'exams', ['content_sha256'])
+    # 同一用户最近上传的近似重复查询
+    op.create_index('ix_exams_user_id_created_at', 'exams', ['user_id', 'created_at'])
+
+
+def downgrade():
+    """删除上传去重字段"""
+    op.drop_index('ix_exams_user_id_created_at', table_name='exams')
+    op.drop_index('ix_exams_content_sha256', table_name='exams')
+    op.drop_column('exams', 'image_dhash')
+    op.drop_column('exams', 'content_sha256')
@@ -2,7 +2,7 @@
 API v1 路由
 """
 from fastapi import APIRouter
-from app.api.v1 import auth, exams, ocr, parser, analysis, reviews, handwriting, diagnostic, reports, history
+from app.api.v1 import auth, exams, ocr, parser, analysis, reviews, handwriting, diagnostic, reports, history, storage
 
 api_router = APIRouter()
 
@@ -35,3 +35,6 @@ api_router.include_router(diagnostic.router, prefix="/diagnostic", tags=["诊断
 
 # 注册报告路由
 api_router.include_router(reports.router, prefix="/reports", tags=["报告"])
+
+# 注册存储路由（本地存储的预签名上传）
+api_router.include_router(storage.router, prefix="/storage", tags=["存储"])
@@ -12,7 +12,7 @@ from app.schemas.analysis import AnalysisRequest, AnalysisResponse
 from app.schemas.parser import ParsedExam
 from app.schemas.ocr import OCRResult
 from app.services.analysis_service import AnalysisService
-from app.services.deepseek_service import deepseek_service
+from app.services.subjective_grader import GradingItem, subjective_grader
 from app.api.v1.auth import get_current_user
 from app.models.user import User
 
@@ -76,41 +76,43 @@ async def analyze_exam(
         
         # 如果启用 DeepSeek，对主观题进行评分
         if request.use_deepseek:
-            for qa in question_analyses:
-                # 找到对应的题目
-                question = next(
-                    (q for q in parsed_exam.questions if q.question_id == qa.question_id),
-                    None
+            questions = {q.question_id: q for q in parsed_exam.questions}
+            items = [
+                GradingItem(
+                    question_id=qa.question_id,
+                    question_text=questions[qa.question_id].question_text,
+                    student_answer=qa.student_answer,
+                    correct_answer=questions[qa.question_id].correct_answer,
+                    max_score=questions[qa.question_id].score
                 )
+                for qa in question_analyses
+                if qa.question_id in questions
+                and questions[qa.question_id].question_type == "subjective"
+                and qa.student_answer
+            ]
+            
+            # 并发评分；超时或失败的题目保留规则判分结果
+            grades = await subjective_grader.grade(items)
+            
+            for qa in question_analyses:
+                eval_result = grades.get(qa.question_id)
+                if eval_result is None:
+                    continue
                 
-                if question and question.question_type == "subjective" and qa.student_answer:
-                    try:
-                        # 调用 DeepSeek 评分
-                        eval_result = await deepseek_service.evaluate_subjective_answer(
-                            question_text=question.question_text,
-                            student_answer=qa.student_answer,
-                            correct_answer=question.correct_answer,
-                            max_score=question.score
-                        )
-                        
-                        # 更新分析结果
-                        qa.is_correct = eval_result.get("is_correct", False)
-                        qa.score_obtained = eval_result.get("score", 0.0)
-                        
-                        # 更新置信度（DeepSeek 评分的置信度较高）
-                        qa.confidence = max(qa.confidence, 0.85)
-                        
-                        # 更新审核状态
-                        qa.review_status = AnalysisService.determine_review_status(qa.confidence)
-                        
-                        logger.info(
-                            f"主观题 {qa.question_id} DeepSeek 评分完成: "
-                            f"score={qa.score_obtained}, is_correct={qa.is_correct}"
-                        )
-                    
-                    except Exception as e:
-                        logger.error(f"主观题 {qa.question_id} DeepSeek 评分失败: {e}")
-                        # 继续处理其他题目
+                # 更新分析结果
+                qa.is_correct = eval_result.get("is_correct", False)
+                qa.score_obtained = eval_result.get("score", 0.0)
+                
+                # 更新置信度（DeepSeek 评分的置信度较高）
+                qa.confidence = max(qa.confidence, 0.85)
+                
+                # 更新审核状态
+                qa.review_status = AnalysisService.determine_review_status(qa.confidence)
+                
+                logger.info(
+                    f"主观题 {qa.question_id} DeepSeek 评分完成: "
+                    f"score={qa.score_obtained}, is_correct={qa.is_correct}"
+                )
             
             # 重新计算整体统计
             overall_stats = AnalysisService.compute_overall_stats(question_analyses)
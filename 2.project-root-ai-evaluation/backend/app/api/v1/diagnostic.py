@@ -2,15 +2,21 @@
 诊断 API 端点
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional
+from typing import Any, Optional
+import json
 import logging
+import uuid
 
-from app.core.database import get_db
+from app.core.database import get_db, async_session_maker
 from app.models.user import User
 from app.models.exam import Exam, ExamStatus
 from app.schemas.diagnostic import DiagnosticRequest, DiagnosticResponse, DiagnosticReport
 from app.services.deepseek_service import deepseek_service
+from app.services.exam_pipeline import exam_pipeline
+from app.services.llm_usage import track_llm_usage
 from app.api.v1.auth import get_current_user
 
 router = APIRouter(prefix="/diagnostic", tags=["diagnostic"])
@@ -109,6 +115,98 @@ async def diagnose_exam(
         )
 
 
+def _sse_event(event: str, data: Any) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    if isinstance(data, list):
+        payload = [item.model_dump() for item in data]
+    else:
+        payload = data.model_dump()
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@router.post("/diagnose/stream")
+async def diagnose_exam_stream(
+    request: DiagnosticRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    流式诊断试卷（Server-Sent Events）
+    
+    报告的每一部分生成完整即推送一条事件（event 为部分名称，data 为该部分 JSON），
+    最后推送 event: report 的完整报告。完整报告同时写入试卷并将状态置为 DIAGNOSED。
+    
+    Args:
+        request: 诊断请求
+        current_user: 当前用户
+        db: 数据库会话
+        
+    Returns:
+        StreamingResponse: text/event-stream 响应
+    """
+    result = await db.execute(
+        select(Exam).where(
+            Exam.exam_id == uuid.UUID(request.exam_id),
+            Exam.user_id == current_user.user_id
+        )
+    )
+    exam = result.scalar_one_or_none()
+    
+    if not exam:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="试卷不存在"
+        )
+    
+    if not exam.parsed_result or not exam.analysis_result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="试卷尚未完成解析和分析"
+        )
+    
+    parsed_exam = exam_pipeline.load_parsed(request.exam_id, exam.parsed_result)
+    question_analyses, overall_stats = exam_pipeline.load_analysis(exam.analysis_result)
+    exam_meta = parsed_exam.exam_meta
+    handwriting_metrics = exam.handwriting_metrics
+    
+    async def event_stream():
+        with track_llm_usage() as llm_usage:
+            stream = deepseek_service.diagnose_exam_stream(
+                exam_id=request.exam_id,
+                subject=exam_meta.subject or "未知",
+                grade=exam_meta.grade or "未知",
+                total_score=exam_meta.total_score or 100,
+                student_score=overall_stats.total_score or overall_stats.correct_count,
+                question_analyses=question_analyses,
+                overall_stats=overall_stats,
+                handwriting_metrics=handwriting_metrics,
+                target_school=request.target_school,
+                questions=parsed_exam.questions
+            )
+            async for name, value in stream:
+                if name == "report":
+                    report = value
+                else:
+                    yield _sse_event(name, value)
+        
+        # 依赖注入的会话在响应体开始发送前已关闭，这里使用独立会话保存
+        async with async_session_maker() as session:
+            stored = await session.get(Exam, uuid.UUID(request.exam_id))
+            if stored:
+                stored.status = ExamStatus.DIAGNOSED
+                stored.diagnostic_report = report.model_dump()
+                stored.llm_usage = llm_usage.merged_into(stored.llm_usage)
+                await session.commit()
+        logger.info(f"流式诊断完成: {request.exam_id}")
+        yield _sse_event("report", report)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{exam_id}", response_model=DiagnosticResponse)
 async def get_diagnostic_report(
     exam_id: str,
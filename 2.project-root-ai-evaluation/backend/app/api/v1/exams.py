@@ -1,34 +1,65 @@
 """
 试卷 API 路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional
+import asyncio
 import uuid
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
 from app.models.exam import Exam, ExamStatus
 from app.schemas.exam import (
     ExamUploadResponse,
+    ExamPresignRequest,
+    ExamPresignResponse,
+    ExamFinalizeRequest,
     ExamStatusResponse,
     ExamDetailResponse,
     ExamListResponse
 )
 from app.api.dependencies import get_current_user
 from app.services.image_service import ImageService
+from app.services.cache_service import CacheService
+from app.services.direct_upload import DirectUploadService
+from app.services.exam_dedup import ImageFingerprint, copy_results, exam_deduplicator, image_dhash
+from app.services.image_preprocess import resolve_profile
+from app.services.storage import get_storage
+from app.services.upload_stream import SpooledUpload, receive_upload
 from app.core.logging import logger
 
 
 router = APIRouter()
 
 
-@router.post("/upload", response_model=ExamUploadResponse)
+# 上传接口直接读取请求体流（见 receive_upload），表单字段在此声明以生成接口文档
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary", "description": "试卷图片文件"},
+                        "capture_time": {"type": "string", "description": "拍摄时间"},
+                        "device_info": {"type": "string", "description": "设备信息"},
+                        "preprocess_profile": {"type": "string", "description": "OCR 前的图像预处理档位"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/upload", response_model=ExamUploadResponse, openapi_extra=UPLOAD_FORM_SCHEMA)
 async def upload_exam(
-    file: UploadFile = File(..., description="试卷图片文件"),
-    capture_time: Optional[str] = Form(None, description="拍摄时间"),
-    device_info: Optional[str] = Form(None, description="设备信息"),
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -38,33 +69,55 @@ async def upload_exam(
     - **file**: 图片文件（JPG, PNG, HEIC，最大10MB）
     - **capture_time**: 拍摄时间（可选）
     - **device_info**: 设备信息（可选）
+    - **preprocess_profile**: OCR 前的图像预处理档位（fast / balanced / quality / none，可选）
+    
+    请求体分块写入临时文件，超过大小上限时立即中止。
+    同一用户重复上传同一张照片（或重新压缩后的近似副本）时返回已有试卷，
+    其他用户上传过相同图片且已完成时复制其识别结果；两种情况都不重新处理（deduplicated=true）。
     
     需要认证：Bearer token
     """
+    upload = None
     try:
-        # 读取文件内容
-        file_content = await file.read()
+        # 流式接收文件（鉴权之后才读取请求体）
+        upload, fields = await receive_upload(request)
+        preprocess_profile = fields.get("preprocess_profile") or None
         
         # 验证图像格式和大小
-        ImageService.validate_image_format_and_size(file.filename, file_content)
+        await asyncio.to_thread(ImageService.validate_upload, upload)
+        resolve_profile(preprocess_profile)
+        
+        # 质量门：在创建记录和入队之前拒绝模糊、过暗、反光或倾斜的照片
+        if settings.IMAGE_QUALITY_GATE != "off":
+            quality = await asyncio.to_thread(_check_spooled_quality, upload)
+            if not quality.is_valid:
+                raise ValueError(quality.reason)
+        
+        # 上传去重：同一用户重复上传返回已有试卷，其他用户已完成的相同图片复制其识别结果
+        fingerprint = ImageFingerprint(upload.sha256)
+        if settings.EXAM_DEDUP_ENABLED:
+            fingerprint.dhash = await asyncio.to_thread(_spooled_dhash, upload)
+        match = await exam_deduplicator.lookup(db, current_user.user_id, fingerprint)
+        if match is not None and not match.is_clone:
+            return _duplicate_response(match.exam)
         
         # 创建试卷记录
         exam = Exam(
+            exam_id=uuid.uuid4(),  # 复制识别结果时需要新试卷的 ID
             user_id=current_user.user_id,
             original_image_url="",  # 稍后更新
-            status=ExamStatus.UPLOADED
+            status=ExamStatus.UPLOADED,
+            content_sha256=fingerprint.sha256,
+            image_dhash=fingerprint.dhash
         )
+        if match is not None:
+            copy_results(match.exam, exam)
         
         db.add(exam)
-        await db.flush()  # 获取 exam_id
+        await db.flush()
         
-        # 存储原始图像
-        original_url = await ImageService.store_image(
-            file_content,
-            str(exam.exam_id),
-            "original",
-            file.filename
-        )
+        # 存储原始图像（移动 spool 文件，不再读入内存）
+        original_url = await ImageService.store_upload(upload, str(exam.exam_id), "original")
         
         # 更新图像 URL
         exam.original_image_url = original_url
@@ -72,10 +125,12 @@ async def upload_exam(
         await db.refresh(exam)
         
         logger.info(f"Exam {exam.exam_id} uploaded by user {current_user.user_id}")
+        if match is not None:
+            return _duplicate_response(exam)
         
-        # 触发异步处理任务链
-        from app.tasks.exam_tasks import process_exam_ocr
-        process_exam_ocr.delay(str(exam.exam_id))
+        # 触发异步处理（单份上传默认走 express 模式）
+        from app.tasks.exam_tasks import enqueue_exam_processing
+        enqueue_exam_processing(str(exam.exam_id), preprocess_profile=preprocess_profile)
         
         return ExamUploadResponse(
             exam_id=str(exam.exam_id),
@@ -94,6 +149,173 @@ async def upload_exam(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to upload exam"
         )
+    finally:
+        if upload is not None:
+            upload.discard()
+
+
+def _check_spooled_quality(upload: SpooledUpload):
+    """在 spool 文件的内存映射上执行质量门"""
+    with upload.mapped() as content:
+        return ImageService.check_upload_quality(content)
+
+
+def _spooled_dhash(upload: SpooledUpload) -> str:
+    """在 spool 文件的内存映射上计算 dHash"""
+    with upload.mapped() as content:
+        return image_dhash(content)
+
+
+def _duplicate_response(exam: Exam) -> ExamUploadResponse:
+    """命中上传去重时的响应（不重新处理）"""
+    return ExamUploadResponse(
+        exam_id=str(exam.exam_id),
+        status=exam.status.value,
+        estimated_time=0 if exam.status == ExamStatus.COMPLETED else 45,
+        message="Duplicate of an existing exam",
+        deduplicated=True
+    )
+
+
+@router.post("/upload/presign", response_model=ExamPresignResponse)
+async def presign_exam_upload(
+    body: ExamPresignRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    申请预签名直传
+    
+    客户端随后把图片直接 PUT 到返回的 upload_url（原样携带 headers），
+    再以 upload_token 调用 /upload/finalize。图片不经过 API 进程。
+    
+    - **filename**: 文件名（JPG, PNG, HEIC）
+    - **size**: 文件字节数（最大10MB）
+    - **sha256**: 文件内容 SHA-256，存储端据此拒绝内容不符的上传
+    - **preprocess_profile**: OCR 前的图像预处理档位（可选）
+    
+    需要认证：Bearer token
+    """
+    try:
+        ticket, presigned, token = DirectUploadService.create_ticket(
+            str(current_user.user_id), body.filename, body.size, body.sha256, body.preprocess_profile
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return ExamPresignResponse(
+        exam_id=ticket.exam_id,
+        upload_url=presigned.url,
+        method=presigned.method,
+        headers=presigned.headers,
+        expires_at=presigned.expires_at,
+        upload_token=token
+    )
+
+
+@router.post("/upload/finalize", response_model=ExamUploadResponse)
+async def finalize_exam_upload(
+    body: ExamFinalizeRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    完成预签名直传
+    
+    核对已上传对象的大小、SHA-256 和文件头，创建试卷记录并触发处理。
+    重复调用返回同一试卷；同一用户上传过 SHA-256 相同的图片时返回已有试卷。
+    
+    - **upload_token**: /upload/presign 返回的上传凭证
+    
+    需要认证：Bearer token
+    """
+    try:
+        ticket = DirectUploadService.parse_token(body.upload_token)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if ticket.user_id != str(current_user.user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Upload token belongs to another user"
+        )
+    
+    try:
+        # 重复完成：返回已创建的记录，不重复入队
+        result = await db.execute(select(Exam).where(Exam.exam_id == uuid.UUID(ticket.exam_id)))
+        exam = result.scalar_one_or_none()
+        if exam is not None:
+            return ExamUploadResponse(
+                exam_id=str(exam.exam_id),
+                status=exam.status.value,
+                estimated_time=45
+            )
+        
+        # 已去重的直传再次完成：返回上次核对内容后匹配到的试卷（上传的对象已删除）
+        duplicate_id = await CacheService.get_direct_upload_duplicate(ticket.exam_id)
+        if duplicate_id:
+            result = await db.execute(select(Exam).where(Exam.exam_id == uuid.UUID(duplicate_id)))
+            duplicate = result.scalar_one_or_none()
+            if duplicate is not None and duplicate.user_id == current_user.user_id:
+                return _duplicate_response(duplicate)
+        
+        # 只读取元数据和文件头，不经 API 进程下载图片；核对通过后 SHA-256 才可用于去重
+        original_url = await DirectUploadService.verify_object(ticket)
+        
+        # 同一用户重复上传：返回已有试卷，删除刚上传的对象
+        # 直传不经 API 进程读取像素，只按 SHA-256 精确去重
+        fingerprint = ImageFingerprint(ticket.sha256)
+        match = await exam_deduplicator.find_duplicate(db, current_user.user_id, fingerprint)
+        if match is not None:
+            exam_deduplicator.record(current_user.user_id, fingerprint, match)
+            await CacheService.set_direct_upload_duplicate(ticket.exam_id, str(match.exam.exam_id))
+            await get_storage().delete(ticket.key)
+            return _duplicate_response(match.exam)
+        
+        exam = Exam(
+            exam_id=uuid.UUID(ticket.exam_id),
+            user_id=current_user.user_id,
+            original_image_url=original_url,
+            status=ExamStatus.UPLOADED,
+            content_sha256=fingerprint.sha256
+        )
+        # 存储端已确认内容与 SHA-256 一致，才复制其他用户的识别结果
+        clone = await exam_deduplicator.find_clone_source(db, fingerprint)
+        exam_deduplicator.record(current_user.user_id, fingerprint, clone)
+        if clone is not None:
+            copy_results(clone.exam, exam)
+        db.add(exam)
+        await db.commit()
+        await db.refresh(exam)
+        
+        logger.info(f"Exam {exam.exam_id} uploaded directly to storage by user {current_user.user_id}")
+        if clone is not None:
+            return _duplicate_response(exam)
+        
+        from app.tasks.exam_tasks import enqueue_exam_processing
+        enqueue_exam_processing(str(exam.exam_id), preprocess_profile=ticket.preprocess_profile)
+        
+        return ExamUploadResponse(
+            exam_id=str(exam.exam_id),
+            status=exam.status.value,
+            estimated_time=45
+        )
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to finalize exam upload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload exam"
+        )
 
 
 @router.get("/{exam_id}/status", response_model=ExamStatusResponse)
@@ -18,6 +18,8 @@ from app.schemas.history import (
     ExamDeleteResponse
 )
 from app.api.dependencies import get_current_user
+from app.services.image_derivatives import thumbnail_url
+from app.services.report_service import report_service
 
 router = APIRouter(prefix="/exams", tags=["history"])
 logger = logging.getLogger(__name__)
@@ -86,7 +88,7 @@ async def get_exam_history(
                 total_score=exam.total_score,
                 student_score=student_score,
                 status=exam.status.value,
-                thumbnail_url=exam.processed_image_url or exam.original_image_url
+                thumbnail_url=thumbnail_url(exam)
             )
             exam_items.append(exam_item)
         
@@ -147,10 +149,8 @@ async def get_exam_detail(
         report_html_url = None
         report_pdf_url = None
         if exam.report_id:
-            # 这里应该从报告服务获取实际 URL
-            # 暂时使用模拟 URL
-            report_html_url = f"https://oss.example.com/reports/{exam.report_id}.html"
-            report_pdf_url = f"https://oss.example.com/reports/{exam.report_id}.pdf"
+            report_html_url = report_service.report_url(f"{exam.report_id}.html")
+            report_pdf_url = report_service.report_url(f"{exam.report_id}.pdf")
         
         return ExamDetailResponse(
             exam_id=exam.exam_id,
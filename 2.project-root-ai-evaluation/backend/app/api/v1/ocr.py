@@ -11,6 +11,7 @@ from app.models.exam import Exam
 from app.schemas.ocr import OCRRequest, OCRResponse
 from app.services.ocr.ocr_service import ocr_service
 from app.services.image_service import ImageService
+from app.services.image_preprocess import resolve_profile, restore_coordinates
 from app.core.config import settings
 
 router = APIRouter()
@@ -28,6 +29,7 @@ async def recognize_exam(
     
     - **exam_id**: 试卷 ID
     - **provider**: 指定 OCR 提供商（可选，默认使用配置的提供商）
+    - **preprocess_profile**: 识别前的图像预处理档位（可选，默认使用配置的档位）
     """
     # 查询试卷
     exam = await db.get(Exam, request.exam_id)
@@ -51,6 +53,14 @@ async def recognize_exam(
             detail=f"试卷状态不允许 OCR 识别: {exam.status}"
         )
     
+    try:
+        profile = resolve_profile(request.preprocess_profile)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     try:
         # 更新状态为处理中
         exam.status = "processing"
@@ -62,11 +72,16 @@ async def recognize_exam(
         
         # 执行 OCR 识别
         logger.info(f"开始 OCR 识别: exam_id={request.exam_id}, provider={request.provider}")
+        scale = 1.0
+        if profile is not None:
+            # 预处理在进程池中执行，不阻塞事件循环
+            image_bytes, scale = await ImageService.preprocess_for_ocr(image_bytes, profile)
         ocr_result = await ocr_service.recognize(
             image_bytes,
             provider_name=request.provider,
             retry_on_failure=True
         )
+        ocr_result = restore_coordinates(ocr_result, scale)
         
         # 标记低置信度区域
         low_confidence_regions = ocr_service.select_provider(request.provider).flag_low_confidence(
@@ -88,7 +88,8 @@ async def parse_exam(
         if request.use_deepseek and deepseek_service.api_key:
             logger.info(f"使用 DeepSeek 丰富题目信息: {len(parsed_exam.questions)} 道题")
             parsed_exam.questions = await deepseek_service.enrich_questions_batch(
-                parsed_exam.questions
+                parsed_exam.questions,
+                subject=parsed_exam.exam_meta.subject
             )
         
         # 保存解析结果到数据库
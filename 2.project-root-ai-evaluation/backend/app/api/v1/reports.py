@@ -87,13 +87,13 @@ async def generate_report(
         # 生成 PDF（简化实现）
         pdf_content = report_service.generate_pdf(html_content)
         
-        # 上传到 OSS（简化实现）
+        # 上传到对象存储
         report_id = str(uuid.uuid4())
-        html_url = report_service.upload_to_oss(
+        html_url = await report_service.upload_to_oss(
             html_content.encode('utf-8'),
             f"{report_id}.html"
         )
-        pdf_url = report_service.upload_to_oss(
+        pdf_url = await report_service.upload_to_oss(
             pdf_content,
             f"{report_id}.pdf"
         )
@@ -164,8 +164,8 @@ async def get_report(
     return {
         "report_id": str(exam.report_id),
         "exam_id": exam_id,
-        "html_url": f"https://oss.example.com/reports/{exam.report_id}.html",
-        "pdf_url": f"https://oss.example.com/reports/{exam.report_id}.pdf",
+        "html_url": report_service.report_url(f"{exam.report_id}.html"),
+        "pdf_url": report_service.report_url(f"{exam.report_id}.pdf"),
         "status": exam.status,
         "generated_at": exam.completed_at
     }
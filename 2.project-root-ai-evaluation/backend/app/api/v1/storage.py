@@ -0,0 +1,94 @@
+"""
+本地存储路由（预签名上传、对象读取）
+
+S3 兼容存储的预签名 URL 直接指向存储服务；本地存储没有独立的存储服务，
+预签名 URL 指向这里。请求以 URL 中的签名鉴权（不需要 Bearer token），
+请求体分块落盘并校验大小和 SHA-256 后写入存储。
+
+本地存储的对象 URL（STORAGE_LOCAL_URL_PREFIX）由 objects_router 提供；
+派生图按内容寻址、内容不变，返回长期缓存头（S3 兼容存储在写入时设置）。
+"""
+import os
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.image_derivatives import DERIVATIVE_PREFIX
+from app.services.storage import get_storage
+from app.services.storage.local import LocalStorageBackend
+from app.services.upload_stream import UploadTooLarge, receive_body
+
+
+router = APIRouter()
+objects_router = APIRouter()
+
+
+@router.put("/upload/{key:path}")
+async def upload_object(
+    key: str,
+    request: Request,
+    size: int,
+    sha256: str,
+    expires: int,
+    signature: str
+):
+    """
+    按预签名 URL 写入对象
+
+    - **size** / **sha256** / **expires** / **signature**: 预签名参数
+
+    请求头 Content-Type 必须与签名时一致。
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorageBackend):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    content_type = request.headers.get("content-type", "")
+    try:
+        storage.verify_presigned(key, content_type, size, sha256, expires, signature)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid storage key")
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+    upload = None
+    try:
+        upload = await receive_body(request, key, max_size=size)
+        if upload.size != size or upload.sha256 != sha256:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Request body does not match the signed size and SHA-256"
+            )
+        await storage.put_file(key, upload.path, content_type, move=True)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body does not match the signed size and SHA-256"
+        )
+    finally:
+        if upload is not None:
+            upload.discard()
+
+    logger.info(f"Object uploaded via presigned URL: {key} ({size} bytes)")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@objects_router.get("/{key:path}", include_in_schema=False)
+async def get_object(key: str):
+    """读取本地存储的对象"""
+    storage = get_storage()
+    if not isinstance(storage, LocalStorageBackend):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    try:
+        path = storage.file_path(key)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    headers = {}
+    if key.startswith(f"{DERIVATIVE_PREFIX}/"):
+        headers["cache-control"] = settings.IMAGE_DERIVATIVE_CACHE_CONTROL
+    return FileResponse(path, headers=headers)
@@ -2,7 +2,13 @@
 Celery 应用配置
 """
 from celery import Celery
+import os
+
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+
 from app.core.config import settings
+from app.core.metrics import mark_worker_process_dead, start_worker_metrics_server
+from app.core.worker_runtime import WorkerRuntime
 
 # 创建 Celery 应用
 celery_app = Celery(
@@ -26,6 +32,7 @@ celery_app.conf.update(
     task_soft_time_limit=240,  # 4 分钟软超时
     worker_prefetch_multiplier=1,  # 每次只预取一个任务
     worker_max_tasks_per_child=1000,  # 每个 worker 最多处理 1000 个任务后重启
+    task_default_queue="default",  # 未配置路由的任务进入 default 队列（worker 以 -Q 订阅下列所有队列）
 )
 
 # 任务路由配置
@@ -36,4 +43,26 @@ celery_app.conf.task_routes = {
     "app.tasks.exam_tasks.process_exam_diagnostic": {"queue": "diagnostic"},
     "app.tasks.exam_tasks.process_exam_report": {"queue": "report"},
     "app.tasks.exam_tasks.process_exam_complete": {"queue": "default"},
+    "app.tasks.exam_tasks.process_exam_express": {"queue": "express"},
+    "app.tasks.exam_tasks.generate_exam_derivatives": {"queue": "default"},
 }
+
+
+# Worker 进程生命周期：每个子进程一个长生命周期事件循环
+@worker_process_init.connect
+def init_worker_runtime(**kwargs):
+    """Worker 子进程启动时初始化异步运行时"""
+    WorkerRuntime.start()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_runtime(**kwargs):
+    """Worker 子进程退出时释放异步运行时资源"""
+    WorkerRuntime.shutdown()
+    mark_worker_process_dead(os.getpid())
+
+
+@worker_init.connect
+def init_worker_metrics(**kwargs):
+    """Worker 主进程启动时暴露 Prometheus 指标（汇总各子进程）"""
+    start_worker_metrics_server(settings.WORKER_METRICS_PORT)
@@ -2,7 +2,7 @@
 应用配置管理
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -29,6 +29,10 @@ class Settings(BaseSettings):
     # 文件上传配置
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_IMAGE_FORMATS: List[str] = ["jpg", "jpeg", "png", "heic"]
+    UPLOAD_CHUNK_SIZE: int = 256 * 1024  # 流式上传每次写入 spool 文件的数据量
+    UPLOAD_SPOOL_DIR: str = ""  # 上传 spool 目录，空字符串表示系统临时目录
+    DIRECT_UPLOAD_EXPIRES: int = 900  # 直传预签名 URL 和上传凭证的有效期（秒）
+    DIRECT_UPLOAD_HEADER_BYTES: int = 64 * 1024  # 完成直传时读取的文件头字节数
     
     # 图像质量阈值
     MIN_RESOLUTION_WIDTH: int = 1920
@@ -36,11 +40,73 @@ class Settings(BaseSettings):
     MIN_BLUR_THRESHOLD: float = 100.0
     MIN_BRIGHTNESS: int = 80
     MAX_BRIGHTNESS: int = 200
-    
+
+    # OCR 前图像预处理（fast / balanced / quality，空字符串表示直接识别原图）
+    IMAGE_PREPROCESS_PROFILE: str = ""  # 默认档位，上传或识别请求可单独指定
+    IMAGE_PREPROCESS_EXECUTOR: str = "process"  # 执行方式：process（进程池 + 共享内存）/ thread
+    IMAGE_PREPROCESS_WORKERS: int = 2  # 进程池大小
+
+    # 上传快速质量门（off / fast：缩小解码后评分 / full：全分辨率 validate_image_quality）
+    IMAGE_QUALITY_GATE: str = "off"
+    IMAGE_QUALITY_GATE_MAX_SIDE: int = 1024  # 评分图像的长边
+    IMAGE_QUALITY_GATE_BLUR_THRESHOLD: float = 580.0  # 缩小图上的模糊度阈值（make calibrate-quality-gate 标定）
+    IMAGE_QUALITY_GATE_MAX_GLARE: float = 0.15  # 过曝像素比例上限
+    IMAGE_QUALITY_GATE_MAX_SKEW: float = 15.0  # 文本行倾斜角上限（度）
+
+    # 派生图像（每次上传生成一次：缩略图 / 预览图 / OCR 灰度图）
+    IMAGE_DERIVATIVE_FORMAT: str = "webp"  # 缩略图和预览图格式：webp / avif（Pillow 不支持 AVIF 时退回 webp）
+    IMAGE_DERIVATIVE_THUMBNAIL_SIDE: int = 320  # 缩略图长边
+    IMAGE_DERIVATIVE_PREVIEW_SIDE: int = 1280  # 预览图长边
+    IMAGE_DERIVATIVE_QUALITY: int = 75  # 缩略图和预览图编码质量
+    IMAGE_DERIVATIVE_OCR_QUALITY: int = 95  # OCR 灰度图（原分辨率 JPEG）编码质量
+    IMAGE_DERIVATIVE_CACHE_CONTROL: str = "public, max-age=31536000, immutable"  # 派生图内容不变，长期缓存
+
+    # 上传去重（精确 SHA-256 + 64 位 dHash 感知哈希）
+    EXAM_DEDUP_ENABLED: bool = True
+    EXAM_DEDUP_MAX_DISTANCE: int = 4  # 同一用户近似重复的 dHash 汉明距离上限（0 表示只做精确去重）
+    EXAM_DEDUP_NEAR_WINDOW: int = 3600  # 近似重复只比较该用户最近多少秒内的上传（重试、重复拍摄）
+    EXAM_DEDUP_NEAR_CANDIDATES: int = 50  # 近似重复最多比较的最近试卷数
+    EXAM_DEDUP_CLONE_GLOBAL: bool = True  # 其他用户上传过完全相同的图片且已完成时，复制其识别结果
+
     # OCR 配置
     OCR_DEFAULT_PROVIDER: str = "baidu"  # 默认 OCR 提供商
     OCR_LOW_CONFIDENCE_THRESHOLD: float = 0.8  # 低置信度阈值
     
+    # OCR 结果缓存（按图像内容寻址）
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_BACKEND: str = "redis"  # 二级缓存后端：redis / disk / none
+    OCR_CACHE_LOCAL_SIZE: int = 256  # 进程内 LRU 条目数
+    OCR_CACHE_TTL: int = 7 * 24 * 3600  # 二级缓存过期时间（秒）
+    OCR_CACHE_DIR: str = "cache/ocr"  # 磁盘缓存目录
+    
+    # 分块并行 OCR（大幅面 / 多栏试卷按栏和重叠条带切分后并发识别）
+    OCR_TILE_MODE: str = "off"  # off：整页识别 / auto：多栏或高度超过 OCR_TILE_MAX_SIDE 时分块
+    OCR_TILE_MAX_SIDE: int = 2048  # 条带高度上限（像素）
+    OCR_TILE_OVERLAP: int = 128  # 相邻条带重叠像素（应大于一行文字的高度）
+    OCR_TILE_CONCURRENCY: int = 4  # 每页同时识别的分块数
+    OCR_TILE_JPEG_QUALITY: int = 95  # 分块 JPEG 编码质量
+    
+    # OCR 对冲请求（主提供商超过分位延迟未返回时并发请求备用提供商）
+    OCR_HEDGE_ENABLED: bool = True
+    OCR_HEDGE_PERCENTILE: float = 0.9  # 触发对冲的延迟分位数
+    OCR_HEDGE_MIN_SAMPLES: int = 20  # 使用分位数前所需的最少样本数
+    OCR_HEDGE_DEFAULT_DELAY: float = 5.0  # 样本不足时的对冲等待时间（秒）
+    OCR_HEDGE_MIN_DELAY: float = 0.5  # 对冲等待时间下限（秒）
+    OCR_HEDGE_MAX_EXTRA_RATIO: float = 0.1  # 对冲额外调用占总请求的比例上限
+    OCR_HEDGE_BURST: float = 3.0  # 允许的突发对冲次数
+    OCR_LATENCY_WINDOW: int = 200  # 每个提供商保留的延迟样本数
+    
+    # OCR 提供商健康评分与熔断
+    OCR_HEALTH_BACKEND: str = "redis"  # 状态共享后端：redis / local
+    OCR_HEALTH_WINDOW: int = 60  # 滑动窗口（秒）
+    OCR_HEALTH_BUCKET: int = 10  # 窗口分桶粒度（秒）
+    OCR_HEALTH_SYNC_INTERVAL: float = 2.0  # 与 Redis 同步的最小间隔（秒）
+    OCR_HEALTH_EWMA_ALPHA: float = 0.2  # EWMA 延迟平滑系数
+    OCR_HEALTH_LATENCY_REF: float = 2.0  # 延迟评分参考值（秒）
+    OCR_CIRCUIT_FAILURE_RATE: float = 0.5  # 触发熔断的窗口失败率
+    OCR_CIRCUIT_MIN_REQUESTS: int = 5  # 触发熔断所需的最少请求数
+    OCR_CIRCUIT_OPEN_SECONDS: float = 30.0  # 熔断冷却时间（秒）
+    
     BAIDU_OCR_APP_ID: str = ""
     BAIDU_OCR_API_KEY: str = ""
     BAIDU_OCR_API_SECRET: str = ""
@@ -57,13 +123,86 @@ class Settings(BaseSettings):
     DEEPSEEK_API_URL: str = "https://api.deepseek.com/v1"
     DEEPSEEK_MAX_RETRIES: int = 3
     DEEPSEEK_RETRY_DELAYS: List[int] = [1, 2, 4]  # 指数退避
-    
-    # 阿里云 OSS 配置
+    DEEPSEEK_ENRICH_BATCH_TOKENS: int = 1500  # 批量丰富每次调用的题目输入 token 预算
+    DEEPSEEK_ENRICH_BATCH_MAX_QUESTIONS: int = 12  # 批量丰富每次调用的最多题目数
+    DEEPSEEK_RETRY_MAX_DELAY: float = 30.0  # Retry-After 等待上限（秒）
+    
+    # DeepSeek 集群限流
+    DEEPSEEK_RATE_LIMIT_BACKEND: str = "redis"  # 令牌桶后端：redis / local
+    DEEPSEEK_MAX_CONCURRENCY: int = 8  # 每个进程的最大并发调用数
+    DEEPSEEK_BACKGROUND_MAX_CONCURRENCY: int = 6  # background 通道并发上限（其余留给 interactive）
+    DEEPSEEK_REQUESTS_PER_SECOND: float = 5.0  # 集群请求速率上限
+    DEEPSEEK_REQUEST_BURST: int = 10  # 请求突发容量
+    DEEPSEEK_TOKENS_PER_MINUTE: int = 200000  # 集群 token 速率上限
+    
+    # DeepSeek 计价（元 / 百万 token），用于估算调用费用
+    DEEPSEEK_PRICE_PROMPT_PER_MILLION: float = 2.0
+    DEEPSEEK_PRICE_PROMPT_CACHE_HIT_PER_MILLION: float = 0.5
+    DEEPSEEK_PRICE_COMPLETION_PER_MILLION: float = 8.0
+    
+    # DeepSeek 相同请求合并
+    DEEPSEEK_SINGLE_FLIGHT_BACKEND: str = "redis"  # 跨进程租约后端：redis / local
+    DEEPSEEK_SINGLE_FLIGHT_LEASE: float = 60.0  # 租约有效期（秒），应覆盖一次调用含重试的耗时
+    DEEPSEEK_SINGLE_FLIGHT_POLL: float = 0.2  # 等待其他进程结果的轮询间隔（秒）
+    
+    # 近似重复题目索引（MinHash-LSH，复用相似题目的知识点和难度）
+    NEAR_DUP_ENABLED: bool = True
+    NEAR_DUP_BACKEND: str = "redis"  # 索引存储：redis / disk
+    NEAR_DUP_INDEX_PATH: str = "cache/near_duplicate_index.json"  # 磁盘索引文件（backend=disk）
+    NEAR_DUP_THRESHOLD: float = 0.8  # 字符 3-gram Jaccard 相似度阈值
+    NEAR_DUP_MAX_CANDIDATES: int = 32  # 每次查询最多校验的候选数
+    NEAR_DUP_TTL: int = 180 * 24 * 3600  # Redis 索引过期时间（秒）
+    
+    # 本地知识点分类器（置信度足够高时不调用 DeepSeek）
+    KNOWLEDGE_CLASSIFIER_ENABLED: bool = True
+    KNOWLEDGE_CLASSIFIER_PATH: str = "models/knowledge_classifier.json.gz"  # 模型文件
+    KNOWLEDGE_CLASSIFIER_MIN_CONFIDENCE: float = 0.6  # 采用本地结果的最低置信度（余弦相似度）
+    
+    # Celery worker 指标端点（需设置 PROMETHEUS_MULTIPROC_DIR；0 表示不启动）
+    WORKER_METRICS_PORT: int = 9808
+    
+    # 诊断提示词压缩
+    DIAGNOSTIC_SUMMARY_TOKEN_BUDGET: int = 1200  # 题目摘要的 token 预算（本地估算）
+    DIAGNOSTIC_SUMMARY_ANSWER_CHARS: int = 40  # 错题学生答案 / 正确答案的截断字数
+    
+    # 主观题评分（分析阶段并发评分）
+    SUBJECTIVE_GRADING_CONCURRENCY: int = 4  # 同时进行的评分调用数
+    SUBJECTIVE_GRADING_TIMEOUT: float = 20.0  # 整次评分（含排队和补评）的时限（秒），未完成的题目保留规则判分
+    SUBJECTIVE_GRADING_SHORT_ANSWER_CHARS: int = 80  # 不超过该字数的答案合并到一次调用中评分
+    SUBJECTIVE_GRADING_BATCH_SIZE: int = 6  # 每次合并评分的最多题目数
+    
+    # 出站 HTTP 连接池（DeepSeek / OCR 提供商共享长连接）
+    HTTP_POOL_MAX_CONNECTIONS: int = 20  # 每个上游最大连接数
+    HTTP_POOL_MAX_KEEPALIVE: int = 10  # 每个上游保持的空闲连接数
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保持时间（秒）
+    HTTP_CONNECT_TIMEOUT: float = 5.0  # 建连超时（秒）
+    HTTP_DEFAULT_TIMEOUT: float = 30.0  # 默认读写超时（秒）
+    HTTP_UPSTREAM_TIMEOUTS: Dict[str, float] = {  # 按上游的读写超时（秒）
+        "deepseek": 30.0,
+        "baidu": 30.0,
+        "aliyun": 30.0,
+        "storage": 60.0,
+    }
+    HTTP2_ENABLED: bool = False  # 启用 HTTP/2（需安装 h2）
+    
+    # 阿里云 OSS 配置（S3 兼容存储后端使用同一组凭据）
     OSS_ACCESS_KEY_ID: str = ""
     OSS_ACCESS_KEY_SECRET: str = ""
     OSS_BUCKET_NAME: str = ""
     OSS_ENDPOINT: str = ""
     
+    # 对象存储（local：本地目录 / s3：S3 兼容接口，阿里云 OSS、MinIO、AWS S3）
+    STORAGE_BACKEND: str = "local"
+    STORAGE_LOCAL_DIR: str = "uploads"  # 本地存储目录
+    STORAGE_LOCAL_URL_PREFIX: str = "/uploads"  # 本地存储对象的 URL 前缀
+    STORAGE_LOCAL_UPLOAD_URL: str = "/api/v1/storage/upload"  # 本地存储预签名上传的 URL 前缀
+    STORAGE_S3_REGION: str = "oss-cn-hangzhou"  # 签名区域
+    STORAGE_S3_PATH_STYLE: bool = False  # 路径风格寻址（MinIO 等），OSS / S3 使用虚拟主机风格
+    STORAGE_PUBLIC_URL: str = ""  # 对象对外访问地址前缀（如 CDN），空字符串表示使用存储端点地址
+    STORAGE_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024  # 超过此大小的文件使用分片上传
+    STORAGE_MULTIPART_PART_SIZE: int = 5 * 1024 * 1024  # 分片大小（S3 要求不小于 5MB）
+    STORAGE_MULTIPART_CONCURRENCY: int = 4  # 单个文件的并发分片数
+    
     # 短信服务配置
     SMS_ACCESS_KEY_ID: str = ""
     SMS_ACCESS_KEY_SECRET: str = ""
@@ -72,6 +211,7 @@ class Settings(BaseSettings):
     
     # 性能配置
     EXAM_PROCESSING_TIMEOUT: int = 60  # 秒
+    EXAM_PIPELINE_MODE: str = "express"  # express: 单任务串联全部阶段；staged: 按队列分阶段
     MAX_CONCURRENT_REQUESTS: int = 10
     
     # Celery 配置
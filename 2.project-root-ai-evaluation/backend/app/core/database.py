@@ -25,6 +25,9 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+# 会话工厂别名（供 Celery 任务使用）
+async_session_maker = AsyncSessionLocal
+
 # 创建基类
 Base = declarative_base()
 
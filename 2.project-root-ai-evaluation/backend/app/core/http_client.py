@@ -0,0 +1,115 @@
+"""
+出站 HTTP 客户端管理
+
+每个上游（DeepSeek / 百度 OCR / 阿里云 OCR / 对象存储）持有一个长生命周期的
+httpx.AsyncClient，复用 keep-alive 连接，避免每次调用都重新进行 TCP + TLS 握手。
+客户端在 API 启动 / worker 进程启动时创建，关闭时统一释放。
+"""
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """是否安装了 HTTP/2 支持（h2）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClientRegistry:
+    """按上游名称管理共享 HTTP 客户端（单例）"""
+
+    # 已知上游（启动时预先创建）
+    UPSTREAMS = ("deepseek", "baidu", "aliyun", "storage")
+
+    _clients: Dict[str, Tuple[httpx.AsyncClient, Optional[asyncio.AbstractEventLoop]]] = {}
+
+    @classmethod
+    def build_client(cls, name: str) -> httpx.AsyncClient:
+        """
+        按配置创建上游客户端
+
+        Args:
+            name: 上游名称
+
+        Returns:
+            httpx.AsyncClient: 新客户端
+        """
+        read_timeout = settings.HTTP_UPSTREAM_TIMEOUTS.get(name, settings.HTTP_DEFAULT_TIMEOUT)
+        http2 = settings.HTTP2_ENABLED and _http2_available()
+        if settings.HTTP2_ENABLED and not http2:
+            logger.warning("HTTP2_ENABLED 已开启但未安装 h2，回退到 HTTP/1.1")
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=settings.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            http2=http2
+        )
+
+    @classmethod
+    def get(cls, name: str) -> httpx.AsyncClient:
+        """
+        获取上游客户端（不存在时创建）
+
+        连接池绑定创建时的事件循环，在其他事件循环中使用时重新创建。
+
+        Args:
+            name: 上游名称
+
+        Returns:
+            httpx.AsyncClient: 共享客户端
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        entry = cls._clients.get(name)
+        if entry is not None:
+            client, client_loop = entry
+            if not client.is_closed and (client_loop is None or client_loop is loop):
+                return client
+
+        client = cls.build_client(name)
+        cls._clients[name] = (client, loop)
+        return client
+
+    @classmethod
+    async def start(cls):
+        """创建所有已知上游的客户端"""
+        for name in cls.UPSTREAMS:
+            cls.get(name)
+        logger.info(f"HTTP 客户端已创建: {', '.join(cls.UPSTREAMS)}")
+
+    @classmethod
+    async def close(cls):
+        """关闭所有客户端"""
+        clients, cls._clients = cls._clients, {}
+        for name, (client, _) in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"HTTP 客户端关闭失败 ({name}): {e}")
+
+    @classmethod
+    def reset(cls):
+        """丢弃（不关闭）继承自父进程的客户端（fork 后调用）"""
+        cls._clients = {}
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """获取上游共享 HTTP 客户端"""
+    return HTTPClientRegistry.get(name)
@@ -0,0 +1,230 @@
+"""
+Prometheus 指标定义
+
+所有指标集中在此处定义，避免重复注册。
+API 进程通过 /metrics 暴露；Celery worker 为多进程（prefork），子进程指标写入
+PROMETHEUS_MULTIPROC_DIR，由主进程上的指标端点汇总暴露。
+"""
+import logging
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# OCR 结果缓存
+# ============================================================================
+
+OCR_CACHE_REQUESTS = Counter(
+    "ocr_cache_requests_total",
+    "OCR 结果缓存查询次数",
+    ["tier", "result"]
+)
+
+
+# ============================================================================
+# 题目画像缓存
+# ============================================================================
+
+QUESTION_CACHE_REQUESTS = Counter(
+    "question_cache_requests_total",
+    "题目画像缓存查询次数（每个字段一次）",
+    ["field", "result"]
+)
+
+NEAR_DUP_LOOKUPS = Counter(
+    "near_duplicate_lookups_total",
+    "近似重复题目索引查询次数",
+    ["result"]
+)
+
+KNOWLEDGE_CLASSIFIER_PREDICTIONS = Counter(
+    "knowledge_classifier_predictions_total",
+    "本地知识点分类器预测次数（accepted 即省去一次 LLM 调用）",
+    ["result"]
+)
+
+
+# ============================================================================
+# OCR 提供商调用
+# ============================================================================
+
+OCR_PROVIDER_LATENCY = Histogram(
+    "ocr_provider_latency_seconds",
+    "OCR 提供商调用延迟（秒）",
+    ["provider"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)
+)
+
+OCR_HEDGE_REQUESTS = Counter(
+    "ocr_hedge_requests_total",
+    "OCR 对冲请求次数",
+    ["outcome"]
+)
+
+OCR_TILED_PAGES = Histogram(
+    "ocr_tiled_page_tiles",
+    "分块识别的页面切分出的分块数",
+    buckets=(2, 3, 4, 6, 8, 12, 16)
+)
+
+OCR_PROVIDER_ERRORS = Counter(
+    "ocr_provider_errors_total",
+    "OCR 提供商调用失败次数",
+    ["provider", "error_class"]
+)
+
+OCR_CIRCUIT_OPEN = Gauge(
+    "ocr_circuit_open",
+    "OCR 提供商熔断状态（1 为熔断中）",
+    ["provider"]
+)
+
+
+# ============================================================================
+# LLM 调用
+# ============================================================================
+
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "LLM 调用在限流器中的排队时间（秒）",
+    ["provider", "lane"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+
+LLM_RATE_LIMITED = Counter(
+    "llm_rate_limited_total",
+    "LLM 上游返回限流（429 / 503 + Retry-After）的次数",
+    ["provider"]
+)
+
+LLM_COALESCED = Counter(
+    "llm_coalesced_requests_total",
+    "被合并而未实际调用上游的 LLM 请求数",
+    ["provider", "source"]
+)
+
+LLM_CALLS = Counter(
+    "llm_calls_total",
+    "LLM 调用次数（source: api 实际调用 / cache 命中缓存或合并 / error 失败）",
+    ["provider", "call_type", "source"]
+)
+
+LLM_CALL_LATENCY = Histogram(
+    "llm_call_latency_seconds",
+    "LLM 调用耗时（秒，含限流排队和重试）",
+    ["provider", "call_type", "source"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM token 用量（kind: prompt / completion / prompt_cache_hit）",
+    ["provider", "call_type", "kind"]
+)
+
+LLM_COST = Counter(
+    "llm_cost_yuan_total",
+    "LLM 调用估算费用（元）",
+    ["provider", "call_type"]
+)
+
+LLM_RETRIES = Counter(
+    "llm_retries_total",
+    "LLM 调用重试次数",
+    ["provider", "call_type"]
+)
+
+DIAGNOSTIC_STREAM_LATENCY = Histogram(
+    "diagnostic_stream_latency_seconds",
+    "流式诊断从发起请求到首个报告部分（first_section）/ 全部完成（complete）/ 输出提前结束（partial）的耗时（秒）",
+    ["stage"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60)
+)
+
+SUBJECTIVE_GRADES = Counter(
+    "subjective_grades_total",
+    "主观题评分结果数（cached / batched / single / timeout / failed）",
+    ["result"]
+)
+
+IMAGE_QUALITY_GATE_RESULTS = Counter(
+    "image_quality_gate_results_total",
+    "上传质量门判定结果数（ok / resolution / blur / brightness / glare / skew）",
+    ["mode", "result"]
+)
+
+IMAGE_PREPROCESS_LATENCY = Histogram(
+    "image_preprocess_latency_seconds",
+    "OCR 前图像预处理耗时（秒，含进程池排队和共享内存拷贝）",
+    ["profile"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+)
+
+STORAGE_LATENCY = Histogram(
+    "storage_request_latency_seconds",
+    "对象存储请求耗时（秒）",
+    ["backend", "operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+
+UPLOADS_RECEIVED = Counter(
+    "uploads_received_total",
+    "流式接收的上传数（ok / too_large / invalid）",
+    ["result"]
+)
+
+IMAGE_DERIVATIVES = Counter(
+    "image_derivatives_total",
+    "派生图像生成次数（generated：解码并编码 / reused：同内容已存在）",
+    ["result"]
+)
+
+DIRECT_UPLOADS = Counter(
+    "direct_uploads_total",
+    "预签名直传数（presigned / ok / missing / rejected）",
+    ["result"]
+)
+
+EXAM_DEDUP = Counter(
+    "exam_dedup_total",
+    "上传去重结果数（exact / near：返回同一用户已有试卷，cloned：复制其他用户的识别结果，miss）",
+    ["result"]
+)
+
+
+# ============================================================================
+# Worker 指标端点
+# ============================================================================
+
+def start_worker_metrics_server(port: int) -> bool:
+    """
+    在 Celery worker 主进程上启动指标端点，汇总所有子进程的指标
+
+    需要在 worker 启动前设置环境变量 PROMETHEUS_MULTIPROC_DIR（空目录）。
+
+    Args:
+        port: 监听端口，0 表示不启动
+
+    Returns:
+        bool: 是否已启动
+    """
+    if not port:
+        return False
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        logger.warning("未设置 PROMETHEUS_MULTIPROC_DIR，无法汇总 worker 子进程指标，不启动指标端点")
+        return False
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+    logger.info(f"Worker 指标端点已启动: :{port}/metrics")
+    return True
+
+
+def mark_worker_process_dead(pid: int):
+    """worker 子进程退出时清理其多进程指标文件"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,114 @@
+"""
+Celery Worker 异步运行时
+
+每个 worker 进程持有一个长生命周期的事件循环，任务以协程形式运行在其上，
+数据库 / Redis 连接池在同一循环内跨任务复用，避免每次 asyncio.run() 重建
+事件循环和冷连接的开销。
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerRuntime:
+    """Worker 进程级异步运行时（单例）"""
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        """
+        获取当前进程的事件循环（不存在或已关闭时创建）
+
+        Returns:
+            asyncio.AbstractEventLoop: 长生命周期事件循环
+        """
+        if cls._loop is None or cls._loop.is_closed():
+            cls._loop = asyncio.new_event_loop()
+            logger.info("Worker 事件循环已创建")
+        return cls._loop
+
+    @classmethod
+    def run(cls, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        在 worker 事件循环上运行协程并等待结果
+
+        Args:
+            coro: 协程对象
+
+        Returns:
+            协程返回值
+        """
+        return cls.get_loop().run_until_complete(coro)
+
+    @classmethod
+    def register_shutdown_hook(cls, hook: Callable[[], Awaitable[None]]):
+        """
+        注册关闭钩子（在事件循环关闭前按注册顺序执行）
+
+        Args:
+            hook: 无参异步函数
+        """
+        if hook not in cls._shutdown_hooks:
+            cls._shutdown_hooks.append(hook)
+
+    @classmethod
+    def start(cls):
+        """
+        Worker 子进程启动时调用
+
+        fork 出的子进程会继承父进程的连接池文件描述符，这些连接不能跨进程
+        共享，需要在子进程中丢弃（不关闭）后重新建立。
+        """
+        from app.core.database import engine
+        from app.core.redis_client import RedisClient
+        from app.core.http_client import HTTPClientRegistry
+
+        engine.sync_engine.dispose(close=False)
+        RedisClient._instance = None
+        HTTPClientRegistry.reset()
+
+        cls.get_loop()
+        cls.run(HTTPClientRegistry.start())
+        logger.info("Worker 异步运行时已启动")
+
+    @classmethod
+    def shutdown(cls):
+        """Worker 子进程退出时调用：执行关闭钩子、释放连接池并关闭事件循环"""
+        if cls._loop is None or cls._loop.is_closed():
+            return
+
+        cls._loop.run_until_complete(cls._close_resources())
+        cls._loop.run_until_complete(cls._loop.shutdown_asyncgens())
+        cls._loop.close()
+        cls._loop = None
+        logger.info("Worker 异步运行时已关闭")
+
+    @classmethod
+    async def _close_resources(cls):
+        """关闭共享资源"""
+        from app.core.database import engine
+        from app.core.redis_client import RedisClient
+        from app.core.http_client import HTTPClientRegistry
+        from app.services.image_preprocess import image_preprocessor
+
+        for hook in cls._shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Worker 关闭钩子执行失败: {e}")
+
+        image_preprocessor.shutdown()
+        await HTTPClientRegistry.close()
+        await RedisClient.close()
+        await engine.dispose()
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """在 worker 事件循环上运行协程（供 Celery 任务调用）"""
+    return WorkerRuntime.run(coro)
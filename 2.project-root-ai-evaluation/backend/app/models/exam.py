@@ -1,7 +1,7 @@
 """
 试卷模型
 """
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Enum as SQLEnum, Text, Boolean
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Enum as SQLEnum, Text, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,6 +15,7 @@ class ExamStatus(str, enum.Enum):
     """试卷处理状态"""
     UPLOADED = "uploaded"
     PROCESSING = "processing"
+    OCR_PROCESSING = "ocr_processing"
     OCR_COMPLETED = "ocr_completed"
     OCR_FAILED = "ocr_failed"
     PARSING = "parsing"
@@ -26,6 +27,9 @@ class ExamStatus(str, enum.Enum):
     DIAGNOSING = "diagnosing"  # 添加 DIAGNOSING 状态
     DIAGNOSED = "diagnosed"  # 添加 DIAGNOSED 状态
     DIAGNOSING_FAILED = "diagnosing_failed"
+    REPORT_GENERATING = "report_generating"
+    REPORT_GENERATED = "report_generated"
+    REPORT_GENERATION_FAILED = "report_generation_failed"
     REVIEWED = "reviewed"  # 添加 REVIEWED 状态（教师审核后）
     COMPLETED = "completed"
     FAILED = "failed"
@@ -34,6 +38,9 @@ class ExamStatus(str, enum.Enum):
 class Exam(Base):
     """试卷模型"""
     __tablename__ = "exams"
+    __table_args__ = (
+        Index("ix_exams_user_id_created_at", "user_id", "created_at"),  # 同一用户最近上传（近似去重）
+    )
     
     exam_id = Column(
         UUID(as_uuid=True),
@@ -51,6 +58,9 @@ class Exam(Base):
     # 图像信息
     original_image_url = Column(String(500), nullable=False)
     processed_image_url = Column(String(500), nullable=True)
+    image_derivatives = Column(JSONB, nullable=True)  # 派生图 URL（thumbnail / preview / ocr）
+    content_sha256 = Column(String(64), nullable=True, index=True)  # 原图内容 SHA-256（上传去重）
+    image_dhash = Column(String(16), nullable=True)  # 原图 64 位 dHash（十六进制，同一用户近似去重）
     
     # 状态
     status = Column(
@@ -76,6 +86,7 @@ class Exam(Base):
     analysis_result = Column(JSONB, nullable=True)  # 分析结果
     handwriting_metrics = Column(JSONB, nullable=True)
     diagnostic_report = Column(JSONB, nullable=True)
+    llm_usage = Column(JSONB, nullable=True)  # LLM 调用用量汇总（token、费用、耗时，按调用类型）
     
     # 错误信息
     error_message = Column(Text, nullable=True)
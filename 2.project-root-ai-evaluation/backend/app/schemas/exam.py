@@ -2,7 +2,7 @@
 试卷相关的 Pydantic 模式
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 
@@ -12,6 +12,30 @@ class ExamUploadResponse(BaseModel):
     status: str
     estimated_time: int = Field(..., description="预计处理时间（秒）")
     message: str = "Exam uploaded successfully"
+    deduplicated: bool = Field(False, description="是否命中上传去重（返回已有试卷或复制了已有识别结果）")
+
+
+class ExamPresignRequest(BaseModel):
+    """预签名直传请求"""
+    filename: str = Field(..., description="文件名（扩展名决定格式）")
+    size: int = Field(..., gt=0, description="文件字节数")
+    sha256: str = Field(..., pattern="^[0-9a-f]{64}$", description="文件内容 SHA-256（十六进制小写）")
+    preprocess_profile: Optional[str] = Field(None, description="OCR 前的图像预处理档位")
+
+
+class ExamPresignResponse(BaseModel):
+    """预签名直传响应"""
+    exam_id: str
+    upload_url: str = Field(..., description="直传地址")
+    method: str = Field("PUT", description="直传使用的 HTTP 方法")
+    headers: Dict[str, str] = Field(..., description="直传请求必须原样携带的请求头")
+    expires_at: datetime = Field(..., description="直传地址和上传凭证的过期时间")
+    upload_token: str = Field(..., description="完成直传时提交的上传凭证")
+
+
+class ExamFinalizeRequest(BaseModel):
+    """完成直传请求"""
+    upload_token: str
 
 
 class ExamStatusResponse(BaseModel):
@@ -33,6 +33,9 @@ class OCRRequest(BaseModel):
     """OCR 识别请求"""
     exam_id: str = Field(..., description="试卷 ID")
     provider: Optional[str] = Field(None, description="指定 OCR 提供商（可选）")
+    preprocess_profile: Optional[str] = Field(
+        None, description="识别前的图像预处理档位（fast / balanced / quality / none，可选）"
+    )
 
 
 class OCRResponse(BaseModel):
@@ -7,7 +7,7 @@ import logging
 from typing import Optional, Any
 from datetime import timedelta
 
-from app.core.redis_client import redis_client
+from app.core.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 
@@ -16,14 +16,20 @@ class CacheService:
     """缓存服务类"""
     
     # 缓存键前缀
-    PREFIX_KNOWLEDGE_POINTS = "knowledge_points:"
+    PREFIX_QUESTION_PROFILE = "question_profile:"
     PREFIX_EXAM_TEMPLATE = "exam_template:"
     PREFIX_SUBJECT_CONFIG = "subject_config:"
+    PREFIX_LLM_RESPONSE = "llm_response:"
+    PREFIX_SUBJECTIVE_GRADE = "subjective_grade:"
+    PREFIX_DIRECT_UPLOAD_DUPLICATE = "direct_upload_duplicate:"
     
     # 缓存过期时间
-    TTL_KNOWLEDGE_POINTS = timedelta(days=7)  # 知识点映射缓存 7 天
+    TTL_QUESTION_PROFILE = timedelta(days=7)  # 题目画像缓存 7 天
     TTL_EXAM_TEMPLATE = timedelta(days=30)  # 试卷模板缓存 30 天
     TTL_SUBJECT_CONFIG = timedelta(days=1)  # 科目配置缓存 1 天
+    TTL_LLM_RESPONSE = timedelta(days=1)  # LLM 响应缓存 1 天
+    TTL_SUBJECTIVE_GRADE = timedelta(days=30)  # 主观题评分缓存 30 天
+    TTL_DIRECT_UPLOAD_DUPLICATE = timedelta(days=1)  # 直传去重记录 1 天（长于上传凭证有效期）
     
     @staticmethod
     async def get(key: str) -> Optional[Any]:
@@ -37,6 +43,7 @@ class CacheService:
             缓存值，如果不存在则返回 None
         """
         try:
+            redis_client = await get_redis()
             value = await redis_client.get(key)
             if value:
                 return json.loads(value)
@@ -56,6 +63,7 @@ class CacheService:
             ttl: 过期时间
         """
         try:
+            redis_client = await get_redis()
             serialized_value = json.dumps(value, ensure_ascii=False)
             if ttl:
                 await redis_client.setex(key, int(ttl.total_seconds()), serialized_value)
@@ -74,6 +82,7 @@ class CacheService:
             key: 缓存键
         """
         try:
+            redis_client = await get_redis()
             await redis_client.delete(key)
             logger.debug(f"Cache deleted for key {key}")
         except Exception as e:
@@ -91,47 +100,43 @@ class CacheService:
             是否存在
         """
         try:
+            redis_client = await get_redis()
             return await redis_client.exists(key) > 0
         except Exception as e:
             logger.error(f"Failed to check cache existence for key {key}: {str(e)}")
             return False
     
     # ========================================================================
-    # 知识点映射缓存
+    # 题目画像缓存（知识点 + 难度）
     # ========================================================================
     
     @staticmethod
-    async def get_knowledge_points(subject: str, question_text: str) -> Optional[list]:
+    async def get_question_profile(subject: str, fingerprint: str) -> Optional[dict]:
         """
-        获取知识点映射缓存
+        获取题目画像缓存
         
         Args:
             subject: 科目
-            question_text: 题目文本
+            fingerprint: 题目指纹（规范化题目文本的 SHA-256）
             
         Returns:
-            知识点列表
+            题目画像（含 schema 版本号、知识点、难度）
         """
-        # 使用题目文本的哈希作为键的一部分
-        import hashlib
-        text_hash = hashlib.md5(question_text.encode()).hexdigest()[:8]
-        key = f"{CacheService.PREFIX_KNOWLEDGE_POINTS}{subject}:{text_hash}"
+        key = f"{CacheService.PREFIX_QUESTION_PROFILE}{subject}:{fingerprint}"
         return await CacheService.get(key)
     
     @staticmethod
-    async def set_knowledge_points(subject: str, question_text: str, knowledge_points: list):
+    async def set_question_profile(subject: str, fingerprint: str, profile: dict):
         """
-        设置知识点映射缓存
+        设置题目画像缓存
         
         Args:
             subject: 科目
-            question_text: 题目文本
-            knowledge_points: 知识点列表
+            fingerprint: 题目指纹
+            profile: 题目画像
         """
-        import hashlib
-        text_hash = hashlib.md5(question_text.encode()).hexdigest()[:8]
-        key = f"{CacheService.PREFIX_KNOWLEDGE_POINTS}{subject}:{text_hash}"
-        await CacheService.set(key, knowledge_points, CacheService.TTL_KNOWLEDGE_POINTS)
+        key = f"{CacheService.PREFIX_QUESTION_PROFILE}{subject}:{fingerprint}"
+        await CacheService.set(key, profile, CacheService.TTL_QUESTION_PROFILE)
     
     # ========================================================================
     # 试卷模板缓存
@@ -195,6 +200,93 @@ class CacheService:
         key = f"{CacheService.PREFIX_SUBJECT_CONFIG}{subject}"
         await CacheService.set(key, config, CacheService.TTL_SUBJECT_CONFIG)
     
+    # ========================================================================
+    # LLM 响应缓存
+    # ========================================================================
+    
+    @staticmethod
+    async def get_llm_response(request_key: str) -> Optional[dict]:
+        """
+        获取 LLM 响应缓存
+        
+        Args:
+            request_key: 请求指纹（规范化提示词 + 参数的哈希）
+            
+        Returns:
+            LLM 响应
+        """
+        return await CacheService.get(f"{CacheService.PREFIX_LLM_RESPONSE}{request_key}")
+    
+    @staticmethod
+    async def set_llm_response(request_key: str, response: dict):
+        """
+        设置 LLM 响应缓存
+        
+        Args:
+            request_key: 请求指纹
+            response: LLM 响应
+        """
+        key = f"{CacheService.PREFIX_LLM_RESPONSE}{request_key}"
+        await CacheService.set(key, response, CacheService.TTL_LLM_RESPONSE)
+    
+    # ========================================================================
+    # 主观题评分缓存
+    # ========================================================================
+    
+    @staticmethod
+    async def get_subjective_grade(fingerprint: str) -> Optional[dict]:
+        """
+        获取主观题评分缓存
+        
+        Args:
+            fingerprint: 评分指纹（规范化题目、参考答案和学生答案的 SHA-256）
+            
+        Returns:
+            评分结果（得分比例、是否正确、理由）
+        """
+        return await CacheService.get(f"{CacheService.PREFIX_SUBJECTIVE_GRADE}{fingerprint}")
+    
+    @staticmethod
+    async def set_subjective_grade(fingerprint: str, grade: dict):
+        """
+        设置主观题评分缓存
+        
+        Args:
+            fingerprint: 评分指纹
+            grade: 评分结果
+        """
+        key = f"{CacheService.PREFIX_SUBJECTIVE_GRADE}{fingerprint}"
+        await CacheService.set(key, grade, CacheService.TTL_SUBJECTIVE_GRADE)
+    
+    # ========================================================================
+    # 直传去重记录
+    # ========================================================================
+    
+    @staticmethod
+    async def get_direct_upload_duplicate(upload_exam_id: str) -> Optional[str]:
+        """
+        获取直传去重记录
+        
+        Args:
+            upload_exam_id: 上传凭证中的试卷 ID
+            
+        Returns:
+            核对内容后匹配到的已有试卷 ID
+        """
+        return await CacheService.get(f"{CacheService.PREFIX_DIRECT_UPLOAD_DUPLICATE}{upload_exam_id}")
+    
+    @staticmethod
+    async def set_direct_upload_duplicate(upload_exam_id: str, exam_id: str):
+        """
+        设置直传去重记录
+        
+        Args:
+            upload_exam_id: 上传凭证中的试卷 ID
+            exam_id: 匹配到的已有试卷 ID
+        """
+        key = f"{CacheService.PREFIX_DIRECT_UPLOAD_DUPLICATE}{upload_exam_id}"
+        await CacheService.set(key, exam_id, CacheService.TTL_DIRECT_UPLOAD_DUPLICATE)
+    
     # ========================================================================
     # 批量操作
     # ========================================================================
@@ -208,6 +300,7 @@ class CacheService:
             pattern: 键模式（支持通配符 *）
         """
         try:
+            redis_client = await get_redis()
             keys = []
             async for key in redis_client.scan_iter(match=pattern):
                 keys.append(key)
@@ -222,6 +315,7 @@ class CacheService:
     async def clear_all():
         """清除所有缓存"""
         try:
+            redis_client = await get_redis()
             await redis_client.flushdb()
             logger.info("All cache cleared")
         except Exception as e:
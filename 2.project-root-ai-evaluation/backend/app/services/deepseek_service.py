@@ -3,19 +3,36 @@ DeepSeek AI 服务
 用于知识点标注、难度估算和诊断分析
 """
 import asyncio
-import httpx
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
 import logging
 import json
 
 from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.metrics import DIAGNOSTIC_STREAM_LATENCY
 from app.schemas.parser import Question
 from app.schemas.analysis import QuestionAnalysis, OverallStats
 from app.schemas.handwriting import HandwritingMetrics
 from app.schemas.diagnostic import (
     DiagnosticReport, CapabilityDimensions, Issue, TargetSchoolGap
 )
-from app.services.cache_service import CacheService
+from app.services.diagnostic_prompt import diagnostic_prompt_compactor, estimate_tokens
+from app.services.json_stream import IncrementalJSONParser
+from app.services.knowledge_classifier import knowledge_classifier
+from app.services.near_duplicate import near_duplicate_index
+from app.services.question_cache import (
+    question_cache, FIELDS, FIELD_KNOWLEDGE_POINTS, FIELD_DIFFICULTY
+)
+from app.services.llm_limiter import (
+    deepseek_limiter, backoff_delay, parse_retry_after,
+    LANE_INTERACTIVE, LANE_BACKGROUND
+)
+from app.services.single_flight import SingleFlight, request_fingerprint
+from app.services.llm_usage import (
+    record_llm_call, CALL_TAGGING, CALL_DIFFICULTY, CALL_ENRICHMENT, CALL_GRADING,
+    CALL_DIAGNOSIS, CALL_OTHER, SOURCE_API, SOURCE_CACHE, SOURCE_ERROR
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,35 +40,47 @@ logger = logging.getLogger(__name__)
 class DeepSeekService:
     """DeepSeek AI 服务"""
     
+    # 每道题在提示词中的固定开销（编号、题型等）和输出预算
+    ENRICH_QUESTION_OVERHEAD = 15
+    ENRICH_OUTPUT_TOKENS_PER_QUESTION = 80
+    DIFFICULTY_OUTPUT_TOKENS_PER_QUESTION = 25
+    
     def __init__(self):
         """初始化 DeepSeek 服务"""
         self.api_key = settings.DEEPSEEK_API_KEY
         self.api_url = settings.DEEPSEEK_API_URL
         self.max_retries = settings.DEEPSEEK_MAX_RETRIES
         self.retry_delays = settings.DEEPSEEK_RETRY_DELAYS
+        self.single_flight = SingleFlight("deepseek")
     
     async def _call_api(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        lane: str = LANE_BACKGROUND,
+        use_cache: bool = True,
+        call_type: str = CALL_OTHER,
+        validate: Optional[Callable[[Dict[str, Any]], bool]] = None
     ) -> Dict[str, Any]:
         """
-        调用 DeepSeek API
+        调用 DeepSeek API（相同请求合并为一次调用，经过集群限流）
+        
+        每次调用按 call_type 记录 token 用量、耗时、重试和缓存命中（见 llm_usage）。
+        只有通过校验的响应才写入响应缓存：被截断或无法解析的输出不会在调用方重试时被重放。
         
         Args:
             messages: 消息列表
             temperature: 温度参数
             max_tokens: 最大 token 数
+            lane: 限流优先级通道（interactive / background）
+            use_cache: 是否合并相同请求并缓存响应
+            call_type: 调用类型（tagging / difficulty / enrichment / grading / diagnosis）
+            validate: 响应校验函数，默认要求输出完整且内容为 JSON 对象（见 _is_complete_json）
             
         Returns:
             Dict: API 响应
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": "deepseek-chat",
             "messages": messages,
@@ -59,47 +88,307 @@ class DeepSeekService:
             "max_tokens": max_tokens
         }
         
+        if not use_cache:
+            return await self._post_with_retry(payload, lane, call_type)
+        
+        request_key = request_fingerprint(
+            payload["model"], messages, temperature=temperature, max_tokens=max_tokens
+        )
+        posted = False
+        
+        async def post():
+            nonlocal posted
+            posted = True
+            return await self._post_with_retry(payload, lane, call_type)
+        
+        start = time.perf_counter()
+        response = await self.single_flight.do(request_key, post, validate or self._is_complete_json)
+        if not posted:
+            # 命中响应缓存或合并到其他进行中的请求，没有消耗 token
+            record_llm_call("deepseek", call_type, SOURCE_CACHE, time.perf_counter() - start)
+        return response
+    
+    @staticmethod
+    def _json_content(response: Dict[str, Any]) -> Any:
+        """
+        解析响应内容中的 JSON（去掉 ```json 代码块标记）
+        
+        Raises:
+            ValueError: 内容不是 JSON
+            KeyError / IndexError / TypeError: 响应结构不完整
+        """
+        text = response["choices"][0]["message"]["content"].strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.find("{"):]
+        return json.loads(text)
+    
+    @staticmethod
+    def _is_number(value: Any) -> bool:
+        """是否为数值（排除布尔值）"""
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    
+    @classmethod
+    def _is_complete_json(cls, response: Dict[str, Any]) -> bool:
+        """响应是否完整（未因长度截断）且内容为 JSON 对象"""
+        try:
+            if response["choices"][0].get("finish_reason") == "length":
+                return False
+            return isinstance(cls._json_content(response), dict)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+    
+    async def _post_with_retry(
+        self,
+        payload: Dict[str, Any],
+        lane: str,
+        call_type: str = CALL_OTHER
+    ) -> Dict[str, Any]:
+        """
+        发送请求（带限流和重试）
+        
+        Args:
+            payload: 请求体
+            lane: 限流优先级通道
+            call_type: 调用类型（用于用量计量）
+            
+        Returns:
+            Dict: API 响应
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # 预计消耗 token 数（提示词 + 最大输出），用于 token 速率限流
+        estimated_tokens = sum(
+            self._estimate_tokens(m["content"]) for m in payload["messages"]
+        ) + payload["max_tokens"]
+        
+        start = time.perf_counter()
+        
         # 实现重试逻辑
         for attempt in range(self.max_retries):
             try:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(
+                async with deepseek_limiter.acquire(lane, estimated_tokens):
+                    response = await get_http_client("deepseek").post(
                         f"{self.api_url}/chat/completions",
                         headers=headers,
                         json=payload
                     )
-                    response.raise_for_status()
-                    return response.json()
+                response.raise_for_status()
+                data = response.json()
+                record_llm_call(
+                    "deepseek", call_type, SOURCE_API, time.perf_counter() - start,
+                    usage=data.get("usage"), retries=attempt
+                )
+                return data
             
             except Exception as e:
                 logger.error(f"DeepSeek API 调用失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
                 
+                retry_after = parse_retry_after(e)
+                if retry_after is not None:
+                    # 上游限流：所有进程一起暂停
+                    await deepseek_limiter.penalize(retry_after)
+                
                 if attempt < self.max_retries - 1:
-                    # 指数退避
-                    delay = self.retry_delays[attempt] if attempt < len(self.retry_delays) else self.retry_delays[-1]
-                    logger.info(f"等待 {delay} 秒后重试...")
+                    # 带抖动的指数退避（优先 Retry-After）
+                    delay = backoff_delay(attempt, e, self.retry_delays)
+                    logger.info(f"等待 {delay:.2f} 秒后重试...")
                     await asyncio.sleep(delay)
                 else:
+                    record_llm_call(
+                        "deepseek", call_type, SOURCE_ERROR, time.perf_counter() - start,
+                        retries=attempt
+                    )
                     raise Exception(f"DeepSeek API 调用失败，已重试 {self.max_retries} 次")
     
-    async def tag_knowledge_points(self, question: Question) -> List[str]:
+    async def _stream_api(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        lane: str = LANE_BACKGROUND,
+        call_type: str = CALL_OTHER
+    ) -> AsyncIterator[str]:
+        """
+        流式调用 DeepSeek API（SSE），逐段返回生成的文本
+        
+        收到首段文本之前失败会按退避策略重试；之后失败直接抛出（已返回的
+        内容无法撤回）。流式请求不参与相同请求合并。
+        
+        Args:
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大 token 数
+            lane: 限流优先级通道
+            call_type: 调用类型（用于用量计量）
+            
+        Yields:
+            str: 新生成的文本片段
+        """
+        payload = {
+            "model": "deepseek-chat",
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            # 最后一个数据块携带本次调用的 usage
+            "stream_options": {"include_usage": True}
+        }
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+        estimated_tokens = sum(
+            self._estimate_tokens(m["content"]) for m in messages
+        ) + max_tokens
+        
+        start = time.perf_counter()
+        usage = None
+        
+        for attempt in range(self.max_retries):
+            received = False
+            try:
+                async with deepseek_limiter.acquire(lane, estimated_tokens):
+                    async with get_http_client("deepseek").stream(
+                        "POST",
+                        f"{self.api_url}/chat/completions",
+                        headers=headers,
+                        json=payload
+                    ) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            usage = chunk.get("usage") or usage
+                            if not chunk.get("choices"):
+                                continue
+                            delta = chunk["choices"][0].get("delta", {})
+                            if delta.get("content"):
+                                received = True
+                                yield delta["content"]
+                record_llm_call(
+                    "deepseek", call_type, SOURCE_API, time.perf_counter() - start,
+                    usage=usage, retries=attempt
+                )
+                return
+            
+            except Exception as e:
+                logger.error(f"DeepSeek 流式调用失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
+                if received or attempt == self.max_retries - 1:
+                    record_llm_call(
+                        "deepseek", call_type, SOURCE_ERROR, time.perf_counter() - start,
+                        usage=usage, retries=attempt
+                    )
+                if received:
+                    raise
+                
+                retry_after = parse_retry_after(e)
+                if retry_after is not None:
+                    await deepseek_limiter.penalize(retry_after)
+                
+                if attempt < self.max_retries - 1:
+                    delay = backoff_delay(attempt, e, self.retry_delays)
+                    logger.info(f"等待 {delay:.2f} 秒后重试...")
+                    await asyncio.sleep(delay)
+                else:
+                    raise Exception(f"DeepSeek API 流式调用失败，已重试 {self.max_retries} 次")
+    
+    async def _cached_profile(
+        self,
+        question: Question,
+        subject: Optional[str] = None,
+        fields: Tuple[str, ...] = FIELDS
+    ) -> Dict[str, Any]:
+        """
+        查询已缓存的题目画像：先查精确指纹缓存，未命中的字段再查近似重复索引
+        （近似命中的结果写回精确缓存）
+        
+        Args:
+            question: 题目
+            subject: 科目（可选）
+            fields: 需要的字段
+            
+        Returns:
+            Dict[str, Any]: 命中的字段及其值
+        """
+        found = await question_cache.get(question, subject, fields)
+        missing = [field for field in fields if field not in found]
+        if not missing or not settings.NEAR_DUP_ENABLED:
+            return found
+        
+        match = await near_duplicate_index.lookup(question, subject)
+        if match is None:
+            return found
+        
+        values = {FIELD_KNOWLEDGE_POINTS: match.knowledge_points, FIELD_DIFFICULTY: match.difficulty}
+        reused = {field: values[field] for field in missing if values[field] not in (None, [])}
+        if reused:
+            logger.info(
+                f"复用近似重复题目结果: {question.question_id} "
+                f"（相似度 {match.similarity:.2f}）-> {list(reused)}"
+            )
+            found.update(reused)
+            await question_cache.update(question, subject, **reused)
+        return found
+    
+    async def _store_profile(
+        self,
+        question: Question,
+        subject: Optional[str] = None,
+        knowledge_points: Optional[List[str]] = None,
+        difficulty: Optional[float] = None
+    ):
+        """
+        保存题目画像到精确指纹缓存和近似重复索引
+        
+        Args:
+            question: 题目
+            subject: 科目（可选）
+            knowledge_points: 知识点列表
+            difficulty: 难度系数
+        """
+        await question_cache.update(
+            question, subject, knowledge_points=knowledge_points, difficulty=difficulty
+        )
+        if settings.NEAR_DUP_ENABLED:
+            await near_duplicate_index.add(
+                question, subject, knowledge_points=knowledge_points, difficulty=difficulty
+            )
+    
+    async def tag_knowledge_points(
+        self,
+        question: Question,
+        subject: Optional[str] = None
+    ) -> List[str]:
         """
         标注知识点（带缓存）
         
         Args:
             question: 题目
+            subject: 科目（可选）
             
         Returns:
             List[str]: 知识点列表
         """
         # 尝试从缓存获取
-        cached_points = await CacheService.get_knowledge_points(
-            question.subject or "unknown",
-            question.question_text
-        )
-        if cached_points:
+        cached = await self._cached_profile(question, subject, (FIELD_KNOWLEDGE_POINTS,))
+        if FIELD_KNOWLEDGE_POINTS in cached:
             logger.info(f"从缓存获取知识点: {question.question_id}")
-            return cached_points
+            return cached[FIELD_KNOWLEDGE_POINTS]
+        
+        # 常见题目由本地分类器回答
+        if settings.KNOWLEDGE_CLASSIFIER_ENABLED:
+            predicted = await knowledge_classifier.predict(question, subject)
+            if predicted:
+                return predicted
         
         prompt = f"""请分析以下题目，提取其涉及的知识点。
 
@@ -119,20 +408,22 @@ class DeepSeekService:
             {"role": "user", "content": prompt}
         ]
         
+        def has_points(r: Dict[str, Any]) -> bool:
+            return self._is_complete_json(r) and isinstance(self._json_content(r).get("knowledge_points"), list)
+        
         try:
-            response = await self._call_api(messages, temperature=0.3)
-            content = response["choices"][0]["message"]["content"]
+            response = await self._call_api(
+                messages, temperature=0.3, call_type=CALL_TAGGING, validate=has_points
+            )
             
-            # 解析 JSON 响应
-            data = json.loads(content)
-            knowledge_points = data.get("knowledge_points", [])
+            # 解析 JSON 响应（缺少知识点时返回默认值，不写入缓存）
+            knowledge_points = self._json_content(response).get("knowledge_points")
+            if not isinstance(knowledge_points, list):
+                logger.warning(f"知识点标注结果缺少 knowledge_points: {question.question_id}")
+                return []
             
             # 缓存结果
-            await CacheService.set_knowledge_points(
-                question.subject or "unknown",
-                question.question_text,
-                knowledge_points
-            )
+            await self._store_profile(question, subject, knowledge_points=knowledge_points)
             
             logger.info(f"知识点标注完成: {question.question_id} -> {knowledge_points}")
             return knowledge_points
@@ -141,16 +432,27 @@ class DeepSeekService:
             logger.error(f"知识点标注失败: {e}")
             return []
     
-    async def estimate_difficulty(self, question: Question) -> float:
+    async def estimate_difficulty(
+        self,
+        question: Question,
+        subject: Optional[str] = None
+    ) -> float:
         """
-        估算难度
+        估算难度（带缓存）
         
         Args:
             question: 题目
+            subject: 科目（可选）
             
         Returns:
             float: 难度系数（0-1，越大越难）
         """
+        # 尝试从缓存获取
+        cached = await self._cached_profile(question, subject, (FIELD_DIFFICULTY,))
+        if FIELD_DIFFICULTY in cached:
+            logger.info(f"从缓存获取难度: {question.question_id}")
+            return cached[FIELD_DIFFICULTY]
+        
         prompt = f"""请评估以下题目的难度系数。
 
 题目：{question.question_text}
@@ -172,16 +474,25 @@ class DeepSeekService:
             {"role": "user", "content": prompt}
         ]
         
+        def has_difficulty(r: Dict[str, Any]) -> bool:
+            return self._is_complete_json(r) and self._is_number(self._json_content(r).get("difficulty"))
+        
         try:
-            response = await self._call_api(messages, temperature=0.3)
-            content = response["choices"][0]["message"]["content"]
+            response = await self._call_api(
+                messages, temperature=0.3, call_type=CALL_DIFFICULTY, validate=has_difficulty
+            )
             
-            # 解析 JSON 响应
-            data = json.loads(content)
-            difficulty = data.get("difficulty", 0.5)
+            # 解析 JSON 响应（缺少数值难度时返回默认值，不写入缓存）
+            difficulty = self._json_content(response).get("difficulty")
+            if not self._is_number(difficulty):
+                logger.warning(f"难度估算结果缺少 difficulty: {question.question_id}")
+                return 0.5
             
             # 确保在有效范围内
-            difficulty = max(0.0, min(1.0, difficulty))
+            difficulty = max(0.0, min(1.0, float(difficulty)))
+            
+            # 缓存结果
+            await self._store_profile(question, subject, difficulty=difficulty)
             
             logger.info(f"难度估算完成: {question.question_id} -> {difficulty}")
             return difficulty
@@ -190,20 +501,25 @@ class DeepSeekService:
             logger.error(f"难度估算失败: {e}")
             return 0.5  # 默认中等难度
     
-    async def enrich_question(self, question: Question) -> Question:
+    async def enrich_question(
+        self,
+        question: Question,
+        subject: Optional[str] = None
+    ) -> Question:
         """
-        丰富题目信息（知识点 + 难度）
+        丰富题目信息（知识点 + 难度，逐题调用）
         
         Args:
             question: 题目
+            subject: 科目（可选）
             
         Returns:
             Question: 丰富后的题目
         """
         # 并发执行知识点标注和难度估算
         knowledge_points, difficulty = await asyncio.gather(
-            self.tag_knowledge_points(question),
-            self.estimate_difficulty(question)
+            self.tag_knowledge_points(question, subject),
+            self.estimate_difficulty(question, subject)
         )
         
         question.knowledge_tags = knowledge_points
@@ -211,32 +527,278 @@ class DeepSeekService:
         
         return question
     
-    async def enrich_questions_batch(self, questions: List[Question]) -> List[Question]:
+    async def enrich_questions_batch(
+        self,
+        questions: List[Question],
+        subject: Optional[str] = None
+    ) -> List[Question]:
         """
         批量丰富题目信息
         
+        已缓存的字段直接填充；缺少知识点的题目先交给本地分类器，置信度足够高的
+        只需再估算难度。其余按 token 预算分组：知识点和难度都缺的每组一次 API 调用
+        同时返回两者，只缺难度的每组一次调用只返回难度；批量结果无法解析的题目
+        逐题回退。
+        
         Args:
             questions: 题目列表
+            subject: 科目（可选）
             
         Returns:
-            List[Question]: 丰富后的题目列表
+            List[Question]: 丰富后的题目列表（顺序不变）
         """
-        # 并发处理所有题目
-        enriched_questions = await asyncio.gather(
-            *[self.enrich_question(q) for q in questions],
-            return_exceptions=True
+        profiles = await asyncio.gather(
+            *[self._cached_profile(q, subject) for q in questions]
         )
+        untagged = []  # (题目, 已缓存的画像)
+        needs_difficulty = []
+        for question, profile in zip(questions, profiles):
+            if FIELD_KNOWLEDGE_POINTS in profile:
+                question.knowledge_tags = profile[FIELD_KNOWLEDGE_POINTS]
+            if FIELD_DIFFICULTY in profile:
+                question.difficulty = profile[FIELD_DIFFICULTY]
+            if FIELD_KNOWLEDGE_POINTS not in profile:
+                untagged.append((question, profile))
+            elif FIELD_DIFFICULTY not in profile:
+                needs_difficulty.append(question)
+        
+        # 常见题目由本地分类器标注知识点，只有置信度不足的题目把知识点交给 LLM
+        classified = 0
+        if untagged and settings.KNOWLEDGE_CLASSIFIER_ENABLED:
+            predictions = await asyncio.gather(
+                *[knowledge_classifier.predict(q, subject) for q, _ in untagged]
+            )
+            remaining = []
+            for (question, profile), predicted in zip(untagged, predictions):
+                if not predicted:
+                    remaining.append((question, profile))
+                    continue
+                classified += 1
+                question.knowledge_tags = predicted
+                if FIELD_DIFFICULTY not in profile:
+                    needs_difficulty.append(question)
+            untagged = remaining
+        
+        full_chunks = self._chunk_questions([q for q, _ in untagged])
+        difficulty_chunks = self._chunk_questions(needs_difficulty)
+        cached = sum(FIELD_KNOWLEDGE_POINTS in p and FIELD_DIFFICULTY in p for p in profiles)
+        logger.info(
+            f"批量丰富题目信息: {len(questions)} 道题，缓存命中 {cached} 道，"
+            f"本地分类 {classified} 道，{len(full_chunks) + len(difficulty_chunks)} 次调用"
+        )
+        
+        # 题目对象原地更新，返回原列表即保持顺序
+        await asyncio.gather(
+            *[self._enrich_chunk(chunk, subject) for chunk in full_chunks],
+            *[self._enrich_chunk(chunk, subject, difficulty_only=True) for chunk in difficulty_chunks]
+        )
+        return questions
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """粗略估算 token 数（中文约 0.6 token/字，其他字符约 0.3 token/字符）"""
+        return estimate_tokens(text)
+    
+    def _chunk_questions(self, questions: List[Question]) -> List[List[Question]]:
+        """
+        按输入 token 预算和题目数上限分组
+        
+        Args:
+            questions: 题目列表
+            
+        Returns:
+            List[List[Question]]: 分组后的题目
+        """
+        budget = settings.DEEPSEEK_ENRICH_BATCH_TOKENS
+        max_size = settings.DEEPSEEK_ENRICH_BATCH_MAX_QUESTIONS
+        
+        chunks: List[List[Question]] = []
+        current: List[Question] = []
+        used = 0
+        for question in questions:
+            cost = self._estimate_tokens(question.question_text) + self.ENRICH_QUESTION_OVERHEAD
+            if current and (used + cost > budget or len(current) >= max_size):
+                chunks.append(current)
+                current, used = [], 0
+            current.append(question)
+            used += cost
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    async def _enrich_chunk(
+        self,
+        chunk: List[Question],
+        subject: Optional[str] = None,
+        difficulty_only: bool = False
+    ) -> List[Question]:
+        """
+        一次调用丰富一组题目
+        
+        输出被截断时对半拆分重试；结果缺失或无法解析的题目逐题回退。
+        
+        Args:
+            chunk: 一组题目
+            subject: 科目（可选）
+            difficulty_only: 是否只估算难度（知识点已由缓存或本地分类器给出）
+            
+        Returns:
+            List[Question]: 丰富后的题目
+        """
+        questions_text = "\n\n".join(
+            f"[{q.question_id}]（{'客观题' if q.question_type == 'objective' else '主观题'}）"
+            f"{q.question_text}"
+            for q in chunk
+        )
+        if difficulty_only:
+            prompt = f"""请评估以下{len(chunk)}道{subject or ''}题目的难度系数。
+
+{questions_text}
+
+请以 JSON 格式返回，results 中每道题一项，id 与题目方括号中的编号一致：
+{{"results": [{{"id": "Q1", "difficulty": 0.65}}]}}
+
+要求：
+1. 难度系数 0.0-0.3 简单，0.3-0.5 中等，0.5-0.7 较难，0.7-1.0 困难
+2. 只返回 JSON，不要其他文字"""
+            system = "你是一位专业的教育测评专家，擅长评估题目难度。"
+            output_tokens = self.DIFFICULTY_OUTPUT_TOKENS_PER_QUESTION
+        else:
+            prompt = f"""请分析以下{len(chunk)}道{subject or ''}题目，为每道题提取知识点并评估难度系数。
+
+{questions_text}
+
+请以 JSON 格式返回，results 中每道题一项，id 与题目方括号中的编号一致：
+{{"results": [{{"id": "Q1", "knowledge_points": ["知识点1", "知识点2"], "difficulty": 0.65}}]}}
+
+要求：
+1. 知识点应该具体、准确，每个不超过10个字，每题最多5个
+2. 难度系数 0.0-0.3 简单，0.3-0.5 中等，0.5-0.7 较难，0.7-1.0 困难
+3. 只返回 JSON，不要其他文字"""
+            system = "你是一位专业的教育测评专家，擅长分析题目的知识点和难度。"
+            output_tokens = self.ENRICH_OUTPUT_TOKENS_PER_QUESTION
+
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        
+        try:
+            response = await self._call_api(
+                messages,
+                temperature=0.3,
+                max_tokens=output_tokens * len(chunk) + 100,
+                call_type=CALL_DIFFICULTY if difficulty_only else CALL_ENRICHMENT
+            )
+        except Exception as e:
+            logger.error(f"批量丰富题目信息失败: {e}")
+            return chunk
+        
+        choice = response["choices"][0]
+        if choice.get("finish_reason") == "length" and len(chunk) > 1:
+            mid = len(chunk) // 2
+            logger.warning(f"批量丰富输出被截断，拆分为 {mid} + {len(chunk) - mid} 道题重试")
+            first, second = await asyncio.gather(
+                self._enrich_chunk(chunk[:mid], subject, difficulty_only),
+                self._enrich_chunk(chunk[mid:], subject, difficulty_only)
+            )
+            return first + second
+        
+        results = self._parse_enrichment(choice["message"]["content"], chunk, difficulty_only)
+        
+        fallback = []
+        for question in chunk:
+            item = results.get(question.question_id)
+            if item is None:
+                fallback.append(question)
+                continue
+            knowledge_points, question.difficulty = item
+            if not difficulty_only:
+                question.knowledge_tags = knowledge_points
+            await self._store_profile(
+                question,
+                subject,
+                knowledge_points=knowledge_points,
+                difficulty=question.difficulty
+            )
+        
+        if fallback:
+            logger.warning(
+                f"批量结果缺失 {len(fallback)} 道题，逐题回退: "
+                f"{[q.question_id for q in fallback]}"
+            )
+            if difficulty_only:
+                difficulties = await asyncio.gather(
+                    *[self.estimate_difficulty(q, subject) for q in fallback],
+                    return_exceptions=True
+                )
+                for question, difficulty in zip(fallback, difficulties):
+                    if not isinstance(difficulty, BaseException):
+                        question.difficulty = difficulty
+            else:
+                await asyncio.gather(
+                    *[self.enrich_question(q, subject) for q in fallback],
+                    return_exceptions=True
+                )
+        
+        return chunk
+    
+    @staticmethod
+    def _parse_enrichment(
+        content: str,
+        chunk: List[Question],
+        difficulty_only: bool = False
+    ) -> Dict[str, Tuple[Optional[List[str]], float]]:
+        """
+        解析批量丰富结果
+        
+        Args:
+            content: 模型返回内容
+            chunk: 本次请求的题目
+            difficulty_only: 是否只含难度（此时知识点为 None）
+            
+        Returns:
+            Dict[题目ID, (知识点列表, 难度系数)]，无法解析的题目不在结果中
+        """
+        text = content.strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.find("{"):]
         
-        # 处理异常
-        result = []
-        for i, q in enumerate(enriched_questions):
-            if isinstance(q, Exception):
-                logger.error(f"题目 {questions[i].question_id} 丰富失败: {q}")
-                result.append(questions[i])  # 使用原始题目
+        try:
+            items = json.loads(text).get("results", [])
+        except (ValueError, AttributeError) as e:
+            logger.error(f"批量丰富结果解析失败: {e}")
+            return {}
+        
+        if not isinstance(items, list):
+            return {}
+        
+        ids = {q.question_id for q in chunk}
+        results: Dict[str, Tuple[Optional[List[str]], float]] = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            question_id = str(item.get("id", ""))
+            # 未返回编号且数量一致时按顺序对应
+            if question_id not in ids and len(items) == len(chunk):
+                question_id = chunk[index].question_id
+            if question_id not in ids:
+                continue
+            
+            points = item.get("knowledge_points")
+            difficulty = item.get("difficulty")
+            if not isinstance(difficulty, (int, float)):
+                continue
+            if difficulty_only:
+                points = None
+            elif isinstance(points, list):
+                points = [str(p) for p in points][:5]
             else:
-                result.append(q)
+                continue
+            results[question_id] = (points, max(0.0, min(1.0, float(difficulty))))
         
-        return result
+        return results
     
     async def evaluate_subjective_answer(
         self,
@@ -257,6 +819,44 @@ class DeepSeekService:
         Returns:
             Dict: 评估结果 {"score": 0.8, "is_correct": True, "reason": "..."}
         """
+        try:
+            data = await self.grade_subjective_answer(question_text, student_answer, correct_answer)
+            
+            # 计算实际得分
+            if max_score:
+                data["score"] = data["score_ratio"] * max_score
+            
+            logger.info(f"主观题评分完成: score_ratio={data['score_ratio']}, is_correct={data['is_correct']}")
+            return data
+        
+        except Exception as e:
+            logger.error(f"主观题评分失败: {e}")
+            # 返回默认评估
+            return {
+                "score_ratio": 0.5,
+                "is_correct": False,
+                "reason": "评估失败，使用默认分数",
+                "strengths": [],
+                "weaknesses": ["无法评估"]
+            }
+    
+    async def grade_subjective_answer(
+        self,
+        question_text: str,
+        student_answer: str,
+        correct_answer: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        评估一道主观题答案，失败时抛出异常（不返回默认分数）
+        
+        Args:
+            question_text: 题目文本
+            student_answer: 学生答案
+            correct_answer: 参考答案（可选）
+            
+        Returns:
+            Dict: {"score_ratio", "is_correct", "reason", "strengths", "weaknesses"}
+        """
         prompt = f"""请评估以下主观题的学生答案。
 
 题目：{question_text}
@@ -288,30 +888,86 @@ class DeepSeekService:
             {"role": "user", "content": prompt}
         ]
         
-        try:
-            response = await self._call_api(messages, temperature=0.3)
-            content = response["choices"][0]["message"]["content"]
-            
-            # 解析 JSON 响应
-            data = json.loads(content)
-            
-            # 计算实际得分
-            if max_score:
-                data["score"] = data["score_ratio"] * max_score
+        def has_grade(r: Dict[str, Any]) -> bool:
+            return self._is_complete_json(r) and self._normalize_grade(self._json_content(r)) is not None
+        
+        response = await self._call_api(
+            messages, temperature=0.3, lane=LANE_INTERACTIVE, call_type=CALL_GRADING, validate=has_grade
+        )
+        grade = self._normalize_grade(self._json_content(response))
+        if grade is None:
+            raise ValueError("主观题评分结果缺少 score_ratio")
+        return grade
+    
+    async def grade_subjective_batch(self, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        一次调用评估多道简答题
+        
+        Args:
+            items: 题目列表，每项 {"id", "question_text", "student_answer", "correct_answer"}
             
-            logger.info(f"主观题评分完成: score_ratio={data['score_ratio']}, is_correct={data['is_correct']}")
-            return data
+        Returns:
+            Dict[题目ID, 评估结果]，结果缺失或无法解析的题目不在其中；调用失败时抛出异常
+        """
+        answers_text = "\n\n".join(
+            f"[{item['id']}] 题目：{item['question_text']}\n"
+            + (f"参考答案：{item['correct_answer']}\n" if item.get("correct_answer") else "")
+            + f"学生答案：{item['student_answer']}"
+            for item in items
+        )
+        prompt = f"""请评估以下{len(items)}道主观题的学生答案。
+
+{answers_text}
+
+请以 JSON 格式返回，results 中每道题一项，id 与题目方括号中的编号一致：
+{{"results": [{{"id": "Q1", "score_ratio": 0.8, "is_correct": true, "reason": "评估理由"}}]}}
+
+评分说明：
+- score_ratio: 得分比例（0-1），表示学生答案的质量
+- is_correct: 是否基本正确（得分 >= 0.6 视为正确）
+- reason: 简要说明评分理由，不超过30字
+
+只返回 JSON，不要其他文字"""
+
+        messages = [
+            {"role": "system", "content": "你是一位专业的教育测评专家，擅长评估学生答案。"},
+            {"role": "user", "content": prompt}
+        ]
         
-        except Exception as e:
-            logger.error(f"主观题评分失败: {e}")
-            # 返回默认评估
-            return {
-                "score_ratio": 0.5,
-                "is_correct": False,
-                "reason": "评估失败，使用默认分数",
-                "strengths": [],
-                "weaknesses": ["无法评估"]
-            }
+        response = await self._call_api(
+            messages, temperature=0.3, max_tokens=60 * len(items) + 100,
+            lane=LANE_INTERACTIVE, call_type=CALL_GRADING
+        )
+        entries = self._json_content(response).get("results", [])
+        if not isinstance(entries, list):
+            return {}
+        
+        ids = {item["id"] for item in items}
+        results: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or str(entry.get("id", "")) not in ids:
+                continue
+            grade = self._normalize_grade(entry)
+            if grade is not None:
+                results[str(entry["id"])] = grade
+        return results
+    
+    @staticmethod
+    def _normalize_grade(data: Any) -> Optional[Dict[str, Any]]:
+        """校验并规范化评分结果，score_ratio 缺失或非数值时返回 None"""
+        if not isinstance(data, dict):
+            return None
+        ratio = data.get("score_ratio")
+        if isinstance(ratio, bool) or not isinstance(ratio, (int, float)):
+            return None
+        ratio = max(0.0, min(1.0, float(ratio)))
+        return {
+            "score_ratio": ratio,
+            "is_correct": bool(data.get("is_correct", ratio >= 0.6)),
+            "reason": str(data.get("reason", "")),
+            "strengths": list(data.get("strengths") or []),
+            "weaknesses": list(data.get("weaknesses") or [])
+        }
     
     def validate_response(self, response: Dict[str, Any]) -> bool:
         """
@@ -350,7 +1006,9 @@ class DeepSeekService:
         question_analyses: List[QuestionAnalysis],
         overall_stats: OverallStats,
         handwriting_metrics: Optional[Dict[str, Any]] = None,
-        target_school: Optional[str] = None
+        target_school: Optional[str] = None,
+        on_section: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+        questions: Optional[List[Question]] = None
     ) -> DiagnosticReport:
         """
         诊断试卷，生成深度诊断报告
@@ -365,12 +1023,61 @@ class DeepSeekService:
             overall_stats: 整体统计
             handwriting_metrics: 书写指标
             target_school: 目标学校
+            on_section: 报告某一部分生成完整时的回调（部分名称, 部分内容），
+                用于提前保存或展示
+            questions: 试卷题目（可选，提供时题目摘要按知识点汇总）
             
         Returns:
             DiagnosticReport: 诊断报告
         """
-        # 构建题目分析摘要
-        question_summary = self._build_question_summary(question_analyses)
+        report = None
+        async for name, value in self.diagnose_exam_stream(
+            exam_id=exam_id,
+            subject=subject,
+            grade=grade,
+            total_score=total_score,
+            student_score=student_score,
+            question_analyses=question_analyses,
+            overall_stats=overall_stats,
+            handwriting_metrics=handwriting_metrics,
+            target_school=target_school,
+            questions=questions
+        ):
+            if name == "report":
+                report = value
+            elif on_section is not None:
+                try:
+                    await on_section(name, value)
+                except Exception as e:
+                    logger.error(f"诊断部分回调失败 {name}: {e}")
+        
+        return report
+    
+    async def diagnose_exam_stream(
+        self,
+        exam_id: str,
+        subject: str,
+        grade: str,
+        total_score: float,
+        student_score: float,
+        question_analyses: List[QuestionAnalysis],
+        overall_stats: OverallStats,
+        handwriting_metrics: Optional[Dict[str, Any]] = None,
+        target_school: Optional[str] = None,
+        questions: Optional[List[Question]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        流式诊断：报告的每一部分生成完整即返回
+        
+        参数同 diagnose_exam。中途失败时已收到的部分保留，其余部分使用默认值；
+        一个部分都没有收到时返回默认诊断报告。
+        
+        Yields:
+            Tuple[str, Any]: 按模型输出顺序返回 capability_dimensions / surface_issues /
+            deep_issues / target_school_gap，最后返回 ("report", DiagnosticReport)
+        """
+        # 构建题目分析摘要（压缩到 token 预算内）
+        question_summary = self._build_question_summary(question_analyses, questions)
         
         # 构建诊断 Prompt
         prompt = self._build_diagnostic_prompt(
@@ -389,39 +1096,58 @@ class DeepSeekService:
             {"role": "user", "content": prompt}
         ]
         
+        sections: Dict[str, Any] = {}
+        parser = IncrementalJSONParser()
+        start = time.perf_counter()
         try:
-            response = await self._call_api(messages, temperature=0.5, max_tokens=2000)
-            content = response["choices"][0]["message"]["content"]
-            
-            # 解析 JSON 响应
-            data = json.loads(content)
-            
-            # 验证并构建诊断报告
-            diagnostic_report = self._build_diagnostic_report(exam_id, data)
-            
-            logger.info(f"诊断完成: {exam_id}")
-            return diagnostic_report
-        
+            async for chunk in self._stream_api(
+                messages, temperature=0.5, max_tokens=2000,
+                lane=LANE_INTERACTIVE, call_type=CALL_DIAGNOSIS
+            ):
+                for name, data in parser.feed(chunk):
+                    section = self._build_diagnostic_section(name, data)
+                    if section is None:
+                        continue
+                    if not sections:
+                        DIAGNOSTIC_STREAM_LATENCY.labels(stage="first_section").observe(
+                            time.perf_counter() - start
+                        )
+                    sections[name] = section
+                    yield name, section
+            complete = parser.done
         except Exception as e:
             logger.error(f"诊断失败: {e}")
+            complete = False
+        
+        if not sections:
             # 返回默认诊断报告
-            return self._build_default_diagnostic_report(exam_id)
-    
-    def _build_question_summary(self, question_analyses: List[QuestionAnalysis]) -> str:
-        """构建题目分析摘要"""
-        summary_lines = []
-        
-        for qa in question_analyses:
-            status = "✓" if qa.is_correct else "✗"
-            summary_lines.append(
-                f"{status} {qa.question_id}: "
-                f"学生答案='{qa.student_answer}', "
-                f"正确答案='{qa.correct_answer}', "
-                f"置信度={qa.confidence:.2f}, "
-                f"错误原因={qa.error_reason or '无'}"
-            )
+            yield "report", self._build_default_diagnostic_report(exam_id)
+            return
         
-        return "\n".join(summary_lines)
+        if complete:
+            DIAGNOSTIC_STREAM_LATENCY.labels(stage="complete").observe(time.perf_counter() - start)
+            logger.info(f"诊断完成: {exam_id}")
+        else:
+            # 输出提前结束：缺少的部分取默认值
+            DIAGNOSTIC_STREAM_LATENCY.labels(stage="partial").observe(time.perf_counter() - start)
+            logger.warning(f"诊断输出提前结束，仅收到 {list(sections)}: {exam_id}")
+        yield "report", DiagnosticReport(
+            exam_id=exam_id,
+            capability_dimensions=(
+                sections.get("capability_dimensions") or self._build_capability_dimensions({})
+            ),
+            surface_issues=sections.get("surface_issues", []),
+            deep_issues=sections.get("deep_issues", []),
+            target_school_gap=sections.get("target_school_gap")
+        )
+    
+    def _build_question_summary(
+        self,
+        question_analyses: List[QuestionAnalysis],
+        questions: Optional[List[Question]] = None
+    ) -> str:
+        """构建题目分析摘要（答对题目合并为区间、按知识点和错误原因汇总，不超过 token 预算）"""
+        return diagnostic_prompt_compactor.build_summary(question_analyses, questions)
     
     def _build_diagnostic_prompt(
         self,
@@ -519,59 +1245,77 @@ class DeepSeekService:
     
     def _build_diagnostic_report(self, exam_id: str, data: Dict[str, Any]) -> DiagnosticReport:
         """构建诊断报告"""
-        
-        # 构建能力维度
-        capability_data = data.get("capability_dimensions", {})
-        capability_dimensions = CapabilityDimensions(
-            comprehension=capability_data.get("comprehension", 0.5),
-            application=capability_data.get("application", 0.5),
-            analysis=capability_data.get("analysis", 0.5),
-            synthesis=capability_data.get("synthesis", 0.5),
-            evaluation=capability_data.get("evaluation", 0.5)
-        )
-        
-        # 构建表层问题
-        surface_issues = []
-        for issue_data in data.get("surface_issues", []):
-            surface_issues.append(Issue(
-                issue=issue_data.get("issue", ""),
-                severity=issue_data.get("severity", "medium"),
-                evidence=issue_data.get("evidence", []),
-                ai_addressable=issue_data.get("ai_addressable", False),
-                consequence=issue_data.get("consequence")
-            ))
-        
-        # 构建深层问题
-        deep_issues = []
-        for issue_data in data.get("deep_issues", []):
-            deep_issues.append(Issue(
-                issue=issue_data.get("issue", ""),
-                severity=issue_data.get("severity", "medium"),
-                evidence=issue_data.get("evidence", []),
-                ai_addressable=issue_data.get("ai_addressable", False),
-                consequence=issue_data.get("consequence"),
-                root_cause=issue_data.get("root_cause")
-            ))
-        
-        # 构建目标学校差距
         target_school_gap = None
-        if "target_school_gap" in data:
-            gap_data = data["target_school_gap"]
-            target_school_gap = TargetSchoolGap(
-                target_school=gap_data.get("target_school", ""),
-                score_gap=gap_data.get("score_gap", 0.0),
-                admission_probability=gap_data.get("admission_probability", 0.0),
-                key_improvement_areas=gap_data.get("key_improvement_areas", [])
-            )
+        if data.get("target_school_gap"):
+            target_school_gap = self._build_target_school_gap(data["target_school_gap"])
         
         return DiagnosticReport(
             exam_id=exam_id,
-            capability_dimensions=capability_dimensions,
-            surface_issues=surface_issues,
-            deep_issues=deep_issues,
+            capability_dimensions=self._build_capability_dimensions(
+                data.get("capability_dimensions", {})
+            ),
+            surface_issues=[self._build_issue(item) for item in data.get("surface_issues", [])],
+            deep_issues=[self._build_issue(item, deep=True) for item in data.get("deep_issues", [])],
             target_school_gap=target_school_gap
         )
     
+    def _build_diagnostic_section(self, name: str, data: Any) -> Any:
+        """
+        构建诊断报告的一个部分
+        
+        Args:
+            name: 部分名称
+            data: 模型返回的该部分 JSON
+            
+        Returns:
+            该部分的模型对象；未知部分或格式错误时返回 None
+        """
+        try:
+            if name == "capability_dimensions":
+                return self._build_capability_dimensions(data)
+            if name == "surface_issues":
+                return [self._build_issue(item) for item in data]
+            if name == "deep_issues":
+                return [self._build_issue(item, deep=True) for item in data]
+            if name == "target_school_gap" and data:
+                return self._build_target_school_gap(data)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"诊断报告部分 {name} 格式错误: {e}")
+        return None
+    
+    @staticmethod
+    def _build_capability_dimensions(data: Dict[str, Any]) -> CapabilityDimensions:
+        """构建能力维度"""
+        return CapabilityDimensions(
+            comprehension=data.get("comprehension", 0.5),
+            application=data.get("application", 0.5),
+            analysis=data.get("analysis", 0.5),
+            synthesis=data.get("synthesis", 0.5),
+            evaluation=data.get("evaluation", 0.5)
+        )
+    
+    @staticmethod
+    def _build_issue(data: Dict[str, Any], deep: bool = False) -> Issue:
+        """构建表层 / 深层问题"""
+        return Issue(
+            issue=data.get("issue", ""),
+            severity=data.get("severity", "medium"),
+            evidence=data.get("evidence", []),
+            ai_addressable=data.get("ai_addressable", False),
+            consequence=data.get("consequence"),
+            root_cause=data.get("root_cause") if deep else None
+        )
+    
+    @staticmethod
+    def _build_target_school_gap(data: Dict[str, Any]) -> TargetSchoolGap:
+        """构建目标学校差距"""
+        return TargetSchoolGap(
+            target_school=data.get("target_school", ""),
+            score_gap=data.get("score_gap", 0.0),
+            admission_probability=data.get("admission_probability", 0.0),
+            key_improvement_areas=data.get("key_improvement_areas", [])
+        )
+    
     def _build_default_diagnostic_report(self, exam_id: str) -> DiagnosticReport:
         """构建默认诊断报告（当诊断失败时）"""
         return DiagnosticReport(
@@ -0,0 +1,211 @@
+"""
+诊断提示词压缩
+
+把逐题分析压缩成诊断所需的摘要，控制在 token 预算内：
+- 答对的题目合并为题号区间（Q1-Q5, Q7）
+- 错题每题一行：知识点、错误原因、截断后的学生答案和正确答案
+- 按知识点汇总错误率、按错误原因汇总题号，作为诊断证据
+- 超出预算时逐级降级：缩短答案 → 去掉答案 → 去掉逐题错题行 → 截断汇总列表
+
+token 数用本地估算（中文约 0.6 token/字，其他字符约 0.3 token/字符），不调用分词服务。
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.schemas.analysis import QuestionAnalysis
+from app.schemas.parser import Question
+
+logger = logging.getLogger(__name__)
+
+
+QUESTION_NUMBER = re.compile(r"^(.*?)(\d+)$")
+
+# 超出预算时依次尝试的（答案截断字数, 是否保留逐题错题行, 汇总列表最多项数）
+DEGRADATION_LEVELS: Tuple[Tuple[Optional[int], bool, Optional[int]], ...] = (
+    (None, True, None),
+    (12, True, None),
+    (0, True, None),
+    (0, False, None),
+    (0, False, 8),
+    (0, False, 3),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（中文约 0.6 token/字，其他字符约 0.3 token/字符）"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return int(non_ascii * 0.6 + (len(text) - non_ascii) * 0.3) + 1
+
+
+def format_id_ranges(question_ids: Sequence[str]) -> str:
+    """
+    把题号列表合并为区间
+
+    前缀相同且编号连续的题号合并，如 [Q1, Q2, Q3, Q5] → "Q1-Q3, Q5"；
+    没有数字编号的题号原样列出。
+
+    Args:
+        question_ids: 题号列表（按试卷顺序）
+
+    Returns:
+        str: 合并后的区间文本
+    """
+    parts: List[str] = []
+    start = end = None
+    prefix = None
+
+    def flush():
+        if start is None:
+            return
+        if start == end:
+            parts.append(f"{prefix}{start}")
+        else:
+            parts.append(f"{prefix}{start}-{prefix}{end}")
+
+    for question_id in question_ids:
+        match = QUESTION_NUMBER.match(question_id)
+        if match is None:
+            flush()
+            start = end = prefix = None
+            parts.append(question_id)
+            continue
+        current_prefix, number = match.group(1), int(match.group(2))
+        if start is not None and current_prefix == prefix and number == end + 1:
+            end = number
+            continue
+        flush()
+        prefix, start, end = current_prefix, number, number
+    flush()
+
+    return ", ".join(parts)
+
+
+def _truncate(text: Optional[str], limit: Optional[int]) -> str:
+    """截断答案文本，超长部分以省略号表示"""
+    text = re.sub(r"\s+", " ", (text or "").strip())
+    if limit is None or len(text) <= limit:
+        return text
+    return text[:limit] + "…"
+
+
+def _limited(items: List[str], limit: Optional[int]) -> str:
+    """列表最多保留 limit 项，其余以 “等 n 项” 表示"""
+    if limit is None or len(items) <= limit:
+        return "；".join(items)
+    return "；".join(items[:limit]) + f"；等 {len(items) - limit} 项"
+
+
+class DiagnosticPromptCompactor:
+    """诊断提示词题目摘要的压缩器"""
+
+    def __init__(self, token_budget: Optional[int] = None, answer_chars: Optional[int] = None):
+        """
+        初始化压缩器
+
+        Args:
+            token_budget: 题目摘要的 token 预算
+            answer_chars: 错题答案的默认截断字数
+        """
+        self.token_budget = token_budget or settings.DIAGNOSTIC_SUMMARY_TOKEN_BUDGET
+        self.answer_chars = answer_chars or settings.DIAGNOSTIC_SUMMARY_ANSWER_CHARS
+
+    def build_summary(
+        self,
+        question_analyses: List[QuestionAnalysis],
+        questions: Optional[List[Question]] = None
+    ) -> str:
+        """
+        构建不超过 token 预算的题目摘要
+
+        Args:
+            question_analyses: 题目分析列表
+            questions: 试卷题目（提供时按知识点汇总）
+
+        Returns:
+            str: 题目摘要
+        """
+        tags = {q.question_id: q.knowledge_tags for q in questions or [] if q.knowledge_tags}
+
+        summary = ""
+        for answer_chars, per_question, list_limit in DEGRADATION_LEVELS:
+            if answer_chars is None:
+                answer_chars = self.answer_chars
+            summary = self._render(question_analyses, tags, answer_chars, per_question, list_limit)
+            if estimate_tokens(summary) <= self.token_budget:
+                return summary
+
+        logger.warning(
+            f"诊断题目摘要压缩后仍超出预算: {estimate_tokens(summary)} > {self.token_budget} tokens"
+        )
+        return summary
+
+    @staticmethod
+    def _render(
+        question_analyses: List[QuestionAnalysis],
+        tags: Dict[str, List[str]],
+        answer_chars: int,
+        per_question: bool,
+        list_limit: Optional[int]
+    ) -> str:
+        """按给定压缩级别渲染摘要"""
+        correct = [qa.question_id for qa in question_analyses if qa.is_correct]
+        wrong = [qa for qa in question_analyses if not qa.is_correct]
+        pending = [qa for qa in question_analyses if qa.review_status == "ai_pending_review"]
+
+        lines = [f"共 {len(question_analyses)} 题，答对 {len(correct)} 题，答错 {len(wrong)} 题"]
+        if correct:
+            lines.append(f"✓ 答对：{format_id_ranges(correct)}")
+
+        if wrong and not per_question:
+            lines.append(f"✗ 答错：{format_id_ranges([qa.question_id for qa in wrong])}")
+        elif wrong:
+            for qa in wrong:
+                parts = [f"✗ {qa.question_id}"]
+                if tags.get(qa.question_id):
+                    parts.append("/".join(tags[qa.question_id]))
+                parts.append(qa.error_reason or "原因不明")
+                if answer_chars:
+                    parts.append(
+                        f"答={_truncate(qa.student_answer, answer_chars) or '空'} "
+                        f"正={_truncate(qa.correct_answer, answer_chars) or '无'}"
+                    )
+                lines.append(" | ".join(parts))
+
+        # 按知识点：错误数 / 题数（错题题号），错误多的在前
+        by_tag: Dict[str, List[QuestionAnalysis]] = {}
+        for qa in question_analyses:
+            for tag in tags.get(qa.question_id, []):
+                by_tag.setdefault(tag, []).append(qa)
+        tag_items = []
+        for tag, items in sorted(
+            by_tag.items(), key=lambda kv: -sum(1 for qa in kv[1] if not qa.is_correct)
+        ):
+            wrong_ids = [qa.question_id for qa in items if not qa.is_correct]
+            tag_items.append(
+                f"{tag} 错{len(wrong_ids)}/{len(items)}"
+                + (f"（{format_id_ranges(wrong_ids)}）" if wrong_ids else "")
+            )
+        if tag_items:
+            lines.append(f"按知识点：{_limited(tag_items, list_limit)}")
+
+        # 按错误原因：题号，题数多的在前
+        by_reason: Dict[str, List[str]] = {}
+        for qa in wrong:
+            by_reason.setdefault(qa.error_reason or "原因不明", []).append(qa.question_id)
+        reason_items = [
+            f"{reason}（{format_id_ranges(ids)}）"
+            for reason, ids in sorted(by_reason.items(), key=lambda kv: -len(kv[1]))
+        ]
+        if reason_items:
+            lines.append(f"按错误原因：{_limited(reason_items, list_limit)}")
+
+        if pending:
+            lines.append(f"判定待复核：{format_id_ranges([qa.question_id for qa in pending])}")
+
+        return "\n".join(lines)
+
+
+# 全局诊断提示词压缩器实例
+diagnostic_prompt_compactor = DiagnosticPromptCompactor()
@@ -0,0 +1,193 @@
+"""
+预签名直传（客户端把图片直接上传到对象存储，API 进程只处理元数据）
+
+流式上传仍要由 API 进程接收最大 10MB 的请求体。直传分三步：
+1. presign：校验文件名、大小、SHA-256 和预处理档位，预先分配 exam_id 和对象 key，
+   返回预签名上传和上传凭证（JWT，绑定用户、key、大小和 SHA-256）
+2. 客户端按预签名上传把图片直接 PUT 到存储；S3 兼容存储按签名中的 x-amz-content-sha256
+   校验请求体，本地存储经 PUT /storage/upload 落盘时校验
+3. finalize：凭上传凭证确认对象——HEAD 核对大小和 SHA-256（存储端未记录时流式计算），
+   只读取文件头校验图像格式，然后创建 Exam 记录并入队处理
+
+直传不在 API 进程中解码整幅图像，上传质量门（IMAGE_QUALITY_GATE）不适用，
+质量检查由处理流水线在 OCR 前执行。
+"""
+import hashlib
+import io
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from jose import JWTError, jwt
+from PIL import Image
+
+from app.core.config import settings
+from app.core.metrics import DIRECT_UPLOADS
+from app.services.image_ingest import check_extension, size_exceeded_message
+from app.services.image_preprocess import resolve_profile
+from app.services.image_service import ImageService
+from app.services.storage import PresignedUpload, get_storage
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN_TYPE = "direct_upload"
+
+
+@dataclass
+class UploadTicket:
+    """上传凭证内容"""
+    user_id: str
+    exam_id: str
+    key: str  # 对象 key
+    filename: str
+    size: int
+    sha256: str
+    content_type: str
+    preprocess_profile: Optional[str] = None
+
+
+class DirectUploadService:
+    """预签名直传服务"""
+
+    @staticmethod
+    def create_ticket(
+        user_id: str,
+        filename: str,
+        size: int,
+        sha256: str,
+        preprocess_profile: Optional[str] = None
+    ) -> Tuple[UploadTicket, PresignedUpload, str]:
+        """
+        为一次直传分配 exam_id 和对象 key，生成预签名上传和上传凭证
+
+        Args:
+            user_id: 用户 ID
+            filename: 文件名
+            size: 文件字节数
+            sha256: 文件 SHA-256（十六进制小写）
+            preprocess_profile: OCR 前的图像预处理档位
+
+        Returns:
+            Tuple[UploadTicket, PresignedUpload, 上传凭证]
+
+        Raises:
+            ValueError: 文件名、大小或预处理档位无效
+        """
+        if size > settings.MAX_UPLOAD_SIZE:
+            raise ValueError(size_exceeded_message(size))
+        check_extension(filename)
+        resolve_profile(preprocess_profile)
+
+        exam_id = str(uuid.uuid4())
+        key = ImageService.image_key(exam_id, "original", filename)
+        ticket = UploadTicket(
+            user_id=user_id,
+            exam_id=exam_id,
+            key=key,
+            filename=filename,
+            size=size,
+            sha256=sha256,
+            content_type=ImageService.image_content_type(key),
+            preprocess_profile=preprocess_profile
+        )
+        presigned = get_storage().presign_put(
+            key, ticket.content_type, size, sha256, settings.DIRECT_UPLOAD_EXPIRES
+        )
+        token = jwt.encode(
+            {
+                "typ": TOKEN_TYPE,
+                "uid": user_id,
+                "exam_id": exam_id,
+                "key": key,
+                "filename": filename,
+                "size": size,
+                "sha256": sha256,
+                "content_type": ticket.content_type,
+                "profile": preprocess_profile,
+                "exp": datetime.utcnow() + timedelta(seconds=settings.DIRECT_UPLOAD_EXPIRES),
+            },
+            settings.SECRET_KEY,
+            algorithm=settings.ALGORITHM
+        )
+        DIRECT_UPLOADS.labels(result="presigned").inc()
+        return ticket, presigned, token
+
+    @staticmethod
+    def parse_token(token: str) -> UploadTicket:
+        """
+        解析上传凭证
+
+        Raises:
+            ValueError: 凭证无效或已过期
+        """
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError as e:
+            raise ValueError(f"Invalid upload token: {e}")
+        if payload.get("typ") != TOKEN_TYPE:
+            raise ValueError("Invalid upload token")
+        return UploadTicket(
+            user_id=payload["uid"],
+            exam_id=payload["exam_id"],
+            key=payload["key"],
+            filename=payload["filename"],
+            size=payload["size"],
+            sha256=payload["sha256"],
+            content_type=payload["content_type"],
+            preprocess_profile=payload.get("profile")
+        )
+
+    @staticmethod
+    async def verify_object(ticket: UploadTicket) -> str:
+        """
+        确认客户端已上传的对象（大小、SHA-256、文件头），不通过时删除对象
+
+        Args:
+            ticket: 上传凭证内容
+
+        Returns:
+            str: 对象 URL
+
+        Raises:
+            ValueError: 对象不存在或内容不符
+        """
+        storage = get_storage()
+        try:
+            info = await storage.head(ticket.key)
+        except FileNotFoundError:
+            DIRECT_UPLOADS.labels(result="missing").inc()
+            raise ValueError("Uploaded file not found. Upload it to the presigned URL before finalizing")
+
+        try:
+            if info.size != ticket.size:
+                raise ValueError(f"Uploaded file size {info.size} does not match declared size {ticket.size}")
+            sha256 = info.sha256 or await DirectUploadService._hash_object(ticket.key)
+            if sha256 != ticket.sha256:
+                raise ValueError("Uploaded file SHA-256 does not match declared hash")
+
+            header = await storage.get_range(ticket.key, 0, settings.DIRECT_UPLOAD_HEADER_BYTES)
+            try:
+                with Image.open(io.BytesIO(header)) as image:
+                    width, height = image.size
+                    image_format = image.format
+            except Exception as e:
+                raise ValueError(f"Invalid image file: {str(e)}")
+        except ValueError:
+            DIRECT_UPLOADS.labels(result="rejected").inc()
+            await storage.delete(ticket.key)
+            raise
+
+        DIRECT_UPLOADS.labels(result="ok").inc()
+        logger.debug(f"Direct upload verified: {ticket.key} {image_format} {width}x{height}")
+        return storage.url_for(ticket.key)
+
+    @staticmethod
+    async def _hash_object(key: str) -> str:
+        """流式计算对象 SHA-256（存储端未记录校验值时）"""
+        digest = hashlib.sha256()
+        async for chunk in get_storage().stream(key):
+            digest.update(chunk)
+        return digest.hexdigest()
@@ -0,0 +1,227 @@
+"""
+试卷上传去重
+
+同一张试卷照片常被重复上传（如 Android 客户端网络重试），每次都会创建新记录并重跑整条
+识别流水线。上传时为原图计算两种指纹并保存在试卷记录上：
+- content_sha256：内容 SHA-256（流式接收时已算出），精确匹配
+- image_dhash：64 位差值哈希（dHash），缩小解码为 9x8 灰度图后逐行比较相邻像素，
+  客户端重新压缩、缩放后汉明距离仍很小
+
+查询顺序：
+1. 同一用户、SHA-256 相同 → 返回已有试卷（exact）
+2. 同一用户、最近 EXAM_DEDUP_NEAR_WINDOW 秒内、dHash 汉明距离不超过
+   EXAM_DEDUP_MAX_DISTANCE → 返回已有试卷（near）
+3. 其他用户上传过 SHA-256 相同且已完成的试卷 → 新建试卷并复制其识别结果（cloned）
+
+近似匹配只在同一用户的最近上传中查找：同一版式的不同试卷在 9x8 尺度上也可能很接近，
+不跨用户、不跨时间使用。已失败或已删除的试卷不参与匹配，重新上传即重新处理。
+"""
+import copy
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import cv2
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import EXAM_DEDUP
+from app.models.exam import Exam, ExamStatus
+from app.services.image_quality import decode_reduced
+
+logger = logging.getLogger(__name__)
+
+
+HASH_SIZE = 8  # dHash 为 HASH_SIZE x HASH_SIZE 位
+HASH_DECODE_SIDE = 256  # 计算 dHash 前缩小解码的长边（JPEG 在 DCT 域缩小，不解码全分辨率）
+
+FAILED_STATUSES = [status for status in ExamStatus if status.value.endswith("failed")]
+
+# 复制给新试卷的识别结果（只取决于图像内容）；报告文件按原试卷渲染，不复制 report_id，
+# 新试卷需要时重新生成
+CLONED_FIELDS = (
+    "subject", "grade", "total_score", "exam_type", "ocr_result", "parsed_result", "analysis_result",
+    "handwriting_metrics", "diagnostic_report", "image_derivatives"
+)
+
+
+@dataclass
+class ImageFingerprint:
+    """原图指纹"""
+    sha256: str
+    dhash: Optional[str] = None  # 十六进制；未计算时为 None（只做精确匹配）
+
+
+@dataclass
+class DedupMatch:
+    """去重结果"""
+    exam: Exam
+    result: str  # exact / near / cloned
+
+    @property
+    def is_clone(self) -> bool:
+        """是否为其他用户的试卷（需新建记录并复制结果）"""
+        return self.result == "cloned"
+
+
+def dhash(gray: np.ndarray, hash_size: int = HASH_SIZE) -> str:
+    """
+    差值哈希
+
+    Args:
+        gray: 灰度图
+        hash_size: 哈希边长（位数为其平方）
+
+    Returns:
+        str: 十六进制哈希
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def image_dhash(file_content: bytes) -> str:
+    """
+    缩小解码原图并计算 dHash（按 EXIF 方向转正）
+
+    Args:
+        file_content: 文件内容（bytes 或只读内存映射）
+
+    Raises:
+        ValueError: 无法解码
+    """
+    gray, _ = decode_reduced(file_content, HASH_DECODE_SIDE)
+    return dhash(gray)
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """两个十六进制哈希的汉明距离"""
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def copy_results(source: Exam, target: Exam) -> None:
+    """
+    把已完成试卷的识别结果复制到新试卷
+
+    结果逐字段深拷贝，诊断报告中的试卷 ID 改为新试卷的 ID，新试卷不引用原试卷。
+
+    Args:
+        source: 已完成的原试卷（其他用户）
+        target: 新试卷（exam_id 须已确定）
+    """
+    for field in CLONED_FIELDS:
+        setattr(target, field, copy.deepcopy(getattr(source, field)))
+    if target.diagnostic_report and "exam_id" in target.diagnostic_report:
+        target.diagnostic_report["exam_id"] = str(target.exam_id)
+    target.status = ExamStatus.COMPLETED
+    target.completed_at = datetime.utcnow()
+
+
+class ExamDeduplicator:
+    """上传去重"""
+
+    async def lookup(self, db: AsyncSession, user_id, fingerprint: ImageFingerprint) -> Optional[DedupMatch]:
+        """
+        查找重复的试卷（先查同一用户，再查其他用户已完成的试卷），并记录结果
+
+        Args:
+            db: 数据库会话
+            user_id: 上传用户
+            fingerprint: 原图指纹（SHA-256 须由服务端确认）
+
+        Returns:
+            Optional[DedupMatch]: 未找到时为 None
+        """
+        match = await self.find_duplicate(db, user_id, fingerprint)
+        if match is None:
+            match = await self.find_clone_source(db, fingerprint)
+        self.record(user_id, fingerprint, match)
+        return match
+
+    async def find_duplicate(
+        self,
+        db: AsyncSession,
+        user_id,
+        fingerprint: ImageFingerprint
+    ) -> Optional[DedupMatch]:
+        """同一用户的精确或近似重复"""
+        if not settings.EXAM_DEDUP_ENABLED:
+            return None
+
+        result = await db.execute(
+            select(Exam)
+            .where(*self._active_exams(user_id), Exam.content_sha256 == fingerprint.sha256)
+            .order_by(Exam.created_at.desc())
+            .limit(1)
+        )
+        exam = result.scalar_one_or_none()
+        if exam is not None:
+            return DedupMatch(exam, "exact")
+
+        max_distance = settings.EXAM_DEDUP_MAX_DISTANCE
+        if not fingerprint.dhash or max_distance <= 0:
+            return None
+
+        since = datetime.utcnow() - timedelta(seconds=settings.EXAM_DEDUP_NEAR_WINDOW)
+        result = await db.execute(
+            select(Exam)
+            .where(*self._active_exams(user_id), Exam.created_at >= since, Exam.image_dhash.isnot(None))
+            .order_by(Exam.created_at.desc())
+            .limit(settings.EXAM_DEDUP_NEAR_CANDIDATES)
+        )
+        best, best_distance = None, max_distance + 1
+        for candidate in result.scalars().all():
+            distance = hamming_distance(fingerprint.dhash, candidate.image_dhash)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return DedupMatch(best, "near") if best is not None else None
+
+    async def find_clone_source(self, db: AsyncSession, fingerprint: ImageFingerprint) -> Optional[DedupMatch]:
+        """
+        任意用户的已完成试卷中内容相同的一份
+
+        只按 SHA-256 精确匹配；调用方须已确认上传内容与该 SHA-256 一致，
+        否则仅凭哈希值即可取得他人的识别结果。
+        """
+        if not settings.EXAM_DEDUP_ENABLED or not settings.EXAM_DEDUP_CLONE_GLOBAL:
+            return None
+
+        result = await db.execute(
+            select(Exam)
+            .where(
+                Exam.content_sha256 == fingerprint.sha256,
+                Exam.status == ExamStatus.COMPLETED,
+                Exam.is_deleted.is_(False)
+            )
+            .order_by(Exam.completed_at.desc())
+            .limit(1)
+        )
+        source = result.scalar_one_or_none()
+        return DedupMatch(source, "cloned") if source is not None else None
+
+    @staticmethod
+    def record(user_id, fingerprint: ImageFingerprint, match: Optional[DedupMatch]) -> None:
+        """记录去重结果"""
+        if not settings.EXAM_DEDUP_ENABLED:
+            return
+        EXAM_DEDUP.labels(result=match.result if match else "miss").inc()
+        if match is not None:
+            logger.info(
+                f"Duplicate upload ({match.result}) by user {user_id}: "
+                f"matches exam {match.exam.exam_id}, sha256 {fingerprint.sha256[:12]}"
+            )
+
+    @staticmethod
+    def _active_exams(user_id):
+        return (
+            Exam.user_id == user_id,
+            Exam.is_deleted.is_(False),
+            Exam.status.notin_(FAILED_STATUSES),
+        )
+
+
+# 全局去重实例
+exam_deduplicator = ExamDeduplicator()
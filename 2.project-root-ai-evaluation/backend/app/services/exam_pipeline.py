@@ -0,0 +1,211 @@
+"""
+试卷处理流水线
+
+OCR → 解析 → 分析 → 诊断 → 报告 五个阶段的共享实现。
+各阶段直接接收和返回内存对象（OCRResult / ParsedExam / QuestionAnalysis），
+既可由 express 模式在一次任务调用中串联执行，也可由按队列分阶段的
+Celery 任务在从数据库加载结果后逐个调用。
+"""
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+from app.schemas.ocr import OCRResult
+from app.schemas.parser import ParsedExam
+from app.schemas.analysis import QuestionAnalysis, OverallStats
+from app.schemas.diagnostic import DiagnosticReport
+from app.services.image_service import ImageService
+from app.services.image_preprocess import resolve_profile, restore_coordinates
+from app.services.parser_service import ParserService
+from app.services.analysis_service import AnalysisService
+from app.services.deepseek_service import deepseek_service
+from app.services.report_service import report_service
+from app.services.ocr.ocr_service import ocr_service
+
+logger = logging.getLogger(__name__)
+
+
+class ExamPipeline:
+    """试卷处理流水线"""
+
+    # ========================================================================
+    # 阶段实现
+    # ========================================================================
+
+    async def run_ocr(self, image_url: str, preprocess_profile: Optional[str] = None) -> OCRResult:
+        """
+        OCR 阶段
+
+        Args:
+            image_url: 图像 URL
+            preprocess_profile: 识别前的预处理档位（默认取 IMAGE_PREPROCESS_PROFILE）
+
+        Returns:
+            OCRResult: OCR 识别结果（坐标对应原图）
+        """
+        image_bytes = await ImageService.read_image(image_url)
+        profile = resolve_profile(preprocess_profile)
+        if profile is None:
+            return await ocr_service.recognize(image_bytes)
+
+        processed_bytes, scale = await ImageService.preprocess_for_ocr(image_bytes, profile)
+        return restore_coordinates(await ocr_service.recognize(processed_bytes), scale)
+
+    async def run_parsing(self, exam_id: str, ocr_result: OCRResult) -> ParsedExam:
+        """
+        解析阶段（含 DeepSeek 知识点和难度标注）
+
+        Args:
+            exam_id: 试卷 ID
+            ocr_result: OCR 识别结果
+
+        Returns:
+            ParsedExam: 解析后的试卷
+        """
+        parsed_exam = ParserService.parse_exam(ocr_result)
+        parsed_exam.exam_id = exam_id
+
+        if deepseek_service.api_key and parsed_exam.questions:
+            parsed_exam.questions = await deepseek_service.enrich_questions_batch(
+                parsed_exam.questions,
+                subject=parsed_exam.exam_meta.subject
+            )
+
+        return parsed_exam
+
+    def run_analysis(
+        self,
+        parsed_exam: ParsedExam,
+        ocr_result: OCRResult
+    ) -> Tuple[List[QuestionAnalysis], OverallStats]:
+        """
+        分析阶段
+
+        Args:
+            parsed_exam: 解析后的试卷
+            ocr_result: OCR 识别结果
+
+        Returns:
+            Tuple[题目分析列表, 整体统计]
+        """
+        return AnalysisService.analyze_exam(parsed_exam, ocr_result)
+
+    async def run_diagnostic(
+        self,
+        parsed_exam: ParsedExam,
+        question_analyses: List[QuestionAnalysis],
+        overall_stats: OverallStats,
+        handwriting_metrics: Optional[Dict[str, Any]] = None,
+        on_section: Optional[Callable[[str, Any], Awaitable[None]]] = None
+    ) -> DiagnosticReport:
+        """
+        诊断阶段
+
+        Args:
+            parsed_exam: 解析后的试卷
+            question_analyses: 题目分析列表
+            overall_stats: 整体统计
+            handwriting_metrics: 书写指标（可选）
+            on_section: 报告某一部分生成完整时的回调（可选）
+
+        Returns:
+            DiagnosticReport: 诊断报告
+        """
+        exam_meta = parsed_exam.exam_meta
+        return await deepseek_service.diagnose_exam(
+            exam_id=parsed_exam.exam_id,
+            subject=exam_meta.subject or "未知",
+            grade=exam_meta.grade or "未知",
+            total_score=exam_meta.total_score or 100,
+            student_score=overall_stats.total_score or overall_stats.correct_count,
+            question_analyses=question_analyses,
+            overall_stats=overall_stats,
+            handwriting_metrics=handwriting_metrics,
+            on_section=on_section,
+            questions=parsed_exam.questions
+        )
+
+    async def run_report(
+        self,
+        parsed_exam: ParsedExam,
+        diagnostic_report: DiagnosticReport,
+        overall_stats: OverallStats
+    ) -> Dict[str, str]:
+        """
+        报告生成阶段
+
+        Args:
+            parsed_exam: 解析后的试卷
+            diagnostic_report: 诊断报告
+            overall_stats: 整体统计
+
+        Returns:
+            Dict: {"report_id": ..., "html_url": ..., "pdf_url": ...}
+        """
+        html_content = report_service.generate_html(
+            exam_id=parsed_exam.exam_id,
+            diagnostic_report=diagnostic_report,
+            overall_stats=overall_stats,
+            exam_meta=parsed_exam.exam_meta.model_dump()
+        )
+        pdf_content = report_service.generate_pdf(html_content)
+
+        report_id = str(uuid.uuid4())
+        return {
+            "report_id": report_id,
+            "html_url": await report_service.upload_to_oss(
+                html_content.encode('utf-8'), f"{report_id}.html"
+            ),
+            "pdf_url": await report_service.upload_to_oss(pdf_content, f"{report_id}.pdf"),
+        }
+
+    # ========================================================================
+    # 持久化格式转换
+    # ========================================================================
+
+    @staticmethod
+    def dump_parsed(parsed_exam: ParsedExam) -> Dict[str, Any]:
+        """ParsedExam -> parsed_result JSON"""
+        return {
+            "exam_meta": parsed_exam.exam_meta.model_dump(),
+            "questions": [q.model_dump() for q in parsed_exam.questions],
+            "parsing_confidence": parsed_exam.parsing_confidence,
+            "incomplete_fields": parsed_exam.incomplete_fields
+        }
+
+    @staticmethod
+    def load_parsed(exam_id: str, parsed_result: Dict[str, Any]) -> ParsedExam:
+        """parsed_result JSON -> ParsedExam"""
+        return ParsedExam(
+            exam_id=exam_id,
+            exam_meta=parsed_result.get("exam_meta", {}),
+            questions=parsed_result.get("questions", []),
+            parsing_confidence=parsed_result.get("parsing_confidence", 0.0),
+            incomplete_fields=parsed_result.get("incomplete_fields", [])
+        )
+
+    @staticmethod
+    def dump_analysis(
+        question_analyses: List[QuestionAnalysis],
+        overall_stats: OverallStats
+    ) -> Dict[str, Any]:
+        """分析结果 -> analysis_result JSON"""
+        return {
+            "question_analysis": [qa.model_dump() for qa in question_analyses],
+            "overall_stats": overall_stats.model_dump()
+        }
+
+    @staticmethod
+    def load_analysis(
+        analysis_result: Dict[str, Any]
+    ) -> Tuple[List[QuestionAnalysis], OverallStats]:
+        """analysis_result JSON -> 分析结果"""
+        question_analyses = [
+            QuestionAnalysis(**qa) for qa in analysis_result.get("question_analysis", [])
+        ]
+        overall_stats = OverallStats(**analysis_result["overall_stats"])
+        return question_analyses, overall_stats
+
+
+# 创建全局流水线实例
+exam_pipeline = ExamPipeline()
@@ -0,0 +1,195 @@
+"""
+试卷图像派生版本（缩略图 / 预览图 / OCR 灰度图）
+
+原先历史列表直接返回原图 URL，移动端渲染列表要下载整张 10MB 照片。每次上传生成一次：
+- thumbnail：长边 IMAGE_DERIVATIVE_THUMBNAIL_SIDE 的 WebP（或 AVIF），历史列表使用
+- preview：长边 IMAGE_DERIVATIVE_PREVIEW_SIDE 的 WebP（或 AVIF），详情页预览
+- ocr：原分辨率单通道 JPEG（已按 EXIF 方向转正），OCR 阶段开始时先生成派生图，
+  然后始终读取它而不是原图，坐标与原图一致
+
+原图只解码一次，预览图由原图缩小，缩略图再由预览图缩小。派生图按原图内容的 SHA-256 和
+规格寻址（derivatives/<sha[:2]>/<sha>/<name>-<side>-q<quality>.<ext>），同一内容、同一规格的
+对象永不改变，写入时带长期缓存头；同一张照片再次上传时直接复用已有对象。
+"""
+import asyncio
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image, features
+
+from app.core.config import settings
+from app.core.metrics import IMAGE_DERIVATIVES
+from app.services.image_ingest import ingest_image
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+DERIVATIVE_PREFIX = "derivatives"
+EXTENSIONS = {"WEBP": "webp", "AVIF": "avif", "JPEG": "jpg"}
+
+
+@dataclass(frozen=True)
+class DerivativeSpec:
+    """派生图规格"""
+    name: str
+    max_side: int  # 长边像素，0 表示保持原尺寸
+    format: str  # PIL 格式名（WEBP / AVIF / JPEG）
+    quality: int
+    grayscale: bool = False
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+    @property
+    def content_type(self) -> str:
+        return "image/jpeg" if self.format == "JPEG" else f"image/{self.extension}"
+
+
+def web_format() -> str:
+    """
+    缩略图和预览图的格式
+
+    Raises:
+        ValueError: IMAGE_DERIVATIVE_FORMAT 不是 webp / avif
+    """
+    image_format = settings.IMAGE_DERIVATIVE_FORMAT.upper()
+    if image_format not in ("WEBP", "AVIF"):
+        raise ValueError(
+            f"Unknown derivative format '{settings.IMAGE_DERIVATIVE_FORMAT}'. Available: webp, avif"
+        )
+    if image_format == "AVIF" and not features.check("avif"):
+        logger.warning("当前 Pillow 不支持 AVIF 编码，派生图使用 WebP")
+        return "WEBP"
+    return image_format
+
+
+def derivative_specs() -> List[DerivativeSpec]:
+    """按配置生成派生图规格"""
+    image_format = web_format()
+    return [
+        DerivativeSpec("thumbnail", settings.IMAGE_DERIVATIVE_THUMBNAIL_SIDE, image_format,
+                       settings.IMAGE_DERIVATIVE_QUALITY),
+        DerivativeSpec("preview", settings.IMAGE_DERIVATIVE_PREVIEW_SIDE, image_format,
+                       settings.IMAGE_DERIVATIVE_QUALITY),
+        DerivativeSpec("ocr", 0, "JPEG", settings.IMAGE_DERIVATIVE_OCR_QUALITY, grayscale=True),
+    ]
+
+
+def derivative_key(source_sha256: str, spec: DerivativeSpec) -> str:
+    """派生图对象 key（由原图内容和规格决定）"""
+    side = spec.max_side or "full"
+    return (
+        f"{DERIVATIVE_PREFIX}/{source_sha256[:2]}/{source_sha256}/"
+        f"{spec.name}-{side}-q{spec.quality}.{spec.extension}"
+    )
+
+
+def _shrink(pixels: np.ndarray, max_side: int) -> np.ndarray:
+    """按长边等比缩小（不放大）"""
+    height, width = pixels.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return pixels
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+
+
+def _encode(pixels: np.ndarray, spec: DerivativeSpec) -> bytes:
+    """编码派生图（JPEG 用 OpenCV，WebP / AVIF 用 Pillow）"""
+    if spec.format == "JPEG":
+        success, encoded = cv2.imencode(".jpg", pixels, [cv2.IMWRITE_JPEG_QUALITY, spec.quality])
+        if not success:
+            raise ValueError("Failed to encode image")
+        return encoded.tobytes()
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=spec.format, quality=spec.quality)
+    return buffer.getvalue()
+
+
+def render_derivatives(file_content: bytes, specs: List[DerivativeSpec]) -> Dict[str, bytes]:
+    """
+    生成派生图（解码一次，彩色派生图由大到小逐级缩小）
+
+    Args:
+        file_content: 原图内容
+        specs: 派生图规格
+
+    Returns:
+        Dict[规格名, 编码后的内容]
+
+    Raises:
+        ValueError: 原图无效或无法解码
+    """
+    image = ingest_image(file_content)
+    rendered = {}
+    pixels = image.pixels
+    for spec in sorted(specs, key=lambda s: s.max_side or float("inf"), reverse=True):
+        if spec.grayscale:
+            rendered[spec.name] = _encode(_shrink(image.gray, spec.max_side), spec)
+        else:
+            pixels = _shrink(pixels, spec.max_side)
+            rendered[spec.name] = _encode(pixels, spec)
+    return rendered
+
+
+class ImageDerivativeService:
+    """派生图服务"""
+
+    async def generate(self, file_content: bytes) -> Dict[str, str]:
+        """
+        生成并存储派生图（同内容、同规格的派生图已存在时直接复用）
+
+        Args:
+            file_content: 原图内容
+
+        Returns:
+            Dict[规格名, 派生图 URL]
+        """
+        specs = derivative_specs()
+        storage = get_storage()
+        source_sha256 = await asyncio.to_thread(lambda: hashlib.sha256(file_content).hexdigest())
+        keys = {spec.name: derivative_key(source_sha256, spec) for spec in specs}
+
+        existing = await asyncio.gather(*(storage.exists(key) for key in keys.values()))
+        if all(existing):
+            IMAGE_DERIVATIVES.labels(result="reused").inc()
+        else:
+            rendered = await asyncio.to_thread(render_derivatives, file_content, specs)
+            await asyncio.gather(*(
+                storage.put(
+                    keys[spec.name], rendered[spec.name], spec.content_type,
+                    cache_control=settings.IMAGE_DERIVATIVE_CACHE_CONTROL
+                )
+                for spec in specs
+            ))
+            IMAGE_DERIVATIVES.labels(result="generated").inc()
+            logger.info(
+                f"派生图已生成 {source_sha256[:12]}: "
+                + ", ".join(f"{name} {len(content)} bytes" for name, content in rendered.items())
+            )
+        return {name: storage.url_for(key) for name, key in keys.items()}
+
+
+def thumbnail_url(exam) -> Optional[str]:
+    """试卷缩略图 URL（尚未生成派生图的旧记录退回处理后的图像或原图）"""
+    derivatives = exam.image_derivatives or {}
+    return derivatives.get("thumbnail") or exam.processed_image_url or exam.original_image_url
+
+
+def ocr_image_url(exam) -> str:
+    """OCR 阶段读取的图像 URL（OCR 灰度派生图，由 OCR 阶段先行生成；旧记录退回处理后的图像或原图）"""
+    derivatives = exam.image_derivatives or {}
+    return derivatives.get("ocr") or exam.processed_image_url or exam.original_image_url
+
+
+# 全局服务实例
+image_derivative_service = ImageDerivativeService()
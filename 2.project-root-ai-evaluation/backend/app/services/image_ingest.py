@@ -0,0 +1,175 @@
+"""
+图像解码（一次解码，多处共享）
+
+原先一张试卷照片会被 PIL 校验一次、OpenCV 解码一次，质量检查、预处理、编码
+又各自转换和复制像素。这里在一次处理中完成：
+- 用 PIL 只解析文件头：格式和 EXIF 方向（不解码像素）
+- 用 OpenCV 解码一次像素（识别路径直接解码为灰度，省去色度上采样和 2/3 内存），
+  OpenCV 不支持的格式退回 PIL 解码
+- 按 EXIF 方向旋转为正向
+
+得到的 IngestedImage 持有唯一的像素缓冲区，质量检查、预处理直接在其上执行。
+"""
+import io
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+EXIF_ORIENTATION = 0x0112
+
+# EXIF 方向 → 转为正向的操作（与 PIL ImageOps.exif_transpose 一致）
+ORIENTATION_OPS = {
+    2: lambda a: cv2.flip(a, 1),
+    3: lambda a: cv2.rotate(a, cv2.ROTATE_180),
+    4: lambda a: cv2.flip(a, 0),
+    5: lambda a: cv2.transpose(a),
+    6: lambda a: cv2.rotate(a, cv2.ROTATE_90_CLOCKWISE),
+    7: lambda a: cv2.flip(cv2.transpose(a), -1),
+    8: lambda a: cv2.rotate(a, cv2.ROTATE_90_COUNTERCLOCKWISE),
+}
+
+
+@dataclass
+class IngestedImage:
+    """解码后的图像（像素已按 EXIF 方向转正）"""
+    content: bytes  # 原始文件内容
+    format: str  # 文件格式（JPEG / PNG / ...）
+    pixels: np.ndarray  # 像素缓冲区（BGR 或灰度，uint8）
+    orientation: int = 1  # 原始 EXIF 方向（1 表示无需旋转）
+    _gray: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def gray(self) -> np.ndarray:
+        """灰度像素（已是灰度时直接返回同一缓冲区，否则转换一次后缓存）"""
+        if self.pixels.ndim == 2:
+            return self.pixels
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.pixels, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+
+def size_exceeded_message(size: int) -> str:
+    """文件超过大小上限时的提示"""
+    return (
+        f"File size {size} bytes exceeds maximum allowed size "
+        f"{settings.MAX_UPLOAD_SIZE} bytes (10MB)"
+    )
+
+
+def check_extension(filename: str) -> None:
+    """
+    检查文件扩展名
+
+    Args:
+        filename: 文件名
+
+    Raises:
+        ValueError: 如果格式不允许
+    """
+    ext = filename.lower().split('.')[-1] if '.' in filename else ''
+    if ext not in settings.ALLOWED_IMAGE_FORMATS:
+        raise ValueError(
+            f"File format '{ext}' not allowed. "
+            f"Allowed formats: {', '.join(settings.ALLOWED_IMAGE_FORMATS)}"
+        )
+
+
+def check_size_and_extension(filename: str, file_content: bytes) -> None:
+    """
+    检查文件大小和扩展名
+
+    Args:
+        filename: 文件名
+        file_content: 文件内容
+
+    Raises:
+        ValueError: 如果格式或大小无效
+    """
+    if len(file_content) > settings.MAX_UPLOAD_SIZE:
+        raise ValueError(size_exceeded_message(len(file_content)))
+    check_extension(filename)
+
+
+def open_image(file_content) -> Image.Image:
+    """
+    用 PIL 打开文件内容（只解析文件头）
+
+    bytes 包装为 BytesIO；mmap 等可 seek 的对象直接使用，不复制到内存。
+    """
+    if hasattr(file_content, "seek"):
+        file_content.seek(0)
+        return Image.open(file_content)
+    return Image.open(io.BytesIO(file_content))
+
+
+def ingest_image(
+    file_content: bytes,
+    filename: Optional[str] = None,
+    grayscale: bool = False
+) -> IngestedImage:
+    """
+    解码图像（一次解码，同时读取 EXIF 方向并转正）
+
+    Args:
+        file_content: 文件内容（bytes 或只读内存映射）
+        filename: 文件名（提供时检查大小和扩展名）
+        grayscale: 是否直接解码为灰度
+
+    Returns:
+        IngestedImage: 解码后的图像
+
+    Raises:
+        ValueError: 文件无效或无法解码
+    """
+    if filename is not None:
+        check_size_and_extension(filename, file_content)
+
+    try:
+        header = open_image(file_content)
+        image_format = header.format or ""
+        orientation = header.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
+
+    flags = (cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR) | cv2.IMREAD_IGNORE_ORIENTATION
+    # np.frombuffer 直接引用 bytes，不复制
+    pixels = cv2.imdecode(np.frombuffer(file_content, np.uint8), flags)
+    if pixels is None:
+        pixels = _decode_with_pil(header, grayscale)
+
+    if orientation in ORIENTATION_OPS:
+        pixels = ORIENTATION_OPS[orientation](pixels)
+
+    return IngestedImage(
+        content=file_content,
+        format=image_format,
+        pixels=pixels,
+        orientation=orientation if orientation in ORIENTATION_OPS else 1
+    )
+
+
+def _decode_with_pil(header: Image.Image, grayscale: bool) -> np.ndarray:
+    """OpenCV 无法解码的格式（如已注册插件的 HEIC）用 PIL 解码"""
+    try:
+        if grayscale:
+            return np.asarray(header.convert("L"))
+        return cv2.cvtColor(np.asarray(header.convert("RGB")), cv2.COLOR_RGB2BGR)
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
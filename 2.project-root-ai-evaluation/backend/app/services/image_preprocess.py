@@ -0,0 +1,284 @@
+"""
+OCR 前图像预处理档位
+
+原先的 ImageService.preprocess_image 在全分辨率上做非局部均值去噪，1200 万像素的
+手机照片需要数秒，在异步路径上直接调用会阻塞事件循环。这里提供三个命名档位：
+- fast:     长边缩到 1600，中值滤波
+- balanced: 长边缩到 2400，双边滤波
+- quality:  全分辨率非局部均值去噪（与原 preprocess_image 一致）
+
+每个档位之后都做 CLAHE 对比度增强。档位按上传 / 识别请求指定，未指定时使用
+IMAGE_PREPROCESS_PROFILE。
+
+异步调用通过 ImagePreprocessor 在进程池中执行：像素数据经共享内存传入和传出，
+不经过 pickle；进程池不可用时退回到线程执行。Celery prefork（billiard）worker 的子进程
+是守护进程，不允许再创建子进程，而 ProcessPoolExecutor 在首次提交任务时才启动子进程，
+因此既在创建前检查守护标志，也在提交失败时退回，并记住该决定。
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import IMAGE_PREPROCESS_LATENCY
+from app.schemas.ocr import BoundingBox, OCRResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PreprocessProfile:
+    """预处理档位"""
+    name: str
+    max_side: Optional[int]  # 长边上限（像素），None 表示保持原分辨率
+    denoise: str  # median / bilateral / nlm
+    clahe_clip: float = 2.0
+
+
+PROFILES: Dict[str, PreprocessProfile] = {
+    "fast": PreprocessProfile("fast", max_side=1600, denoise="median"),
+    "balanced": PreprocessProfile("balanced", max_side=2400, denoise="bilateral"),
+    "quality": PreprocessProfile("quality", max_side=None, denoise="nlm"),
+}
+
+
+def resolve_profile(name: Optional[str] = None) -> Optional[PreprocessProfile]:
+    """
+    按名称获取档位
+
+    Args:
+        name: 档位名称，None 时使用 IMAGE_PREPROCESS_PROFILE；空字符串或 "none" 表示不预处理
+
+    Returns:
+        Optional[PreprocessProfile]: 档位，不预处理时为 None
+
+    Raises:
+        ValueError: 档位名称无效
+    """
+    if name is None:
+        name = settings.IMAGE_PREPROCESS_PROFILE
+    name = (name or "").strip().lower()
+    if name in ("", "none"):
+        return None
+    if name not in PROFILES:
+        raise ValueError(
+            f"Unknown preprocess profile '{name}'. "
+            f"Allowed profiles: {', '.join(PROFILES)}, none"
+        )
+    return PROFILES[name]
+
+
+def apply_profile(image: np.ndarray, profile: PreprocessProfile) -> Tuple[np.ndarray, float]:
+    """
+    按档位预处理图像（缩放、去噪、对比度增强）
+
+    Args:
+        image: OpenCV 图像数组（BGR 或灰度，uint8）
+        profile: 预处理档位
+
+    Returns:
+        Tuple[处理后的图像（通道数与输入一致）, 缩放比例（处理后 / 原图）]
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    scale = 1.0
+    height, width = gray.shape[:2]
+    if profile.max_side and max(height, width) > profile.max_side:
+        scale = profile.max_side / max(height, width)
+        gray = cv2.resize(
+            gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA
+        )
+
+    if profile.denoise == "median":
+        denoised = cv2.medianBlur(gray, 3)
+    elif profile.denoise == "bilateral":
+        denoised = cv2.bilateralFilter(gray, 5, 50, 50)
+    else:
+        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+
+    clahe = cv2.createCLAHE(clipLimit=profile.clahe_clip, tileGridSize=(8, 8))
+    enhanced = clahe.apply(denoised)
+
+    if image.ndim == 3:
+        return cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR), scale
+    return enhanced, scale
+
+
+def _apply_shared(
+    source_name: str,
+    target_name: str,
+    shape: Tuple[int, ...],
+    dtype: str,
+    profile_name: str
+) -> Tuple[Tuple[int, ...], float]:
+    """
+    进程池中执行：从共享内存读取原图，处理结果写回另一块共享内存
+
+    Returns:
+        Tuple[结果形状, 缩放比例]
+    """
+    source = shared_memory.SharedMemory(name=source_name)
+    target = shared_memory.SharedMemory(name=target_name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=source.buf)
+        result, scale = apply_profile(image, PROFILES[profile_name])
+        output = np.ndarray(result.shape, dtype=result.dtype, buffer=target.buf)
+        output[...] = result
+        # 关闭共享内存前必须释放指向其缓冲区的数组
+        del image, output
+        return result.shape, scale
+    finally:
+        for block in (source, target):
+            try:
+                block.close()
+            except BufferError:
+                # 处理出错时异常回溯仍引用缓冲区，映射随进程回收，由父进程负责 unlink
+                pass
+
+
+class ImagePreprocessor:
+    """在事件循环之外执行图像预处理"""
+
+    def __init__(self, executor: Optional[str] = None, workers: Optional[int] = None):
+        """
+        初始化预处理器
+
+        Args:
+            executor: 执行方式（process / thread），默认取配置
+            workers: 进程池大小，默认取配置
+        """
+        self.executor = executor or settings.IMAGE_PREPROCESS_EXECUTOR
+        self.workers = workers or settings.IMAGE_PREPROCESS_WORKERS
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Optional[Executor]:
+        """获取进程池（首次使用时创建），无法创建时退回线程执行"""
+        if self.executor != "process":
+            return None
+        if multiprocessing.current_process().daemon:
+            self._fall_back_to_threads("当前进程为守护进程，不能创建子进程")
+            return None
+        if self._pool is None:
+            try:
+                # spawn 启动的子进程不继承父进程的连接池和事件循环
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            except (AssertionError, OSError, ValueError) as e:
+                self._fall_back_to_threads(e)
+        return self._pool
+
+    def _fall_back_to_threads(self, reason) -> None:
+        """改为线程执行（之后的调用不再尝试进程池）"""
+        logger.warning(f"图像预处理进程池不可用，改为线程执行: {reason}")
+        self.executor = "thread"
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, image: np.ndarray, profile: PreprocessProfile) -> Tuple[np.ndarray, float]:
+        """
+        预处理图像，不阻塞事件循环
+
+        Args:
+            image: OpenCV 图像数组（uint8）
+            profile: 预处理档位
+
+        Returns:
+            Tuple[处理后的图像, 缩放比例（处理后 / 原图）]
+        """
+        start = time.perf_counter()
+        result = None
+        pool = self._get_pool()
+        if pool is not None:
+            try:
+                result = await self._run_in_pool(pool, image, profile)
+            except BrokenProcessPool:
+                # 子进程异常退出后进程池不可再用，下次调用时重建
+                logger.error("图像预处理进程池已损坏，重建后重试")
+                self._pool = None
+                pool.shutdown(wait=False)
+                pool = self._get_pool()
+                if pool is not None:
+                    result = await self._run_in_pool(pool, image, profile)
+            except (AssertionError, OSError) as e:
+                # 提交时才启动子进程：守护进程中在这里失败（如 "daemonic processes are not allowed to have children"）
+                self._fall_back_to_threads(e)
+        if result is None:
+            result = await asyncio.to_thread(apply_profile, image, profile)
+
+        IMAGE_PREPROCESS_LATENCY.labels(profile=profile.name).observe(time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    async def _run_in_pool(
+        pool: Executor,
+        image: np.ndarray,
+        profile: PreprocessProfile
+    ) -> Tuple[np.ndarray, float]:
+        """经共享内存在进程池中执行（处理结果不大于原图，输出缓冲区与输入等大）"""
+        image = np.ascontiguousarray(image)
+        source = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        target = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        try:
+            staged = np.ndarray(image.shape, dtype=image.dtype, buffer=source.buf)
+            staged[...] = image
+            del staged
+
+            shape, scale = await asyncio.wrap_future(pool.submit(
+                _apply_shared, source.name, target.name, image.shape, image.dtype.str, profile.name
+            ))
+
+            output = np.ndarray(shape, dtype=image.dtype, buffer=target.buf)
+            result = output.copy()
+            del output
+            return result, scale
+        finally:
+            for block in (source, target):
+                block.close()
+                block.unlink()
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def restore_coordinates(ocr_result: OCRResult, scale: float) -> OCRResult:
+    """
+    把缩放后图像上的 OCR 坐标换算回原图坐标
+
+    Args:
+        ocr_result: 在预处理后图像上的识别结果
+        scale: 预处理缩放比例（处理后 / 原图）
+
+    Returns:
+        OCRResult: 坐标对应原图的识别结果
+    """
+    if scale == 1.0:
+        return ocr_result
+    regions = [
+        region.model_copy(update={"bbox": BoundingBox(
+            x=round(region.bbox.x / scale),
+            y=round(region.bbox.y / scale),
+            width=round(region.bbox.width / scale),
+            height=round(region.bbox.height / scale)
+        )})
+        for region in ocr_result.text_regions
+    ]
+    return ocr_result.model_copy(update={"text_regions": regions})
+
+
+# 全局图像预处理器实例
+image_preprocessor = ImagePreprocessor()
@@ -0,0 +1,236 @@
+"""
+上传图像快速质量门
+
+validate_image_quality 在全分辨率灰度图上计算 Laplacian 方差和亮度均值，
+需要先完整解码整张照片。质量门改为：
+- 从文件头读取分辨率（不解码像素）
+- JPEG 在 DCT 域按 1/2、1/4、1/8 缩小解码为灰度，再缩到长边 IMAGE_QUALITY_GATE_MAX_SIDE
+- 在小图上计算模糊度、亮度、反光比例和倾斜角
+
+缩小后 Laplacian 方差的量级与全分辨率不同，模糊阈值 IMAGE_QUALITY_GATE_BLUR_THRESHOLD
+由 scripts/calibrate_quality_gate.py 对照全分辨率判定结果标定；亮度均值与分辨率无关，
+沿用 MIN_BRIGHTNESS / MAX_BRIGHTNESS。
+"""
+import logging
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.image_ingest import EXIF_ORIENTATION, ORIENTATION_OPS, open_image
+
+logger = logging.getLogger(__name__)
+
+
+# JPEG 缩小解码可用的比例
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                 (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+GLARE_LEVEL = 250  # 视为过曝反光的灰度值
+
+
+@dataclass
+class QualityScores:
+    """质量评分（分辨率为原图转正后的尺寸，其余在缩小后的图上计算）"""
+    width: int
+    height: int
+    blur: float  # Laplacian 方差，越小越模糊
+    brightness: float  # 灰度均值
+    glare: float  # 过曝像素比例
+    skew: Optional[float]  # 文本行倾斜角（度，正值为顺时针），未检测到文本行时为 None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def decode_reduced(file_content: bytes, max_side: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    缩小解码为灰度
+
+    Args:
+        file_content: 文件内容（bytes 或只读内存映射）
+        max_side: 缩小后的长边上限
+
+    Returns:
+        Tuple[转正后的小灰度图, 原图转正后的 (宽, 高)]
+
+    Raises:
+        ValueError: 无法解码
+    """
+    try:
+        header = open_image(file_content)
+        width, height = header.size
+        orientation = header.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
+
+    # 取缩小后长边不低于 max_side 的 3/4 的最大比例，其余部分再用 INTER_AREA 缩放
+    flag = cv2.IMREAD_GRAYSCALE
+    for factor, reduced_flag in REDUCED_FLAGS:
+        if max(width, height) / factor >= max_side * 0.75:
+            flag = reduced_flag
+            break
+
+    buffer = np.frombuffer(file_content, np.uint8)
+    # OpenCV 解码时已按 EXIF 方向转正
+    gray = cv2.imdecode(buffer, flag)
+    if gray is None:
+        try:
+            gray = np.asarray(header.convert("L"))
+        except Exception as e:
+            raise ValueError(f"Invalid image file: {str(e)}")
+        if orientation in ORIENTATION_OPS:
+            gray = ORIENTATION_OPS[orientation](gray)
+
+    long_side = max(gray.shape[:2])
+    if long_side > max_side:
+        scale = max_side / long_side
+        gray = cv2.resize(
+            gray, (round(gray.shape[1] * scale), round(gray.shape[0] * scale)),
+            interpolation=cv2.INTER_AREA
+        )
+
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    return gray, (width, height)
+
+
+def blur_score(gray: np.ndarray) -> float:
+    """Laplacian 方差（16 位 Laplacian + meanStdDev，不分配 float64 临时数组）"""
+    _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return float(stddev[0][0]) ** 2
+
+
+def estimate_skew(gray: np.ndarray) -> Optional[float]:
+    """
+    估计文本行倾斜角
+
+    二值化后按字符高度做横向闭运算把字符连成文本行，取足够长的文本行最小外接矩形角度的中位数。
+
+    Args:
+        gray: 灰度图
+
+    Returns:
+        Optional[float]: 倾斜角（度，-45 ~ 45，正值为顺时针），未检测到文本行时为 None
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    # 闭运算宽度取字符高度的 2.5 倍，足以跨过字间和词间空白
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT][stats[1:, cv2.CC_STAT_AREA] >= 8]
+    if heights.size == 0:
+        return None
+    kernel_width = max(9, int(np.median(heights) * 2.5))
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 3)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    angles = []
+    min_length = gray.shape[1] * 0.15
+    for contour in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(contour)
+        if max(w, h) < min_length or min(w, h) == 0 or max(w, h) / min(w, h) < 4:
+            continue
+        if w < h:
+            angle -= 90
+        # 归一化到 (-45, 45]
+        angle = (angle + 45) % 90 - 45
+        angles.append(angle)
+
+    if not angles:
+        return None
+    return float(np.median(angles))
+
+
+def compute_scores(gray: np.ndarray, size: Tuple[int, int]) -> QualityScores:
+    """
+    计算质量评分
+
+    Args:
+        gray: 灰度图（通常为缩小后的图）
+        size: 原图转正后的 (宽, 高)
+
+    Returns:
+        QualityScores: 质量评分
+    """
+    return QualityScores(
+        width=size[0],
+        height=size[1],
+        blur=blur_score(gray),
+        brightness=float(np.mean(gray)),
+        glare=float(np.count_nonzero(gray >= GLARE_LEVEL)) / gray.size,
+        skew=estimate_skew(gray)
+    )
+
+
+class QualityGate:
+    """上传图像快速质量门"""
+
+    def __init__(
+        self,
+        max_side: Optional[int] = None,
+        blur_threshold: Optional[float] = None,
+        max_glare: Optional[float] = None,
+        max_skew: Optional[float] = None
+    ):
+        """
+        初始化质量门
+
+        Args:
+            max_side: 计算评分的图像长边
+            blur_threshold: 缩小图上的模糊度阈值（标定值）
+            max_glare: 过曝像素比例上限
+            max_skew: 倾斜角上限（度）
+        """
+        self.max_side = max_side or settings.IMAGE_QUALITY_GATE_MAX_SIDE
+        self.blur_threshold = blur_threshold or settings.IMAGE_QUALITY_GATE_BLUR_THRESHOLD
+        self.max_glare = max_glare or settings.IMAGE_QUALITY_GATE_MAX_GLARE
+        self.max_skew = max_skew or settings.IMAGE_QUALITY_GATE_MAX_SKEW
+
+    def score(self, file_content: bytes) -> QualityScores:
+        """缩小解码并计算质量评分"""
+        gray, size = decode_reduced(file_content, self.max_side)
+        return compute_scores(gray, size)
+
+    def evaluate(self, scores: QualityScores) -> Optional[Tuple[str, str]]:
+        """
+        判定质量评分
+
+        Args:
+            scores: 质量评分
+
+        Returns:
+            Optional[Tuple[不合格项, 原因]]: 合格时为 None
+        """
+        if scores.width < settings.MIN_RESOLUTION_WIDTH or scores.height < settings.MIN_RESOLUTION_HEIGHT:
+            return "resolution", (
+                f"Resolution {scores.width}x{scores.height} is below minimum required "
+                f"{settings.MIN_RESOLUTION_WIDTH}x{settings.MIN_RESOLUTION_HEIGHT}"
+            )
+        if scores.brightness < settings.MIN_BRIGHTNESS or scores.brightness > settings.MAX_BRIGHTNESS:
+            return "brightness", (
+                f"Image brightness {scores.brightness:.2f} is outside acceptable range "
+                f"({settings.MIN_BRIGHTNESS}-{settings.MAX_BRIGHTNESS})"
+            )
+        # 大面积反光会拉低整体锐度，先于模糊度判定，给出更准确的原因
+        if scores.glare > self.max_glare:
+            return "glare", (
+                f"Image has too much glare ({scores.glare:.1%} overexposed, "
+                f"maximum allowed: {self.max_glare:.0%})"
+            )
+        if scores.blur < self.blur_threshold:
+            return "blur", (
+                f"Image is too blurry (blur score: {scores.blur:.2f}, "
+                f"minimum required: {self.blur_threshold})"
+            )
+        if scores.skew is not None and abs(scores.skew) > self.max_skew:
+            return "skew", (
+                f"Image is tilted by {scores.skew:.1f} degrees "
+                f"(maximum allowed: {self.max_skew})"
+            )
+        return None
+
+
+# 全局质量门实例
+quality_gate = QualityGate()
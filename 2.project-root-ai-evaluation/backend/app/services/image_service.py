@@ -1,17 +1,28 @@
 """
 图像处理服务
 """
-import os
+import asyncio
 import cv2
 import numpy as np
 from PIL import Image
 import io
 from typing import Tuple, Optional
 import hashlib
+import mimetypes
 from datetime import datetime
 
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import IMAGE_QUALITY_GATE_RESULTS
+from app.services.image_ingest import (
+    check_extension, check_size_and_extension, ingest_image, size_exceeded_message
+)
+from app.services.storage import get_storage
+from app.services.upload_stream import SpooledUpload
+from app.services.image_quality import quality_gate
+from app.services.image_preprocess import (
+    PreprocessProfile, apply_profile, image_preprocessor, resolve_profile
+)
 
 
 class ImageValidationResult:
@@ -36,21 +47,7 @@ class ImageService:
         Raises:
             ValueError: 如果格式或大小无效
         """
-        # 检查文件大小
-        file_size = len(file_content)
-        if file_size > settings.MAX_UPLOAD_SIZE:
-            raise ValueError(
-                f"File size {file_size} bytes exceeds maximum allowed size "
-                f"{settings.MAX_UPLOAD_SIZE} bytes (10MB)"
-            )
-        
-        # 检查文件扩展名
-        ext = filename.lower().split('.')[-1] if '.' in filename else ''
-        if ext not in settings.ALLOWED_IMAGE_FORMATS:
-            raise ValueError(
-                f"File format '{ext}' not allowed. "
-                f"Allowed formats: {', '.join(settings.ALLOWED_IMAGE_FORMATS)}"
-            )
+        check_size_and_extension(filename, file_content)
         
         # 尝试打开图像以验证它是有效的图像文件
         try:
@@ -59,13 +56,34 @@ class ImageService:
         except Exception as e:
             raise ValueError(f"Invalid image file: {str(e)}")
     
+    @staticmethod
+    def validate_upload(upload: SpooledUpload) -> None:
+        """
+        验证已落盘上传的格式和大小（从 spool 文件读取，不把整个文件读入内存）
+        
+        Args:
+            upload: 已落盘的上传文件
+            
+        Raises:
+            ValueError: 如果格式或大小无效
+        """
+        if upload.size > settings.MAX_UPLOAD_SIZE:
+            raise ValueError(size_exceeded_message(upload.size))
+        check_extension(upload.filename)
+        
+        try:
+            with Image.open(upload.path) as image:
+                image.verify()
+        except Exception as e:
+            raise ValueError(f"Invalid image file: {str(e)}")
+    
     @staticmethod
     def validate_image_quality(image_array: np.ndarray) -> ImageValidationResult:
         """
         验证图像质量
         
         Args:
-            image_array: OpenCV 图像数组
+            image_array: OpenCV 图像数组（BGR 或灰度）
             
         Returns:
             ImageValidationResult: 验证结果
@@ -80,8 +98,14 @@ class ImageService:
             )
         
         # 检查模糊度（使用 Laplacian 方差）
-        gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+        if image_array.ndim == 3:
+            gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image_array
+        # uint8 输入的 3x3 Laplacian 响应不超过 ±1020，用 16 位存储即可精确表示，
+        # 方差由 meanStdDev 直接计算，不分配 float64 的整幅临时数组
+        _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+        laplacian_var = float(stddev[0][0]) ** 2
         
         if laplacian_var < settings.MIN_BLUR_THRESHOLD:
             return ImageValidationResult(
@@ -102,39 +126,71 @@ class ImageService:
         return ImageValidationResult(True)
     
     @staticmethod
-    def preprocess_image(image_array: np.ndarray) -> np.ndarray:
+    def check_upload_quality(file_content: bytes) -> ImageValidationResult:
         """
-        预处理图像（去噪、增强、矫正）
+        上传时的质量门（按 IMAGE_QUALITY_GATE 选择方式）
+        
+        - fast: 缩小解码后计算模糊度、亮度、反光和倾斜（毫秒级）
+        - full: 全分辨率解码后执行 validate_image_quality
+        - off:  不检查
         
         Args:
-            image_array: OpenCV 图像数组
+            file_content: 文件内容（bytes 或 SpooledUpload.mapped() 的只读内存映射）
             
         Returns:
-            np.ndarray: 处理后的图像数组
+            ImageValidationResult: 验证结果
         """
-        # 转换为灰度图
-        if len(image_array.shape) == 3:
-            gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image_array
-        
-        # 去噪
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        mode = settings.IMAGE_QUALITY_GATE
+        if mode == "fast":
+            failure = quality_gate.evaluate(quality_gate.score(file_content))
+            IMAGE_QUALITY_GATE_RESULTS.labels(mode=mode, result=failure[0] if failure else "ok").inc()
+            return ImageValidationResult(failure is None, failure[1] if failure else "")
+        if mode == "full":
+            result = ImageService.validate_image_quality(ingest_image(file_content).pixels)
+            IMAGE_QUALITY_GATE_RESULTS.labels(mode=mode, result="ok" if result.is_valid else "rejected").inc()
+            return result
+        return ImageValidationResult(True)
+    
+    @staticmethod
+    def preprocess_image(image_array: np.ndarray, profile: str = "quality") -> np.ndarray:
+        """
+        预处理图像（去噪、增强），在当前线程同步执行
         
-        # 自适应直方图均衡化（增强对比度）
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(denoised)
+        异步路径请使用 preprocess_for_ocr，避免阻塞事件循环。
         
-        # 二值化（可选，根据需要）
-        # _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        Args:
+            image_array: OpenCV 图像数组
+            profile: 预处理档位（fast / balanced / quality，默认 quality 为全分辨率去噪）
+            
+        Returns:
+            np.ndarray: 处理后的图像数组
+        """
+        processed, _ = apply_profile(image_array, resolve_profile(profile))
+        return processed
+    
+    @staticmethod
+    async def preprocess_for_ocr(
+        file_content: bytes,
+        profile: PreprocessProfile
+    ) -> Tuple[bytes, float]:
+        """
+        按档位预处理待识别的图像
         
-        # 转回 BGR 以便保存
-        if len(image_array.shape) == 3:
-            processed = cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
-        else:
-            processed = enhanced
+        只解码一次（直接解码为灰度并按 EXIF 方向转正），处理结果编码为单通道 JPEG。
+        解码、编码在线程中执行，预处理在进程池中执行；图像质量由上传时的质量门
+        （IMAGE_QUALITY_GATE）把关，这里不再在事件循环上做全分辨率质量检查。
         
-        return processed
+        Args:
+            file_content: 原图字节内容
+            profile: 预处理档位
+            
+        Returns:
+            Tuple[处理后的图像字节内容, 缩放比例（处理后 / 转正后的原图）]
+        """
+        image = await asyncio.to_thread(ingest_image, file_content, None, True)
+        processed, scale = await image_preprocessor.run(image.pixels, profile)
+        processed_bytes = await asyncio.to_thread(ImageService.cv2_image_to_bytes, processed)
+        return processed_bytes, scale
     
     @staticmethod
     async def store_image(
@@ -144,7 +200,7 @@ class ImageService:
         original_filename: str
     ) -> str:
         """
-        存储图像到本地或 OSS
+        存储图像到对象存储（STORAGE_BACKEND：本地目录或 S3 兼容存储）
         
         Args:
             file_content: 文件内容
@@ -155,30 +211,47 @@ class ImageService:
         Returns:
             str: 图像 URL
         """
-        # 生成文件名
-        ext = original_filename.split('.')[-1] if '.' in original_filename else 'jpg'
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        filename = f"{exam_id}_{image_type}_{timestamp}.{ext}"
-        
-        # TODO: 集成阿里云 OSS
-        # 这里暂时存储到本地
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
+        key = ImageService.image_key(exam_id, image_type, original_filename)
+        url = await get_storage().put(key, file_content, ImageService.image_content_type(key))
         
-        file_path = os.path.join(upload_dir, filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
+        logger.info(f"Image stored: {url}")
+        return url
+    
+    @staticmethod
+    async def store_upload(upload: SpooledUpload, exam_id: str, image_type: str) -> str:
+        """
+        存储已落盘的上传文件（本地存储直接移动 spool 文件，S3 兼容存储从文件分片上传）
         
-        # 返回 URL（开发环境使用本地路径，生产环境使用 OSS URL）
-        url = f"/uploads/{filename}"
+        Args:
+            upload: 已落盘的上传文件
+            exam_id: 试卷 ID
+            image_type: 图像类型（original/processed）
+            
+        Returns:
+            str: 图像 URL
+        """
+        key = ImageService.image_key(exam_id, image_type, upload.filename)
+        url = await get_storage().put_file(key, upload.path, ImageService.image_content_type(key), move=True)
         
-        logger.info(f"Image stored: {url}")
+        logger.info(f"Image stored: {url} ({upload.size} bytes, sha256 {upload.sha256[:12]})")
         return url
     
+    @staticmethod
+    def image_key(exam_id: str, image_type: str, original_filename: str) -> str:
+        """生成对象 key"""
+        ext = original_filename.split('.')[-1] if '.' in original_filename else 'jpg'
+        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        return f"{exam_id}_{image_type}_{timestamp}.{ext}"
+    
+    @staticmethod
+    def image_content_type(key: str) -> str:
+        """对象 key 对应的内容类型"""
+        return mimetypes.guess_type(key)[0] or "application/octet-stream"
+    
     @staticmethod
     async def read_image(image_url: str) -> bytes:
         """
-        从本地或 OSS 读取图像
+        从对象存储读取图像
         
         Args:
             image_url: 图像 URL
@@ -189,18 +262,11 @@ class ImageService:
         Raises:
             FileNotFoundError: 如果图像不存在
         """
-        # TODO: 支持从 OSS 读取
-        # 这里暂时从本地读取
-        if image_url.startswith('/uploads/'):
-            file_path = image_url[1:]  # 移除开头的 /
-        else:
-            file_path = image_url
-        
-        if not os.path.exists(file_path):
+        storage = get_storage()
+        key = storage.key_from_url(image_url)
+        if key is None:
             raise FileNotFoundError(f"Image not found: {image_url}")
-        
-        with open(file_path, 'rb') as f:
-            return f.read()
+        return await storage.get(key)
     
     @staticmethod
     def bytes_to_cv2_image(file_content: bytes) -> np.ndarray:
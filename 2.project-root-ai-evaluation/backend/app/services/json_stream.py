@@ -0,0 +1,118 @@
+"""
+增量 JSON 解析
+
+流式接收模型输出时，顶层 JSON 对象的每个成员值一旦完整就立即解析返回，
+不必等待整个对象结束。只跟踪顶层对象的结构（括号深度、字符串与转义），
+成员值本身交给 json.loads。对象之前的多余文本（如 ```json 代码块标记）被忽略。
+"""
+import json
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """顶层 JSON 对象的增量解析器"""
+
+    def __init__(self):
+        """初始化解析器"""
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # start: 等待顶层 "{"；key / colon / value / after_value：顶层成员；done：对象结束
+        self._state = "start"
+        self._token_start: Optional[int] = None
+        self._key: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已结束"""
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        输入一段文本
+
+        Args:
+            chunk: 新收到的文本
+
+        Returns:
+            List[Tuple[str, Any]]: 本次新完成的顶层成员 (键, 值)
+        """
+        self.buffer += chunk
+        members = []
+        while self._pos < len(self.buffer) and self._state != "done":
+            index = self._pos
+            ch = self.buffer[index]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == "key":
+                        self._key = json.loads(self.buffer[self._token_start:index + 1])
+                        self._state = "colon"
+                continue
+
+            if self._state == "start":
+                if ch == "{":
+                    self._depth = 1
+                    self._state = "key"
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._mark_value_start(index)
+                if self._depth == 1 and self._state == "key":
+                    self._token_start = index
+            elif ch in "{[":
+                self._mark_value_start(index)
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 1:
+                    if self._state == "value":
+                        members.append(self._emit(index))
+                    self._depth = 0
+                    self._state = "done"
+                    continue
+                self._depth -= 1
+                if self._depth == 1 and self._state == "value":
+                    # 对象 / 数组值在闭合括号处即完整
+                    members.append(self._emit(index + 1))
+                    self._state = "after_value"
+            elif self._depth == 1:
+                if ch == ":" and self._state == "colon":
+                    self._state = "value"
+                    self._token_start = None
+                elif ch == ",":
+                    if self._state == "value":
+                        members.append(self._emit(index))
+                    self._state = "key"
+                elif not ch.isspace():
+                    self._mark_value_start(index)
+
+        return [member for member in members if member is not None]
+
+    def _mark_value_start(self, index: int):
+        """记录顶层成员值的起始位置"""
+        if self._depth == 1 and self._state == "value" and self._token_start is None:
+            self._token_start = index
+
+    def _emit(self, end: int) -> Optional[Tuple[str, Any]]:
+        """解析已完整的成员值，无法解析时丢弃"""
+        key = self._key
+        raw = self.buffer[self._token_start:end] if self._token_start is not None else ""
+        self._token_start = None
+        self._key = None
+        try:
+            return key, json.loads(raw)
+        except ValueError as e:
+            logger.warning(f"流式 JSON 成员解析失败 {key}: {e}")
+            return None
@@ -0,0 +1,372 @@
+"""
+本地知识点分类器
+
+用历史试卷中已标注的 knowledge_tags 训练，CPU 上毫秒级给出常见题目的知识点，
+置信度足够高时 tag_knowledge_points 不再调用 DeepSeek：
+- 特征：规范化题目文本的字符 1~3-gram，TF-IDF（次线性 TF）+ L2 归一化
+- 模型：按科目训练的最近质心（Rocchio）线性分类器，每个知识点一个质心向量，
+  得分为余弦相似度；多标签输出与最高分足够接近的知识点
+- 模型文件为 gzip JSON，带格式版本号和模型版本，首次使用时加载
+"""
+import asyncio
+import gzip
+import json
+import logging
+import math
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import KNOWLEDGE_CLASSIFIER_PREDICTIONS
+from app.schemas.parser import Question
+from app.services.question_cache import normalize_question_text
+
+logger = logging.getLogger(__name__)
+
+
+# 模型文件格式版本（特征或文件结构变化时递增，旧文件拒绝加载）
+MODEL_FORMAT_VERSION = 1
+
+NGRAM_RANGE = (1, 3)
+# 得分不低于最高分该比例的知识点一并输出
+LABEL_SCORE_RATIO = 0.8
+MAX_LABELS = 5
+
+
+def extract_ngrams(question: Question) -> Counter:
+    """
+    提取字符 n-gram 计数
+
+    Args:
+        question: 题目
+
+    Returns:
+        Counter: n-gram -> 出现次数
+    """
+    text = normalize_question_text(question.question_text, question.options)
+    counts: Counter = Counter()
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(text) - n + 1):
+            counts[text[i:i + n]] += 1
+    return counts
+
+
+def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    """L2 归一化"""
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {k: w / norm for k, w in vector.items()} if norm else {}
+
+
+@dataclass
+class Prediction:
+    """分类结果"""
+    knowledge_points: List[str]
+    confidence: float
+
+
+class SubjectModel:
+    """单个科目的最近质心模型"""
+
+    def __init__(self, idf: Dict[str, float], labels: List[str], centroids: List[Dict[str, float]]):
+        """
+        Args:
+            idf: n-gram -> IDF
+            labels: 知识点列表
+            centroids: 与 labels 对应的质心向量（稀疏）
+        """
+        self.idf = idf
+        self.labels = labels
+        self.centroids = centroids
+        # 倒排表：n-gram -> [(知识点序号, 权重)]，预测时只遍历题目包含的 n-gram
+        self._postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for index, centroid in enumerate(centroids):
+            for ngram, weight in centroid.items():
+                self._postings[ngram].append((index, weight))
+
+    def vectorize(self, counts: Counter) -> Dict[str, float]:
+        """n-gram 计数 -> 归一化 TF-IDF 向量（忽略词表外的 n-gram）"""
+        return _normalize({
+            ngram: (1 + math.log(count)) * self.idf[ngram]
+            for ngram, count in counts.items() if ngram in self.idf
+        })
+
+    def predict(self, counts: Counter) -> Optional[Prediction]:
+        """
+        预测知识点
+
+        Args:
+            counts: 题目 n-gram 计数
+
+        Returns:
+            Optional[Prediction]: 结果，题目与所有质心都不相交时返回 None
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for ngram, weight in self.vectorize(counts).items():
+            for index, centroid_weight in self._postings.get(ngram, ()):
+                scores[index] += weight * centroid_weight
+        if not scores:
+            return None
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        top = ranked[0][1]
+        if top <= 0:
+            return None
+        labels = [
+            self.labels[index] for index, score in ranked[:MAX_LABELS]
+            if score >= top * LABEL_SCORE_RATIO
+        ]
+        return Prediction(knowledge_points=labels, confidence=top)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "idf": {k: round(v, 4) for k, v in self.idf.items()},
+            "labels": self.labels,
+            "centroids": [{k: round(w, 5) for k, w in c.items()} for c in self.centroids],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SubjectModel":
+        return cls(data["idf"], data["labels"], data["centroids"])
+
+
+class KnowledgePointModel:
+    """按科目组织的知识点分类模型"""
+
+    def __init__(self, subjects: Dict[str, SubjectModel], version: str, params: Dict[str, Any]):
+        """
+        Args:
+            subjects: 科目 -> 模型
+            version: 模型版本（训练时间戳）
+            params: 训练参数
+        """
+        self.subjects = subjects
+        self.version = version
+        self.params = params
+
+    @classmethod
+    def train(
+        cls,
+        examples: Iterable[Tuple[Optional[str], Question]],
+        min_df: int = 2,
+        min_label_count: int = 3,
+        max_centroid_features: int = 400
+    ) -> "KnowledgePointModel":
+        """
+        训练模型
+
+        Args:
+            examples: (科目, 带 knowledge_tags 的题目)
+            min_df: n-gram 至少出现在多少道题中才进入词表
+            min_label_count: 知识点至少出现在多少道题中才参与训练
+            max_centroid_features: 每个质心保留的最大特征数
+
+        Returns:
+            KnowledgePointModel: 训练好的模型
+        """
+        by_subject: Dict[str, List[Tuple[Counter, List[str]]]] = defaultdict(list)
+        for subject, question in examples:
+            if question.knowledge_tags:
+                by_subject[subject or "unknown"].append(
+                    (extract_ngrams(question), list(dict.fromkeys(question.knowledge_tags)))
+                )
+
+        subjects = {}
+        for subject, rows in by_subject.items():
+            label_counts = Counter(label for _, labels in rows for label in labels)
+            labels = sorted(label for label, count in label_counts.items() if count >= min_label_count)
+            if not labels:
+                continue
+
+            df = Counter(ngram for counts, _ in rows for ngram in counts)
+            total = len(rows)
+            idf = {
+                ngram: math.log((1 + total) / (1 + count)) + 1
+                for ngram, count in df.items() if count >= min_df
+            }
+            model = SubjectModel(idf, labels, [])
+
+            sums: Dict[str, Dict[str, float]] = {label: defaultdict(float) for label in labels}
+            for counts, row_labels in rows:
+                vector = model.vectorize(counts)
+                for label in row_labels:
+                    if label in sums:
+                        for ngram, weight in vector.items():
+                            sums[label][ngram] += weight
+
+            centroids = []
+            for label in labels:
+                top = sorted(sums[label].items(), key=lambda item: item[1], reverse=True)
+                centroids.append(_normalize(dict(top[:max_centroid_features])))
+            subjects[subject] = SubjectModel(idf, labels, centroids)
+            logger.info(f"科目 {subject}: {total} 道题，{len(labels)} 个知识点，词表 {len(idf)}")
+
+        params = {
+            "min_df": min_df,
+            "min_label_count": min_label_count,
+            "max_centroid_features": max_centroid_features,
+        }
+        return cls(subjects, datetime.utcnow().strftime("%Y%m%d%H%M%S"), params)
+
+    def predict(self, question: Question, subject: Optional[str] = None) -> Optional[Prediction]:
+        """
+        预测知识点
+
+        Args:
+            question: 题目
+            subject: 科目（可选）
+
+        Returns:
+            Optional[Prediction]: 结果，科目无模型时返回 None
+        """
+        model = self.subjects.get(subject or "unknown")
+        if model is None:
+            return None
+        return model.predict(extract_ngrams(question))
+
+    def save(self, path: str):
+        """写入模型文件（先写临时文件再替换）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "format_version": MODEL_FORMAT_VERSION,
+            "version": self.version,
+            "params": self.params,
+            "subjects": {subject: model.to_dict() for subject, model in self.subjects.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "KnowledgePointModel":
+        """
+        读取模型文件
+
+        Raises:
+            ValueError: 文件格式版本不匹配
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format_version") != MODEL_FORMAT_VERSION:
+            raise ValueError(
+                f"模型格式版本 {data.get('format_version')} 与当前版本 {MODEL_FORMAT_VERSION} 不一致"
+            )
+        subjects = {s: SubjectModel.from_dict(m) for s, m in data["subjects"].items()}
+        return cls(subjects, data["version"], data.get("params", {}))
+
+
+def evaluate(
+    model: KnowledgePointModel,
+    examples: List[Tuple[Optional[str], Question]],
+    thresholds: Iterable[float]
+) -> List[Dict[str, float]]:
+    """
+    在验证集上评估不同置信度阈值下的效果
+
+    Args:
+        model: 模型
+        examples: (科目, 带 knowledge_tags 的题目)
+        thresholds: 置信度阈值
+
+    Returns:
+        List[Dict]: 每个阈值一项：coverage（本地回答比例，即省去的 LLM 调用比例）、
+        precision / recall（本地回答题目上的知识点准确率 / 召回率）、exact（完全一致比例）
+    """
+    scored = []
+    for subject, question in examples:
+        gold = set(question.knowledge_tags)
+        if not gold:
+            continue
+        prediction = model.predict(question, subject)
+        scored.append((prediction, gold))
+
+    report = []
+    for threshold in thresholds:
+        answered = [
+            (set(p.knowledge_points), gold) for p, gold in scored
+            if p is not None and p.confidence >= threshold
+        ]
+        count = len(answered)
+        report.append({
+            "threshold": threshold,
+            "coverage": count / len(scored) if scored else 0.0,
+            "precision": sum(len(p & g) / len(p) for p, g in answered) / count if count else 0.0,
+            "recall": sum(len(p & g) / len(g) for p, g in answered) / count if count else 0.0,
+            "exact": sum(p == g for p, g in answered) / count if count else 0.0,
+        })
+    return report
+
+
+class KnowledgePointClassifier:
+    """本地知识点分类服务（模型首次使用时加载）"""
+
+    def __init__(self, path: Optional[str] = None, min_confidence: Optional[float] = None):
+        """
+        初始化分类服务
+
+        Args:
+            path: 模型文件路径
+            min_confidence: 采用本地结果的最低置信度（余弦相似度）
+        """
+        self.path = path or settings.KNOWLEDGE_CLASSIFIER_PATH
+        self.min_confidence = (
+            min_confidence if min_confidence is not None
+            else settings.KNOWLEDGE_CLASSIFIER_MIN_CONFIDENCE
+        )
+        self.model: Optional[KnowledgePointModel] = None
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    async def _ensure_loaded(self):
+        """首次调用时在线程中加载模型；文件不存在或无法读取时禁用"""
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                try:
+                    self.model = await asyncio.to_thread(KnowledgePointModel.load, self.path)
+                    logger.info(f"加载知识点分类模型: {self.path} (版本 {self.model.version})")
+                except Exception as e:
+                    logger.error(f"知识点分类模型加载失败，回退到 LLM: {e}")
+            else:
+                logger.info(f"知识点分类模型不存在，回退到 LLM: {self.path}")
+            self._loaded = True
+
+    async def predict(self, question: Question, subject: Optional[str] = None) -> Optional[List[str]]:
+        """
+        置信度足够高时返回本地预测的知识点
+
+        Args:
+            question: 题目
+            subject: 科目（可选）
+
+        Returns:
+            Optional[List[str]]: 知识点列表；模型不可用或置信度不足时返回 None
+        """
+        await self._ensure_loaded()
+        if self.model is None:
+            KNOWLEDGE_CLASSIFIER_PREDICTIONS.labels(result="unavailable").inc()
+            return None
+
+        prediction = self.model.predict(question, subject)
+        if prediction is None or prediction.confidence < self.min_confidence:
+            KNOWLEDGE_CLASSIFIER_PREDICTIONS.labels(result="rejected").inc()
+            return None
+
+        KNOWLEDGE_CLASSIFIER_PREDICTIONS.labels(result="accepted").inc()
+        logger.info(
+            f"本地分类器标注知识点: {question.question_id} -> {prediction.knowledge_points} "
+            f"（置信度 {prediction.confidence:.2f}）"
+        )
+        return prediction.knowledge_points
+
+
+# 创建全局知识点分类器实例
+knowledge_classifier = KnowledgePointClassifier()
@@ -0,0 +1,372 @@
+"""
+LLM 调用限流
+
+- PrioritySemaphore: 进程内并发上限，按优先级通道（interactive > background）分配
+- 令牌桶: 按 请求数/秒 和 token 数/分钟 双维度限流；backend=redis 时通过 Lua 脚本
+  在 Redis 中原子扣减，所有 API / worker 进程共享同一配额
+- 退避: 带抖动的指数退避，429 / 503 响应的 Retry-After 优先，并使所有进程暂停发送
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import LLM_QUEUE_WAIT, LLM_RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+# 优先级通道（按优先级从高到低）
+LANE_INTERACTIVE = "interactive"
+LANE_BACKGROUND = "background"
+LANES = (LANE_INTERACTIVE, LANE_BACKGROUND)
+
+
+class PrioritySemaphore:
+    """带优先级通道的信号量：释放时优先唤醒高优先级通道的等待者"""
+
+    def __init__(self, capacity: int, lane_limits: Optional[Dict[str, int]] = None):
+        """
+        初始化信号量
+
+        Args:
+            capacity: 总并发上限
+            lane_limits: 各通道并发上限（为高优先级通道预留名额）
+        """
+        self.capacity = capacity
+        self.lane_limits = lane_limits or {}
+        self.in_use = 0
+        self.lane_in_use: Counter = Counter()
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+
+    def _can_take(self, lane: str) -> bool:
+        return (
+            self.in_use < self.capacity
+            and self.lane_in_use[lane] < self.lane_limits.get(lane, self.capacity)
+        )
+
+    def _take(self, lane: str):
+        self.in_use += 1
+        self.lane_in_use[lane] += 1
+
+    def _has_waiters_ahead(self, lane: str) -> bool:
+        """同一通道或更高优先级通道是否有人在排队"""
+        for other in LANES:
+            if self._waiters[other]:
+                return True
+            if other == lane:
+                return False
+        return False
+
+    async def acquire(self, lane: str = LANE_BACKGROUND):
+        """
+        获取一个并发名额
+
+        Args:
+            lane: 优先级通道
+        """
+        if self._can_take(lane) and not self._has_waiters_ahead(lane):
+            self._take(lane)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已分配但调用方被取消，归还名额
+                self.release(lane)
+            else:
+                self._waiters[lane].remove(future)
+            raise
+
+    def release(self, lane: str = LANE_BACKGROUND):
+        """
+        归还一个并发名额
+
+        Args:
+            lane: 优先级通道
+        """
+        self.in_use -= 1
+        self.lane_in_use[lane] -= 1
+        self._wake()
+
+    def _wake(self):
+        """按优先级唤醒等待者"""
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and self._can_take(lane):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self._take(lane)
+                future.set_result(True)
+
+
+class TokenBucket:
+    """进程内令牌桶（redis 不可用或 backend=local 时使用）"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """获取 cost 个令牌需要等待的时间（秒）"""
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self.tokens -= min(cost, self.capacity)
+
+
+# 原子检查并扣减两个令牌桶（请求数 / token 数），返回需要等待的秒数（0 表示已扣减）
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local current = {}
+local costs = {}
+for i = 1, 2 do
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local capacity = tonumber(ARGV[i * 3])
+    local cost = math.min(tonumber(ARGV[i * 3 + 1]), capacity)
+    local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+    current[i] = tokens
+    costs[i] = cost
+end
+for i = 1, 2 do
+    local tokens = current[i]
+    if wait == 0 then
+        tokens = tokens - costs[i]
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[i], 300)
+end
+return tostring(wait)
+"""
+
+
+class LLMRateLimiter:
+    """LLM 上游限流器（并发 + 请求速率 + token 速率）"""
+
+    KEY_PREFIX = "llm_limit:"
+
+    def __init__(
+        self,
+        name: str,
+        backend: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        background_concurrency: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        request_burst: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None
+    ):
+        """
+        初始化限流器
+
+        Args:
+            name: 上游名称（用于 Redis 键和指标标签）
+            backend: 令牌桶后端（redis / local）
+            max_concurrency: 进程内总并发上限
+            background_concurrency: background 通道并发上限
+            requests_per_second: 集群请求速率上限
+            request_burst: 请求突发容量
+            tokens_per_minute: 集群 token 速率上限
+        """
+        self.name = name
+        self.backend = backend or settings.DEEPSEEK_RATE_LIMIT_BACKEND
+        capacity = max_concurrency or settings.DEEPSEEK_MAX_CONCURRENCY
+        self.semaphore = PrioritySemaphore(
+            capacity,
+            {LANE_BACKGROUND: background_concurrency or settings.DEEPSEEK_BACKGROUND_MAX_CONCURRENCY}
+        )
+        self.requests_per_second = requests_per_second or settings.DEEPSEEK_REQUESTS_PER_SECOND
+        self.request_burst = request_burst or settings.DEEPSEEK_REQUEST_BURST
+        self.tokens_per_minute = tokens_per_minute or settings.DEEPSEEK_TOKENS_PER_MINUTE
+        self._request_bucket = TokenBucket(self.requests_per_second, self.request_burst)
+        self._token_bucket = TokenBucket(self.tokens_per_minute / 60, self.tokens_per_minute)
+        self._blocked_until = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, lane: str = LANE_BACKGROUND, tokens: int = 0) -> AsyncIterator[None]:
+        """
+        获取一次调用的配额（并发名额 + 请求令牌 + token 令牌）
+
+        Args:
+            lane: 优先级通道（interactive / background）
+            tokens: 本次调用预计消耗的 token 数（提示词 + 最大输出）
+        """
+        start = time.perf_counter()
+        await self.semaphore.acquire(lane)
+        try:
+            while True:
+                wait = await self._reserve(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 1.0) * random.uniform(1.0, 1.2))
+            LLM_QUEUE_WAIT.labels(provider=self.name, lane=lane).observe(
+                time.perf_counter() - start
+            )
+            yield
+        finally:
+            self.semaphore.release(lane)
+
+    async def _reserve(self, tokens: int) -> float:
+        """
+        尝试扣减请求令牌和 token 令牌
+
+        Returns:
+            float: 需要等待的秒数（0 表示扣减成功）
+        """
+        cooldown = await self._cooldown_remaining()
+        if cooldown > 0:
+            return cooldown
+
+        if self.backend == "redis":
+            try:
+                from app.core.redis_client import get_redis
+                redis = await get_redis()
+                wait = await redis.eval(
+                    TOKEN_BUCKET_SCRIPT,
+                    2,
+                    f"{self.KEY_PREFIX}{self.name}:requests",
+                    f"{self.KEY_PREFIX}{self.name}:tokens",
+                    time.time(),
+                    self.requests_per_second, self.request_burst, 1,
+                    self.tokens_per_minute / 60, self.tokens_per_minute, tokens
+                )
+                return float(wait)
+            except Exception as e:
+                logger.error(f"Redis 限流不可用，使用进程内令牌桶: {e}")
+
+        now = time.monotonic()
+        wait = max(
+            self._request_bucket.wait_time(1, now),
+            self._token_bucket.wait_time(tokens, now)
+        )
+        if wait <= 0:
+            self._request_bucket.take(1)
+            self._token_bucket.take(tokens)
+        return wait
+
+    async def _cooldown_remaining(self) -> float:
+        """上游限流冷却的剩余时间（秒）"""
+        remaining = self._blocked_until - time.time()
+        if remaining > 0:
+            return remaining
+        if self.backend == "redis":
+            try:
+                from app.core.redis_client import get_redis
+                redis = await get_redis()
+                until = await redis.get(f"{self.KEY_PREFIX}{self.name}:cooldown")
+                if until:
+                    self._blocked_until = float(until)
+                    return max(0.0, self._blocked_until - time.time())
+            except Exception as e:
+                logger.error(f"读取限流冷却状态失败: {e}")
+        return 0.0
+
+    async def penalize(self, seconds: float):
+        """
+        上游返回限流时暂停所有进程发送
+
+        Args:
+            seconds: 暂停时间（秒）
+        """
+        LLM_RATE_LIMITED.labels(provider=self.name).inc()
+        until = time.time() + seconds
+        self._blocked_until = max(self._blocked_until, until)
+        if self.backend == "redis":
+            try:
+                from app.core.redis_client import get_redis
+                redis = await get_redis()
+                await redis.set(
+                    f"{self.KEY_PREFIX}{self.name}:cooldown",
+                    until,
+                    px=max(1, int(seconds * 1000))
+                )
+            except Exception as e:
+                logger.error(f"写入限流冷却状态失败: {e}")
+
+
+def parse_retry_after(error: BaseException) -> Optional[float]:
+    """
+    从 429 / 503 响应中解析 Retry-After（秒）
+
+    Args:
+        error: 调用异常
+
+    Returns:
+        Optional[float]: 等待秒数，无法解析时返回 None
+    """
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    if error.response.status_code not in (429, 503):
+        return None
+    value = error.response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_delay(
+    attempt: int,
+    error: Optional[BaseException] = None,
+    delays: Optional[List[float]] = None
+) -> float:
+    """
+    计算重试等待时间
+
+    优先使用 Retry-After；否则以 DEEPSEEK_RETRY_DELAYS 为上限做 equal jitter
+    （在 [delay/2, delay] 内随机），避免多个进程同时重试。
+
+    Args:
+        attempt: 已失败的次数（从 0 开始）
+        error: 本次失败的异常
+        delays: 各次重试的等待上限（默认 DEEPSEEK_RETRY_DELAYS）
+
+    Returns:
+        float: 等待秒数
+    """
+    retry_after = parse_retry_after(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, settings.DEEPSEEK_RETRY_MAX_DELAY)
+
+    delays = delays or settings.DEEPSEEK_RETRY_DELAYS
+    delay = delays[attempt] if attempt < len(delays) else delays[-1]
+    return random.uniform(delay / 2, delay)
+
+
+# 创建全局 DeepSeek 限流器
+deepseek_limiter = LLMRateLimiter("deepseek")
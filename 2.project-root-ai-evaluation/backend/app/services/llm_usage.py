@@ -0,0 +1,185 @@
+"""
+LLM 调用计量
+
+记录每次 LLM 调用的 token 用量、估算费用、耗时、重试次数和缓存命中：
+- 全部写入 Prometheus 指标（按提供商和调用类型分组）
+- 在 track_llm_usage() 范围内的调用同时累加到一份按试卷汇总的用量，
+  由试卷处理任务保存到 exams.llm_usage
+
+调用类型通过 _call_api 的 call_type 参数显式传入；按试卷汇总通过 ContextVar 传递，
+asyncio.gather 创建的子任务共享同一份汇总对象。
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.core.metrics import (
+    LLM_CALLS, LLM_CALL_LATENCY, LLM_COST, LLM_RETRIES, LLM_TOKENS
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 调用类型
+CALL_TAGGING = "tagging"
+CALL_DIFFICULTY = "difficulty"
+CALL_ENRICHMENT = "enrichment"
+CALL_GRADING = "grading"
+CALL_DIAGNOSIS = "diagnosis"
+CALL_OTHER = "other"
+
+# 调用来源：实际调用上游 / 命中响应缓存或合并到其他请求 / 重试后仍失败
+SOURCE_API = "api"
+SOURCE_CACHE = "cache"
+SOURCE_ERROR = "error"
+
+USAGE_FIELDS = (
+    "calls", "cache_hits", "errors", "retries",
+    "prompt_tokens", "completion_tokens", "prompt_cache_hit_tokens",
+    "cost", "latency_seconds"
+)
+
+
+def estimate_cost(usage: Dict[str, Any]) -> float:
+    """
+    按 DeepSeek 计价估算一次调用的费用（元）
+
+    usage 中有 prompt_cache_hit_tokens 时，命中上下文缓存的输入 token 按缓存价计费。
+
+    Args:
+        usage: 响应中的 usage 字段
+
+    Returns:
+        float: 估算费用
+    """
+    prompt = usage.get("prompt_tokens", 0) or 0
+    completion = usage.get("completion_tokens", 0) or 0
+    cache_hit = min(usage.get("prompt_cache_hit_tokens", 0) or 0, prompt)
+    return (
+        (prompt - cache_hit) * settings.DEEPSEEK_PRICE_PROMPT_PER_MILLION
+        + cache_hit * settings.DEEPSEEK_PRICE_PROMPT_CACHE_HIT_PER_MILLION
+        + completion * settings.DEEPSEEK_PRICE_COMPLETION_PER_MILLION
+    ) / 1_000_000
+
+
+class LLMUsage:
+    """一份 LLM 用量汇总（总计 + 按调用类型）"""
+
+    def __init__(self):
+        """初始化汇总"""
+        self.total = dict.fromkeys(USAGE_FIELDS, 0)
+        self.by_type: Dict[str, Dict[str, float]] = {}
+
+    def add(self, call_type: str, **values: float):
+        """
+        累加一次调用
+
+        Args:
+            call_type: 调用类型
+            **values: USAGE_FIELDS 中的字段增量
+        """
+        bucket = self.by_type.setdefault(call_type, dict.fromkeys(USAGE_FIELDS, 0))
+        for key, value in values.items():
+            self.total[key] += value
+            bucket[key] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可保存的 JSON 结构"""
+        def rounded(values: Dict[str, float]) -> Dict[str, float]:
+            return {
+                key: round(value, 6) if isinstance(value, float) else value
+                for key, value in values.items()
+            }
+
+        return {
+            **rounded(self.total),
+            "by_type": {call_type: rounded(values) for call_type, values in self.by_type.items()},
+        }
+
+    def merged_into(self, existing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        与已保存的汇总合并（试卷分多个阶段处理时逐阶段累加）
+
+        Args:
+            existing: exams.llm_usage 中已有的汇总
+
+        Returns:
+            Dict: 合并后的汇总
+        """
+        merged = LLMUsage()
+        for usage in (existing or {}, self.to_dict()):
+            for call_type, values in usage.get("by_type", {}).items():
+                merged.add(call_type, **{k: v for k, v in values.items() if k in USAGE_FIELDS})
+        return merged.to_dict()
+
+
+_current_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_llm_usage() -> Iterator[LLMUsage]:
+    """
+    在该范围内（含其中创建的子任务）发起的 LLM 调用累加到返回的汇总对象
+
+    Yields:
+        LLMUsage: 本范围的用量汇总
+    """
+    usage = LLMUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_llm_call(
+    provider: str,
+    call_type: str,
+    source: str,
+    latency: float = 0.0,
+    usage: Optional[Dict[str, Any]] = None,
+    retries: int = 0
+):
+    """
+    记录一次 LLM 调用
+
+    Args:
+        provider: 提供商
+        call_type: 调用类型
+        source: 调用来源（api / cache / error）
+        latency: 耗时（秒，含重试和排队）
+        usage: 响应中的 usage 字段
+        retries: 重试次数
+    """
+    usage = usage or {}
+    prompt = usage.get("prompt_tokens", 0) or 0
+    completion = usage.get("completion_tokens", 0) or 0
+    cache_hit = usage.get("prompt_cache_hit_tokens", 0) or 0
+    cost = estimate_cost(usage) if usage else 0.0
+
+    LLM_CALLS.labels(provider=provider, call_type=call_type, source=source).inc()
+    LLM_CALL_LATENCY.labels(provider=provider, call_type=call_type, source=source).observe(latency)
+    if retries:
+        LLM_RETRIES.labels(provider=provider, call_type=call_type).inc(retries)
+    if usage:
+        LLM_TOKENS.labels(provider=provider, call_type=call_type, kind="prompt").inc(prompt)
+        LLM_TOKENS.labels(provider=provider, call_type=call_type, kind="completion").inc(completion)
+        LLM_TOKENS.labels(provider=provider, call_type=call_type, kind="prompt_cache_hit").inc(cache_hit)
+        LLM_COST.labels(provider=provider, call_type=call_type).inc(cost)
+
+    exam_usage = _current_usage.get()
+    if exam_usage is not None:
+        exam_usage.add(
+            call_type,
+            calls=1,
+            cache_hits=int(source == SOURCE_CACHE),
+            errors=int(source == SOURCE_ERROR),
+            retries=retries,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            prompt_cache_hit_tokens=cache_hit,
+            cost=cost,
+            latency_seconds=latency
+        )
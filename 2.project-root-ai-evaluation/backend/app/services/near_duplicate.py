@@ -0,0 +1,336 @@
+"""
+近似重复题目索引
+
+打印试卷被反复上传时，OCR 往往只差一两个字符，精确指纹无法命中。这里对规范化
+题目文本的字符 3-gram 做 MinHash 签名，按 LSH 分段（band）落入桶中：
+- 查询：取与当前题目共享任一桶的候选，按 3-gram Jaccard 精确校验，超过阈值即
+  复用其知识点和难度
+- 存储：按科目隔离；backend=redis 时多进程共享，backend=disk 时保存在本地 JSON 文件
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import NEAR_DUP_LOOKUPS
+from app.schemas.parser import Question
+from app.services.question_cache import normalize_question_text, question_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+# 16 段 × 4 行：Jaccard 0.8 的题目成为候选的概率约 99.9%，0.3 约 12%
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# 固定种子，保证不同进程、不同版本间签名一致
+_rng = random.Random(20240601)
+PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def _hash64(value: str) -> int:
+    """稳定的 64 位哈希（内置 hash() 在进程间不一致）"""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shingles(normalized_text: str) -> Set[str]:
+    """
+    字符 n-gram 集合
+
+    Args:
+        normalized_text: 规范化题目文本
+
+    Returns:
+        Set[str]: n-gram 集合（文本短于 n 时为文本本身）
+    """
+    if len(normalized_text) <= SHINGLE_SIZE:
+        return {normalized_text}
+    return {
+        normalized_text[i:i + SHINGLE_SIZE]
+        for i in range(len(normalized_text) - SHINGLE_SIZE + 1)
+    }
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Jaccard 相似度"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash_signature(shingle_set: Iterable[str]) -> List[int]:
+    """
+    计算 MinHash 签名
+
+    Args:
+        shingle_set: n-gram 集合
+
+    Returns:
+        List[int]: 长度为 NUM_PERMUTATIONS 的签名
+    """
+    hashes = [_hash64(shingle) for shingle in shingle_set] or [0]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in PERMUTATIONS
+    ]
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    """
+    LSH 分段桶键
+
+    Args:
+        signature: MinHash 签名
+
+    Returns:
+        List[str]: 每段一个桶键，格式 "{段号}:{段哈希}"
+    """
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode(), digest_size=8).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+@dataclass
+class NearDuplicateMatch:
+    """近似重复匹配结果"""
+    fingerprint: str
+    similarity: float
+    knowledge_points: Optional[List[str]] = None
+    difficulty: Optional[float] = None
+
+
+class NearDuplicateIndex:
+    """近似重复题目索引"""
+
+    KEY_PREFIX = "near_dup:"
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        path: Optional[str] = None,
+        threshold: Optional[float] = None,
+        max_candidates: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        """
+        初始化索引
+
+        Args:
+            backend: 存储后端（redis / disk）
+            path: 磁盘索引文件路径（backend=disk 时使用；为空时仅保存在内存）
+            threshold: Jaccard 相似度阈值
+            max_candidates: 每次查询最多校验的候选数
+            ttl: Redis 键过期时间（秒）
+        """
+        self.backend = backend or settings.NEAR_DUP_BACKEND
+        self.path = path if path is not None else settings.NEAR_DUP_INDEX_PATH
+        self.threshold = threshold if threshold is not None else settings.NEAR_DUP_THRESHOLD
+        self.max_candidates = max_candidates or settings.NEAR_DUP_MAX_CANDIDATES
+        self.ttl = ttl or settings.NEAR_DUP_TTL
+        # 磁盘后端的内存索引: {科目: {"buckets": {桶键: [指纹]}, "entries": {指纹: 记录}}}
+        self._local: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+
+    # ========================================================================
+    # 查询与写入
+    # ========================================================================
+
+    async def lookup(
+        self,
+        question: Question,
+        subject: Optional[str] = None
+    ) -> Optional[NearDuplicateMatch]:
+        """
+        查找最相似的已丰富题目
+
+        Args:
+            question: 题目
+            subject: 科目（可选）
+
+        Returns:
+            Optional[NearDuplicateMatch]: 相似度超过阈值的最佳匹配，没有时返回 None
+        """
+        subject = subject or "unknown"
+        normalized = normalize_question_text(question.question_text, question.options)
+        query = shingles(normalized)
+
+        try:
+            entries = await self._candidates(subject, band_keys(minhash_signature(query)))
+        except Exception as e:
+            logger.error(f"近似重复索引查询失败: {e}")
+            return None
+
+        best: Optional[NearDuplicateMatch] = None
+        for fingerprint, entry in entries.items():
+            similarity = jaccard(query, shingles(entry.get("text", "")))
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = NearDuplicateMatch(
+                    fingerprint=fingerprint,
+                    similarity=similarity,
+                    knowledge_points=entry.get("knowledge_points"),
+                    difficulty=entry.get("difficulty")
+                )
+
+        NEAR_DUP_LOOKUPS.labels(result="hit" if best else "miss").inc()
+        if best:
+            logger.debug(f"近似重复命中: {question.question_id} 相似度 {best.similarity:.2f}")
+        return best
+
+    async def add(
+        self,
+        question: Question,
+        subject: Optional[str] = None,
+        knowledge_points: Optional[List[str]] = None,
+        difficulty: Optional[float] = None,
+        save: bool = True
+    ):
+        """
+        将已丰富的题目加入索引（已存在时合并字段）
+
+        Args:
+            question: 题目
+            subject: 科目（可选）
+            knowledge_points: 知识点列表
+            difficulty: 难度系数
+            save: 磁盘后端是否立即写回文件（批量构建时最后统一调用 save）
+        """
+        values = {"knowledge_points": knowledge_points or None, "difficulty": difficulty}
+        values = {field: value for field, value in values.items() if value is not None}
+        if not values:
+            return
+
+        subject = subject or "unknown"
+        normalized = normalize_question_text(question.question_text, question.options)
+        fingerprint = question_fingerprint(question)
+        keys = band_keys(minhash_signature(shingles(normalized)))
+
+        try:
+            if self.backend == "redis":
+                await self._redis_add(subject, fingerprint, normalized, keys, values)
+            else:
+                self._local_add(subject, fingerprint, normalized, keys, values)
+                if save:
+                    await asyncio.to_thread(self.save)
+        except Exception as e:
+            logger.error(f"近似重复索引写入失败: {e}")
+
+    # ========================================================================
+    # Redis 后端
+    # ========================================================================
+
+    def _bucket_key(self, subject: str, band_key: str) -> str:
+        return f"{self.KEY_PREFIX}{subject}:b:{band_key}"
+
+    def _entry_key(self, subject: str, fingerprint: str) -> str:
+        return f"{self.KEY_PREFIX}{subject}:e:{fingerprint}"
+
+    async def _candidates(self, subject: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """取共享任一桶的候选记录"""
+        if self.backend != "redis":
+            index = self._local_subject(subject)
+            fingerprints = self._limit(
+                fp for key in keys for fp in index["buckets"].get(key, [])
+            )
+            return {fp: index["entries"][fp] for fp in fingerprints if fp in index["entries"]}
+
+        from app.core.redis_client import get_redis
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.smembers(self._bucket_key(subject, key))
+        members = await pipe.execute()
+        fingerprints = self._limit(fp for bucket in members for fp in sorted(bucket))
+        if not fingerprints:
+            return {}
+
+        values = await redis.mget([self._entry_key(subject, fp) for fp in fingerprints])
+        return {fp: json.loads(value) for fp, value in zip(fingerprints, values) if value}
+
+    def _limit(self, fingerprints: Iterable[str]) -> List[str]:
+        """去重并截断候选（按出现顺序，即低段号的桶优先）"""
+        unique = list(dict.fromkeys(fingerprints))
+        return unique[:self.max_candidates]
+
+    async def _redis_add(
+        self,
+        subject: str,
+        fingerprint: str,
+        normalized: str,
+        keys: List[str],
+        values: Dict[str, Any]
+    ):
+        from app.core.redis_client import get_redis
+        redis = await get_redis()
+        entry_key = self._entry_key(subject, fingerprint)
+        existing = await redis.get(entry_key)
+        entry = json.loads(existing) if existing else {}
+        entry.update(values)
+        entry["text"] = normalized
+
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(entry_key, json.dumps(entry, ensure_ascii=False), ex=self.ttl)
+        for key in keys:
+            bucket = self._bucket_key(subject, key)
+            pipe.sadd(bucket, fingerprint)
+            pipe.expire(bucket, self.ttl)
+        await pipe.execute()
+
+    # ========================================================================
+    # 磁盘后端
+    # ========================================================================
+
+    def _local_subject(self, subject: str) -> Dict[str, Dict[str, Any]]:
+        """按需加载磁盘索引并返回某科目的索引"""
+        if self._local is None:
+            self._local = {}
+            if self.path and os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._local = json.load(f)
+                logger.info(f"加载近似重复索引: {self.path}")
+        return self._local.setdefault(subject, {"buckets": {}, "entries": {}})
+
+    def _local_add(
+        self,
+        subject: str,
+        fingerprint: str,
+        normalized: str,
+        keys: List[str],
+        values: Dict[str, Any]
+    ):
+        index = self._local_subject(subject)
+        entry = index["entries"].setdefault(fingerprint, {})
+        entry.update(values)
+        entry["text"] = normalized
+        for key in keys:
+            bucket = index["buckets"].setdefault(key, [])
+            if fingerprint not in bucket:
+                bucket.append(fingerprint)
+
+    def save(self):
+        """将磁盘索引写回文件（先写临时文件再替换）"""
+        if self.backend == "redis" or not self.path or self._local is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._local, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+# 创建全局近似重复索引实例
+near_duplicate_index = NearDuplicateIndex()
@@ -9,8 +9,8 @@ import hashlib
 from typing import Optional
 from datetime import datetime
 from urllib.parse import quote
-import httpx
 
+from app.core.http_client import get_http_client
 from app.services.ocr.base import OCRProvider
 from app.schemas.ocr import OCRResult, TextRegion, BoundingBox
 
@@ -109,15 +109,14 @@ class AliyunOCRProvider(OCRProvider):
         params["Signature"] = signature
         
         # 发送请求
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                self.API_ENDPOINT,
-                params=params,
-                json=body,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await get_http_client("aliyun").post(
+            self.API_ENDPOINT,
+            params=params,
+            json=body,
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        return response.json()
     
     def _parse_aliyun_response(self, data: dict, text_type: str = "printed") -> OCRResult:
         """
@@ -4,8 +4,8 @@
 import base64
 import time
 from typing import Optional
-import httpx
 
+from app.core.http_client import get_http_client
 from app.services.ocr.base import OCRProvider
 from app.schemas.ocr import OCRResult, TextRegion, BoundingBox
 
@@ -43,23 +43,22 @@ class BaiduOCRProvider(OCRProvider):
             return self.access_token
         
         # 获取新 token
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.TOKEN_URL,
-                params={
-                    "grant_type": "client_credentials",
-                    "client_id": self.api_key,
-                    "client_secret": self.api_secret
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            self.access_token = data["access_token"]
-            # Token 有效期通常是 30 天，提前 1 天刷新
-            self.token_expires_at = time.time() + data.get("expires_in", 2592000) - 86400
-            
-            return self.access_token
+        response = await get_http_client("baidu").post(
+            self.TOKEN_URL,
+            params={
+                "grant_type": "client_credentials",
+                "client_id": self.api_key,
+                "client_secret": self.api_secret
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        self.access_token = data["access_token"]
+        # Token 有效期通常是 30 天，提前 1 天刷新
+        self.token_expires_at = time.time() + data.get("expires_in", 2592000) - 86400
+        
+        return self.access_token
     
     async def _call_ocr_api(self, url: str, image_bytes: bytes) -> dict:
         """
@@ -77,15 +76,14 @@ class BaiduOCRProvider(OCRProvider):
         # 将图像转换为 base64
         image_base64 = base64.b64encode(image_bytes).decode('utf-8')
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                url,
-                params={"access_token": access_token},
-                data={"image": image_base64},
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await get_http_client("baidu").post(
+            url,
+            params={"access_token": access_token},
+            data={"image": image_base64},
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        response.raise_for_status()
+        return response.json()
     
     def _parse_baidu_response(self, data: dict, text_type: str = "printed") -> OCRResult:
         """
@@ -0,0 +1,126 @@
+"""
+OCR 对冲请求支持
+
+- LatencyTracker: 按提供商维护滚动延迟窗口，计算对冲等待时间（默认 p90）
+- HedgeBudget: 令牌桶形式的对冲预算，限制对冲带来的额外调用比例
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.core.config import settings
+
+
+class LatencyTracker:
+    """提供商延迟统计（滚动窗口）"""
+
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        percentile: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        default_delay: Optional[float] = None,
+        min_delay: Optional[float] = None
+    ):
+        """
+        初始化延迟统计
+
+        Args:
+            window: 每个提供商保留的最近样本数
+            percentile: 对冲触发分位数（0~1）
+            min_samples: 使用分位数前所需的最少样本数
+            default_delay: 样本不足时的对冲等待时间（秒）
+            min_delay: 对冲等待时间下限（秒）
+        """
+        self.window = window or settings.OCR_LATENCY_WINDOW
+        self.percentile_q = percentile if percentile is not None else settings.OCR_HEDGE_PERCENTILE
+        self.min_samples = min_samples if min_samples is not None else settings.OCR_HEDGE_MIN_SAMPLES
+        self.default_delay = default_delay if default_delay is not None else settings.OCR_HEDGE_DEFAULT_DELAY
+        self.min_delay = min_delay if min_delay is not None else settings.OCR_HEDGE_MIN_DELAY
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, provider: str, latency: float):
+        """
+        记录一次成功调用的延迟
+
+        Args:
+            provider: 提供商名称
+            latency: 延迟（秒）
+        """
+        samples = self._samples.get(provider)
+        if samples is None:
+            samples = self._samples[provider] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def sample_count(self, provider: str) -> int:
+        """提供商当前样本数"""
+        return len(self._samples.get(provider, ()))
+
+    def percentile(self, provider: str, q: float) -> Optional[float]:
+        """
+        计算延迟分位数（最近邻法）
+
+        Args:
+            provider: 提供商名称
+            q: 分位数（0~1）
+
+        Returns:
+            Optional[float]: 分位数延迟，无样本时返回 None
+        """
+        samples = self._samples.get(provider)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def hedge_delay(self, provider: str) -> float:
+        """
+        对冲等待时间：主提供商超过该时间未返回则发起对冲请求
+
+        Args:
+            provider: 提供商名称
+
+        Returns:
+            float: 等待时间（秒）
+        """
+        if self.sample_count(provider) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, self.percentile(provider, self.percentile_q))
+
+
+class HedgeBudget:
+    """
+    对冲预算
+
+    每次识别请求存入 max_ratio 个令牌，每次对冲消耗 1 个令牌，
+    长期来看对冲次数不超过 请求数 × max_ratio + burst。
+    """
+
+    def __init__(self, max_ratio: Optional[float] = None, burst: Optional[float] = None):
+        """
+        初始化对冲预算
+
+        Args:
+            max_ratio: 对冲额外请求占总请求的比例上限
+            burst: 令牌桶容量（允许的突发对冲次数）
+        """
+        self.max_ratio = max_ratio if max_ratio is not None else settings.OCR_HEDGE_MAX_EXTRA_RATIO
+        self.burst = burst if burst is not None else settings.OCR_HEDGE_BURST
+        self.tokens = self.burst
+
+    def record_request(self):
+        """记录一次识别请求"""
+        self.tokens = min(self.burst, self.tokens + self.max_ratio)
+
+    def try_acquire(self) -> bool:
+        """
+        尝试消耗一次对冲预算
+
+        Returns:
+            bool: 预算充足返回 True
+        """
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
@@ -0,0 +1,239 @@
+"""
+OCR 结果缓存
+
+按内容寻址：键为 SHA-256(图像字节) + 识别模式，值为紧凑编码的 OCRResult（含实际产出结果的提供商）。
+键不含提供商：故障转移、对冲或健康路由换用其他提供商时，同一图像仍得到同一个键。
+两级缓存：
+- L1: 进程内 LRU
+- L2: Redis（多进程共享）或本地磁盘，带 TTL
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import OCR_CACHE_REQUESTS
+from app.schemas.ocr import OCRResult, TextRegion, BoundingBox
+
+logger = logging.getLogger(__name__)
+
+
+class OCRResultCache:
+    """OCR 结果两级缓存"""
+
+    # 缓存键前缀（同时用作编码版本号，编码格式变化时递增）
+    KEY_PREFIX = "ocr_result:v2:"
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        local_size: Optional[int] = None,
+        ttl: Optional[int] = None,
+        cache_dir: Optional[str] = None
+    ):
+        """
+        初始化 OCR 结果缓存
+
+        Args:
+            backend: 二级缓存后端（redis / disk / none）
+            local_size: 进程内 LRU 容量
+            ttl: 二级缓存过期时间（秒）
+            cache_dir: 磁盘缓存目录（backend=disk 时使用）
+        """
+        self.backend = backend or settings.OCR_CACHE_BACKEND
+        self.local_size = local_size if local_size is not None else settings.OCR_CACHE_LOCAL_SIZE
+        self.ttl = ttl if ttl is not None else settings.OCR_CACHE_TTL
+        self.cache_dir = cache_dir or settings.OCR_CACHE_DIR
+        self._local: "OrderedDict[str, OCRResult]" = OrderedDict()
+        self.stats = {"local_hits": 0, "remote_hits": 0, "misses": 0}
+
+    # ========================================================================
+    # 键与编码
+    # ========================================================================
+
+    @staticmethod
+    def make_key(image_bytes: bytes, mode: str) -> str:
+        """
+        生成缓存键
+
+        图像按发送给提供商的原始字节计算哈希，相同照片的重复上传和任务重试
+        都会得到相同的键。
+
+        Args:
+            image_bytes: 图像二进制数据
+            mode: 识别模式（general / tiled / printed / handwritten）
+
+        Returns:
+            str: 缓存键
+        """
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{OCRResultCache.KEY_PREFIX}{mode}:{digest}"
+
+    @staticmethod
+    def encode(result: OCRResult) -> str:
+        """
+        将 OCRResult 编码为紧凑 JSON
+
+        每个文本区域编码为 [text, x, y, w, h, confidence, is_handwritten]
+        """
+        return json.dumps(
+            {
+                "p": result.provider,
+                "c": result.overall_confidence,
+                "t": result.processing_time,
+                "r": [
+                    [
+                        r.text, r.bbox.x, r.bbox.y, r.bbox.width, r.bbox.height,
+                        r.confidence, 1 if r.type == "handwritten" else 0
+                    ]
+                    for r in result.text_regions
+                ],
+            },
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+
+    @staticmethod
+    def decode(data: str) -> OCRResult:
+        """将紧凑 JSON 解码为 OCRResult"""
+        payload: Dict[str, Any] = json.loads(data)
+        return OCRResult(
+            text_regions=[
+                TextRegion(
+                    text=text,
+                    bbox=BoundingBox(x=x, y=y, width=w, height=h),
+                    confidence=confidence,
+                    type="handwritten" if handwritten else "printed"
+                )
+                for text, x, y, w, h, confidence, handwritten in payload["r"]
+            ],
+            overall_confidence=payload["c"],
+            processing_time=payload["t"],
+            provider=payload["p"]
+        )
+
+    # ========================================================================
+    # 读写
+    # ========================================================================
+
+    async def get(self, key: str) -> Optional[OCRResult]:
+        """
+        查询缓存（先 L1 后 L2，L2 命中时回填 L1）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[OCRResult]: 缓存的识别结果
+        """
+        result = self._local.get(key)
+        if result is not None:
+            self._local.move_to_end(key)
+            self.stats["local_hits"] += 1
+            OCR_CACHE_REQUESTS.labels(tier="local", result="hit").inc()
+            return result
+
+        data = await self._remote_get(key)
+        if data is not None:
+            try:
+                result = self.decode(data)
+            except Exception as e:
+                logger.error(f"OCR 缓存数据损坏 {key}: {e}")
+                result = None
+
+        if result is not None:
+            self._local_put(key, result)
+            self.stats["remote_hits"] += 1
+            OCR_CACHE_REQUESTS.labels(tier=self.backend, result="hit").inc()
+            return result
+
+        self.stats["misses"] += 1
+        OCR_CACHE_REQUESTS.labels(tier=self.backend, result="miss").inc()
+        return None
+
+    async def set(self, key: str, result: OCRResult):
+        """
+        写入缓存（L1 与 L2）
+
+        Args:
+            key: 缓存键
+            result: 识别结果
+        """
+        self._local_put(key, result)
+        await self._remote_set(key, self.encode(result))
+
+    def hit_rate(self) -> float:
+        """缓存命中率"""
+        hits = self.stats["local_hits"] + self.stats["remote_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _local_put(self, key: str, result: OCRResult):
+        """写入进程内 LRU"""
+        if self.local_size <= 0:
+            return
+        self._local[key] = result
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    # ========================================================================
+    # 二级缓存后端
+    # ========================================================================
+
+    async def _remote_get(self, key: str) -> Optional[str]:
+        """从二级缓存读取"""
+        try:
+            if self.backend == "redis":
+                from app.core.redis_client import get_redis
+                redis = await get_redis()
+                return await redis.get(key)
+            if self.backend == "disk":
+                return await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            logger.error(f"OCR 缓存读取失败 {key}: {e}")
+        return None
+
+    async def _remote_set(self, key: str, data: str):
+        """写入二级缓存"""
+        try:
+            if self.backend == "redis":
+                from app.core.redis_client import get_redis
+                redis = await get_redis()
+                await redis.setex(key, self.ttl, data)
+            elif self.backend == "disk":
+                await asyncio.to_thread(self._disk_set, key, data)
+        except Exception as e:
+            logger.error(f"OCR 缓存写入失败 {key}: {e}")
+
+    def _disk_path(self, key: str) -> str:
+        """磁盘缓存文件路径（按哈希前两位分目录）"""
+        name = key.replace(":", "_")
+        digest = key.rsplit(":", 1)[-1]
+        return os.path.join(self.cache_dir, digest[:2], f"{name}.json")
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        """读取磁盘缓存（过期则删除）"""
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _disk_set(self, key: str, data: str):
+        """写入磁盘缓存（先写临时文件再原子替换）"""
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
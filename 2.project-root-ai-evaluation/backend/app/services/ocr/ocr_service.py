@@ -1,11 +1,18 @@
 """
 OCR 服务管理器
 """
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import logging
+import time
 
 from app.core.config import settings
+from app.core.metrics import OCR_PROVIDER_LATENCY, OCR_HEDGE_REQUESTS, OCR_TILED_PAGES
 from app.services.ocr.base import OCRProvider, OCRProviderFactory
+from app.services.ocr.ocr_cache import OCRResultCache
+from app.services.ocr.hedging import LatencyTracker, HedgeBudget
+from app.services.ocr.provider_health import ProviderHealthRouter
+from app.services.ocr.tiling import prepare_tiles, stitch
 from app.schemas.ocr import OCRResult
 
 # 导入提供商以触发注册
@@ -24,6 +31,12 @@ class OCRService:
         """初始化 OCR 服务"""
         self.default_provider = settings.OCR_DEFAULT_PROVIDER
         self.providers: dict[str, OCRProvider] = {}
+        self.cache: Optional[OCRResultCache] = (
+            OCRResultCache() if settings.OCR_CACHE_ENABLED else None
+        )
+        self.latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget()
+        self.health = ProviderHealthRouter()
         
         # 初始化配置的提供商
         self._init_providers()
@@ -70,6 +83,9 @@ class OCRService:
         """
         选择 OCR 提供商
         
+        指定的提供商可用（未熔断）时直接使用；否则在可用提供商中选择健康评分
+        最高者，评分相同时优先默认提供商。
+        
         Args:
             provider_name: 提供商名称（可选）
             
@@ -79,61 +95,285 @@ class OCRService:
         Raises:
             ValueError: 如果提供商不存在或未配置
         """
-        # 使用指定的提供商或默认提供商
-        name = provider_name or self.default_provider
+        if not self.providers:
+            raise ValueError(f"没有可用的 OCR 提供商")
         
-        if name not in self.providers:
-            # 尝试故障转移
-            if self.providers:
-                fallback_name = next(iter(self.providers.keys()))
-                logger.warning(
-                    f"OCR 提供商 '{name}' 不可用，故障转移到 '{fallback_name}'"
-                )
-                return self.providers[fallback_name]
-            else:
-                raise ValueError(f"没有可用的 OCR 提供商")
+        if provider_name in self.providers and self.health.is_available(provider_name):
+            return self.providers[provider_name]
         
-        return self.providers[name]
+        ranked = self.health.rank(list(self.providers), preferred=self.default_provider)
+        if not ranked:
+            # 全部熔断时仍尝试默认提供商，由调用结果决定是否恢复
+            name = self.default_provider if self.default_provider in self.providers \
+                else next(iter(self.providers))
+            logger.warning(f"所有 OCR 提供商均处于熔断状态，尝试 '{name}'")
+            return self.providers[name]
+        
+        name = provider_name or self.default_provider
+        if ranked[0] != name:
+            logger.info(f"OCR 提供商 '{name}' 健康度较低或不可用，路由到 '{ranked[0]}'")
+        return self.providers[ranked[0]]
     
     async def recognize(
         self,
         image_bytes: bytes,
         provider_name: Optional[str] = None,
-        retry_on_failure: bool = True
+        retry_on_failure: bool = True,
+        use_cache: bool = True
     ) -> OCRResult:
         """
         识别图像中的文本
         
+        OCR_TILE_MODE=auto 时，多栏或过高的页面切成分块并发识别后拼接（见 tiling）。
+        
         Args:
             image_bytes: 图像二进制数据
             provider_name: 指定的提供商名称（可选）
             retry_on_failure: 失败时是否尝试其他提供商
+            use_cache: 是否使用 OCR 结果缓存
             
         Returns:
             OCRResult: OCR 识别结果
+            
+        Raises:
+            ValueError: OCR_TILE_MODE 无效
         """
+        await self.health.sync(list(self.providers))
         provider = self.select_provider(provider_name)
+        tiled = self._tiling_enabled()
+        
+        cache_key = self._cache_key(image_bytes, "tiled" if tiled else "general", use_cache)
+        cached = await self._cached(cache_key, provider_name)
+        if cached:
+            logger.info(f"OCR 缓存命中 (提供商: {cached.provider})")
+            return cached
+        
+        if tiled:
+            result = await self._recognize_tiled(image_bytes, provider, retry_on_failure)
+        else:
+            result = await self._recognize_with_failover(image_bytes, provider, retry_on_failure)
+        
+        if cache_key:
+            await self.cache.set(cache_key, result)
+        return result
+    
+    @staticmethod
+    def _tiling_enabled() -> bool:
+        """是否启用分块识别"""
+        mode = settings.OCR_TILE_MODE
+        if mode not in ("off", "auto"):
+            raise ValueError(f"Unknown OCR tile mode '{mode}'. Available: off, auto")
+        return mode == "auto"
+    
+    async def _recognize_tiled(
+        self,
+        image_bytes: bytes,
+        provider: OCRProvider,
+        retry_on_failure: bool
+    ) -> OCRResult:
+        """
+        分块并行识别
+        
+        页面按栏和重叠条带切分，最多 OCR_TILE_CONCURRENCY 个分块同时识别（每个分块
+        各自对冲和故障转移），结果拼接为整页坐标。只有一个分块或无法解码时整页识别。
+        
+        Args:
+            image_bytes: 图像二进制数据
+            provider: 提供商
+            retry_on_failure: 失败时是否尝试其他提供商
+            
+        Returns:
+            OCRResult: 整页识别结果
+        """
+        start = time.perf_counter()
+        try:
+            plan, tiles = await asyncio.to_thread(
+                prepare_tiles, image_bytes, settings.OCR_TILE_MAX_SIDE,
+                settings.OCR_TILE_OVERLAP, settings.OCR_TILE_JPEG_QUALITY
+            )
+        except ValueError as e:
+            logger.warning(f"图像无法分块，整页识别: {e}")
+            tiles = []
+        if not tiles:
+            return await self._recognize_with_failover(image_bytes, provider, retry_on_failure)
+        
+        semaphore = asyncio.Semaphore(settings.OCR_TILE_CONCURRENCY)
         
+        async def recognize_tile(tile_bytes: bytes) -> OCRResult:
+            async with semaphore:
+                return await self._recognize_with_failover(tile_bytes, provider, retry_on_failure)
+        
+        tasks = [asyncio.create_task(recognize_tile(tile_bytes)) for tile_bytes in tiles]
         try:
-            result = await provider.recognize(image_bytes)
-            return result
+            results = await asyncio.gather(*tasks)
+        finally:
+            # 任一分块失败时取消其余分块
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        OCR_TILED_PAGES.observe(len(tiles))
+        providers = sorted({result.provider for result in results})
+        result = stitch(plan, results, "+".join(providers), time.perf_counter() - start)
+        logger.info(
+            f"分块识别完成: {plan.width}x{plan.height}, {plan.columns} 栏, {len(tiles)} 块, "
+            f"{len(result.text_regions)} 个区域, {result.processing_time:.2f}s"
+        )
+        return result
+    
+    async def _recognize_with_failover(
+        self,
+        image_bytes: bytes,
+        provider: OCRProvider,
+        retry_on_failure: bool
+    ) -> OCRResult:
+        """调用提供商识别（可对冲），失败时按需故障转移"""
+        tried = [provider.provider_name]
+        try:
+            if retry_on_failure and settings.OCR_HEDGE_ENABLED:
+                return await self._recognize_hedged(image_bytes, provider, tried)
+            return await self._timed_call(provider, provider.recognize, image_bytes)
         except Exception as e:
             logger.error(f"OCR 识别失败 (提供商: {provider.provider_name}): {e}")
+        
+        # 如果启用重试且有其他提供商，按健康评分依次故障转移
+        if retry_on_failure:
+            candidates = [name for name in self.providers if name not in tried]
+            for name in self.health.rank(candidates):
+                fallback_provider = self.providers[name]
+                try:
+                    logger.info(f"尝试故障转移到提供商: {name}")
+                    return await self._timed_call(
+                        fallback_provider, fallback_provider.recognize, image_bytes
+                    )
+                except Exception as fallback_error:
+                    logger.error(f"故障转移失败 (提供商: {name}): {fallback_error}")
+        
+        # 所有提供商都失败
+        raise Exception(f"所有 OCR 提供商都失败")
+    
+    async def _recognize_hedged(
+        self,
+        image_bytes: bytes,
+        primary: OCRProvider,
+        tried: List[str]
+    ) -> OCRResult:
+        """
+        对冲识别
+        
+        主提供商超过其延迟分位数（默认 p90）仍未返回时，向备用提供商发起
+        同样的请求，取先成功返回的结果并取消另一个。对冲次数受预算限制。
+        
+        Args:
+            image_bytes: 图像二进制数据
+            primary: 主提供商
+            tried: 已尝试的提供商名称（会追加对冲提供商）
             
-            # 如果启用重试且有其他提供商，尝试故障转移
-            if retry_on_failure and len(self.providers) > 1:
-                for name, fallback_provider in self.providers.items():
-                    if name != provider.provider_name:
-                        try:
-                            logger.info(f"尝试故障转移到提供商: {name}")
-                            result = await fallback_provider.recognize(image_bytes)
-                            return result
-                        except Exception as fallback_error:
-                            logger.error(f"故障转移失败 (提供商: {name}): {fallback_error}")
-                            continue
+        Returns:
+            OCRResult: OCR 识别结果
+        """
+        self.hedge_budget.record_request()
+        backup = self._select_hedge_provider(tried)
+        primary_task = asyncio.create_task(
+            self._timed_call(primary, primary.recognize, image_bytes)
+        )
+        tasks = [primary_task]
+        
+        try:
+            if backup is None:
+                return await primary_task
+            
+            delay = self.latency.hedge_delay(primary.provider_name)
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if done:
+                return primary_task.result()
+            
+            if not self.hedge_budget.try_acquire():
+                OCR_HEDGE_REQUESTS.labels(outcome="budget_exhausted").inc()
+                return await primary_task
+            
+            logger.info(
+                f"OCR 提供商 {primary.provider_name} {delay:.2f}s 未返回，"
+                f"对冲请求 {backup.provider_name}"
+            )
+            tried.append(backup.provider_name)
+            tasks.append(asyncio.create_task(
+                self._timed_call(backup, backup.recognize, image_bytes)
+            ))
+            
+            pending = set(tasks)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        outcome = "primary_won" if task is primary_task else "hedge_won"
+                        OCR_HEDGE_REQUESTS.labels(outcome=outcome).inc()
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"对冲中的 OCR 请求失败: {last_error}")
+            
+            OCR_HEDGE_REQUESTS.labels(outcome="all_failed").inc()
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def _select_hedge_provider(self, exclude: List[str]) -> Optional[OCRProvider]:
+        """选择对冲提供商（未尝试过的可用提供商中健康评分最高者）"""
+        candidates = [name for name in self.providers if name not in exclude]
+        ranked = self.health.rank(candidates)
+        return self.providers[ranked[0]] if ranked else None
+    
+    async def _timed_call(self, provider: OCRProvider, method, image_bytes: bytes) -> OCRResult:
+        """
+        调用提供商识别方法，记录延迟并更新健康状态
+        
+        Args:
+            provider: 提供商
+            method: 提供商的识别方法（recognize / recognize_printed / recognize_handwritten）
+            image_bytes: 图像二进制数据
             
-            # 所有提供商都失败
-            raise Exception(f"所有 OCR 提供商都失败")
+        Returns:
+            OCRResult: OCR 识别结果
+        """
+        name = provider.provider_name
+        self.health.begin_call(name)
+        start = time.perf_counter()
+        try:
+            result = await method(image_bytes)
+        except asyncio.CancelledError:
+            self.health.abort_call(name)
+            raise
+        except Exception as e:
+            await self.health.record_failure(name, e)
+            raise
+        elapsed = time.perf_counter() - start
+        self.latency.record(name, elapsed)
+        OCR_PROVIDER_LATENCY.labels(provider=name).observe(elapsed)
+        await self.health.record_success(name, elapsed)
+        return result
+    
+    def _cache_key(
+        self,
+        image_bytes: bytes,
+        mode: str,
+        use_cache: bool = True
+    ) -> Optional[str]:
+        """生成缓存键（缓存未启用时返回 None）"""
+        if not use_cache or self.cache is None:
+            return None
+        return self.cache.make_key(image_bytes, mode)
+    
+    async def _cached(self, cache_key: Optional[str], provider_name: Optional[str]) -> Optional[OCRResult]:
+        """读取缓存结果（指定了提供商时只接受该提供商产出的结果）"""
+        if not cache_key:
+            return None
+        cached = await self.cache.get(cache_key)
+        if cached and provider_name and cached.provider != provider_name:
+            return None
+        return cached
     
     async def recognize_printed(
         self,
@@ -150,8 +390,19 @@ class OCRService:
         Returns:
             OCRResult: OCR 识别结果
         """
+        await self.health.sync(list(self.providers))
         provider = self.select_provider(provider_name)
-        return await provider.recognize_printed(image_bytes)
+        
+        cache_key = self._cache_key(image_bytes, "printed")
+        cached = await self._cached(cache_key, provider_name)
+        if cached:
+            return cached
+        
+        result = await self._timed_call(provider, provider.recognize_printed, image_bytes)
+        
+        if cache_key:
+            await self.cache.set(cache_key, result)
+        return result
     
     async def recognize_handwritten(
         self,
@@ -168,8 +419,19 @@ class OCRService:
         Returns:
             OCRResult: OCR 识别结果
         """
+        await self.health.sync(list(self.providers))
         provider = self.select_provider(provider_name)
-        return await provider.recognize_handwritten(image_bytes)
+        
+        cache_key = self._cache_key(image_bytes, "handwritten")
+        cached = await self._cached(cache_key, provider_name)
+        if cached:
+            return cached
+        
+        result = await self._timed_call(provider, provider.recognize_handwritten, image_bytes)
+        
+        if cache_key:
+            await self.cache.set(cache_key, result)
+        return result
     
     def classify_text_type(self, text_region) -> str:
         """
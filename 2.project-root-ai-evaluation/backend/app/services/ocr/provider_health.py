@@ -0,0 +1,377 @@
+"""
+OCR 提供商健康评分与熔断
+
+每个提供商在滑动窗口内统计成功/失败次数和错误类别，并维护 EWMA 延迟：
+- 健康评分 = 平滑成功率 / (1 + EWMA 延迟 / 参考延迟)
+- 窗口内失败率超过阈值时熔断（open），冷却后进入半开（half_open），
+  放行一个探测请求，成功则恢复（closed），失败则重新熔断
+
+backend=redis 时，计数、EWMA 和熔断状态写入 Redis，各 API / worker 进程
+定期同步，一个进程检测到的故障会保护所有进程。
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import OCR_PROVIDER_ERRORS, OCR_CIRCUIT_OPEN
+
+logger = logging.getLogger(__name__)
+
+
+# 熔断状态
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    错误分类
+
+    Args:
+        error: 调用提供商时抛出的异常
+
+    Returns:
+        str: timeout / rate_limited / server / auth / client / network / other
+    """
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if status == 429:
+            return "rate_limited"
+        if status >= 500:
+            return "server"
+        if status in (401, 403):
+            return "auth"
+        return "client"
+    if isinstance(error, httpx.TransportError):
+        return "network"
+    return "other"
+
+
+class ProviderHealth:
+    """单个提供商的健康状态（进程内视图）"""
+
+    def __init__(self):
+        self.buckets: Dict[int, Counter] = {}
+        self.ewma_latency: Optional[float] = None
+        self.circuit = CIRCUIT_CLOSED
+        self.open_until = 0.0
+        self.probe_started_at: Optional[float] = None
+
+    def window_counts(self, min_bucket: int) -> Counter:
+        """汇总窗口内的计数"""
+        total = Counter()
+        for bucket, counts in self.buckets.items():
+            if bucket >= min_bucket:
+                total.update(counts)
+        return total
+
+
+class ProviderHealthRouter:
+    """基于健康评分的提供商路由"""
+
+    KEY_PREFIX = "ocr_health:"
+    CIRCUIT_PREFIX = "ocr_circuit:"
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        window: Optional[int] = None,
+        bucket_seconds: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        min_requests: Optional[int] = None,
+        open_seconds: Optional[float] = None,
+        ewma_alpha: Optional[float] = None,
+        latency_ref: Optional[float] = None,
+        sync_interval: Optional[float] = None
+    ):
+        """
+        初始化路由器
+
+        Args:
+            backend: 状态共享后端（redis / local）
+            window: 滑动窗口长度（秒）
+            bucket_seconds: 窗口分桶粒度（秒）
+            failure_rate: 触发熔断的失败率
+            min_requests: 触发熔断所需的窗口内最少请求数
+            open_seconds: 熔断冷却时间（秒）
+            ewma_alpha: EWMA 延迟平滑系数
+            latency_ref: 延迟评分参考值（秒）
+            sync_interval: 与 Redis 同步的最小间隔（秒）
+        """
+        self.backend = backend or settings.OCR_HEALTH_BACKEND
+        self.window = window or settings.OCR_HEALTH_WINDOW
+        self.bucket_seconds = bucket_seconds or settings.OCR_HEALTH_BUCKET
+        self.failure_rate = failure_rate if failure_rate is not None else settings.OCR_CIRCUIT_FAILURE_RATE
+        self.min_requests = min_requests if min_requests is not None else settings.OCR_CIRCUIT_MIN_REQUESTS
+        self.open_seconds = open_seconds if open_seconds is not None else settings.OCR_CIRCUIT_OPEN_SECONDS
+        self.ewma_alpha = ewma_alpha if ewma_alpha is not None else settings.OCR_HEALTH_EWMA_ALPHA
+        self.latency_ref = latency_ref or settings.OCR_HEALTH_LATENCY_REF
+        self.sync_interval = sync_interval if sync_interval is not None else settings.OCR_HEALTH_SYNC_INTERVAL
+        self._health: Dict[str, ProviderHealth] = {}
+        self._last_sync = 0.0
+
+    # ========================================================================
+    # 查询
+    # ========================================================================
+
+    def get(self, provider: str) -> ProviderHealth:
+        """获取提供商健康状态"""
+        health = self._health.get(provider)
+        if health is None:
+            health = self._health[provider] = ProviderHealth()
+        return health
+
+    def counts(self, provider: str) -> Counter:
+        """滑动窗口内的计数（ok / fail / err:<类别>）"""
+        return self.get(provider).window_counts(self._bucket() - self._bucket_count() + 1)
+
+    def state(self, provider: str) -> str:
+        """当前熔断状态（冷却结束的 open 视为 half_open）"""
+        health = self.get(provider)
+        if health.circuit == CIRCUIT_OPEN and time.time() >= health.open_until:
+            return CIRCUIT_HALF_OPEN
+        return health.circuit
+
+    def is_available(self, provider: str) -> bool:
+        """
+        提供商是否可接收请求
+
+        半开状态下只放行一个探测请求（探测超时后允许再次探测）
+        """
+        state = self.state(provider)
+        if state == CIRCUIT_CLOSED:
+            return True
+        if state == CIRCUIT_OPEN:
+            return False
+        started = self.get(provider).probe_started_at
+        return started is None or time.time() - started > self.open_seconds
+
+    def score(self, provider: str) -> float:
+        """
+        健康评分（越高越好）
+
+        Args:
+            provider: 提供商名称
+
+        Returns:
+            float: 平滑成功率 / (1 + EWMA 延迟 / 参考延迟)
+        """
+        counts = self.counts(provider)
+        success_rate = (counts["ok"] + 1) / (counts["ok"] + counts["fail"] + 2)
+        ewma = self.get(provider).ewma_latency or 0.0
+        return success_rate / (1 + ewma / self.latency_ref)
+
+    def rank(self, providers: List[str], preferred: Optional[str] = None) -> List[str]:
+        """
+        按健康评分排序可用提供商（熔断中的提供商被排除）
+
+        Args:
+            providers: 候选提供商名称
+            preferred: 评分相同时优先的提供商
+
+        Returns:
+            List[str]: 排序后的提供商名称
+        """
+        available = [p for p in providers if self.is_available(p)]
+        return sorted(
+            available,
+            key=lambda p: (-self.score(p), p != preferred, providers.index(p))
+        )
+
+    # ========================================================================
+    # 记录
+    # ========================================================================
+
+    def begin_call(self, provider: str):
+        """开始调用（半开状态下标记探测请求）"""
+        if self.state(provider) == CIRCUIT_HALF_OPEN:
+            self.get(provider).probe_started_at = time.time()
+
+    def abort_call(self, provider: str):
+        """调用被取消（不计入成功或失败）"""
+        self.get(provider).probe_started_at = None
+
+    async def record_success(self, provider: str, latency: float):
+        """
+        记录一次成功调用
+
+        Args:
+            provider: 提供商名称
+            latency: 延迟（秒）
+        """
+        health = self.get(provider)
+        if health.ewma_latency is None:
+            health.ewma_latency = latency
+        else:
+            health.ewma_latency += self.ewma_alpha * (latency - health.ewma_latency)
+
+        recovered = health.circuit != CIRCUIT_CLOSED
+        if recovered:
+            logger.info(f"OCR 提供商 {provider} 探测成功，熔断恢复")
+            health.circuit = CIRCUIT_CLOSED
+            health.buckets.clear()
+            OCR_CIRCUIT_OPEN.labels(provider=provider).set(0)
+        self._incr(health, ["ok"])
+        health.probe_started_at = None
+
+        await self._remote_record(provider, ["ok"], health.ewma_latency, recovered=recovered)
+
+    async def record_failure(self, provider: str, error: BaseException):
+        """
+        记录一次失败调用，必要时触发熔断
+
+        Args:
+            provider: 提供商名称
+            error: 异常
+        """
+        error_class = classify_error(error)
+        OCR_PROVIDER_ERRORS.labels(provider=provider, error_class=error_class).inc()
+
+        health = self.get(provider)
+        fields = ["fail", f"err:{error_class}"]
+        self._incr(health, fields)
+
+        probe_failed = self.state(provider) == CIRCUIT_HALF_OPEN
+        counts = self.counts(provider)
+        total = counts["ok"] + counts["fail"]
+        tripped = total >= self.min_requests and counts["fail"] / total >= self.failure_rate
+
+        open_until = None
+        if probe_failed or (health.circuit == CIRCUIT_CLOSED and tripped):
+            open_until = time.time() + self.open_seconds
+            self._open(provider, open_until)
+            logger.warning(
+                f"OCR 提供商 {provider} 熔断 {self.open_seconds:.0f}s "
+                f"(窗口失败 {counts['fail']}/{total}, 最近错误: {error_class})"
+            )
+        health.probe_started_at = None
+
+        await self._remote_record(provider, fields, None, open_until=open_until)
+
+    def _open(self, provider: str, open_until: float):
+        """本地打开熔断"""
+        health = self.get(provider)
+        health.circuit = CIRCUIT_OPEN
+        health.open_until = open_until
+        OCR_CIRCUIT_OPEN.labels(provider=provider).set(1)
+
+    def _incr(self, health: ProviderHealth, fields: List[str]):
+        """本地计数并清理过期分桶"""
+        bucket = self._bucket()
+        health.buckets.setdefault(bucket, Counter()).update(fields)
+        min_bucket = bucket - self._bucket_count() + 1
+        for old in [b for b in health.buckets if b < min_bucket]:
+            del health.buckets[old]
+
+    def _bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def _bucket_count(self) -> int:
+        return max(1, self.window // self.bucket_seconds)
+
+    # ========================================================================
+    # Redis 共享
+    # ========================================================================
+
+    async def _remote_record(
+        self,
+        provider: str,
+        fields: List[str],
+        ewma_latency: Optional[float],
+        open_until: Optional[float] = None,
+        recovered: bool = False
+    ):
+        """将一次调用结果写入 Redis（熔断恢复时清空窗口计数）"""
+        if self.backend != "redis":
+            return
+        try:
+            from app.core.redis_client import get_redis
+            redis = await get_redis()
+            key = f"{self.KEY_PREFIX}{provider}"
+            circuit_key = f"{self.CIRCUIT_PREFIX}{provider}"
+            if recovered:
+                await redis.delete(key, circuit_key)
+
+            bucket = self._bucket()
+            for field in fields:
+                await redis.hincrby(key, f"{bucket}:{field}", 1)
+            if ewma_latency is not None:
+                await redis.hset(key, "ewma", ewma_latency)
+            await redis.expire(key, self.window * 2)
+
+            if open_until is not None:
+                await redis.set(circuit_key, open_until, ex=int(self.open_seconds * 2) + 1)
+        except Exception as e:
+            logger.error(f"OCR 健康状态写入 Redis 失败 ({provider}): {e}")
+
+    async def sync(self, providers: List[str], force: bool = False):
+        """
+        从 Redis 同步共享状态（按 sync_interval 节流）
+
+        Args:
+            providers: 需要同步的提供商名称
+            force: 忽略节流间隔
+        """
+        if self.backend != "redis":
+            return
+        now = time.time()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        try:
+            from app.core.redis_client import get_redis
+            redis = await get_redis()
+            min_bucket = self._bucket() - self._bucket_count() + 1
+            for provider in providers:
+                data = await redis.hgetall(f"{self.KEY_PREFIX}{provider}")
+                circuit = await redis.get(f"{self.CIRCUIT_PREFIX}{provider}")
+                stale = self._apply_remote(provider, data, circuit, min_bucket)
+                if stale:
+                    await redis.hdel(f"{self.KEY_PREFIX}{provider}", *stale)
+        except Exception as e:
+            logger.error(f"OCR 健康状态同步失败: {e}")
+
+    def _apply_remote(
+        self,
+        provider: str,
+        data: Dict[str, str],
+        circuit: Optional[str],
+        min_bucket: int
+    ) -> List[str]:
+        """
+        用 Redis 中的共享状态覆盖本地视图
+
+        Returns:
+            List[str]: 已过期的字段（由调用方删除）
+        """
+        health = self.get(provider)
+        buckets: Dict[int, Counter] = {}
+        stale = []
+        for field, value in data.items():
+            if field == "ewma":
+                health.ewma_latency = float(value)
+                continue
+            bucket, name = field.split(":", 1)
+            if int(bucket) < min_bucket:
+                stale.append(field)
+                continue
+            buckets.setdefault(int(bucket), Counter())[name] += int(value)
+        health.buckets = buckets
+
+        if circuit is not None:
+            if health.circuit == CIRCUIT_CLOSED or float(circuit) > health.open_until:
+                self._open(provider, float(circuit))
+        elif health.circuit == CIRCUIT_OPEN:
+            health.circuit = CIRCUIT_CLOSED
+            health.probe_started_at = None
+            OCR_CIRCUIT_OPEN.labels(provider=provider).set(0)
+        return stale
@@ -0,0 +1,298 @@
+"""
+分块并行 OCR（大幅面 / 多栏试卷）
+
+整张 A3 试卷作为一张图片发给提供商时，提供商会在内部缩小图像（小字和手写识别率下降），
+超过尺寸上限时直接报错，而且整页是一次长时间的串行调用。分块模式：
+- 在缩小的灰度图上做投影分析：列投影中贯穿整页的空白竖带视为栏间空白，按栏切分
+- 栏的高度超过 OCR_TILE_MAX_SIDE 时再切成上下相互重叠 OCR_TILE_OVERLAP 像素的条带，
+  切分位置尽量落在行投影的空白行上，避免把一行文字切成两半；栏内不做左右切分
+  （文字行是横向的，左右切分会把每一行都切断）
+- 各分块分别编码，由 OCRService 并发识别
+- 拼接：坐标平移回整页；贴着切分边、且完整出现在相邻条带中的区域（被切断的行）丢弃；
+  重叠区中同一行文字（框重叠且文本相近）只保留较完整的一份；按栏、从上到下、从左到右排序
+
+分块坐标均为按 EXIF 方向转正后的整页像素坐标，与预处理和 OCR 灰度派生图一致。
+"""
+import logging
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.schemas.ocr import BoundingBox, OCRResult, TextRegion
+from app.services.image_ingest import ingest_image, open_image
+
+logger = logging.getLogger(__name__)
+
+
+ANALYSIS_SIDE = 1024  # 投影分析所用缩小图的长边
+BLANK_INK_RATIO = 0.004  # 墨迹像素比例低于该值的列 / 行视为空白
+MIN_GUTTER_RATIO = 0.015  # 栏间空白的最小宽度（占页宽）
+MIN_COLUMN_RATIO = 0.2  # 每栏的最小宽度（占页宽），过窄的切分视为误检
+DUPLICATE_OVERLAP = 0.5  # 两个框的交集占较小框面积的比例超过该值时视为同一位置
+DUPLICATE_TEXT_SIMILARITY = 0.6  # 同一位置的两段文本相似度超过该值时视为重复
+EDGE_MARGIN = 2  # 区域距切分边不超过该像素数时视为被切断
+
+
+@dataclass(frozen=True)
+class Tile:
+    """分块（整页像素坐标）"""
+    x: int
+    y: int
+    width: int
+    height: int
+    column: int = 0  # 所在栏序号（从左到右）
+
+
+@dataclass
+class TilePlan:
+    """分块方案"""
+    width: int  # 整页宽度
+    height: int  # 整页高度
+    columns: int  # 检测到的栏数
+    tiles: List[Tile]
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
+    """二值化（墨迹为 1）"""
+    _, mask = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return mask
+
+
+def detect_columns(ink: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    按列投影检测分栏
+
+    Args:
+        ink: 墨迹掩码（缩小图）
+
+    Returns:
+        List[(起始列, 结束列)]：各栏在缩小图上的范围，单栏时为整页
+    """
+    width = ink.shape[1]
+    blank = ink.mean(axis=0) < BLANK_INK_RATIO
+    inked = np.flatnonzero(~blank)
+    if inked.size == 0:
+        return [(0, width)]
+
+    # 只在首尾墨迹之间寻找空白竖带（页边空白不算栏间空白）
+    cuts = []
+    min_gutter = max(2, round(width * MIN_GUTTER_RATIO))
+    start = None
+    for x in range(inked[0], inked[-1] + 1):
+        if blank[x] and start is None:
+            start = x
+        elif not blank[x] and start is not None:
+            if x - start >= min_gutter:
+                cuts.append((start + x) // 2)
+            start = None
+
+    bounds = [0] + cuts + [width]
+    min_column = width * MIN_COLUMN_RATIO
+    columns = []
+    for left, right in zip(bounds, bounds[1:]):
+        if columns and right - left < min_column:
+            # 过窄的栏并入左侧（如题号列、装订线）
+            columns[-1] = (columns[-1][0], right)
+        else:
+            columns.append((left, right))
+    if len(columns) > 1 and columns[0][1] - columns[0][0] < min_column:
+        columns[1] = (columns[0][0], columns[1][1])
+        columns.pop(0)
+    return columns
+
+
+def split_span(length: int, max_length: int, overlap: int, blank: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+    """
+    把 [0, length) 切成长度不超过 max_length、相邻重叠 overlap 的区间
+
+    Args:
+        length: 总长度
+        max_length: 区间长度上限
+        overlap: 相邻区间的重叠长度
+        blank: 每个位置是否空白（可选；提供时切分位置尽量落在区间末尾 1/4 内的空白处）
+
+    Returns:
+        List[(起始, 结束)]
+    """
+    if length <= max_length:
+        return [(0, length)]
+
+    spans = []
+    start = 0
+    while True:
+        end = start + max_length
+        if end >= length:
+            spans.append((start, length))
+            return spans
+        if blank is not None:
+            window = max(1, max_length // 4)
+            candidates = np.flatnonzero(blank[end - window:end])
+            if candidates.size:
+                end = end - window + int(candidates[-1]) + 1
+        spans.append((start, end))
+        start = max(end - overlap, start + 1)
+
+
+def plan_tiles(gray: np.ndarray, max_side: int, overlap: int) -> TilePlan:
+    """
+    规划分块
+
+    Args:
+        gray: 整页灰度图
+        max_side: 条带高度上限
+        overlap: 同一栏内相邻条带的重叠像素
+
+    Returns:
+        TilePlan: 分块方案（坐标为整页像素坐标）
+    """
+    height, width = gray.shape[:2]
+    scale = min(1.0, ANALYSIS_SIDE / max(height, width))
+    small = gray if scale == 1.0 else cv2.resize(
+        gray, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+    )
+    ink = _ink_mask(small)
+    columns = detect_columns(ink)
+
+    tiles = []
+    for index, (left, right) in enumerate(columns):
+        x0 = round(left / scale)
+        x1 = width if right == ink.shape[1] else round(right / scale)
+        # 条带切分位置按缩小图上该栏的行投影寻找空白行
+        row_blank = ink[:, left:right].mean(axis=1) < BLANK_INK_RATIO
+        rows = np.minimum((np.arange(height) * scale).astype(int), row_blank.size - 1)
+        for y0, y1 in split_span(height, max_side, overlap, row_blank[rows]):
+            tiles.append(Tile(x0, y0, x1 - x0, y1 - y0, column=index))
+    return TilePlan(width=width, height=height, columns=len(columns), tiles=tiles)
+
+
+def prepare_tiles(
+    image_bytes: bytes,
+    max_side: int,
+    overlap: int,
+    quality: int
+) -> Tuple[TilePlan, List[bytes]]:
+    """
+    解码整页、规划分块并编码各分块
+
+    Args:
+        image_bytes: 整页图像
+        max_side: 条带高度上限
+        overlap: 相邻条带的重叠像素
+        quality: 分块 JPEG 编码质量
+
+    Returns:
+        Tuple[分块方案, 各分块的 JPEG]
+
+    Raises:
+        ValueError: 无法解码
+    """
+    try:
+        grayscale = open_image(image_bytes).mode in ("L", "1")
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
+    image = ingest_image(image_bytes, grayscale=grayscale)
+    plan = plan_tiles(image.gray, max_side, overlap)
+    if len(plan.tiles) == 1:
+        return plan, []
+
+    encoded = []
+    for tile in plan.tiles:
+        crop = image.pixels[tile.y:tile.y + tile.height, tile.x:tile.x + tile.width]
+        success, buffer = cv2.imencode(".jpg", crop, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            raise ValueError("Failed to encode image tile")
+        encoded.append(buffer.tobytes())
+    return plan, encoded
+
+
+def _area(box: BoundingBox) -> int:
+    return max(0, box.width) * max(0, box.height)
+
+
+def _intersection(a: BoundingBox, b: BoundingBox) -> int:
+    width = min(a.x + a.width, b.x + b.width) - max(a.x, b.x)
+    height = min(a.y + a.height, b.y + b.height) - max(a.y, b.y)
+    return max(0, width) * max(0, height)
+
+
+def is_duplicate(a: TextRegion, b: TextRegion) -> bool:
+    """两个来自不同分块的区域是否为重叠区中的同一段文字"""
+    smaller = min(_area(a.bbox), _area(b.bbox))
+    if smaller == 0 or _intersection(a.bbox, b.bbox) < smaller * DUPLICATE_OVERLAP:
+        return False
+    text_a, text_b = a.text.strip(), b.text.strip()
+    if not text_a or not text_b or text_a in text_b or text_b in text_a:
+        return True
+    return SequenceMatcher(None, text_a, text_b).ratio() >= DUPLICATE_TEXT_SIMILARITY
+
+
+def _is_clipped(box: BoundingBox, tile: Tile, plan: TilePlan) -> bool:
+    """区域是否贴着条带的切分边，且完整出现在同一栏的另一条带中"""
+    top = tile.y > 0 and box.y <= tile.y + EDGE_MARGIN
+    bottom = tile.y + tile.height < plan.height and box.y + box.height >= tile.y + tile.height - EDGE_MARGIN
+    if not (top or bottom):
+        return False
+    return any(
+        other is not tile and other.column == tile.column
+        and other.y <= box.y and box.y + box.height <= other.y + other.height
+        for other in plan.tiles
+    )
+
+
+def stitch(plan: TilePlan, results: Sequence[OCRResult], provider: str, processing_time: float) -> OCRResult:
+    """
+    拼接各分块的识别结果
+
+    Args:
+        plan: 分块方案
+        results: 与 plan.tiles 一一对应的识别结果（坐标为分块内坐标）
+        provider: 提供商名称
+        processing_time: 整页处理耗时（秒）
+
+    Returns:
+        OCRResult: 整页识别结果
+    """
+    candidates = []  # (所在栏, 分块序号, 区域)
+    for index, (tile, result) in enumerate(zip(plan.tiles, results)):
+        for region in result.text_regions:
+            bbox = region.bbox
+            # 平移回整页坐标，并裁剪到分块范围内
+            x = min(max(bbox.x, 0), tile.width)
+            y = min(max(bbox.y, 0), tile.height)
+            box = BoundingBox(
+                x=tile.x + x,
+                y=tile.y + y,
+                width=min(bbox.width, tile.width - x),
+                height=min(bbox.height, tile.height - y)
+            )
+            if _is_clipped(box, tile, plan):
+                continue
+            candidates.append((tile.column, index, region.model_copy(update={"bbox": box})))
+
+    # 较完整（面积大）、置信度高的区域优先保留，被切断的半行在重叠区中被去掉
+    candidates.sort(key=lambda item: (_area(item[2].bbox), item[2].confidence), reverse=True)
+    kept: List[Tuple[int, int, TextRegion]] = []
+    for column, index, region in candidates:
+        if any(other_index != index and is_duplicate(region, other) for _, other_index, other in kept):
+            continue
+        kept.append((column, index, region))
+
+    kept.sort(key=lambda item: (item[0], item[2].bbox.y, item[2].bbox.x))
+    regions = [region for _, _, region in kept]
+
+    # 整体置信度按各分块的区域数加权
+    weights = [len(result.text_regions) for result in results]
+    total = sum(weights)
+    overall = (
+        sum(result.overall_confidence * weight for result, weight in zip(results, weights)) / total
+        if total else min((result.overall_confidence for result in results), default=0.0)
+    )
+    return OCRResult(
+        text_regions=regions,
+        overall_confidence=overall,
+        processing_time=processing_time,
+        provider=provider
+    )
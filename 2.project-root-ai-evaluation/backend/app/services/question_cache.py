@@ -0,0 +1,230 @@
+"""
+题目画像缓存
+
+按题目指纹缓存知识点和难度，一条缓存记录同时保存两者：
+- 指纹：规范化题目文本（全/半角、中英文标点、空白、选项顺序）后的完整 SHA-256，
+  OCR 噪声造成的细微差异仍命中同一条记录
+- 记录带 schema 版本号，版本不一致视为未命中
+- 统计每个字段的命中率，命中即省去一次逐题 LLM 调用
+"""
+import hashlib
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.metrics import QUESTION_CACHE_REQUESTS
+from app.schemas.parser import Question
+from app.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+# 缓存记录格式版本（字段或规范化规则变化时递增）
+SCHEMA_VERSION = 1
+
+FIELD_KNOWLEDGE_POINTS = "knowledge_points"
+FIELD_DIFFICULTY = "difficulty"
+FIELDS = (FIELD_KNOWLEDGE_POINTS, FIELD_DIFFICULTY)
+
+# 全角 ASCII（！～）与全角空格 → 半角；不使用 NFKC，避免 x² 与 x2 等被合并
+CHARACTER_MAP = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+CHARACTER_MAP[0x3000] = 0x20
+# 其余中文标点 → 英文标点
+CHARACTER_MAP.update(str.maketrans({
+    "。": ".", "、": ",", "·": ".",
+    "“": '"', "”": '"', "「": '"', "」": '"', "『": '"', "』": '"',
+    "‘": "'", "’": "'",
+    "【": "[", "】": "]", "〔": "[", "〕": "]",
+    "《": "<", "》": ">", "〈": "<", "〉": ">",
+    "—": "-", "–": "-", "…": "...",
+}))
+
+# 选项标记：(A) 或 A. / A, / A: （A、 经标点映射后为 A,）；OCR 常丢失选项间空白，
+# 只排除前面紧跟大写字母的情况（如缩写 "AB."）
+OPTION_MARKER = re.compile(r"\(([A-H])\)|(?<![A-Z])([A-H])[.,:]")
+OPTION_PREFIX = re.compile(r"^\s*(?:\([A-H]\)|[A-H][.,:])")
+WHITESPACE = re.compile(r"\s+")
+BLANK = re.compile(r"_+")
+
+
+def _compact(text: str) -> str:
+    """去除空白、统一大小写、折叠填空横线"""
+    return BLANK.sub("_", WHITESPACE.sub("", text).lower())
+
+
+def _split_options(text: str) -> Tuple[str, List[str]]:
+    """
+    从题目文本中拆出题干和选项
+
+    选项标记须从 A 开始连续出现（A、B、C…）且至少两个，否则视为没有选项。
+
+    Returns:
+        Tuple[str, List[str]]: (题干, 选项内容列表)
+    """
+    markers = []
+    expected = "A"
+    for match in OPTION_MARKER.finditer(text):
+        if (match.group(1) or match.group(2)) == expected:
+            markers.append(match)
+            expected = chr(ord(expected) + 1)
+    if len(markers) < 2:
+        return text, []
+
+    options = [
+        text[marker.end():following.start()]
+        for marker, following in zip(markers, markers[1:])
+    ]
+    options.append(text[markers[-1].end():])
+    return text[:markers[0].start()], options
+
+
+def normalize_question_text(text: str, options: Optional[Iterable[str]] = None) -> str:
+    """
+    规范化题目文本
+
+    全角字符转半角、中文标点映射为英文标点、去除空白、选项按内容排序
+    （选项顺序不影响知识点和难度）。
+
+    Args:
+        text: 题目文本
+        options: 单独解析出的选项列表（可选）
+
+    Returns:
+        str: 规范化文本，格式为 "题干" 或 "题干|选项1|选项2..."
+    """
+    text = text.translate(CHARACTER_MAP)
+    stem, inline_options = _split_options(text)
+
+    all_options = [_compact(option) for option in inline_options]
+    for option in options or []:
+        option = option.translate(CHARACTER_MAP)
+        # 去掉选项自带的 "A." 前缀
+        option = OPTION_PREFIX.sub("", option)
+        all_options.append(_compact(option))
+
+    all_options = sorted(option for option in all_options if option)
+    return "|".join([_compact(stem)] + all_options)
+
+
+def question_fingerprint(question: Question) -> str:
+    """
+    计算题目指纹
+
+    Args:
+        question: 题目
+
+    Returns:
+        str: 规范化文本的 SHA-256 十六进制摘要
+    """
+    normalized = normalize_question_text(question.question_text, question.options)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class QuestionProfileCache:
+    """题目画像缓存（知识点 + 难度）"""
+
+    def __init__(self):
+        """初始化题目画像缓存"""
+        self.stats: Dict[str, Dict[str, int]] = {
+            field: {"hits": 0, "misses": 0} for field in FIELDS
+        }
+
+    async def get(
+        self,
+        question: Question,
+        subject: Optional[str] = None,
+        fields: Iterable[str] = FIELDS
+    ) -> Dict[str, Any]:
+        """
+        查询题目画像
+
+        Args:
+            question: 题目
+            subject: 科目（可选）
+            fields: 需要的字段
+
+        Returns:
+            Dict[str, Any]: 命中的字段及其值（未命中的字段不在结果中）
+        """
+        profile = await self._load(question, subject)
+        found = {}
+        for field in fields:
+            value = profile.get(field)
+            hit = self._is_valid(field, value)
+            if hit:
+                found[field] = value
+            self.stats[field]["hits" if hit else "misses"] += 1
+            QUESTION_CACHE_REQUESTS.labels(field=field, result="hit" if hit else "miss").inc()
+        return found
+
+    async def update(
+        self,
+        question: Question,
+        subject: Optional[str] = None,
+        knowledge_points: Optional[List[str]] = None,
+        difficulty: Optional[float] = None
+    ):
+        """
+        写入题目画像（只更新传入的字段，保留已缓存的其他字段）
+
+        Args:
+            question: 题目
+            subject: 科目（可选）
+            knowledge_points: 知识点列表
+            difficulty: 难度系数
+        """
+        values = {FIELD_KNOWLEDGE_POINTS: knowledge_points, FIELD_DIFFICULTY: difficulty}
+        values = {field: value for field, value in values.items() if self._is_valid(field, value)}
+        if not values:
+            return
+
+        profile = {} if len(values) == len(FIELDS) else await self._load(question, subject)
+        profile.update(values)
+        profile["v"] = SCHEMA_VERSION
+        await CacheService.set_question_profile(
+            subject or "unknown", question_fingerprint(question), profile
+        )
+
+    def report(self) -> Dict[str, Any]:
+        """
+        命中率报告
+
+        Returns:
+            Dict[str, Any]: 各字段的查询数、命中数、命中率，以及节省的 LLM 调用数
+            （按逐题调用计：每个字段命中省去一次调用）
+        """
+        fields = {}
+        for field, counts in self.stats.items():
+            total = counts["hits"] + counts["misses"]
+            fields[field] = {
+                "lookups": total,
+                "hits": counts["hits"],
+                "hit_rate": counts["hits"] / total if total else 0.0,
+            }
+        hits = sum(counts["hits"] for counts in self.stats.values())
+        lookups = sum(field["lookups"] for field in fields.values())
+        return {
+            "fields": fields,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "llm_calls_saved": hits,
+        }
+
+    async def _load(self, question: Question, subject: Optional[str]) -> Dict[str, Any]:
+        """读取缓存记录，版本不一致时视为空"""
+        profile = await CacheService.get_question_profile(
+            subject or "unknown", question_fingerprint(question)
+        )
+        if not isinstance(profile, dict) or profile.get("v") != SCHEMA_VERSION:
+            return {}
+        return profile
+
+    @staticmethod
+    def _is_valid(field: str, value: Any) -> bool:
+        """字段值是否可用（空知识点列表不缓存）"""
+        if field == FIELD_KNOWLEDGE_POINTS:
+            return isinstance(value, list) and len(value) > 0
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# 创建全局题目画像缓存实例
+question_cache = QuestionProfileCache()
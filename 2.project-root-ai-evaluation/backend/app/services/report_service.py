@@ -5,9 +5,11 @@ import uuid
 from typing import Dict, Any, Optional
 from datetime import datetime
 import logging
+import mimetypes
 
 from app.schemas.diagnostic import DiagnosticReport
 from app.schemas.analysis import OverallStats
+from app.services.storage import get_storage
 
 logger = logging.getLogger(__name__)
 
@@ -562,9 +564,9 @@ class ReportService:
         logger.warning("PDF 生成功能未完全实现，返回 HTML 内容")
         return html_content.encode('utf-8')
     
-    def upload_to_oss(self, file_content: bytes, filename: str) -> str:
+    async def upload_to_oss(self, file_content: bytes, filename: str) -> str:
         """
-        上传到 OSS（简化实现）
+        上传报告到对象存储（reports/ 目录下）
         
         Args:
             file_content: 文件内容
@@ -573,11 +575,20 @@ class ReportService:
         Returns:
             str: 文件 URL
         """
-        # 简化实现：返回模拟 URL
-        # 实际应该使用阿里云 OSS SDK
-        mock_url = f"https://oss.example.com/reports/{filename}"
-        logger.warning(f"OSS 上传功能未完全实现，返回模拟 URL: {mock_url}")
-        return mock_url
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return await get_storage().put(f"reports/{filename}", file_content, content_type)
+
+    def report_url(self, filename: str) -> str:
+        """
+        已上传报告的 URL（与 upload_to_oss 返回的 URL 一致）
+
+        Args:
+            filename: 文件名
+
+        Returns:
+            str: 文件 URL
+        """
+        return get_storage().url_for(f"reports/{filename}")
 
 
 # 创建全局报告服务实例
@@ -43,11 +43,9 @@ def get_storage_service():
         from app.services.mock_storage_service import MockStorageService
         return MockStorageService()
     else:
-        logger.info("🔧 Using Real OSS Service")
-        # TODO: Implement real OSS service
-        # from app.services.oss_service import OSSService
-        # return OSSService()
-        raise NotImplementedError("Real OSS service not implemented yet")
+        logger.info(f"🔧 Using {settings.STORAGE_BACKEND} Storage Backend")
+        from app.services.storage import get_storage
+        return get_storage()
 
 
 def get_sms_service():
@@ -0,0 +1,222 @@
+"""
+LLM 请求合并（single-flight）
+
+相同请求（规范化提示词 + 参数）同时到达时只调用一次上游：
+- 进程内：后到的请求等待同一个进行中的任务
+- 跨进程：通过 Redis 租约（SET NX PX）选出一个执行者，其他进程轮询
+  CacheService 等待结果；执行者失败或租约过期时自行调用
+结果由执行者写入 CacheService 一次。调用方可提供校验函数：未通过校验的结果（如被截断或
+无法解析的模型输出）仍返回给本次调用，但不写入缓存，缓存中未通过校验的旧结果也视为未命中，
+调用方重试同一请求时会重新调用上游。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import LLM_COALESCED
+from app.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+# 仅当租约仍属于自己时删除
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def request_fingerprint(model: str, messages: List[Dict[str, str]], **params: Any) -> str:
+    """
+    计算请求指纹
+
+    消息内容中的连续空白折叠为一个空格，参数按键排序后参与哈希。
+
+    Args:
+        model: 模型名称
+        messages: 消息列表
+        **params: 其他请求参数（temperature、max_tokens 等）
+
+    Returns:
+        str: SHA-256 十六进制摘要
+    """
+    normalized = {
+        "model": model,
+        "messages": [
+            {"role": m["role"], "content": " ".join(m["content"].split())}
+            for m in messages
+        ],
+        "params": params,
+    }
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """请求合并器"""
+
+    LEASE_PREFIX = "llm_lease:"
+
+    def __init__(
+        self,
+        name: str,
+        backend: Optional[str] = None,
+        lease_ttl: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ):
+        """
+        初始化请求合并器
+
+        Args:
+            name: 上游名称（用于指标标签）
+            backend: 跨进程租约后端（redis / local）
+            lease_ttl: 租约有效期（秒），应覆盖一次调用的最长耗时
+            poll_interval: 等待其他进程结果时的轮询间隔（秒）
+        """
+        self.name = name
+        self.backend = backend or settings.DEEPSEEK_SINGLE_FLIGHT_BACKEND
+        self.lease_ttl = lease_ttl or settings.DEEPSEEK_SINGLE_FLIGHT_LEASE
+        self.poll_interval = poll_interval or settings.DEEPSEEK_SINGLE_FLIGHT_POLL
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        validate: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        执行或等待相同请求
+
+        Args:
+            key: 请求指纹
+            fn: 实际调用上游的无参异步函数
+            validate: 结果校验函数（可选），返回 False 的结果不写入缓存、不从缓存返回
+
+        Returns:
+            调用结果
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, validate))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            LLM_COALESCED.labels(provider=self.name, source="inflight").inc()
+
+        # 调用方被取消时不影响其他等待者
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        """任务结束后移除，并标记异常已读取（避免无人等待时的告警）"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        validate: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """查缓存 → 抢租约 → 调用并写缓存（只缓存通过校验的结果）"""
+        cached = await self._get_cached(key, validate)
+        if cached is not None:
+            LLM_COALESCED.labels(provider=self.name, source="cache").inc()
+            return cached
+
+        token = await self._acquire_lease(key)
+        if token is None:
+            cached = await self._wait_for_leader(key, validate)
+            if cached is not None:
+                LLM_COALESCED.labels(provider=self.name, source="lease").inc()
+                return cached
+
+        try:
+            result = await fn()
+            if validate is None or validate(result):
+                await CacheService.set_llm_response(key, result)
+            else:
+                logger.warning(f"LLM 响应未通过校验，不写入缓存: {key[:12]}")
+            return result
+        finally:
+            if token is not None:
+                await self._release_lease(key, token)
+
+    @staticmethod
+    async def _get_cached(key: str, validate: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """读取缓存结果（未通过校验的视为未命中）"""
+        cached = await CacheService.get_llm_response(key)
+        if cached is None or validate is None or validate(cached):
+            return cached
+        logger.warning(f"缓存的 LLM 响应未通过校验，重新调用: {key[:12]}")
+        return None
+
+    async def _acquire_lease(self, key: str) -> Optional[str]:
+        """
+        抢占跨进程租约
+
+        Returns:
+            Optional[str]: 成功时返回租约令牌；已被其他进程持有时返回 None
+            （local 后端或 Redis 不可用时视为抢占成功）
+        """
+        token = uuid.uuid4().hex
+        if self.backend != "redis":
+            return token
+        try:
+            from app.core.redis_client import get_redis
+            redis = await get_redis()
+            acquired = await redis.set(
+                f"{self.LEASE_PREFIX}{key}", token, nx=True, px=int(self.lease_ttl * 1000)
+            )
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"LLM 请求租约获取失败: {e}")
+            return token
+
+    async def _release_lease(self, key: str, token: str):
+        """释放租约"""
+        if self.backend != "redis":
+            return
+        try:
+            from app.core.redis_client import get_redis
+            redis = await get_redis()
+            await redis.eval(RELEASE_LEASE_SCRIPT, 1, f"{self.LEASE_PREFIX}{key}", token)
+        except Exception as e:
+            logger.error(f"LLM 请求租约释放失败: {e}")
+
+    async def _wait_for_leader(
+        self,
+        key: str,
+        validate: Optional[Callable[[Any], bool]] = None
+    ) -> Optional[Any]:
+        """
+        等待持有租约的进程写入结果
+
+        Returns:
+            Optional[Any]: 结果；租约释放或过期仍无结果时返回 None
+        """
+        from app.core.redis_client import get_redis
+
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            cached = await self._get_cached(key, validate)
+            if cached is not None:
+                return cached
+            try:
+                redis = await get_redis()
+                if not await redis.exists(f"{self.LEASE_PREFIX}{key}"):
+                    break
+            except Exception as e:
+                logger.error(f"LLM 请求租约查询失败: {e}")
+                break
+        return await self._get_cached(key, validate)
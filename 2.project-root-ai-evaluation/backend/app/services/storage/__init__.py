@@ -0,0 +1,52 @@
+"""
+对象存储模块
+"""
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.services.storage.base import ObjectInfo, PresignedUpload, StorageBackend, StorageError
+
+logger = logging.getLogger(__name__)
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage(backend: Optional[str] = None) -> StorageBackend:
+    """
+    按配置创建存储后端
+
+    Args:
+        backend: 后端名称（local / s3），默认取 STORAGE_BACKEND
+
+    Returns:
+        StorageBackend: 存储后端
+    """
+    backend = backend or settings.STORAGE_BACKEND
+    if backend == "local":
+        from app.services.storage.local import LocalStorageBackend
+        return LocalStorageBackend()
+    if backend == "s3":
+        from app.services.storage.s3 import S3StorageBackend
+        return S3StorageBackend()
+    raise ValueError(f"Unknown storage backend '{backend}'. Available: local, s3")
+
+
+def get_storage() -> StorageBackend:
+    """获取全局存储后端（首次调用时按配置创建）"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+        logger.info(f"对象存储后端: {_storage.name}")
+    return _storage
+
+
+def set_storage(storage: Optional[StorageBackend]) -> None:
+    """替换全局存储后端（None 表示下次调用 get_storage 时重新按配置创建）"""
+    global _storage
+    _storage = storage
+
+
+__all__ = [
+    "ObjectInfo", "PresignedUpload", "StorageBackend", "StorageError", "create_storage", "get_storage", "set_storage"
+]
@@ -0,0 +1,171 @@
+"""
+对象存储后端抽象基类
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
+
+
+class StorageError(Exception):
+    """存储后端请求失败"""
+
+
+@dataclass
+class ObjectInfo:
+    """对象元数据"""
+    size: int
+    content_type: str = ""
+    sha256: Optional[str] = None  # 写入时由存储端校验过的内容 SHA-256（后端不记录时为 None）
+
+
+@dataclass
+class PresignedUpload:
+    """预签名上传：客户端以 method 向 url 发送对象内容，并原样携带 headers"""
+    url: str
+    expires_at: datetime
+    method: str = "PUT"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class StorageBackend(ABC):
+    """
+    对象存储后端抽象基类
+
+    对象以 key（如 "exam-id_original_20240101.jpg"、"reports/xxx.html"）寻址，
+    对外返回可访问的 URL；URL 与 key 可相互转换，数据库中保存的是 URL。
+    所有 I/O 均为异步，不阻塞事件循环。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def put(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+        cache_control: Optional[str] = None
+    ) -> str:
+        """
+        写入对象
+
+        Args:
+            key: 对象 key
+            data: 对象内容
+            content_type: 内容类型
+            cache_control: 读取对象时返回的 Cache-Control（本地后端按 key 前缀决定，见 storage 路由）
+
+        Returns:
+            str: 对象 URL
+        """
+        pass
+
+    @abstractmethod
+    async def put_file(
+        self,
+        key: str,
+        path: str,
+        content_type: str = "application/octet-stream",
+        move: bool = False
+    ) -> str:
+        """
+        从本地文件写入对象（不把整个文件读入内存）
+
+        Args:
+            key: 对象 key
+            path: 本地文件路径
+            content_type: 内容类型
+            move: 写入成功后删除本地文件（本地后端直接移动）
+
+        Returns:
+            str: 对象 URL
+        """
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """
+        读取对象
+
+        Raises:
+            FileNotFoundError: 对象不存在
+        """
+        pass
+
+    @abstractmethod
+    def stream(self, key: str, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        """
+        分块读取对象
+
+        Raises:
+            FileNotFoundError: 对象不存在
+        """
+        pass
+
+    @abstractmethod
+    async def get_range(self, key: str, start: int, length: int) -> bytes:
+        """
+        读取对象的一段（超出对象末尾时返回实际可读部分）
+
+        Raises:
+            FileNotFoundError: 对象不存在
+        """
+        pass
+
+    @abstractmethod
+    async def head(self, key: str) -> ObjectInfo:
+        """
+        读取对象元数据
+
+        Raises:
+            FileNotFoundError: 对象不存在
+        """
+        pass
+
+    @abstractmethod
+    def presign_put(
+        self,
+        key: str,
+        content_type: str,
+        size: int,
+        sha256: str,
+        expires_in: int
+    ) -> PresignedUpload:
+        """
+        生成客户端直传对象的预签名上传
+
+        签名绑定内容类型、大小和 SHA-256，存储端拒绝内容不符的请求体，
+        之后 head() 返回的 sha256 即为校验过的值。
+
+        Args:
+            key: 对象 key
+            content_type: 内容类型
+            size: 内容字节数
+            sha256: 内容 SHA-256（十六进制）
+            expires_in: 有效期（秒）
+
+        Returns:
+            PresignedUpload: 预签名上传
+        """
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """删除对象，返回对象此前是否存在"""
+        pass
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """对象是否存在"""
+        pass
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        """对象 URL"""
+        pass
+
+    @abstractmethod
+    def key_from_url(self, url: str) -> Optional[str]:
+        """从 URL 还原对象 key，不属于本后端的 URL 返回 None"""
+        pass
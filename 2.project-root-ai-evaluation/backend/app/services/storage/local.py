@@ -0,0 +1,206 @@
+"""
+本地目录存储后端
+
+文件读写放到线程池中执行，不阻塞事件循环；写入先写临时文件再原子重命名，
+读取方不会看到写了一半的对象。URL 形如 /uploads/<key>，由 API 进程的静态目录提供。
+
+本地存储没有独立的存储服务，预签名上传指向 API 的 PUT /storage/upload/<key>，
+查询参数中的 HMAC 签名（SECRET_KEY）绑定 key、内容类型、大小、SHA-256 和过期时间。
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from urllib.parse import quote, urlencode
+
+from app.core.config import settings
+from app.services.storage.base import ObjectInfo, PresignedUpload, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStorageBackend(StorageBackend):
+    """本地目录存储后端"""
+
+    name = "local"
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        url_prefix: Optional[str] = None,
+        upload_url: Optional[str] = None
+    ):
+        """
+        初始化本地存储
+
+        Args:
+            root: 存储目录
+            url_prefix: URL 前缀
+            upload_url: 预签名上传的 URL 前缀
+        """
+        self.root = os.path.abspath(root or settings.STORAGE_LOCAL_DIR)
+        self.url_prefix = (url_prefix if url_prefix is not None else settings.STORAGE_LOCAL_URL_PREFIX).rstrip("/")
+        self.upload_url = (upload_url or settings.STORAGE_LOCAL_UPLOAD_URL).rstrip("/")
+
+    def _path(self, key: str) -> str:
+        """key 对应的文件路径（拒绝越出存储目录的 key）"""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root or path == self.root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _copy(self, source: str, path: str, move: bool) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if move:
+            shutil.move(source, path)
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _read_range(path: str, start: int, length: int) -> bytes:
+        with open(path, "rb") as f:
+            return os.pread(f.fileno(), length, start)
+
+    @staticmethod
+    def _upload_signature(key: str, content_type: str, size: int, sha256: str, expires: int) -> str:
+        message = "\n".join([key, content_type, str(size), sha256, str(expires)])
+        return hmac.new(settings.SECRET_KEY.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    async def put(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+        cache_control: Optional[str] = None
+    ) -> str:
+        await asyncio.to_thread(self._write, self._path(key), data)
+        return self.url_for(key)
+
+    async def put_file(
+        self,
+        key: str,
+        path: str,
+        content_type: str = "application/octet-stream",
+        move: bool = False
+    ) -> str:
+        await asyncio.to_thread(self._copy, path, self._path(key), move)
+        return self.url_for(key)
+
+    def file_path(self, key: str) -> str:
+        """对象对应的本地文件路径"""
+        return self._path(key)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, self._path(key))
+
+    async def stream(self, key: str, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    async def get_range(self, key: str, start: int, length: int) -> bytes:
+        return await asyncio.to_thread(self._read_range, self._path(key), start, length)
+
+    async def head(self, key: str) -> ObjectInfo:
+        stat = await asyncio.to_thread(os.stat, self._path(key))
+        return ObjectInfo(size=stat.st_size, content_type=mimetypes.guess_type(key)[0] or "")
+
+    def presign_put(
+        self,
+        key: str,
+        content_type: str,
+        size: int,
+        sha256: str,
+        expires_in: int
+    ) -> PresignedUpload:
+        self._path(key)
+        expires = int(time.time()) + expires_in
+        query = urlencode({
+            "size": size,
+            "sha256": sha256,
+            "expires": expires,
+            "signature": self._upload_signature(key, content_type, size, sha256, expires),
+        })
+        return PresignedUpload(
+            url=f"{self.upload_url}/{quote(key, safe='/-_.~')}?{query}",
+            expires_at=datetime.fromtimestamp(expires, timezone.utc),
+            headers={"content-type": content_type}
+        )
+
+    def verify_presigned(
+        self,
+        key: str,
+        content_type: str,
+        size: int,
+        sha256: str,
+        expires: int,
+        signature: str
+    ) -> None:
+        """
+        校验预签名上传请求
+
+        Raises:
+            ValueError: key 越出存储目录
+            PermissionError: 签名不符或已过期
+        """
+        self._path(key)
+        expected = self._upload_signature(key, content_type, size, sha256, expires)
+        if not hmac.compare_digest(expected, signature):
+            raise PermissionError("Upload signature does not match")
+        if expires < time.time():
+            raise PermissionError("Upload URL has expired")
+
+    async def delete(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(os.unlink, self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.isfile, self._path(key))
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.url_prefix}/"
+        if url.startswith(prefix):
+            return url[len(prefix):]
+        return None
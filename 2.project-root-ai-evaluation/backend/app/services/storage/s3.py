@@ -0,0 +1,457 @@
+"""
+S3 兼容对象存储后端（阿里云 OSS S3 兼容接口 / MinIO / AWS S3）
+
+- 基于共享的 httpx.AsyncClient（HTTPClientRegistry 的 "storage" 上游），复用 keep-alive 连接
+- AWS Signature V4 签名，请求体 SHA-256 同时作为完整性校验
+- 超过 STORAGE_MULTIPART_THRESHOLD 的文件走分片上传，分片按 STORAGE_MULTIPART_CONCURRENCY
+  并发上传，每个分片在线程中从文件按偏移读取；任一分片失败时中止整个上传
+- stream() 以流式响应分块读取，不在内存中保留整个对象
+- presign_put() 生成客户端直传的预签名 URL：签名绑定 x-amz-content-sha256，存储端校验请求体；
+  同值写入 x-amz-meta-sha256，head() 读回后无需下载对象即可确认内容
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+import httpx
+
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.metrics import STORAGE_LATENCY
+from app.services.storage.base import ObjectInfo, PresignedUpload, StorageBackend, StorageError
+
+logger = logging.getLogger(__name__)
+
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+HASH_IN_THREAD_SIZE = 1024 * 1024  # 超过此大小的请求体在线程中计算 SHA-256
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+def canonical_query(params: Dict[str, str]) -> str:
+    """规范化查询字符串（按 key 排序，RFC 3986 编码）"""
+    return "&".join(
+        f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(params.items())
+    )
+
+
+def _signature(
+    method: str,
+    path: str,
+    params: Dict[str, str],
+    headers: Dict[str, str],
+    payload_hash: str,
+    access_key_secret: str,
+    region: str,
+    now: datetime
+) -> Tuple[str, str]:
+    """
+    计算 SigV4 签名
+
+    Args:
+        headers: 参与签名的全部请求头（小写 key，含 host）
+
+    Returns:
+        Tuple[SignedHeaders, Signature]
+    """
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = now.strftime("%Y%m%d")
+    signed_headers = ";".join(sorted(headers))
+    canonical_headers = "".join(f"{k}:{str(headers[k]).strip()}\n" for k in sorted(headers))
+    canonical_request = "\n".join([
+        method, path, canonical_query(params), canonical_headers, signed_headers, payload_hash
+    ])
+
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+    ])
+    key = _hmac(_hmac(_hmac(_hmac(f"AWS4{access_key_secret}".encode("utf-8"), date), region), "s3"), "aws4_request")
+    return signed_headers, hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def sign_v4(
+    method: str,
+    host: str,
+    path: str,
+    params: Dict[str, str],
+    headers: Dict[str, str],
+    payload_hash: str,
+    access_key_id: str,
+    access_key_secret: str,
+    region: str,
+    now: datetime
+) -> str:
+    """
+    计算 AWS Signature V4 的 Authorization 头
+
+    Args:
+        method: HTTP 方法
+        host: Host 头
+        path: 已编码的请求路径
+        params: 查询参数
+        headers: 参与签名的其他请求头（x-amz-*、content-type 等，小写 key）
+        payload_hash: 请求体 SHA-256（十六进制）
+        access_key_id: AccessKey ID
+        access_key_secret: AccessKey Secret
+        region: 区域
+        now: 请求时间（UTC）
+
+    Returns:
+        str: Authorization 头
+    """
+    signed = {
+        "host": host, "x-amz-content-sha256": payload_hash, "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"), **headers
+    }
+    signed_headers, signature = _signature(
+        method, path, params, signed, payload_hash, access_key_secret, region, now
+    )
+    return (
+        f"AWS4-HMAC-SHA256 Credential={access_key_id}/{now.strftime('%Y%m%d')}/{region}/s3/aws4_request, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+
+
+def presign_v4(
+    method: str,
+    host: str,
+    path: str,
+    headers: Dict[str, str],
+    payload_hash: str,
+    access_key_id: str,
+    access_key_secret: str,
+    region: str,
+    now: datetime,
+    expires_in: int
+) -> Dict[str, str]:
+    """
+    计算预签名 URL 的查询参数（查询字符串形式的 Signature V4）
+
+    headers 中的请求头参与签名，客户端必须原样携带；payload_hash 为 UNSIGNED-PAYLOAD
+    以外的值时，客户端还需携带同值的 x-amz-content-sha256 头，由存储端校验请求体。
+
+    Args:
+        method: HTTP 方法
+        host: Host 头
+        path: 已编码的请求路径
+        headers: 参与签名的其他请求头（小写 key）
+        payload_hash: 请求体 SHA-256（十六进制）或 UNSIGNED-PAYLOAD
+        access_key_id: AccessKey ID
+        access_key_secret: AccessKey Secret
+        region: 区域
+        now: 签名时间（UTC）
+        expires_in: 有效期（秒）
+
+    Returns:
+        Dict[str, str]: 查询参数（含 X-Amz-Signature）
+    """
+    signed = {"host": host, **headers}
+    params = {
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": f"{access_key_id}/{now.strftime('%Y%m%d')}/{region}/s3/aws4_request",
+        "X-Amz-Date": now.strftime("%Y%m%dT%H%M%SZ"),
+        "X-Amz-Expires": str(expires_in),
+        "X-Amz-SignedHeaders": ";".join(sorted(signed)),
+    }
+    _, signature = _signature(method, path, params, signed, payload_hash, access_key_secret, region, now)
+    return {**params, "X-Amz-Signature": signature}
+
+
+class S3StorageBackend(StorageBackend):
+    """S3 兼容对象存储后端"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        bucket: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        access_key_secret: Optional[str] = None,
+        region: Optional[str] = None,
+        path_style: Optional[bool] = None,
+        public_url: Optional[str] = None,
+        multipart_threshold: Optional[int] = None,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        client: Optional[httpx.AsyncClient] = None
+    ):
+        """
+        初始化 S3 兼容存储
+
+        Args:
+            endpoint: 服务端点（如 https://oss-cn-hangzhou.aliyuncs.com，缺省协议时使用 https）
+            bucket: 存储桶
+            access_key_id: AccessKey ID
+            access_key_secret: AccessKey Secret
+            region: 签名区域
+            path_style: 使用路径风格（MinIO）而不是虚拟主机风格（OSS / S3）
+            public_url: 对外访问地址前缀（如 CDN 域名），为空时使用对象地址
+            multipart_threshold: 超过此大小的文件使用分片上传
+            part_size: 分片大小（S3 要求除最后一片外不小于 5MB）
+            concurrency: 单个文件的并发分片数
+            client: HTTP 客户端（默认使用共享的 "storage" 上游客户端）
+        """
+        endpoint = endpoint or settings.OSS_ENDPOINT
+        if "://" not in endpoint:
+            endpoint = f"https://{endpoint}"
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket or settings.OSS_BUCKET_NAME
+        self.access_key_id = access_key_id or settings.OSS_ACCESS_KEY_ID
+        self.access_key_secret = access_key_secret or settings.OSS_ACCESS_KEY_SECRET
+        self.region = region or settings.STORAGE_S3_REGION
+        self.path_style = settings.STORAGE_S3_PATH_STYLE if path_style is None else path_style
+        self.multipart_threshold = multipart_threshold or settings.STORAGE_MULTIPART_THRESHOLD
+        self.part_size = part_size or settings.STORAGE_MULTIPART_PART_SIZE
+        self.concurrency = concurrency or settings.STORAGE_MULTIPART_CONCURRENCY
+        self._client = client
+
+        parts = urlsplit(self.endpoint)
+        if self.path_style:
+            self.host = parts.netloc
+            self.base_path = f"/{self.bucket}"
+        else:
+            self.host = f"{self.bucket}.{parts.netloc}"
+            self.base_path = ""
+        self.object_base = f"{parts.scheme}://{self.host}{self.base_path}"
+        self.public_url = (public_url if public_url is not None else settings.STORAGE_PUBLIC_URL).rstrip("/")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client("storage")
+
+    def _path(self, key: str) -> str:
+        return f"{self.base_path}/{quote(key, safe='/-_.~')}"
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        params: Optional[Dict[str, str]] = None,
+        content: bytes = b"",
+        headers: Optional[Dict[str, str]] = None,
+        operation: str = "",
+        stream: bool = False
+    ) -> httpx.Response:
+        """
+        签名并发送请求
+
+        Raises:
+            FileNotFoundError: 对象不存在（404）
+            StorageError: 其他错误响应
+        """
+        params = params or {}
+        signed_headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if not content:
+            payload_hash = EMPTY_SHA256
+        elif len(content) > HASH_IN_THREAD_SIZE:
+            payload_hash = await asyncio.to_thread(_sha256, content)
+        else:
+            payload_hash = _sha256(content)
+        now = datetime.now(timezone.utc)
+        path = self._path(key)
+        request_headers = {
+            **signed_headers,
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "x-amz-content-sha256": payload_hash,
+            "authorization": sign_v4(
+                method, self.host, path, params, signed_headers, payload_hash,
+                self.access_key_id, self.access_key_secret, self.region, now
+            ),
+        }
+        url = f"{urlsplit(self.endpoint).scheme}://{self.host}{path}"
+        if params:
+            url = f"{url}?{canonical_query(params)}"
+
+        with STORAGE_LATENCY.labels(backend=self.name, operation=operation or method.lower()).time():
+            request = self.client.build_request(method, url, content=content or None, headers=request_headers)
+            response = await self.client.send(request, stream=stream)
+        if response.status_code == 404:
+            await response.aclose()
+            raise FileNotFoundError(f"Object not found: {key}")
+        if response.status_code >= 300:
+            body = (await response.aread()).decode("utf-8", errors="replace")
+            await response.aclose()
+            raise StorageError(f"{method} {key} failed: HTTP {response.status_code} {body[:200]}")
+        return response
+
+    async def put(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+        cache_control: Optional[str] = None
+    ) -> str:
+        headers = {"content-type": content_type}
+        if cache_control:
+            headers["cache-control"] = cache_control
+        await self._request("PUT", key, content=data, headers=headers, operation="put")
+        return self.url_for(key)
+
+    async def put_file(
+        self,
+        key: str,
+        path: str,
+        content_type: str = "application/octet-stream",
+        move: bool = False
+    ) -> str:
+        size = os.path.getsize(path)
+        if size <= self.multipart_threshold:
+            data = await asyncio.to_thread(_read_range, path, 0, size)
+            await self.put(key, data, content_type)
+        else:
+            await self._multipart_upload(key, path, size, content_type)
+        if move:
+            os.unlink(path)
+        return self.url_for(key)
+
+    async def _multipart_upload(self, key: str, path: str, size: int, content_type: str) -> None:
+        """分片上传：创建 → 并发上传分片 → 合并；失败时中止"""
+        response = await self._request(
+            "POST", key, params={"uploads": ""}, headers={"content-type": content_type}, operation="multipart_create"
+        )
+        upload_id = _xml_value(response.text, "UploadId")
+        if not upload_id:
+            raise StorageError(f"Invalid CreateMultipartUpload response for {key}")
+
+        ranges = [(offset, min(self.part_size, size - offset)) for offset in range(0, size, self.part_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def upload_part(number: int, offset: int, length: int) -> Tuple[int, str]:
+            async with semaphore:
+                data = await asyncio.to_thread(_read_range, path, offset, length)
+                part = await self._request(
+                    "PUT", key, params={"partNumber": str(number), "uploadId": upload_id},
+                    content=data, operation="multipart_part"
+                )
+                return number, part.headers.get("etag", "")
+
+        tasks = [
+            asyncio.ensure_future(upload_part(number, offset, length))
+            for number, (offset, length) in enumerate(ranges, start=1)
+        ]
+        try:
+            etags = await asyncio.gather(*tasks)
+            await self._request(
+                "POST", key, params={"uploadId": upload_id},
+                content=_complete_body(sorted(etags)), headers={"content-type": "application/xml"},
+                operation="multipart_complete"
+            )
+        except BaseException:
+            # 先取消仍在进行的分片，再中止上传
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._request("DELETE", key, params={"uploadId": upload_id}, operation="multipart_abort")
+            except Exception as e:
+                logger.warning(f"中止分片上传失败 ({key}): {e}")
+            raise
+        logger.debug(f"分片上传完成: {key} ({size} bytes, {len(ranges)} parts)")
+
+    async def get(self, key: str) -> bytes:
+        response = await self._request("GET", key, operation="get")
+        return response.content
+
+    async def stream(self, key: str, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        response = await self._request("GET", key, operation="stream", stream=True)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def get_range(self, key: str, start: int, length: int) -> bytes:
+        response = await self._request(
+            "GET", key, headers={"range": f"bytes={start}-{start + length - 1}"}, operation="get_range"
+        )
+        return response.content[:length]
+
+    async def head(self, key: str) -> ObjectInfo:
+        response = await self._request("HEAD", key, operation="head")
+        return ObjectInfo(
+            size=int(response.headers.get("content-length", 0)),
+            content_type=response.headers.get("content-type", ""),
+            sha256=response.headers.get("x-amz-meta-sha256")
+        )
+
+    def presign_put(
+        self,
+        key: str,
+        content_type: str,
+        size: int,
+        sha256: str,
+        expires_in: int
+    ) -> PresignedUpload:
+        now = datetime.now(timezone.utc)
+        path = self._path(key)
+        headers = {
+            "content-length": str(size),
+            "content-type": content_type,
+            "x-amz-content-sha256": sha256,
+            "x-amz-meta-sha256": sha256,
+        }
+        params = presign_v4(
+            "PUT", self.host, path, headers, sha256,
+            self.access_key_id, self.access_key_secret, self.region, now, expires_in
+        )
+        return PresignedUpload(
+            url=f"{urlsplit(self.endpoint).scheme}://{self.host}{path}?{canonical_query(params)}",
+            expires_at=now + timedelta(seconds=expires_in),
+            headers=headers
+        )
+
+    async def delete(self, key: str) -> bool:
+        existed = await self.exists(key)
+        if existed:
+            await self._request("DELETE", key, operation="delete")
+        return existed
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self._request("HEAD", key, operation="head")
+            return True
+        except FileNotFoundError:
+            return False
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_url or self.object_base}/{quote(key, safe='/-_.~')}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        for base in filter(None, (self.public_url, self.object_base)):
+            if url.startswith(f"{base}/"):
+                return unquote(url[len(base) + 1:])
+        return None
+
+
+def _read_range(path: str, offset: int, length: int) -> bytes:
+    """从文件按偏移读取（线程中执行）"""
+    with open(path, "rb") as f:
+        return os.pread(f.fileno(), length, offset)
+
+
+def _xml_value(body: str, tag: str) -> Optional[str]:
+    match = re.search(rf"<{tag}>([^<]*)</{tag}>", body)
+    return match.group(1) if match else None
+
+
+def _complete_body(etags: List[Tuple[int, str]]) -> bytes:
+    parts = "".join(
+        f"<Part><PartNumber>{number}</PartNumber><ETag>{escape(etag)}</ETag></Part>" for number, etag in etags
+    )
+    return f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode("utf-8")
+
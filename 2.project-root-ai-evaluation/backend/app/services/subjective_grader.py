@@ -0,0 +1,209 @@
+"""
+主观题评分引擎
+
+分析阶段一次评完整张试卷的主观题：
+- 相同（题目、参考答案、学生答案）的评分结果按指纹缓存，命中即不调用 LLM
+- 简答（答案不超过 SUBJECTIVE_GRADING_SHORT_ANSWER_CHARS 字）合并到一次调用中评分，
+  批量结果缺失的题目逐题补评
+- 每次 LLM 调用（含补评）都占用一个并发名额，同时进行的调用不超过 SUBJECTIVE_GRADING_CONCURRENCY
+- 整次评分（含排队和补评）的时限为 SUBJECTIVE_GRADING_TIMEOUT，到时未完成的调用被取消；
+  超时或失败的题目结果为 None，由调用方保留规则判分，不拖慢整个请求
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import SUBJECTIVE_GRADES
+from app.services.cache_service import CacheService
+from app.services.deepseek_service import deepseek_service
+from app.services.question_cache import CHARACTER_MAP, normalize_question_text
+
+logger = logging.getLogger(__name__)
+
+
+# 评分提示词或缓存记录格式变化时递增，使旧缓存失效
+GRADE_VERSION = 1
+
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class GradingItem:
+    """一道待评分的主观题"""
+    question_id: str
+    question_text: str
+    student_answer: str
+    correct_answer: Optional[str] = None
+    max_score: Optional[float] = None
+
+
+def _normalize_answer(text: Optional[str]) -> str:
+    """答案规范化：统一全/半角和中英文标点、去除空白（不调整内容顺序）"""
+    return WHITESPACE.sub("", (text or "").translate(CHARACTER_MAP)).lower()
+
+
+def grade_fingerprint(item: GradingItem) -> str:
+    """
+    评分指纹：规范化后的题目、参考答案、学生答案的 SHA-256
+
+    满分不参与指纹，缓存保存得分比例，取用时再按满分换算。
+    """
+    key = "\x1f".join([
+        str(GRADE_VERSION),
+        normalize_question_text(item.question_text),
+        _normalize_answer(item.correct_answer),
+        _normalize_answer(item.student_answer),
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class SubjectiveGrader:
+    """有界并发的主观题评分引擎"""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        short_answer_chars: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        """
+        初始化评分引擎
+
+        Args:
+            concurrency: 并发调用上限
+            timeout: 整次评分的时限（秒，含排队和补评）
+            short_answer_chars: 合并评分的答案字数上限
+            batch_size: 每次合并评分的最多题目数
+        """
+        self.concurrency = concurrency or settings.SUBJECTIVE_GRADING_CONCURRENCY
+        self.timeout = timeout or settings.SUBJECTIVE_GRADING_TIMEOUT
+        self.short_answer_chars = short_answer_chars or settings.SUBJECTIVE_GRADING_SHORT_ANSWER_CHARS
+        self.batch_size = batch_size or settings.SUBJECTIVE_GRADING_BATCH_SIZE
+
+    async def grade(self, items: List[GradingItem]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        评分一组主观题
+
+        Args:
+            items: 待评分题目
+
+        Returns:
+            Dict[题目ID, 评分结果]：评分结果含 score_ratio / is_correct / reason，
+            有满分时另含 score；超时或失败的题目为 None
+        """
+        fingerprints = [grade_fingerprint(item) for item in items]
+        cached = await asyncio.gather(
+            *[CacheService.get_subjective_grade(fp) for fp in fingerprints]
+        )
+
+        grades: Dict[str, Optional[Dict[str, Any]]] = {}
+        # 同一张试卷中指纹相同的题目只评一次
+        pending: Dict[str, List[GradingItem]] = {}
+        for item, fingerprint, grade in zip(items, fingerprints, cached):
+            if grade is not None:
+                SUBJECTIVE_GRADES.labels(result="cached").inc()
+                grades[item.question_id] = self._scaled(grade, item.max_score)
+            else:
+                pending.setdefault(fingerprint, []).append(item)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        units = self._plan([group[0] for group in pending.values()])
+        # 各调用完成即写入，时限到达时保留已完成的结果
+        graded: Dict[str, Dict[str, Any]] = {}
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*[self._run_unit(unit, semaphore, graded) for unit in units]),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            unfinished = [group[0].question_id for group in pending.values()
+                          if group[0].question_id not in graded]
+            SUBJECTIVE_GRADES.labels(result="timeout").inc(len(unfinished))
+            logger.warning(f"主观题评分超时: {unfinished}")
+
+        for fingerprint, group in pending.items():
+            grade = graded.get(group[0].question_id)
+            if grade is not None:
+                await CacheService.set_subjective_grade(fingerprint, grade)
+            for item in group:
+                grades[item.question_id] = (
+                    self._scaled(grade, item.max_score) if grade is not None else None
+                )
+
+        logger.info(
+            f"主观题评分: {len(items)} 道，缓存命中 {len(items) - sum(map(len, pending.values()))} 道，"
+            f"{len(units)} 次调用，未完成 {sum(1 for g in grades.values() if g is None)} 道"
+        )
+        return grades
+
+    def _plan(self, items: List[GradingItem]) -> List[List[GradingItem]]:
+        """简答按 batch_size 合并为一组，长答案单独一组"""
+        short = [item for item in items if len(item.student_answer) <= self.short_answer_chars]
+        long = [item for item in items if len(item.student_answer) > self.short_answer_chars]
+        units = [short[i:i + self.batch_size] for i in range(0, len(short), self.batch_size)]
+        return units + [[item] for item in long]
+
+    async def _run_unit(
+        self,
+        unit: List[GradingItem],
+        semaphore: asyncio.Semaphore,
+        graded: Dict[str, Dict[str, Any]]
+    ):
+        """评分一组题目，结果写入 graded；失败的题目不写入"""
+        try:
+            await self._grade_unit(unit, semaphore, graded)
+        except Exception as e:
+            SUBJECTIVE_GRADES.labels(result="failed").inc(len(unit))
+            logger.error(f"主观题评分失败 {[item.question_id for item in unit]}: {e}")
+
+    async def _grade_unit(
+        self,
+        unit: List[GradingItem],
+        semaphore: asyncio.Semaphore,
+        graded: Dict[str, Dict[str, Any]]
+    ):
+        """评分一组题目：单题直接评分，多题合并评分后逐题补评缺失结果（每次调用占用一个并发名额）"""
+        if len(unit) == 1:
+            item = unit[0]
+            async with semaphore:
+                grade = await deepseek_service.grade_subjective_answer(
+                    item.question_text, item.student_answer, item.correct_answer
+                )
+            SUBJECTIVE_GRADES.labels(result="single").inc()
+            graded[item.question_id] = grade
+            return
+
+        async with semaphore:
+            results = await deepseek_service.grade_subjective_batch([
+                {
+                    "id": item.question_id,
+                    "question_text": item.question_text,
+                    "student_answer": item.student_answer,
+                    "correct_answer": item.correct_answer,
+                }
+                for item in unit
+            ])
+        SUBJECTIVE_GRADES.labels(result="batched").inc(len(results))
+        graded.update(results)
+
+        missing = [item for item in unit if item.question_id not in results]
+        if missing:
+            logger.warning(f"批量评分结果缺失，逐题补评: {[item.question_id for item in missing]}")
+            await asyncio.gather(*[self._run_unit([item], semaphore, graded) for item in missing])
+
+    @staticmethod
+    def _scaled(grade: Dict[str, Any], max_score: Optional[float]) -> Dict[str, Any]:
+        """按满分换算得分"""
+        result = dict(grade)
+        if max_score:
+            result["score"] = grade["score_ratio"] * max_score
+        return result
+
+
+# 全局主观题评分引擎实例
+subjective_grader = SubjectiveGrader()
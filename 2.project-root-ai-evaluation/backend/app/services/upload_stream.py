@@ -0,0 +1,311 @@
+"""
+上传流式接收（分块落盘，增量计算哈希和大小）
+
+原先上传接口 `await file.read()` 把最大 10MB 的整个文件读入内存，校验和存储期间一直持有；
+且 FastAPI 在鉴权前就解析完整个表单。这里直接读取请求体流：
+- Content-Length 已超出上限时不读取请求体，直接拒绝
+- 逐块解析 multipart，文件部分写入磁盘上的临时文件（spool），同时增量计算 SHA-256 和大小
+- 累计大小超过 MAX_UPLOAD_SIZE 时立即中止，不再读取剩余请求体
+- 内存中只保留不超过 UPLOAD_CHUNK_SIZE 的待写缓冲区和少量普通表单字段
+
+得到的 SpooledUpload 指向 spool 文件，校验、质量门通过文件或内存映射读取，
+存储时直接移动 / 流式复制该文件。
+"""
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.metrics import UPLOADS_RECEIVED
+from app.services.image_ingest import size_exceeded_message
+
+logger = logging.getLogger(__name__)
+
+
+MAX_FORM_FIELDS_SIZE = 64 * 1024  # 普通表单字段总大小上限
+MULTIPART_OVERHEAD = MAX_FORM_FIELDS_SIZE + 16 * 1024  # Content-Length 预检时为边界和字段预留的余量
+
+
+class UploadTooLarge(ValueError):
+    """上传大小超过上限"""
+
+
+@dataclass
+class SpooledUpload:
+    """已落盘的上传文件"""
+    filename: str  # 客户端提供的文件名
+    path: str  # spool 文件路径
+    size: int  # 字节数
+    sha256: str  # 内容 SHA-256（十六进制）
+    content_type: str = ""
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb")
+
+    def read_bytes(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+    @contextmanager
+    def mapped(self) -> Iterator[mmap.mmap]:
+        """只读内存映射（按页从页缓存读取，不占用进程堆内存）"""
+        with self.open() as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapping
+            finally:
+                try:
+                    mapping.close()
+                except BufferError:
+                    # 仍有 numpy 视图引用（如异常回溯中的帧），由垃圾回收释放
+                    pass
+
+    def discard(self) -> None:
+        """删除 spool 文件（已被移动到存储时忽略）"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _UploadReceiver:
+    """multipart 解析回调：文件部分写入 spool，普通字段收集到内存"""
+
+    def __init__(self, file_field: str, max_size: int, chunk_size: int, spool_dir: Optional[str]):
+        self.file_field = file_field
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.spool_dir = spool_dir
+        self.fields: Dict[str, str] = {}
+        self.fields_size = 0
+        self.upload: Optional[SpooledUpload] = None
+        self._spool: Optional[BinaryIO] = None
+        self._hash = hashlib.sha256()
+        self._pending = bytearray()  # 待写入 spool 的数据
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._part_name = ""
+        self._part_is_file = False
+        self._part_data = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._part_name = ""
+        self._part_is_file = False
+        self._part_data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise ValueError('Invalid multipart form: Content-Disposition field "name" is required')
+        self._part_name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" not in options:
+            return
+        if self._part_name != self.file_field or self.upload is not None:
+            raise ValueError(f"Unexpected file field '{self._part_name}'")
+        self.start_file(
+            options[b"filename"].decode("utf-8", errors="replace"),
+            self._headers.get(b"content-type", b"").decode("latin-1")
+        )
+
+    def start_file(self, filename: str, content_type: str) -> None:
+        """创建 spool 文件，之后的文件数据写入其中"""
+        self._part_is_file = True
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool = tempfile.NamedTemporaryFile(dir=self.spool_dir or None, prefix="upload-", delete=False)
+        self.upload = SpooledUpload(
+            filename=filename, path=self._spool.name, size=0, sha256="", content_type=content_type
+        )
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._part_is_file:
+            self.fields_size += end - start
+            if self.fields_size > MAX_FORM_FIELDS_SIZE:
+                raise ValueError("Form fields are too large")
+            self._part_data += data[start:end]
+            return
+        self.upload.size += end - start
+        if self.upload.size > self.max_size:
+            raise UploadTooLarge(size_exceeded_message(self.upload.size))
+        self._pending += data[start:end]
+
+    def on_part_end(self) -> None:
+        if not self._part_is_file:
+            self.fields[self._part_name] = self._part_data.decode("utf-8", errors="replace")
+
+    def take_pending(self, final: bool = False) -> Optional[bytes]:
+        """取出攒够 chunk_size（或结束时剩余）的待写数据"""
+        if not self._pending or (len(self._pending) < self.chunk_size and not final):
+            return None
+        data = bytes(self._pending)
+        self._pending.clear()
+        return data
+
+    def write(self, data: bytes) -> None:
+        """在线程中执行：更新哈希并写入 spool"""
+        self._hash.update(data)
+        self._spool.write(data)
+
+    def finish(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+            self.upload.sha256 = self._hash.hexdigest()
+
+    def abort(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+        if self.upload is not None:
+            self.upload.discard()
+
+
+async def receive_upload(
+    request: Request,
+    file_field: str = "file",
+    max_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    spool_dir: Optional[str] = None
+) -> Tuple[SpooledUpload, Dict[str, str]]:
+    """
+    流式接收 multipart 上传
+
+    Args:
+        request: 请求
+        file_field: 文件字段名
+        max_size: 文件大小上限（默认 MAX_UPLOAD_SIZE）
+        chunk_size: 每次写入 spool 的数据量（默认 UPLOAD_CHUNK_SIZE）
+        spool_dir: spool 目录（默认 UPLOAD_SPOOL_DIR，为空时使用系统临时目录）
+
+    Returns:
+        Tuple[SpooledUpload, 普通表单字段]
+
+    Raises:
+        UploadTooLarge: 文件超过大小上限（此时剩余请求体不再读取）
+        ValueError: 请求不是 multipart 表单或缺少文件字段
+    """
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    spool_dir = spool_dir if spool_dir is not None else settings.UPLOAD_SPOOL_DIR
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        UPLOADS_RECEIVED.labels(result="invalid").inc()
+        raise ValueError("Invalid upload: expected multipart/form-data")
+
+    # 声明的请求体已超过上限时不读取
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        UPLOADS_RECEIVED.labels(result="too_large").inc()
+        raise UploadTooLarge(size_exceeded_message(int(content_length)))
+
+    receiver = _UploadReceiver(file_field, max_size, chunk_size, spool_dir)
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            data = receiver.take_pending()
+            if data is not None:
+                await asyncio.to_thread(receiver.write, data)
+        parser.finalize()
+        data = receiver.take_pending(final=True)
+        if data is not None:
+            await asyncio.to_thread(receiver.write, data)
+        receiver.finish()
+    except BaseException as e:
+        # 含客户端断开和请求取消：删除未完成的 spool 文件
+        receiver.abort()
+        UPLOADS_RECEIVED.labels(result="too_large" if isinstance(e, UploadTooLarge) else "invalid").inc()
+        raise
+
+    if receiver.upload is None:
+        UPLOADS_RECEIVED.labels(result="invalid").inc()
+        raise ValueError(f"Invalid upload: missing file field '{file_field}'")
+
+    UPLOADS_RECEIVED.labels(result="ok").inc()
+    logger.debug(f"Upload spooled: {receiver.upload.filename} {receiver.upload.size} bytes")
+    return receiver.upload, receiver.fields
+
+
+async def receive_body(
+    request: Request,
+    filename: str,
+    max_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    spool_dir: Optional[str] = None
+) -> SpooledUpload:
+    """
+    流式接收原始请求体（预签名直传的 PUT 请求），同样分块落盘并增量计算哈希
+
+    Args:
+        request: 请求
+        filename: 文件名
+        max_size: 大小上限（默认 MAX_UPLOAD_SIZE）
+        chunk_size: 每次写入 spool 的数据量（默认 UPLOAD_CHUNK_SIZE）
+        spool_dir: spool 目录（默认 UPLOAD_SPOOL_DIR）
+
+    Returns:
+        SpooledUpload: 已落盘的请求体
+
+    Raises:
+        UploadTooLarge: 请求体超过大小上限（此时剩余请求体不再读取）
+    """
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    spool_dir = spool_dir if spool_dir is not None else settings.UPLOAD_SPOOL_DIR
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size:
+        UPLOADS_RECEIVED.labels(result="too_large").inc()
+        raise UploadTooLarge(size_exceeded_message(int(content_length)))
+
+    receiver = _UploadReceiver("", max_size, chunk_size, spool_dir)
+    receiver.start_file(filename, request.headers.get("content-type", ""))
+    try:
+        async for chunk in request.stream():
+            receiver.on_part_data(chunk, 0, len(chunk))
+            data = receiver.take_pending()
+            if data is not None:
+                await asyncio.to_thread(receiver.write, data)
+        data = receiver.take_pending(final=True)
+        if data is not None:
+            await asyncio.to_thread(receiver.write, data)
+        receiver.finish()
+    except BaseException as e:
+        receiver.abort()
+        UPLOADS_RECEIVED.labels(result="too_large" if isinstance(e, UploadTooLarge) else "invalid").inc()
+        raise
+
+    UPLOADS_RECEIVED.labels(result="ok").inc()
+    return receiver.upload
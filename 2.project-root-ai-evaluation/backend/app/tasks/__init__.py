@@ -8,6 +8,8 @@ from app.tasks.exam_tasks import (
     process_exam_diagnostic,
     process_exam_report,
     process_exam_complete,
+    process_exam_express,
+    enqueue_exam_processing,
 )
 
 __all__ = [
@@ -17,4 +19,6 @@ __all__ = [
     "process_exam_diagnostic",
     "process_exam_report",
     "process_exam_complete",
+    "process_exam_express",
+    "enqueue_exam_processing",
 ]
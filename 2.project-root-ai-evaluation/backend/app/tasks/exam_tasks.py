@@ -4,17 +4,21 @@
 import logging
 from uuid import UUID
 from datetime import datetime
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Awaitable, Callable, Optional
+from sqlalchemy import select, update
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.core.database import async_session_maker
+from app.core.worker_runtime import run_async
 from app.models.exam import Exam, ExamStatus
-from app.services.ocr.ocr_service import OCRService
-from app.services.parser_service import ParserService
-from app.services.analysis_service import AnalysisService
-from app.services.deepseek_service import DeepSeekService
-from app.services.report_service import ReportService
+from app.schemas.ocr import OCRResult
+from app.schemas.parser import ParsedExam
+from app.schemas.diagnostic import DiagnosticReport
+from app.services.exam_pipeline import exam_pipeline
+from app.services.image_derivatives import image_derivative_service, ocr_image_url
+from app.services.image_service import ImageService
+from app.services.llm_usage import track_llm_usage
 
 logger = logging.getLogger(__name__)
 
@@ -44,36 +48,319 @@ async def update_exam_status(exam_id: UUID, status: ExamStatus, **kwargs):
             logger.info(f"Exam {exam_id} status updated to {status.value}")
 
 
+def _partial_diagnostic_saver(exam_uuid: UUID) -> Callable[[str, Any], Awaitable[None]]:
+    """
+    诊断部分结果的保存回调
+    
+    流式诊断每完成一个部分就把已完成的部分写入 diagnostic_report，
+    状态保持 DIAGNOSING，客户端轮询时可提前展示。
+    """
+    sections = {}
+    
+    async def save_section(name: str, value: Any):
+        if isinstance(value, list):
+            sections[name] = [item.model_dump() for item in value]
+        else:
+            sections[name] = value.model_dump()
+        await update_exam_status(exam_uuid, ExamStatus.DIAGNOSING, diagnostic_report=dict(sections))
+    
+    return save_section
+
+
+# ============================================================================
+# 阶段协程：每个 Celery 任务只进入一次 worker 事件循环
+# ============================================================================
+
+async def _run_ocr(exam_uuid: UUID, preprocess_profile: Optional[str] = None):
+    """OCR 阶段"""
+    # 更新状态为 OCR 处理中
+    await update_exam_status(exam_uuid, ExamStatus.OCR_PROCESSING)
+    
+    # 获取试卷
+    exam = await get_exam(exam_uuid)
+    
+    # 执行 OCR
+    ocr_result = await exam_pipeline.run_ocr(
+        await _prepare_ocr_image(exam_uuid, exam), preprocess_profile
+    )
+    
+    # 保存 OCR 结果
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.OCR_COMPLETED,
+        ocr_result=ocr_result.model_dump()
+    )
+
+
+async def _prepare_ocr_image(exam_uuid: UUID, exam: Exam) -> str:
+    """
+    OCR 读取的图像 URL
+    
+    OCR 始终读取 OCR 灰度派生图：尚未生成时在此先生成（同一内容的派生图已存在时
+    直接复用），保证 OCR 输入字节、OCR 缓存键和识别结果不取决于任务执行的先后。
+    派生图生成失败时 OCR 阶段随之失败，不退回原图。
+    """
+    if not (exam.image_derivatives or {}).get("ocr"):
+        exam.image_derivatives = await _run_derivatives(exam_uuid, exam)
+    return ocr_image_url(exam)
+
+
+async def _run_derivatives(exam_uuid: UUID, exam: Optional[Exam] = None) -> dict:
+    """派生图生成（只写入派生图字段，不改变试卷状态）"""
+    if exam is None:
+        exam = await get_exam(exam_uuid)
+    image_bytes = await ImageService.read_image(exam.original_image_url)
+    derivatives = await image_derivative_service.generate(image_bytes)
+    
+    async with async_session_maker() as db:
+        await db.execute(
+            update(Exam).where(Exam.exam_id == exam_uuid).values(image_derivatives=derivatives)
+        )
+        await db.commit()
+    return derivatives
+
+
+async def _run_parsing(exam_uuid: UUID):
+    """解析阶段"""
+    # 更新状态为解析中
+    await update_exam_status(exam_uuid, ExamStatus.PARSING)
+    
+    # 获取试卷
+    exam = await get_exam(exam_uuid)
+    
+    # 执行解析（含 DeepSeek 知识点和难度标注）
+    with track_llm_usage() as llm_usage:
+        parsed_exam = await exam_pipeline.run_parsing(str(exam_uuid), OCRResult(**exam.ocr_result))
+    
+    # 保存解析结果
+    await _save_parsed(exam_uuid, parsed_exam, llm_usage=llm_usage.merged_into(exam.llm_usage))
+
+
+async def _run_analysis(exam_uuid: UUID):
+    """分析阶段"""
+    # 更新状态为分析中
+    await update_exam_status(exam_uuid, ExamStatus.ANALYZING)
+    
+    # 获取试卷
+    exam = await get_exam(exam_uuid)
+    
+    # 执行分析
+    parsed_exam = exam_pipeline.load_parsed(str(exam_uuid), exam.parsed_result)
+    question_analyses, overall_stats = exam_pipeline.run_analysis(
+        parsed_exam, OCRResult(**exam.ocr_result)
+    )
+    
+    # 保存分析结果
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.ANALYZED,
+        analysis_result=exam_pipeline.dump_analysis(question_analyses, overall_stats)
+    )
+
+
+async def _run_diagnostic(exam_uuid: UUID):
+    """诊断阶段"""
+    # 更新状态为诊断中
+    await update_exam_status(exam_uuid, ExamStatus.DIAGNOSING)
+    
+    # 获取试卷
+    exam = await get_exam(exam_uuid)
+    
+    # 执行诊断
+    parsed_exam = exam_pipeline.load_parsed(str(exam_uuid), exam.parsed_result)
+    question_analyses, overall_stats = exam_pipeline.load_analysis(exam.analysis_result)
+    with track_llm_usage() as llm_usage:
+        diagnostic_report = await exam_pipeline.run_diagnostic(
+            parsed_exam, question_analyses, overall_stats, exam.handwriting_metrics,
+            on_section=_partial_diagnostic_saver(exam_uuid)
+        )
+    
+    # 保存诊断结果
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.DIAGNOSED,
+        diagnostic_report=diagnostic_report.model_dump(),
+        llm_usage=llm_usage.merged_into(exam.llm_usage)
+    )
+
+
+async def _run_report(exam_uuid: UUID) -> dict:
+    """报告生成阶段"""
+    # 更新状态为报告生成中
+    await update_exam_status(exam_uuid, ExamStatus.REPORT_GENERATING)
+    
+    # 获取试卷
+    exam = await get_exam(exam_uuid)
+    
+    # 生成报告
+    parsed_exam = exam_pipeline.load_parsed(str(exam_uuid), exam.parsed_result)
+    _, overall_stats = exam_pipeline.load_analysis(exam.analysis_result)
+    report_result = await exam_pipeline.run_report(
+        parsed_exam, DiagnosticReport(**exam.diagnostic_report), overall_stats
+    )
+    
+    # 保存报告结果
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.REPORT_GENERATED,
+        report_id=UUID(report_result["report_id"])
+    )
+    
+    return report_result
+
+
+async def _save_parsed(exam_uuid: UUID, parsed_exam: ParsedExam, **kwargs):
+    """保存解析结果（kwargs 为同时更新的其他字段）"""
+    exam_meta = parsed_exam.exam_meta
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.PARSED,
+        parsed_result=exam_pipeline.dump_parsed(parsed_exam),
+        subject=exam_meta.subject,
+        grade=exam_meta.grade,
+        total_score=exam_meta.total_score,
+        exam_type=exam_meta.exam_type,
+        **kwargs
+    )
+
+
+class ExpressStageError(Exception):
+    """Express 模式阶段失败（携带应写入的失败状态）"""
+    
+    def __init__(self, failed_status: ExamStatus, cause: Exception):
+        super().__init__(f"{failed_status.value}: {cause}")
+        self.failed_status = failed_status
+
+
+async def _run_express(exam_uuid: UUID, preprocess_profile: Optional[str] = None) -> dict:
+    """
+    Express 模式：在一次任务调用中串联执行全部阶段
+    
+    阶段间直接传递内存对象，不经过 broker，也不从数据库重新加载试卷；
+    每个阶段完成后仍写入状态和结果，便于客户端轮询进度。
+    阶段失败时抛出 ExpressStageError，携带该阶段对应的失败状态。
+    """
+    exam = await get_exam(exam_uuid)
+    exam_id = str(exam_uuid)
+    
+    # OCR
+    await update_exam_status(exam_uuid, ExamStatus.OCR_PROCESSING)
+    try:
+        ocr_result = await exam_pipeline.run_ocr(
+            await _prepare_ocr_image(exam_uuid, exam), preprocess_profile
+        )
+    except Exception as e:
+        raise ExpressStageError(ExamStatus.OCR_FAILED, e) from e
+    await update_exam_status(exam_uuid, ExamStatus.PARSING, ocr_result=ocr_result.model_dump())
+    
+    # 解析
+    try:
+        with track_llm_usage() as parsing_usage:
+            parsed_exam = await exam_pipeline.run_parsing(exam_id, ocr_result)
+    except Exception as e:
+        raise ExpressStageError(ExamStatus.PARSING_FAILED, e) from e
+    llm_usage = parsing_usage.merged_into(exam.llm_usage)
+    await _save_parsed(exam_uuid, parsed_exam, llm_usage=llm_usage)
+    
+    # 分析
+    try:
+        question_analyses, overall_stats = exam_pipeline.run_analysis(parsed_exam, ocr_result)
+    except Exception as e:
+        raise ExpressStageError(ExamStatus.ANALYZING_FAILED, e) from e
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.DIAGNOSING,
+        analysis_result=exam_pipeline.dump_analysis(question_analyses, overall_stats)
+    )
+    
+    # 诊断
+    try:
+        with track_llm_usage() as diagnostic_usage:
+            diagnostic_report = await exam_pipeline.run_diagnostic(
+                parsed_exam, question_analyses, overall_stats, exam.handwriting_metrics,
+                on_section=_partial_diagnostic_saver(exam_uuid)
+            )
+    except Exception as e:
+        raise ExpressStageError(ExamStatus.DIAGNOSING_FAILED, e) from e
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.REPORT_GENERATING,
+        diagnostic_report=diagnostic_report.model_dump(),
+        llm_usage=diagnostic_usage.merged_into(llm_usage)
+    )
+    
+    # 报告
+    try:
+        report_result = await exam_pipeline.run_report(parsed_exam, diagnostic_report, overall_stats)
+    except Exception as e:
+        raise ExpressStageError(ExamStatus.REPORT_GENERATION_FAILED, e) from e
+    await update_exam_status(
+        exam_uuid,
+        ExamStatus.COMPLETED,
+        report_id=UUID(report_result["report_id"]),
+        completed_at=datetime.utcnow()
+    )
+    
+    return report_result
+
+
+def enqueue_exam_processing(
+    exam_id: str,
+    express: Optional[bool] = None,
+    preprocess_profile: Optional[str] = None
+):
+    """
+    触发试卷处理
+    
+    Args:
+        exam_id: 试卷 ID
+        express: 是否使用 express 模式（默认按 EXAM_PIPELINE_MODE 配置）；
+                 批量上传应传 False，走按队列分阶段的任务链
+        preprocess_profile: OCR 前的图像预处理档位（默认取 IMAGE_PREPROCESS_PROFILE）
+    """
+    if express is None:
+        express = settings.EXAM_PIPELINE_MODE == "express"
+    
+    # 派生图（缩略图 / 预览图 / OCR 灰度图）在 OCR 阶段开始时生成，OCR 始终读取灰度派生图
+    kwargs = {"preprocess_profile": preprocess_profile} if preprocess_profile else {}
+    if express:
+        process_exam_express.delay(exam_id, **kwargs)
+    else:
+        process_exam_ocr.delay(exam_id, **kwargs)
+
+
+@celery_app.task(name="app.tasks.exam_tasks.generate_exam_derivatives", bind=True)
+def generate_exam_derivatives(self, exam_id: str):
+    """
+    生成试卷图像派生版本（缩略图 / 预览图 / OCR 灰度图）
+    
+    上传流程中派生图由 OCR 阶段生成；本任务用于为旧记录补生成派生图。
+    
+    Args:
+        exam_id: 试卷 ID
+    """
+    try:
+        derivatives = run_async(_run_derivatives(UUID(exam_id)))
+        return {"status": "success", "exam_id": exam_id, "derivatives": derivatives}
+    except Exception as e:
+        logger.error(f"Derivative generation failed for exam {exam_id}: {str(e)}")
+        raise
+
+
 @celery_app.task(name="app.tasks.exam_tasks.process_exam_ocr", bind=True)
-def process_exam_ocr(self, exam_id: str):
+def process_exam_ocr(self, exam_id: str, preprocess_profile: Optional[str] = None):
     """
     异步处理 OCR 识别
     
     Args:
         exam_id: 试卷 ID
+        preprocess_profile: OCR 前的图像预处理档位（可选）
     """
-    import asyncio
-    
     exam_uuid = UUID(exam_id)
     logger.info(f"Starting OCR processing for exam {exam_id}")
     
     try:
-        # 更新状态为 OCR 处理中
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.OCR_PROCESSING))
-        
-        # 获取试卷
-        exam = asyncio.run(get_exam(exam_uuid))
-        
-        # 执行 OCR
-        ocr_service = OCRService()
-        ocr_result = asyncio.run(ocr_service.recognize_image(exam.processed_image_url or exam.original_image_url))
-        
-        # 保存 OCR 结果
-        asyncio.run(update_exam_status(
-            exam_uuid,
-            ExamStatus.OCR_COMPLETED,
-            ocr_result=ocr_result.dict()
-        ))
+        run_async(_run_ocr(exam_uuid, preprocess_profile))
         
         logger.info(f"OCR processing completed for exam {exam_id}")
         
@@ -84,7 +371,7 @@ def process_exam_ocr(self, exam_id: str):
         
     except Exception as e:
         logger.error(f"OCR processing failed for exam {exam_id}: {str(e)}")
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.OCR_FAILED))
+        run_async(update_exam_status(exam_uuid, ExamStatus.OCR_FAILED))
         raise
 
 
@@ -96,54 +383,11 @@ def process_exam_parsing(self, exam_id: str):
     Args:
         exam_id: 试卷 ID
     """
-    import asyncio
-    
     exam_uuid = UUID(exam_id)
     logger.info(f"Starting parsing for exam {exam_id}")
     
     try:
-        # 更新状态为解析中
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.PARSING))
-        
-        # 获取试卷
-        exam = asyncio.run(get_exam(exam_uuid))
-        
-        # 执行解析
-        parser_service = ParserService()
-        deepseek_service = DeepSeekService()
-        
-        # 提取元数据
-        exam_meta = parser_service.extract_exam_meta(exam.ocr_result)
-        
-        # 分割题目
-        questions = parser_service.segment_questions(exam.ocr_result)
-        
-        # 使用 DeepSeek 标注知识点和难度
-        for question in questions:
-            knowledge_points = asyncio.run(
-                deepseek_service.tag_knowledge_points(question["text"], exam_meta.get("subject"))
-            )
-            difficulty = asyncio.run(
-                deepseek_service.estimate_difficulty(question["text"], exam_meta.get("subject"))
-            )
-            question["knowledge_points"] = knowledge_points
-            question["difficulty"] = difficulty
-        
-        parsed_result = {
-            "exam_meta": exam_meta,
-            "questions": questions
-        }
-        
-        # 保存解析结果
-        asyncio.run(update_exam_status(
-            exam_uuid,
-            ExamStatus.PARSED,
-            parsed_result=parsed_result,
-            subject=exam_meta.get("subject"),
-            grade=exam_meta.get("grade"),
-            total_score=exam_meta.get("total_score"),
-            exam_type=exam_meta.get("exam_type")
-        ))
+        run_async(_run_parsing(exam_uuid))
         
         logger.info(f"Parsing completed for exam {exam_id}")
         
@@ -154,7 +398,7 @@ def process_exam_parsing(self, exam_id: str):
         
     except Exception as e:
         logger.error(f"Parsing failed for exam {exam_id}: {str(e)}")
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.PARSING_FAILED))
+        run_async(update_exam_status(exam_uuid, ExamStatus.PARSING_FAILED))
         raise
 
 
@@ -166,28 +410,11 @@ def process_exam_analysis(self, exam_id: str):
     Args:
         exam_id: 试卷 ID
     """
-    import asyncio
-    
     exam_uuid = UUID(exam_id)
     logger.info(f"Starting analysis for exam {exam_id}")
     
     try:
-        # 更新状态为分析中
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.ANALYZING))
-        
-        # 获取试卷
-        exam = asyncio.run(get_exam(exam_uuid))
-        
-        # 执行分析
-        analysis_service = AnalysisService()
-        analysis_result = asyncio.run(analysis_service.analyze_exam(exam_uuid))
-        
-        # 保存分析结果
-        asyncio.run(update_exam_status(
-            exam_uuid,
-            ExamStatus.ANALYZED,
-            analysis_result=analysis_result.dict()
-        ))
+        run_async(_run_analysis(exam_uuid))
         
         logger.info(f"Analysis completed for exam {exam_id}")
         
@@ -198,7 +425,7 @@ def process_exam_analysis(self, exam_id: str):
         
     except Exception as e:
         logger.error(f"Analysis failed for exam {exam_id}: {str(e)}")
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.ANALYZING_FAILED))
+        run_async(update_exam_status(exam_uuid, ExamStatus.ANALYZING_FAILED))
         raise
 
 
@@ -210,28 +437,11 @@ def process_exam_diagnostic(self, exam_id: str):
     Args:
         exam_id: 试卷 ID
     """
-    import asyncio
-    
     exam_uuid = UUID(exam_id)
     logger.info(f"Starting diagnostic for exam {exam_id}")
     
     try:
-        # 更新状态为诊断中
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.DIAGNOSING))
-        
-        # 获取试卷
-        exam = asyncio.run(get_exam(exam_uuid))
-        
-        # 执行诊断
-        deepseek_service = DeepSeekService()
-        diagnostic_result = asyncio.run(deepseek_service.diagnose_exam(exam_uuid))
-        
-        # 保存诊断结果
-        asyncio.run(update_exam_status(
-            exam_uuid,
-            ExamStatus.DIAGNOSED,
-            diagnostic_result=diagnostic_result.dict()
-        ))
+        run_async(_run_diagnostic(exam_uuid))
         
         logger.info(f"Diagnostic completed for exam {exam_id}")
         
@@ -242,7 +452,7 @@ def process_exam_diagnostic(self, exam_id: str):
         
     except Exception as e:
         logger.error(f"Diagnostic failed for exam {exam_id}: {str(e)}")
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.DIAGNOSING_FAILED))
+        run_async(update_exam_status(exam_uuid, ExamStatus.DIAGNOSING_FAILED))
         raise
 
 
@@ -254,41 +464,22 @@ def process_exam_report(self, exam_id: str):
     Args:
         exam_id: 试卷 ID
     """
-    import asyncio
-    
     exam_uuid = UUID(exam_id)
     logger.info(f"Starting report generation for exam {exam_id}")
     
     try:
-        # 更新状态为报告生成中
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.REPORT_GENERATING))
-        
-        # 获取试卷
-        exam = asyncio.run(get_exam(exam_uuid))
-        
-        # 生成报告
-        report_service = ReportService()
-        report_result = asyncio.run(report_service.generate_report(exam_uuid))
-        
-        # 保存报告结果
-        asyncio.run(update_exam_status(
-            exam_uuid,
-            ExamStatus.REPORT_GENERATED,
-            report_id=report_result.report_id,
-            report_html_url=report_result.html_url,
-            report_pdf_url=report_result.pdf_url
-        ))
+        report_result = run_async(_run_report(exam_uuid))
         
         logger.info(f"Report generation completed for exam {exam_id}")
         
         # 触发完成任务
         process_exam_complete.delay(exam_id)
         
-        return {"status": "success", "exam_id": exam_id, "report_id": report_result.report_id}
+        return {"status": "success", "exam_id": exam_id, "report_id": report_result["report_id"]}
         
     except Exception as e:
         logger.error(f"Report generation failed for exam {exam_id}: {str(e)}")
-        asyncio.run(update_exam_status(exam_uuid, ExamStatus.REPORT_GENERATION_FAILED))
+        run_async(update_exam_status(exam_uuid, ExamStatus.REPORT_GENERATION_FAILED))
         raise
 
 
@@ -300,14 +491,12 @@ def process_exam_complete(self, exam_id: str):
     Args:
         exam_id: 试卷 ID
     """
-    import asyncio
-    
     exam_uuid = UUID(exam_id)
     logger.info(f"Completing exam processing for {exam_id}")
     
     try:
         # 更新状态为已完成
-        asyncio.run(update_exam_status(
+        run_async(update_exam_status(
             exam_uuid,
             ExamStatus.COMPLETED,
             completed_at=datetime.utcnow()
@@ -320,3 +509,36 @@ def process_exam_complete(self, exam_id: str):
     except Exception as e:
         logger.error(f"Failed to complete exam {exam_id}: {str(e)}")
         raise
+
+
+@celery_app.task(name="app.tasks.exam_tasks.process_exam_express", bind=True)
+def process_exam_express(self, exam_id: str, preprocess_profile: Optional[str] = None):
+    """
+    Express 模式：单次任务内完成 OCR → 解析 → 分析 → 诊断 → 报告
+    
+    适用于单份试卷上传；批量上传请使用按队列分阶段的任务链。
+    
+    Args:
+        exam_id: 试卷 ID
+        preprocess_profile: OCR 前的图像预处理档位（可选）
+    """
+    exam_uuid = UUID(exam_id)
+    logger.info(f"Starting express processing for exam {exam_id}")
+    
+    try:
+        report_result = run_async(_run_express(exam_uuid, preprocess_profile))
+        
+        logger.info(f"Express processing completed for exam {exam_id}")
+        
+        return {"status": "success", "exam_id": exam_id, "report_id": report_result["report_id"]}
+        
+    except ExpressStageError as e:
+        logger.error(f"Express processing failed for exam {exam_id}: {str(e)}")
+        run_async(update_exam_status(exam_uuid, e.failed_status, error_message=str(e)))
+        raise
+    
+    except Exception as e:
+        # 阶段之外的异常（加载试卷、写入状态等）：不确定所处阶段，记为整体失败
+        logger.error(f"Express processing failed for exam {exam_id}: {str(e)}")
+        run_async(update_exam_status(exam_uuid, ExamStatus.FAILED, error_message=str(e)))
+        raise
@@ -0,0 +1,6 @@
+"""
+性能基准测试脚本
+
+在 backend 目录下运行，例如：
+    python -m benchmarks.bench_worker_runtime
+"""
@@ -0,0 +1,49 @@
+"""
+派生图基准：各派生图的字节数和生成耗时
+
+对一张合成照片生成缩略图、预览图和 OCR 灰度图，报告每个派生图相对原图的字节数，
+以及一次生成的 CPU 时间中位数（原图只解码一次，彩色派生图逐级缩小）。
+历史列表原先下载原图，现在下载缩略图，节省的字节数即为第一行与原图之差。
+
+用法：
+    python -m benchmarks.bench_derivatives --megapixels 12 --format webp --repeat 3
+"""
+import argparse
+import statistics
+import time
+
+from app.core.config import settings
+from app.services.image_derivatives import derivative_specs, render_derivatives
+from app.services.image_service import ImageService
+from benchmarks.bench_image_preprocess import make_photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="派生图基准：字节数和生成耗时")
+    parser.add_argument("--megapixels", type=float, default=12.0, help="合成照片像素数（百万）")
+    parser.add_argument("--format", default=settings.IMAGE_DERIVATIVE_FORMAT, choices=["webp", "avif"],
+                        help="缩略图和预览图格式")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    args = parser.parse_args()
+
+    settings.IMAGE_DERIVATIVE_FORMAT = args.format
+    specs = derivative_specs()
+    photo, _ = make_photo(args.megapixels, seed=0)
+    content = ImageService.cv2_image_to_bytes(photo)
+
+    cpu = []
+    for _ in range(args.repeat):
+        start = time.process_time()
+        rendered = render_derivatives(content, specs)
+        cpu.append(time.process_time() - start)
+
+    print(f"photo={photo.shape[1]}x{photo.shape[0]}  jpeg={len(content) / 1e6:.2f}MB  "
+          f"render={statistics.median(cpu) * 1000:.0f}ms (cpu, median of {args.repeat})")
+    print(f"{'derivative':>11}{'format':>8}{'bytes':>12}{'of original':>13}")
+    for spec in specs:
+        size = len(rendered[spec.name])
+        print(f"{spec.name:>11}{spec.format:>8}{size:>12,}{size / len(content):>12.2%}")
+
+
+if __name__ == "__main__":
+    main()
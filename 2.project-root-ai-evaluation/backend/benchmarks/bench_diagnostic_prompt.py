@@ -0,0 +1,182 @@
+"""
+诊断提示词压缩回归基准
+
+用合成试卷（--sizes 道题，约 --wrong-rate 答错，主观题答案较长）对比两种题目摘要：
+- before: 逐题一行，完整学生答案和正确答案
+- after:  DiagnosticPromptCompactor（区间、汇总、截断、token 预算）
+
+离线报告完整诊断提示词的估算 token 数，以及压缩后摘要的证据完整性：
+每道错题的题号和每个知识点的错题数都能从摘要中读出时为 ok。
+
+--live N 时额外用两种提示词各调用 DeepSeek N 次（需要 DEEPSEEK_API_KEY），
+比较诊断输出的稳定性：能力维度的平均绝对差，以及报告中引用的错题题号的 Jaccard 相似度。
+
+用法：
+    python -m benchmarks.bench_diagnostic_prompt --sizes 20 40 80
+    python -m benchmarks.bench_diagnostic_prompt --sizes 40 --live 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+
+from app.schemas.analysis import AnswerEvidence, OverallStats, QuestionAnalysis
+from app.schemas.parser import Question
+from app.services.deepseek_service import deepseek_service
+from app.services.diagnostic_prompt import DiagnosticPromptCompactor, estimate_tokens
+
+TAGS = ["二次函数", "一次函数", "概率统计", "三角形全等", "圆的性质", "分式方程"]
+REASONS = ["计算错误", "审题不清", "概念混淆", "步骤缺失"]
+LONG_ANSWER = "解：设所求为x，由题意可得方程，整理后移项合并同类项，两边同除以系数，"
+
+
+def make_paper(size: int, wrong_rate: float, seed: int):
+    """生成一张合成试卷的题目和分析结果"""
+    rng = random.Random(seed)
+    questions, analyses = [], []
+    for i in range(1, size + 1):
+        subjective = i > size * 0.6
+        is_correct = rng.random() >= wrong_rate
+        question_id = f"Q{i}"
+        questions.append(Question(
+            question_id=question_id,
+            question_type="subjective" if subjective else "objective",
+            question_text="题目",
+            knowledge_tags=[rng.choice(TAGS)]
+        ))
+        answer = LONG_ANSWER * rng.randint(1, 3) if subjective else rng.choice("ABCD")
+        confidence = rng.uniform(0.5, 0.99)
+        analyses.append(QuestionAnalysis(
+            question_id=question_id,
+            student_answer=answer,
+            correct_answer=LONG_ANSWER * 2 if subjective else rng.choice("ABCD"),
+            is_correct=is_correct,
+            confidence=confidence,
+            error_reason=None if is_correct else rng.choice(REASONS),
+            review_status="ai_confident" if confidence >= 0.7 else "ai_pending_review",
+            evidence=AnswerEvidence(
+                answer_bbox={"x": 0, "y": 0, "width": 100, "height": 50}, ocr_confidence=confidence
+            )
+        ))
+    return questions, analyses
+
+
+def verbose_summary(analyses) -> str:
+    """压缩前的逐题摘要"""
+    return "\n".join(
+        f"{'✓' if qa.is_correct else '✗'} {qa.question_id}: "
+        f"学生答案='{qa.student_answer}', 正确答案='{qa.correct_answer}', "
+        f"置信度={qa.confidence:.2f}, 错误原因={qa.error_reason or '无'}"
+        for qa in analyses
+    )
+
+
+def expand_ids(text: str) -> set:
+    """从摘要文本中读出题号（展开 Q3-Q7 形式的区间）"""
+    ids = set()
+    for start, end in re.findall(r"Q(\d+)(?:-Q(\d+))?", text):
+        ids.update(f"Q{n}" for n in range(int(start), int(end or start) + 1))
+    return ids
+
+
+def evidence_ok(summary: str, questions, analyses) -> bool:
+    """压缩后的摘要是否保留每道错题的题号和每个知识点的错题数"""
+    wrong_line = "\n".join(
+        line for line in summary.splitlines() if line.startswith("✗") or line.startswith("按错误原因")
+    )
+    wrong_ids = {qa.question_id for qa in analyses if not qa.is_correct}
+    if not wrong_ids <= expand_ids(wrong_line):
+        return False
+    tags = {q.question_id: q.knowledge_tags[0] for q in questions}
+    for tag in set(tags.values()):
+        count = sum(1 for qa in analyses if tags[qa.question_id] == tag and not qa.is_correct)
+        if f"{tag} 错{count}/" not in summary:
+            return False
+    return True
+
+
+def build_prompt(summary: str, analyses) -> str:
+    """用给定摘要构建完整诊断提示词"""
+    correct = sum(1 for qa in analyses if qa.is_correct)
+    return deepseek_service._build_diagnostic_prompt(
+        subject="数学",
+        grade="初三",
+        total_score=120,
+        student_score=correct * 120 / len(analyses),
+        question_summary=summary,
+        overall_stats=OverallStats(
+            total_questions=len(analyses), correct_count=correct, objective_accuracy=0.7,
+            subjective_accuracy=0.6, pending_review_count=0
+        ),
+        handwriting_metrics=None,
+        target_school=None
+    )
+
+
+async def diagnose(prompt: str) -> dict:
+    """调用 DeepSeek 诊断，返回解析后的 JSON"""
+    messages = [
+        {"role": "system", "content": "你是一位资深的 K12 教育测评专家，擅长深度诊断学生的学习问题。"},
+        {"role": "user", "content": prompt}
+    ]
+    response = await deepseek_service._call_api(messages, temperature=0.5, max_tokens=2000, use_cache=False)
+    text = response["choices"][0]["message"]["content"].strip().strip("`")
+    return json.loads(text[text.find("{"):])
+
+
+def cited_ids(report: dict) -> set:
+    """诊断报告中作为证据引用的题号"""
+    evidence = [
+        e for key in ("surface_issues", "deep_issues") for issue in report.get(key, [])
+        for e in issue.get("evidence", [])
+    ]
+    return expand_ids(" ".join(evidence))
+
+
+async def live_stability(before_prompt: str, after_prompt: str, runs: int):
+    """两种提示词各调用 runs 次，比较能力维度和引用题号"""
+    before = [await diagnose(before_prompt) for _ in range(runs)]
+    after = [await diagnose(after_prompt) for _ in range(runs)]
+    dims = ["comprehension", "application", "analysis", "synthesis", "evaluation"]
+    diffs = [
+        abs(b["capability_dimensions"].get(d, 0.5) - a["capability_dimensions"].get(d, 0.5))
+        for b in before for a in after for d in dims
+    ]
+    jaccards = []
+    for b in before:
+        for a in after:
+            union = cited_ids(b) | cited_ids(a)
+            jaccards.append(len(cited_ids(b) & cited_ids(a)) / len(union) if union else 1.0)
+    print(f"  live runs={runs}: capability mean |Δ|={sum(diffs) / len(diffs):.3f}  "
+          f"cited-id jaccard={sum(jaccards) / len(jaccards):.2f}")
+
+
+async def main_async(args):
+    compactor = DiagnosticPromptCompactor(token_budget=args.budget)
+    print(f"summary budget={compactor.token_budget} tokens  wrong_rate={args.wrong_rate}")
+    print(f"{'questions':>9}{'before':>9}{'after':>8}{'saved':>8}{'summary':>9}{'evidence':>10}")
+    for size in args.sizes:
+        questions, analyses = make_paper(size, args.wrong_rate, args.seed + size)
+        compact = compactor.build_summary(analyses, questions)
+        before_prompt = build_prompt(verbose_summary(analyses), analyses)
+        after_prompt = build_prompt(compact, analyses)
+        before, after = estimate_tokens(before_prompt), estimate_tokens(after_prompt)
+        ok = "ok" if evidence_ok(compact, questions, analyses) else "LOST"
+        print(f"{size:>9}{before:>9}{after:>8}{1 - after / before:>8.0%}{estimate_tokens(compact):>9}{ok:>10}")
+        if args.live:
+            await live_stability(before_prompt, after_prompt, args.live)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="诊断提示词压缩回归基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40, 80], help="试卷题数")
+    parser.add_argument("--wrong-rate", type=float, default=0.3, help="答错比例")
+    parser.add_argument("--budget", type=int, default=None, help="摘要 token 预算（默认取配置）")
+    parser.add_argument("--live", type=int, default=0, help="每种提示词调用 DeepSeek 的次数（0 表示只做离线对比）")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+直传压测：API 进程在两种上传方式下的 CPU 时间和常驻内存峰值
+
+- stream: POST /exams/upload，API 进程流式接收整个文件，再分片上传到存储
+- direct: POST /exams/upload/presign → 客户端直接 PUT 到存储 → POST /exams/upload/finalize，
+          API 进程只签名、HEAD 和读取文件头
+
+API（main.app，鉴权、数据库和入队替换为内存实现）和 S3 替身（scripts/s3_standin.py）
+分别在 spawn 子进程中由 uvicorn 运行，压测客户端在主进程中。对每种方式同时发起 N 个上传，
+从 /proc/<pid> 读取 API 进程的 CPU 时间增量和常驻内存峰值（先经 clear_refs 重置）。
+
+用法：
+    python -m benchmarks.bench_direct_upload --size-mb 10 --uploads 32 --concurrency 8
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+import httpx
+from PIL import Image
+
+STANDIN_KEY_ID = "standin"
+STANDIN_SECRET = "standin-secret"
+REGION = "oss-cn-hangzhou"
+
+
+def serve_standin(root: str, port: int):
+    """子进程入口：运行 S3 替身"""
+    import uvicorn
+    from scripts.s3_standin import S3StandIn
+    standin = S3StandIn(root, STANDIN_KEY_ID, STANDIN_SECRET, REGION)
+    uvicorn.run(standin.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class MemorySession:
+    """只在内存中保存试卷的数据库会话"""
+
+    def __init__(self):
+        self.exams = {}
+
+    async def execute(self, statement):
+        exam = self.exams.get(statement.whereclause.right.value)
+        return SimpleNamespace(scalar_one_or_none=lambda: exam)
+
+    def add(self, exam):
+        exam.exam_id = exam.exam_id or uuid.uuid4()
+        self.exams[exam.exam_id] = exam
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, exam):
+        exam.status = exam.status or "uploaded"
+
+
+def serve_api(port: int, storage_port: int):
+    """子进程入口：运行 API（对象存储指向 S3 替身）"""
+    import logging
+    import uvicorn
+    import app.tasks.exam_tasks as exam_tasks
+    from app.api.dependencies import get_current_user
+    from app.core.config import settings
+    from app.core.database import get_db
+    from app.services.storage import set_storage
+    from app.services.storage.s3 import S3StorageBackend
+    from main import app
+
+    logging.disable(logging.INFO)
+    # 每次上传的内容相同，关闭上传去重以测量完整的上传路径
+    settings.EXAM_DEDUP_ENABLED = False
+    user = SimpleNamespace(user_id=uuid.uuid4())
+    session = MemorySession()
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: session
+    exam_tasks.enqueue_exam_processing = lambda exam_id, preprocess_profile=None: None
+    set_storage(S3StorageBackend(
+        endpoint=f"http://127.0.0.1:{storage_port}", bucket="exams", access_key_id=STANDIN_KEY_ID,
+        access_key_secret=STANDIN_SECRET, region=REGION, path_style=True, public_url=""
+    ))
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def cpu_seconds(pid: int) -> float:
+    """进程累计 CPU 时间（用户态 + 内核态）"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def memory_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        return int(re.search(rf"{field}:\s+(\d+)", f.read()).group(1))
+
+
+def make_jpeg(size: int) -> bytes:
+    """约 size 字节的 JPEG（噪声图像，尾部补齐）"""
+    side = 1024
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buffer, format="JPEG", quality=95)
+    content = buffer.getvalue()
+    return content + b"\0" * max(0, size - len(content))
+
+
+async def upload_stream(client: httpx.AsyncClient, api: str, content: bytes, _sha256: str):
+    response = await client.post(
+        f"{api}/api/v1/exams/upload", files={"file": ("exam.jpg", content, "image/jpeg")}
+    )
+    response.raise_for_status()
+
+
+async def upload_direct(client: httpx.AsyncClient, api: str, content: bytes, sha256: str):
+    ticket = (await client.post(f"{api}/api/v1/exams/upload/presign", json={
+        "filename": "exam.jpg", "size": len(content), "sha256": sha256
+    })).json()
+    put = await client.put(ticket["upload_url"], content=content, headers=ticket["headers"])
+    put.raise_for_status()
+    response = await client.post(
+        f"{api}/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]}
+    )
+    response.raise_for_status()
+
+
+async def run_mode(upload, api: str, pid: int, content: bytes, uploads: int, concurrency: int):
+    """并发执行上传，返回 (耗时, API CPU 秒, API 常驻内存峰值增量 KB)"""
+    sha256 = hashlib.sha256(content).hexdigest()
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=120) as client:
+        await upload(client, api, content, sha256)  # 预热
+
+        async def limited():
+            async with semaphore:
+                await upload(client, api, content, sha256)
+
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        baseline = memory_kb(pid, "VmRSS")
+        cpu_before = cpu_seconds(pid)
+        start = time.perf_counter()
+        await asyncio.gather(*[limited() for _ in range(uploads)])
+        elapsed = time.perf_counter() - start
+        return elapsed, cpu_seconds(pid) - cpu_before, memory_kb(pid, "VmHWM") - baseline
+
+
+async def main_async(args):
+    content = make_jpeg(int(args.size_mb * 1024 * 1024))
+    workdir = tempfile.mkdtemp(prefix="bench-direct-")
+    context = multiprocessing.get_context("spawn")
+    storage_port, api_port = free_port(), free_port()
+    standin = context.Process(target=serve_standin, args=(workdir, storage_port), daemon=True)
+    api = context.Process(target=serve_api, args=(api_port, storage_port), daemon=True)
+    standin.start()
+    api.start()
+    try:
+        wait_for_port(storage_port)
+        wait_for_port(api_port)
+        print(f"size={len(content) / 1e6:.1f}MB  uploads={args.uploads}  concurrency={args.concurrency}")
+        print(f"{'mode':>8} {'elapsed':>9} {'API CPU/upload':>15} {'API peak RSS':>13}")
+        for name, upload in (("stream", upload_stream), ("direct", upload_direct)):
+            elapsed, cpu, peak_kb = await run_mode(
+                upload, f"http://127.0.0.1:{api_port}", api.pid, content, args.uploads, args.concurrency
+            )
+            print(f"{name:>8} {elapsed:>8.2f}s {cpu / args.uploads * 1000:>12.1f} ms {peak_kb / 1024:>10.1f} MB")
+    finally:
+        for process in (api, standin):
+            process.terminate()
+            process.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直传压测")
+    parser.add_argument("--size-mb", type=float, default=10.0, help="上传文件大小（MB）")
+    parser.add_argument("--uploads", type=int, default=32, help="上传次数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发上传数")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
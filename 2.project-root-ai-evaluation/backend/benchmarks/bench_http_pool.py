@@ -0,0 +1,166 @@
+"""
+出站 HTTP 连接池基准测试
+
+对比两种调用方式在本地 HTTPS 替身服务器上的单次请求耗时：
+- before: 每次调用新建 httpx.AsyncClient（每次 TCP + TLS 握手）
+- after:  复用 HTTPClientRegistry 配置的长连接客户端
+
+替身服务器使用临时自签名证书，返回固定 JSON；--rtt-ms 为每个新连接额外
+增加的延迟，用于模拟真实网络下握手的往返时间（本机回环几乎为 0）。
+
+用法：
+    python -m benchmarks.bench_http_pool --requests 200 --concurrency 4 --rtt-ms 20
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import ssl
+import tempfile
+import time
+
+import httpx
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app.core.config import settings
+
+RESPONSE_BODY = b'{"choices":[{"message":{"content":"ok"}}]}'
+
+
+def write_self_signed_cert(directory: str):
+    """生成 localhost 自签名证书，返回 (cert_path, key_path)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+class StandInServer:
+    """HTTP/1.1 keep-alive 替身服务器"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        first = True
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                if first:
+                    # 新连接的握手往返
+                    await asyncio.sleep(self.rtt)
+                    first = False
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Connection: keep-alive\r\nContent-Length: "
+                    + str(len(RESPONSE_BODY)).encode() + b"\r\n\r\n" + RESPONSE_BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run_requests(call, requests: int, concurrency: int) -> float:
+    """并发执行请求，返回总耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = write_self_signed_cert(directory)
+        server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_ctx.load_cert_chain(cert_path, key_path)
+        client_ctx = ssl.create_default_context(cafile=cert_path)
+
+        stand_in = StandInServer(args.rtt_ms / 1000)
+        server = await asyncio.start_server(stand_in.handle, "localhost", 0, ssl=server_ctx)
+        port = server.sockets[0].getsockname()[1]
+        url = f"https://localhost:{port}/v1/chat/completions"
+        payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "x"}]}
+
+        async def before():
+            async with httpx.AsyncClient(timeout=30.0, verify=client_ctx) as client:
+                response = await client.post(url, json=payload)
+                response.raise_for_status()
+
+        # 与 HTTPClientRegistry.build_client 相同的连接池参数
+        pooled = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.HTTP_DEFAULT_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            verify=client_ctx
+        )
+
+        async def after():
+            response = await pooled.post(url, json=payload)
+            response.raise_for_status()
+
+        print(f"requests={args.requests} concurrency={args.concurrency} rtt={args.rtt_ms}ms")
+        print(f"{'mode':<8}{'total_s':>10}{'per_req_ms':>12}{'connections':>13}")
+        for name, call in (("before", before), ("after", after)):
+            stand_in.connections = 0
+            elapsed = await run_requests(call, args.requests, args.concurrency)
+            per_request = elapsed / args.requests * 1000
+            print(f"{name:<8}{elapsed:>10.3f}{per_request:>12.3f}{stand_in.connections:>13}")
+
+        await pooled.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出站 HTTP 连接池基准测试")
+    parser.add_argument("--requests", type=int, default=200, help="请求数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发数")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="模拟每个新连接的握手往返（毫秒）")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+图像一次解码基准：每次上传的峰值内存和 CPU 时间
+
+对比识别前处理一张照片的两条路径（同一预处理档位，进程内执行以便计量）：
+- before: PIL 校验 → OpenCV 彩色解码 → 质量检查（float64 Laplacian）→
+          彩色进彩色出的预处理 → 三通道 JPEG 编码 → base64
+- after:  PIL 校验 → ingest_image 一次解码为灰度并按 EXIF 转正 → 质量检查复用同一缓冲区 →
+          灰度预处理 → 单通道 JPEG 编码 → base64
+
+每条路径在独立的 spawn 子进程中运行，报告 CPU 时间中位数，以及一次处理中
+同时存活的内存峰值（tracemalloc，含 numpy / OpenCV 返回的像素缓冲区）。
+
+用法：
+    python -m benchmarks.bench_image_ingest --megapixels 12 --profile fast --repeat 3
+"""
+import argparse
+import base64
+import multiprocessing
+import statistics
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app.services.image_ingest import ingest_image
+from app.services.image_preprocess import PROFILES, apply_profile
+from app.services.image_service import ImageService
+from benchmarks.bench_image_preprocess import make_photo
+
+
+def before(content: bytes, profile_name: str) -> int:
+    """原路径"""
+    ImageService.validate_image_format_and_size("exam.jpg", content)
+    image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    cv2.Laplacian(gray, cv2.CV_64F).var()
+    np.mean(gray)
+    processed, _ = apply_profile(image, PROFILES[profile_name])
+    encoded = ImageService.cv2_image_to_bytes(processed)
+    return len(base64.b64encode(encoded))
+
+
+def after(content: bytes, profile_name: str) -> int:
+    """一次解码路径"""
+    ImageService.validate_image_format_and_size("exam.jpg", content)
+    image = ingest_image(content, grayscale=True)
+    ImageService.validate_image_quality(image.pixels)
+    processed, _ = apply_profile(image.pixels, PROFILES[profile_name])
+    encoded = ImageService.cv2_image_to_bytes(processed)
+    return len(base64.b64encode(encoded))
+
+
+def measure(variant: str, content: bytes, profile_name: str, repeat: int):
+    """在子进程中运行一条路径，返回（CPU 时间列表, 峰值内存 MB, 上传给 OCR 的 base64 字节数）"""
+    run = before if variant == "before" else after
+
+    tracemalloc.start()
+    payload = run(content, profile_name)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cpu = []
+    for _ in range(repeat):
+        start = time.process_time()
+        run(content, profile_name)
+        cpu.append(time.process_time() - start)
+    return cpu, peak / 1e6, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像一次解码基准：峰值内存和 CPU 时间")
+    parser.add_argument("--megapixels", type=float, default=12.0, help="合成照片像素数（百万）")
+    parser.add_argument("--profile", default="fast", choices=list(PROFILES), help="预处理档位")
+    parser.add_argument("--repeat", type=int, default=3, help="每条路径的重复次数")
+    args = parser.parse_args()
+
+    photo, _ = make_photo(args.megapixels, seed=0)
+    content = ImageService.cv2_image_to_bytes(photo)
+    print(f"photo={photo.shape[1]}x{photo.shape[0]}  jpeg={len(content) / 1e6:.1f}MB  profile={args.profile}")
+    print(f"{'path':>7}{'cpu':>10}{'peak mem':>11}{'ocr payload':>13}")
+
+    context = multiprocessing.get_context("spawn")
+    for variant in ("before", "after"):
+        # 每条路径一个新进程，峰值内存互不影响
+        with context.Pool(1) as pool:
+            cpu, peak, payload = pool.apply(measure, (variant, content, args.profile, args.repeat))
+        print(f"{variant:>7}{statistics.median(cpu) * 1000:>8.0f}ms{peak:>9.0f}MB{payload / 1e6:>11.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+图像预处理档位基准：延迟与 OCR 准确率
+
+对每个档位（none / fast / balanced / quality）报告：
+- inline:  在当前线程直接处理的耗时（即原先在事件循环上调用 preprocess_image 的阻塞时长）
+- pooled:  经 ImagePreprocessor 进程池 + 共享内存处理的端到端耗时
+- stall:   pooled 期间事件循环心跳的最大间隔（越接近 10ms 越说明没有阻塞）
+- accuracy: 指定 --provider 时，用该 OCR 提供商识别处理后的图像，按字符序列相似度
+            与标注文本比较（需要对应提供商的密钥）
+
+夹具集：--fixtures 目录下的 *.jpg / *.png，每张图片旁边放同名 .txt 作为标注文本；
+未指定时生成 --pages 张合成试卷照片（约 --megapixels 百万像素，含噪声、模糊和不均匀光照）。
+
+用法：
+    python -m benchmarks.bench_image_preprocess --pages 2 --megapixels 12
+    python -m benchmarks.bench_image_preprocess --fixtures tests/fixtures/exams --provider baidu
+"""
+import argparse
+import asyncio
+import difflib
+import statistics
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.image_preprocess import PROFILES, ImagePreprocessor, apply_profile, restore_coordinates
+from app.services.image_service import ImageService
+
+LINES = [
+    "1. Solve 3x + 5 = 20, x = 5",
+    "2. f(x) = x^2 - 4x + 3, min = -1",
+    "3. P(A) = 0.25, P(B) = 0.4",
+    "4. sin 30 + cos 60 = 1",
+    "5. (a + b)^2 = a^2 + 2ab + b^2",
+]
+
+
+def make_photo(megapixels: float, seed: int) -> Tuple[np.ndarray, str]:
+    """生成一张合成试卷照片及其标注文本"""
+    rng = np.random.default_rng(seed)
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    page = np.full((height, width), 240, dtype=np.float32)
+
+    scale = width / 1000
+    lines = [LINES[(seed + i) % len(LINES)] for i in range(len(LINES))]
+    for i, line in enumerate(lines):
+        y = int(height * (0.12 + i * 0.16))
+        cv2.putText(page, line, (int(width * 0.05), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    1.2 * scale, 40, max(1, int(2 * scale)))
+
+    # 不均匀光照、镜头模糊和传感器噪声
+    gradient = np.linspace(0.75, 1.05, width, dtype=np.float32)[None, :]
+    page = cv2.GaussianBlur(page * gradient, (0, 0), 1.2 * scale)
+    page += rng.normal(0, 14, page.shape).astype(np.float32)
+    gray = np.clip(page, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), "\n".join(lines)
+
+
+def load_fixtures(directory: str) -> List[Tuple[str, bytes, str]]:
+    """读取夹具目录中的图片和标注文本"""
+    fixtures = []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() not in (".jpg", ".jpeg", ".png"):
+            continue
+        truth = path.with_suffix(".txt")
+        fixtures.append((path.name, path.read_bytes(), truth.read_text("utf-8") if truth.exists() else ""))
+    return fixtures
+
+
+def char_accuracy(recognized: str, truth: str) -> float:
+    """忽略空白后的字符序列相似度"""
+    a, b = "".join(recognized.split()), "".join(truth.split())
+    return difflib.SequenceMatcher(None, a, b).ratio() if b else 0.0
+
+
+async def pooled_with_stall(preprocessor: ImagePreprocessor, image: np.ndarray, profile) -> Tuple[float, float]:
+    """经进程池处理一次，返回（耗时, 事件循环最大心跳间隔）"""
+    gaps = [0.0]
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    await preprocessor.run(image, profile)
+    elapsed = time.perf_counter() - start
+    ticker.cancel()
+    return elapsed, max(gaps)
+
+
+async def recognize(provider: str, image_bytes: bytes, profile) -> str:
+    """按档位预处理后识别，返回拼接后的文本"""
+    from app.services.ocr.ocr_service import ocr_service
+
+    scale = 1.0
+    if profile is not None:
+        image_bytes, scale = await ImageService.preprocess_for_ocr(image_bytes, profile)
+    result = restore_coordinates(
+        await ocr_service.recognize(image_bytes, provider_name=provider, use_cache=False), scale
+    )
+    return "\n".join(region.text for region in result.text_regions)
+
+
+async def main_async(args):
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        fixtures = []
+        for seed in range(args.pages):
+            photo, truth = make_photo(args.megapixels, seed)
+            fixtures.append((f"synthetic-{seed}", ImageService.cv2_image_to_bytes(photo), truth))
+
+    images = [ImageService.bytes_to_cv2_image(content) for _, content, _ in fixtures]
+    print(f"fixtures={len(fixtures)}  size={images[0].shape[1]}x{images[0].shape[0]}  "
+          f"workers={args.workers}  provider={args.provider or '-'}")
+    print(f"{'profile':>9}{'inline':>10}{'pooled':>10}{'stall':>9}{'accuracy':>10}")
+
+    preprocessor = ImagePreprocessor(executor="process", workers=args.workers)
+    # 预热进程池（spawn 启动子进程并导入 OpenCV）
+    await preprocessor.run(images[0][:64, :64], PROFILES["fast"])
+    try:
+        for name in ["none", *PROFILES]:
+            profile = PROFILES.get(name)
+            inline, pooled, stalls = [], [], []
+            if profile is not None:
+                for image in images:
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        apply_profile(image, profile)
+                        inline.append(time.perf_counter() - start)
+                        elapsed, stall = await pooled_with_stall(preprocessor, image, profile)
+                        pooled.append(elapsed)
+                        stalls.append(stall)
+
+            accuracy = "-"
+            if args.provider:
+                scores = [
+                    char_accuracy(await recognize(args.provider, content, profile), truth)
+                    for _, content, truth in fixtures if truth
+                ]
+                accuracy = f"{statistics.mean(scores):.3f}" if scores else "-"
+
+            def fmt(values):
+                return f"{statistics.median(values) * 1000:.0f}ms" if values else "-"
+
+            print(f"{name:>9}{fmt(inline):>10}{fmt(pooled):>10}{fmt(stalls):>9}{accuracy:>10}")
+    finally:
+        preprocessor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像预处理档位基准：延迟与 OCR 准确率")
+    parser.add_argument("--fixtures", default=None, help="夹具目录（图片 + 同名 .txt 标注）")
+    parser.add_argument("--pages", type=int, default=2, help="未指定夹具时生成的合成照片数")
+    parser.add_argument("--megapixels", type=float, default=12.0, help="合成照片像素数（百万）")
+    parser.add_argument("--repeat", type=int, default=2, help="每张图片每个档位的重复次数")
+    parser.add_argument("--workers", type=int, default=2, help="进程池大小")
+    parser.add_argument("--provider", default=None, help="用于比较准确率的 OCR 提供商（需要密钥）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+本地知识点分类器基准测试
+
+在合成（或导出的真实）题目上训练 / 验证 KnowledgePointModel，报告各置信度阈值下：
+- coverage: 由本地分类器回答的题目比例，即 tag_knowledge_points 省去的 LLM 调用比例
+- precision / recall / exact: 这些题目上的知识点准确率、召回率、完全一致比例
+以及单题预测耗时。
+
+合成数据：常见课程题型按模板生成（数字、措辞随机变化），另有 --tail 比例的
+长尾题目（随机文本 + 少见知识点），用于检验低置信度时是否回退到 LLM。
+
+用法：
+    python -m benchmarks.bench_knowledge_classifier --questions 3000 --tail 0.2
+    python -m benchmarks.bench_knowledge_classifier --from-jsonl questions.jsonl
+"""
+import argparse
+import random
+import time
+
+from app.core.config import settings
+from app.schemas.parser import Question
+from app.services.knowledge_classifier import KnowledgePointModel, evaluate
+from scripts.train_knowledge_classifier import THRESHOLDS, deduplicate, load_jsonl, print_report, split
+
+TEMPLATES = {
+    "一元二次方程": [
+        "解方程：x²-{a}x+{b}=0",
+        "已知关于x的方程x²+{a}x-{b}=0的两根为x₁、x₂，求x₁+x₂的值",
+        "若方程x²-{a}x+m=0有两个相等的实数根，则m的值为（  ）",
+    ],
+    "勾股定理": [
+        "直角三角形的两条直角边分别为{a}和{b}，求斜边的长",
+        "在Rt△ABC中，∠C=90°，AC={a}，BC={b}，则AB=（  ）",
+    ],
+    "概率": [
+        "袋中有{a}个红球和{b}个白球，从中任取一个，取到红球的概率是（  ）",
+        "掷一枚质地均匀的骰子，点数大于{c}的概率是多少",
+    ],
+    "等差数列": [
+        "在等差数列{{aₙ}}中，a₁={a}，公差d={b}，求a₁₀",
+        "已知等差数列的前{c}项和为{a}，首项为{b}，求公差",
+    ],
+    "一次函数": [
+        "一次函数y={a}x+{b}的图像经过第几象限",
+        "已知一次函数y=kx+{b}的图像经过点({c},{a})，求k的值",
+    ],
+    "三角形全等": [
+        "如图，AB=DE，∠B=∠E，BC=EF，求证△ABC≌△DEF",
+        "已知AB=AC，AD平分∠BAC，求证：△ABD≌△ACD（AB={a}）",
+    ],
+}
+# 同一模板有时会同时标注相关知识点
+RELATED = {"一元二次方程": "根与系数的关系", "勾股定理": "直角三角形", "等差数列": "数列求和"}
+
+
+def synthetic_examples(count: int, tail: float, seed: int):
+    """生成合成题目"""
+    rng = random.Random(seed)
+    labels = list(TEMPLATES)
+    rare_labels = [f"少见知识点{i}" for i in range(40)]
+    alphabet = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处府计"
+
+    examples = []
+    for i in range(count):
+        if rng.random() < tail:
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(15, 40)))
+            tags = [rng.choice(rare_labels)]
+        else:
+            label = rng.choice(labels)
+            text = rng.choice(TEMPLATES[label]).format(
+                a=rng.randint(1, 30), b=rng.randint(1, 30), c=rng.randint(2, 9)
+            )
+            tags = [label] + ([RELATED[label]] if label in RELATED and rng.random() < 0.5 else [])
+        question = Question(
+            question_id=f"Q{i + 1}", question_type="objective", question_text=text, knowledge_tags=tags
+        )
+        examples.append(("数学", question))
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地知识点分类器基准测试")
+    parser.add_argument("--questions", type=int, default=3000, help="合成题目数")
+    parser.add_argument("--tail", type=float, default=0.2, help="长尾题目比例")
+    parser.add_argument("--from-jsonl", default=None, help="使用导出的真实题目代替合成数据")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.from_jsonl:
+        examples = load_jsonl(args.from_jsonl)
+    else:
+        examples = synthetic_examples(args.questions, args.tail, args.seed)
+    examples = deduplicate(examples)
+    train, holdout = split(examples, args.holdout, args.seed)
+
+    start = time.perf_counter()
+    model = KnowledgePointModel.train(train)
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for subject, question in holdout:
+        model.predict(question, subject)
+    predict_ms = (time.perf_counter() - start) * 1000 / max(1, len(holdout))
+
+    print(f"examples={len(examples)} train={len(train)} holdout={len(holdout)}")
+    print(f"train_s={train_seconds:.2f} predict_ms_per_question={predict_ms:.3f}")
+    print(f"configured threshold={settings.KNOWLEDGE_CLASSIFIER_MIN_CONFIDENCE}")
+    print_report(evaluate(model, holdout, THRESHOLDS))
+
+
+if __name__ == "__main__":
+    main()
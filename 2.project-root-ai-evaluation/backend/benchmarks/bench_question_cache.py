@@ -0,0 +1,114 @@
+"""
+题目画像缓存命中率报告
+
+用合成的试卷流估算缓存省去的 LLM 调用数：--questions 道不同的题目被反复
+上传 --uploads 次，每次上传随机带 OCR 噪声（空白、全/半角标点、选项顺序）。
+对比两种缓存键在逐题标注（知识点 + 难度各一次调用）下的效果：
+- before: md5(原始题目文本)[:8]，仅缓存知识点
+- after:  QuestionProfileCache（规范化文本 SHA-256，知识点 + 难度同一条记录）
+
+另外给出 32 位截断哈希在 --volume 道不同题目下出现碰撞的概率（生日界）。
+
+用法：
+    python -m benchmarks.bench_question_cache --questions 300 --uploads 3000 --noise 0.5
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+from unittest.mock import patch
+
+from app.schemas.parser import Question
+from app.services.cache_service import CacheService
+from app.services.question_cache import QuestionProfileCache
+
+STEMS = ["已知函数f(x)=x²+{a}，求f({b})的值", "下列各数中，比{a}大的是（  ）", "计算：{a}×{b}=（  ）"]
+
+
+def make_question(index: int) -> tuple:
+    """生成第 index 道题的题干和选项"""
+    rng = random.Random(index)
+    stem = rng.choice(STEMS).format(a=rng.randint(1, 99), b=rng.randint(1, 99))
+    options = [str(rng.randint(-50, 200)) for _ in range(4)]
+    return stem, options
+
+
+def render(stem: str, options: list, rng: random.Random, noise: float) -> str:
+    """渲染题目文本，按 noise 概率加入 OCR 噪声"""
+    if rng.random() >= noise:
+        return stem + " " + " ".join(f"{chr(65 + i)}．{o}" for i, o in enumerate(options))
+    if rng.random() < 0.5:
+        stem = stem.replace("，", ",").replace("（", "(").replace("）", ")")
+    shuffled = rng.sample(options, len(options))
+    separator = rng.choice([" ", "\n", "  ", ""])
+    return stem + separator + separator.join(
+        f"{chr(65 + i)}{rng.choice(['.', '．', '、'])}{rng.choice(['', ' '])}{o}"
+        for i, o in enumerate(shuffled)
+    )
+
+
+def collision_probability(volume: int, bits: int) -> float:
+    """volume 个不同键在 bits 位哈希下至少一次碰撞的概率"""
+    return 1 - math.exp(-volume * (volume - 1) / (2 * 2 ** bits))
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    bank = [make_question(i) for i in range(args.questions)]
+    uploads = [render(*rng.choice(bank), rng, args.noise) for _ in range(args.uploads)]
+
+    # before: 原始文本截断 md5，难度不缓存
+    seen = set()
+    before_calls = 0
+    for text in uploads:
+        key = hashlib.md5(text.encode()).hexdigest()[:8]
+        before_calls += 1 if key in seen else 2
+        seen.add(key)
+
+    # after: 题目画像缓存（内存字典代替 Redis）
+    store = {}
+
+    async def get_profile(subject, fingerprint):
+        return store.get((subject, fingerprint))
+
+    async def set_profile(subject, fingerprint, profile):
+        store[(subject, fingerprint)] = profile
+
+    cache = QuestionProfileCache()
+    after_calls = 0
+    with patch.object(CacheService, "get_question_profile", side_effect=get_profile), \
+            patch.object(CacheService, "set_question_profile", side_effect=set_profile):
+        for i, text in enumerate(uploads):
+            question = Question(question_id=f"Q{i}", question_type="objective", question_text=text)
+            found = await cache.get(question, "数学")
+            after_calls += 2 - len(found)
+            await cache.update(question, "数学", knowledge_points=["知识点"], difficulty=0.5)
+
+    report = cache.report()
+    baseline = 2 * len(uploads)
+    print(f"questions={args.questions} uploads={args.uploads} noise={args.noise}")
+    print(f"{'mode':<8}{'llm_calls':>11}{'saved':>8}{'saved_pct':>11}{'entries':>9}")
+    for name, calls, entries in (("before", before_calls, len(seen)), ("after", after_calls, len(store))):
+        saved = baseline - calls
+        print(f"{name:<8}{calls:>11}{saved:>8}{saved / baseline:>10.1%}{entries:>9}")
+    for field, stats in report["fields"].items():
+        print(f"after.{field}: lookups={stats['lookups']} hits={stats['hits']} hit_rate={stats['hit_rate']:.1%}")
+    print(
+        f"32-bit key collision probability at {args.volume} distinct questions: "
+        f"{collision_probability(args.volume, 32):.1%} (256-bit: ~0)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="题目画像缓存命中率报告")
+    parser.add_argument("--questions", type=int, default=300, help="不同题目数")
+    parser.add_argument("--uploads", type=int, default=3000, help="题目出现次数")
+    parser.add_argument("--noise", type=float, default=0.5, help="带 OCR 噪声的比例")
+    parser.add_argument("--volume", type=int, default=100000, help="估算碰撞概率的题目总量")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+对象存储吞吐基准：本地目录后端与 S3 兼容后端
+
+对每个后端测量：
+- put_file：并发写入 --files 个 --size-mb 大小的文件（S3 超过阈值时走分片上传）
+- get：并发整对象读取
+- stream：并发流式读取
+
+S3 后端默认对接在子进程中启动的本地 S3 替身（scripts/s3_standin.py，经 uvicorn 监听回环地址），
+并以单分片并发再测一次，对比并行分片的收益。回环地址上替身本身是瓶颈，并行分片没有收益；
+--link-mbps 让替身按单连接带宽延迟请求，模拟公网上传到 OSS 时单连接受限的情况。
+指定 --endpoint 时改为对接真实的 MinIO / OSS（凭据取命令行参数）。
+
+用法：
+    python -m benchmarks.bench_storage --files 16 --size-mb 10 --concurrency 8
+    python -m benchmarks.bench_storage --files 4 --size-mb 10 --concurrency 1 --link-mbps 20
+    python -m benchmarks.bench_storage --endpoint http://127.0.0.1:9000 --bucket exams \\
+        --access-key-id minioadmin --access-key-secret minioadmin
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+from typing import List
+
+from app.core.http_client import HTTPClientRegistry
+from app.services.storage.base import StorageBackend
+from app.services.storage.local import LocalStorageBackend
+from app.services.storage.s3 import S3StorageBackend
+
+STANDIN_KEY_ID = "standin"
+STANDIN_SECRET = "standin-secret"
+REGION = "oss-cn-hangzhou"
+
+
+def serve_standin(root: str, port: int, link_mbps: float):
+    """子进程入口：运行 S3 替身"""
+    import uvicorn
+    from scripts.s3_standin import S3StandIn
+    standin = S3StandIn(root, STANDIN_KEY_ID, STANDIN_SECRET, REGION, link_mbps)
+    uvicorn.run(standin.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"S3 stand-in did not start on port {port}")
+
+
+async def run_all(tasks, concurrency: int) -> float:
+    """以并发上限执行协程工厂列表，返回耗时秒"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(factory):
+        async with semaphore:
+            await factory()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[limited(factory) for factory in tasks])
+    return time.perf_counter() - start
+
+
+async def drain(storage: StorageBackend, key: str):
+    async for _ in storage.stream(key):
+        pass
+
+
+async def bench_backend(label: str, storage: StorageBackend, paths: List[str], size: int, concurrency: int):
+    """测量一个后端的写入、读取、流式读取吞吐"""
+    total_mb = len(paths) * size / 1e6
+    keys = [f"bench/{label}/{i}.jpg" for i in range(len(paths))]
+
+    elapsed = await run_all(
+        [lambda k=k, p=p: storage.put_file(k, p, "image/jpeg") for k, p in zip(keys, paths)], concurrency
+    )
+    print(f"{label:>14}  put_file {total_mb / elapsed:>8.1f} MB/s")
+    elapsed = await run_all([lambda k=k: storage.get(k) for k in keys], concurrency)
+    print(f"{label:>14}  get      {total_mb / elapsed:>8.1f} MB/s")
+    elapsed = await run_all([lambda k=k: drain(storage, k) for k in keys], concurrency)
+    print(f"{label:>14}  stream   {total_mb / elapsed:>8.1f} MB/s")
+    await run_all([lambda k=k: storage.delete(k) for k in keys], concurrency)
+
+
+async def main_async(args):
+    size = int(args.size_mb * 1024 * 1024)
+    workdir = tempfile.mkdtemp(prefix="bench-storage-")
+    paths = []
+    for i in range(args.files):
+        path = os.path.join(workdir, f"src-{i}.jpg")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    print(f"files={args.files}  size={args.size_mb:.0f}MB  concurrency={args.concurrency}  "
+          f"link={args.link_mbps or 'unlimited'}MB/s")
+
+    standin = None
+    try:
+        local = LocalStorageBackend(root=os.path.join(workdir, "local"), url_prefix="/uploads")
+        await bench_backend("local", local, paths, size, args.concurrency)
+
+        if args.endpoint:
+            s3_options = dict(
+                endpoint=args.endpoint, bucket=args.bucket, access_key_id=args.access_key_id,
+                access_key_secret=args.access_key_secret, region=args.region, path_style=True
+            )
+        else:
+            port = free_port()
+            standin = multiprocessing.get_context("spawn").Process(
+                target=serve_standin, args=(os.path.join(workdir, "s3"), port, args.link_mbps), daemon=True
+            )
+            standin.start()
+            wait_for_port(port)
+            s3_options = dict(
+                endpoint=f"http://127.0.0.1:{port}", bucket="exams", access_key_id=STANDIN_KEY_ID,
+                access_key_secret=STANDIN_SECRET, region=REGION, path_style=True
+            )
+
+        s3 = S3StorageBackend(**s3_options, public_url="")
+        await bench_backend(f"s3 (parts x{s3.concurrency})", s3, paths, size, args.concurrency)
+        serial = S3StorageBackend(**s3_options, public_url="", concurrency=1)
+        await bench_backend("s3 (parts x1)", serial, paths, size, args.concurrency)
+    finally:
+        await HTTPClientRegistry.close()
+        if standin is not None:
+            standin.terminate()
+            standin.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对象存储吞吐基准")
+    parser.add_argument("--files", type=int, default=16, help="文件数")
+    parser.add_argument("--size-mb", type=float, default=10.0, help="每个文件大小（MB）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发文件数")
+    parser.add_argument("--endpoint", default="", help="真实 S3 兼容端点（为空时启动本地替身）")
+    parser.add_argument("--bucket", default="exams")
+    parser.add_argument("--access-key-id", default="")
+    parser.add_argument("--access-key-secret", default="")
+    parser.add_argument("--region", default=REGION)
+    parser.add_argument("--link-mbps", type=float, default=0.0, help="替身模拟的单连接带宽（MB/s），0 表示不模拟")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+上传流式接收压测：并发上传时每个请求的峰值内存
+
+对比两种上传接收方式（同一进程内的 ASGI 应用，请求体由客户端分块流式发送）：
+- before: FastAPI UploadFile 解析完整表单 → `await file.read()` 读入内存 → 写入存储
+- after:  receive_upload 分块写入 spool 文件并增量计算 SHA-256 → 移动到存储
+
+每个（接收方式, 并发数）在独立的 spawn 子进程中运行：先上传一次预热，再重置常驻内存
+峰值（Linux /proc/self/clear_refs），同时发起 N 个上传，报告常驻内存峰值相对上传前的
+增量及折算到每个请求的值。after 的每请求峰值应与并发数和文件大小无关。
+（tracemalloc 会让纯 Python 的 multipart 解析慢几十倍，这里不使用。）
+
+用法：
+    python -m benchmarks.bench_upload_stream --size-mb 10 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from fastapi import FastAPI, File, Request, UploadFile
+from httpx import ASGITransport, AsyncClient
+
+from app.services.upload_stream import receive_upload
+
+BOUNDARY = "bench-upload-boundary"
+SEND_CHUNK = 64 * 1024
+
+
+def build_app(storage_dir: str) -> FastAPI:
+    """两种接收方式的最小上传接口（不含鉴权和数据库）"""
+    app = FastAPI()
+
+    @app.post("/before")
+    async def before(file: UploadFile = File(...)):
+        content = await file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        with tempfile.NamedTemporaryFile(dir=storage_dir, delete=False) as f:
+            f.write(content)
+        return {"size": len(content), "sha256": digest}
+
+    @app.post("/after")
+    async def after(request: Request):
+        upload, _ = await receive_upload(request, spool_dir=storage_dir)
+        await asyncio.to_thread(shutil.move, upload.path, upload.path + ".stored")
+        return {"size": upload.size, "sha256": upload.sha256}
+
+    return app
+
+
+async def body_stream(payload: bytes):
+    """分块发送 multipart 请求体（各请求共享同一份 payload，客户端不额外占用内存）"""
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="exam.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    view = memoryview(payload)
+    for offset in range(0, len(payload), SEND_CHUNK):
+        yield bytes(view[offset:offset + SEND_CHUNK])
+        await asyncio.sleep(0)
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def memory_kb(field: str) -> int:
+    """读取 /proc/self/status 中的内存字段（KB）"""
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"{field}:\s+(\d+)", f.read()).group(1))
+
+
+async def upload_concurrently(path: str, payload: bytes, concurrency: int, storage_dir: str):
+    """并发上传，返回（常驻内存峰值增量字节数, 耗时秒）"""
+    headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    app = build_app(storage_dir)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        # 预热：导入、线程池和解析器初始化不计入峰值
+        (await client.post(path, content=body_stream(payload[:1024]), headers=headers)).raise_for_status()
+
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # 重置 VmHWM
+        baseline = memory_kb("VmRSS")
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post(path, content=body_stream(payload), headers=headers) for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+        peak = memory_kb("VmHWM")
+
+    for response in responses:
+        response.raise_for_status()
+        assert response.json()["size"] == len(payload)
+    return (peak - baseline) * 1024, elapsed
+
+
+def run_level(path: str, size: int, concurrency: int):
+    """子进程入口"""
+    payload = os.urandom(size)
+    storage_dir = tempfile.mkdtemp(prefix="bench-upload-")
+    try:
+        return asyncio.run(upload_concurrently(path, payload, concurrency, storage_dir))
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传流式接收压测：并发上传时每个请求的峰值内存")
+    parser.add_argument("--size-mb", type=float, default=10.0, help="上传文件大小（MB）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="并发上传数")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    print(f"upload={args.size_mb:.0f}MB  send chunk={SEND_CHUNK // 1024}KB")
+    print(f"{'path':>7}{'conc':>6}{'peak':>10}{'per req':>10}{'time':>9}")
+    context = multiprocessing.get_context("spawn")
+    for path in ("before", "after"):
+        for concurrency in args.concurrency:
+            with context.Pool(1) as pool:
+                peak, elapsed = pool.apply(run_level, (f"/{path}", size, concurrency))
+            print(f"{path:>7}{concurrency:>6}{peak / 1e6:>8.1f}MB"
+                  f"{peak / concurrency / 1e6:>8.2f}MB{elapsed * 1000:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Worker 事件循环基准测试
+
+对比两种 Celery 任务执行方式的单任务开销：
+- before: 每个步骤调用一次 asyncio.run()（每次新建事件循环，连接池冷启动）
+- after:  整个任务作为一个协程运行在 WorkerRuntime 的长生命周期事件循环上
+
+连接池使用模拟实现：与 asyncpg / redis.asyncio 一样，连接绑定在创建它的
+事件循环上，新循环必须重新建连（默认 5ms，模拟 TCP + 认证）。
+
+用法：
+    python -m benchmarks.bench_worker_runtime --tasks 200 --steps 5 --connect-ms 5
+"""
+import argparse
+import asyncio
+import time
+import weakref
+
+from app.core.worker_runtime import WorkerRuntime
+
+
+class LoopBoundPool:
+    """模拟连接池：每个事件循环首次获取连接时需要建连"""
+
+    def __init__(self, connect_cost: float):
+        self.connect_cost = connect_cost
+        self._warm_loops = weakref.WeakSet()
+        self.connects = 0
+
+    async def query(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._warm_loops:
+            await asyncio.sleep(self.connect_cost)
+            self._warm_loops.add(loop)
+            self.connects += 1
+        await asyncio.sleep(0)
+
+
+def run_before(pool: LoopBoundPool, tasks: int, steps: int) -> float:
+    """旧方式：每个步骤一次 asyncio.run()"""
+    start = time.perf_counter()
+    for _ in range(tasks):
+        for _ in range(steps):
+            asyncio.run(pool.query())
+    return time.perf_counter() - start
+
+
+def run_after(pool: LoopBoundPool, tasks: int, steps: int) -> float:
+    """新方式：整个任务一次进入 worker 事件循环"""
+
+    async def task():
+        for _ in range(steps):
+            await pool.query()
+
+    start = time.perf_counter()
+    for _ in range(tasks):
+        WorkerRuntime.run(task())
+    elapsed = time.perf_counter() - start
+    WorkerRuntime.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker 事件循环基准测试")
+    parser.add_argument("--tasks", type=int, default=200, help="任务数")
+    parser.add_argument("--steps", type=int, default=5, help="每个任务的 asyncio.run 次数")
+    parser.add_argument("--connect-ms", type=float, default=5.0, help="模拟建连耗时（毫秒）")
+    args = parser.parse_args()
+
+    print(f"tasks={args.tasks} steps={args.steps} connect={args.connect_ms}ms")
+    print(f"{'mode':<8}{'connect_ms':>12}{'per_task_ms':>14}{'connects':>10}")
+
+    for connect_ms in (0.0, args.connect_ms):
+        for name, runner in (("before", run_before), ("after", run_after)):
+            pool = LoopBoundPool(connect_ms / 1000)
+            elapsed = runner(pool, args.tasks, args.steps)
+            per_task = elapsed / args.tasks * 1000
+            print(f"{name:<8}{connect_ms:>12.1f}{per_task:>14.3f}{pool.connects:>10}")
+
+
+if __name__ == "__main__":
+    main()
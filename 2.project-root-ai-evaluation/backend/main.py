@@ -1,13 +1,18 @@
 """
 AI 试卷拍照测评工具 - FastAPI 主应用
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.http_client import HTTPClientRegistry
+from app.core.redis_client import RedisClient
+from app.services.image_preprocess import image_preprocessor
 from app.api.v1 import api_router
+from app.api.v1.storage import objects_router
 
 
 @asynccontextmanager
@@ -17,9 +22,15 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     
+    # 创建出站 HTTP 连接池
+    await HTTPClientRegistry.start()
+    
     yield
     
     # 关闭时：清理资源
+    image_preprocessor.shutdown()
+    await HTTPClientRegistry.close()
+    await RedisClient.close()
     await engine.dispose()
 
 
@@ -42,6 +53,9 @@ app.add_middleware(
 # 注册路由
 app.include_router(api_router, prefix="/api/v1")
 
+# 本地存储的对象（STORAGE_BACKEND=local 时有效）
+app.include_router(objects_router, prefix=settings.STORAGE_LOCAL_URL_PREFIX)
+
 
 @app.get("/health")
 async def health_check():
@@ -52,6 +66,12 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标端点"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
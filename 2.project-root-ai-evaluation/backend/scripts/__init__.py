@@ -0,0 +1,6 @@
+"""
+运维脚本
+
+在 backend 目录下运行，例如：
+    python -m scripts.build_near_duplicate_index
+"""
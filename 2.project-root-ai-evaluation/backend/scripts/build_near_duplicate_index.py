@@ -0,0 +1,86 @@
+"""
+离线构建近似重复题目索引
+
+遍历 exams 表中已解析试卷的 parsed_result，将带知识点或难度的题目写入
+NearDuplicateIndex（按 NEAR_DUP_BACKEND 写入 Redis 或本地索引文件）。
+重复运行是幂等的：同一道题按指纹合并。
+
+用法：
+    python -m scripts.build_near_duplicate_index --batch-size 500
+    python -m scripts.build_near_duplicate_index --subject 数学 --backend disk
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.database import engine
+from app.services.near_duplicate import NearDuplicateIndex
+from scripts.exam_questions import iter_parsed_results, parse_questions
+
+logger = logging.getLogger(__name__)
+
+
+async def index_exam(
+    index: NearDuplicateIndex,
+    subject: Optional[str],
+    parsed_result: Dict[str, Any]
+) -> int:
+    """
+    将一份试卷的题目写入索引
+
+    Args:
+        index: 近似重复索引
+        subject: 试卷科目（为空时取 parsed_result.exam_meta.subject）
+        parsed_result: 解析结果 JSON
+
+    Returns:
+        int: 写入的题目数
+    """
+    subject, questions = parse_questions(subject, parsed_result)
+    added = 0
+    for question in questions:
+        if not question.knowledge_tags and question.difficulty is None:
+            continue
+        await index.add(
+            question,
+            subject,
+            knowledge_points=question.knowledge_tags,
+            difficulty=question.difficulty,
+            save=False
+        )
+        added += 1
+    return added
+
+
+async def build(args) -> Dict[str, int]:
+    """按批读取试卷并构建索引"""
+    index = NearDuplicateIndex(backend=args.backend, path=args.path)
+    stats = {"exams": 0, "questions": 0}
+
+    async for subject, parsed_result in iter_parsed_results(args.batch_size, args.subject):
+        stats["exams"] += 1
+        stats["questions"] += await index_exam(index, subject, parsed_result)
+        if stats["exams"] % args.batch_size == 0:
+            logger.info(f"已处理 {stats['exams']} 份试卷，{stats['questions']} 道题")
+
+    index.save()
+    await engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线构建近似重复题目索引")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批读取的试卷数")
+    parser.add_argument("--subject", default=None, help="只索引指定科目")
+    parser.add_argument("--backend", default=None, help="索引存储（redis / disk），默认 NEAR_DUP_BACKEND")
+    parser.add_argument("--path", default=None, help="磁盘索引文件，默认 NEAR_DUP_INDEX_PATH")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = asyncio.run(build(args))
+    print(f"indexed exams={stats['exams']} questions={stats['questions']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+标定上传快速质量门的模糊度阈值
+
+对每张图片分别计算全分辨率 Laplacian 方差（validate_image_quality 的判定依据）和
+质量门缩小图上的 Laplacian 方差，以全分辨率按 MIN_BLUR_THRESHOLD 的通过 / 拒绝为准，
+在缩小图评分上搜索与之判定一致率最高的阈值（一致率相同时取误放行更少的），
+并报告亮度均值的偏差和两种方式的耗时。
+
+图片来源：--fixtures 目录（默认 uploads/，即已上传的试卷照片）；目录为空或不存在时
+生成 --synthetic 张合成照片（不同分辨率、对焦模糊和传感器噪声）。
+
+用法：
+    python -m scripts.calibrate_quality_gate
+    python -m scripts.calibrate_quality_gate --fixtures /data/exam-photos --max-side 1024
+"""
+import argparse
+import logging
+import statistics
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.image_quality import QualityGate, blur_score
+
+logger = logging.getLogger(__name__)
+
+LINES = ["1. 3x + 5 = 20", "2. f(x) = x^2 - 4x + 3", "3. P(A) = 0.25", "4. sin 30 = 0.5", "5. a^2 + b^2 = c^2"]
+
+
+def load_fixtures(directory: str) -> List[bytes]:
+    """读取目录中的图片"""
+    path = Path(directory)
+    if not path.is_dir():
+        return []
+    return [
+        item.read_bytes() for item in sorted(path.iterdir())
+        if item.suffix.lower().lstrip(".") in settings.ALLOWED_IMAGE_FORMATS
+    ]
+
+
+def synthetic_photos(count: int, seed: int) -> List[bytes]:
+    """生成合成试卷照片（随机分辨率、模糊程度和噪声）"""
+    rng = np.random.default_rng(seed)
+    photos = []
+    for _ in range(count):
+        megapixels = rng.choice([3.0, 8.0, 12.0])
+        width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+        height = width * 3 // 4
+        page = np.full((height, width), 235, dtype=np.uint8)
+        scale = width / 1000
+        for i, line in enumerate(LINES):
+            cv2.putText(page, line, (int(width * 0.05), int(height * (0.15 + i * 0.16))),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2 * scale, 30, max(1, int(2 * scale)))
+        sigma = rng.uniform(0.3, 2.0)
+        page = cv2.GaussianBlur(page, (0, 0), sigma).astype(np.float32)
+        page += rng.normal(0, rng.uniform(1, 3), page.shape).astype(np.float32)
+        _, encoded = cv2.imencode(".jpg", np.clip(page, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 92])
+        photos.append(encoded.tobytes())
+    return photos
+
+
+def measure(gate: QualityGate, content: bytes) -> Tuple[float, float, float, float, float, float]:
+    """返回（全分辨率模糊度, 缩小图模糊度, 全分辨率亮度, 缩小图亮度, 全分辨率耗时, 质量门耗时）"""
+    start = time.perf_counter()
+    full = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_GRAYSCALE)
+    full_blur, full_brightness = blur_score(full), float(np.mean(full))
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = gate.score(content)
+    gate_time = time.perf_counter() - start
+    return full_blur, scores.blur, full_brightness, scores.brightness, full_time, gate_time
+
+
+def best_threshold(samples: List[Tuple[float, bool]]) -> Tuple[float, int, int]:
+    """
+    搜索与全分辨率判定一致率最高的阈值
+
+    Args:
+        samples: (缩小图模糊度, 全分辨率是否通过)
+
+    Returns:
+        Tuple[阈值, 误放行数, 误拒绝数]
+    """
+    scores = sorted(score for score, _ in samples)
+    candidates = [scores[0]] + [(a + b) / 2 for a, b in zip(scores, scores[1:])] + [scores[-1] + 1]
+    best = None
+    for threshold in candidates:
+        false_accept = sum(1 for score, ok in samples if score >= threshold and not ok)
+        false_reject = sum(1 for score, ok in samples if score < threshold and ok)
+        key = (false_accept + false_reject, false_accept)
+        if best is None or key < best[0]:
+            best = (key, threshold, false_accept, false_reject)
+    return best[1], best[2], best[3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标定上传快速质量门的模糊度阈值")
+    parser.add_argument("--fixtures", default="uploads", help="试卷照片目录")
+    parser.add_argument("--synthetic", type=int, default=60, help="没有照片时生成的合成照片数")
+    parser.add_argument("--max-side", type=int, default=None, help="质量门评分图像的长边（默认取配置）")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    photos = load_fixtures(args.fixtures)
+    source = args.fixtures
+    if not photos:
+        photos = synthetic_photos(args.synthetic, args.seed)
+        source = "synthetic"
+
+    gate = QualityGate(max_side=args.max_side)
+    rows = [measure(gate, content) for content in photos]
+    samples = [(small, full >= settings.MIN_BLUR_THRESHOLD) for full, small, *_ in rows]
+    threshold, false_accept, false_reject = best_threshold(samples)
+
+    rejected = sum(1 for _, ok in samples if not ok)
+    agreement = 1 - (false_accept + false_reject) / len(samples)
+    brightness_error = max(abs(full - small) for _, _, full, small, _, _ in rows)
+    logger.info(f"photos={len(photos)} ({source})  max_side={gate.max_side}  "
+                f"full-res rejects={rejected} (MIN_BLUR_THRESHOLD={settings.MIN_BLUR_THRESHOLD})")
+    logger.info(f"calibrated blur threshold={threshold:.1f}  agreement={agreement:.1%}  "
+                f"false accepts={false_accept}  false rejects={false_reject}")
+    logger.info(f"brightness max |full - gate|={brightness_error:.2f}")
+    logger.info(f"decode+score time: full-res median={statistics.median(r[4] for r in rows) * 1000:.0f}ms  "
+                f"gate median={statistics.median(r[5] for r in rows) * 1000:.0f}ms")
+    logger.info(f"set IMAGE_QUALITY_GATE_BLUR_THRESHOLD={threshold:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+从 exams 表读取已解析题目（供离线脚本共用）
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from app.core.database import async_session_maker
+from app.models.exam import Exam
+from app.schemas.parser import Question
+
+
+def parse_questions(
+    subject: Optional[str],
+    parsed_result: Dict[str, Any]
+) -> Tuple[Optional[str], List[Question]]:
+    """
+    从 parsed_result 中解析题目
+
+    Args:
+        subject: 试卷科目（为空时取 parsed_result.exam_meta.subject）
+        parsed_result: 解析结果 JSON
+
+    Returns:
+        Tuple[Optional[str], List[Question]]: (科目, 题目列表)，跳过格式不完整的题目
+    """
+    subject = subject or (parsed_result.get("exam_meta") or {}).get("subject")
+    questions = []
+    for item in parsed_result.get("questions") or []:
+        try:
+            questions.append(Question(**item))
+        except (TypeError, ValidationError):
+            continue
+    return subject, questions
+
+
+async def iter_parsed_results(
+    batch_size: int = 500,
+    subject: Optional[str] = None
+) -> AsyncIterator[Tuple[Optional[str], Dict[str, Any]]]:
+    """
+    流式读取已解析试卷
+
+    Args:
+        batch_size: 每批读取的试卷数
+        subject: 只读取指定科目（可选）
+
+    Yields:
+        (科目, parsed_result)
+    """
+    stmt = select(Exam.subject, Exam.parsed_result).where(Exam.parsed_result.isnot(None))
+    if subject:
+        stmt = stmt.where(Exam.subject == subject)
+
+    async with async_session_maker() as session:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        async for row_subject, parsed_result in result:
+            yield row_subject, parsed_result
@@ -0,0 +1,286 @@
+"""
+本地 S3 兼容存储替身（MinIO 风格，路径风格寻址）
+
+实现 S3StorageBackend 用到的接口子集，便于在没有 MinIO / OSS 的环境下测试和压测：
+PutObject、GetObject（含 Range）、HeadObject、DeleteObject，以及分片上传的
+CreateMultipartUpload、UploadPart、CompleteMultipartUpload、AbortMultipartUpload。
+每个请求都校验 AWS Signature V4 签名（Authorization 头或预签名查询参数）和
+x-amz-content-sha256，对象保存在 --root 目录，Content-Type、Cache-Control 和 x-amz-meta-* 保存在内存中。
+
+用法：
+    python -m scripts.s3_standin --port 9000 --root .s3
+    # 然后配置 STORAGE_BACKEND=s3 OSS_ENDPOINT=http://127.0.0.1:9000 STORAGE_S3_PATH_STYLE=true
+    #       OSS_BUCKET_NAME=exams OSS_ACCESS_KEY_ID=standin OSS_ACCESS_KEY_SECRET=standin-secret
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from app.services.storage.s3 import presign_v4, sign_v4
+
+AUTH_PATTERN = re.compile(r"Credential=([^/]+)/([^,]+), SignedHeaders=([^,]+), Signature=([0-9a-f]+)")
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+
+def _error(status: int, code: str) -> Response:
+    return Response(f"<Error><Code>{code}</Code></Error>", status_code=status, media_type="application/xml")
+
+
+class S3StandIn:
+    """S3 兼容存储替身"""
+
+    def __init__(
+        self,
+        root: str,
+        access_key_id: str,
+        access_key_secret: str,
+        region: str,
+        link_mbps: float = 0.0
+    ):
+        """
+        Args:
+            root: 对象保存目录
+            access_key_id: 接受的 AccessKey ID
+            access_key_secret: 对应的 AccessKey Secret
+            region: 签名区域
+            link_mbps: 模拟的单连接带宽（MB/s），按请求 / 响应体大小延迟，0 表示不模拟
+        """
+        self.root = os.path.abspath(root)
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.region = region
+        self.link_mbps = link_mbps
+        self.uploads: Dict[str, str] = {}  # uploadId -> 对象路径
+        self.metadata: Dict[str, Dict[str, str]] = {}  # 对象路径 -> Content-Type、x-amz-meta-*
+        self.fail_part: Optional[int] = None  # 测试用：该分片号返回 500
+        self.active_parts = 0
+        self.max_active_parts = 0  # 观察到的最大并发分片数
+        self.app = Starlette(routes=[
+            Route("/{bucket}/{key:path}", self.handle, methods=["GET", "HEAD", "PUT", "POST", "DELETE"])
+        ])
+
+    def _object_path(self, bucket: str, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(key)
+        return path
+
+    def _verify(self, request: Request, body: bytes) -> Optional[Response]:
+        """校验签名和请求体哈希"""
+        if "X-Amz-Signature" in request.query_params:
+            return self._verify_presigned(request, body)
+        match = AUTH_PATTERN.search(request.headers.get("authorization", ""))
+        if not match or match.group(1) != self.access_key_id:
+            return _error(403, "InvalidAccessKeyId")
+        payload_hash = request.headers.get("x-amz-content-sha256", "")
+        if hashlib.sha256(body).hexdigest() != payload_hash:
+            return _error(400, "XAmzContentSHA256Mismatch")
+
+        signed_names = match.group(3).split(";")
+        extra = {
+            name: request.headers.get(name, "") for name in signed_names
+            if name not in ("host", "x-amz-date", "x-amz-content-sha256")
+        }
+        now = datetime.strptime(request.headers.get("x-amz-date", ""), "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        expected = sign_v4(
+            request.method, request.headers.get("host", ""), request.scope["raw_path"].decode("latin-1"),
+            dict(parse_qsl(request.url.query, keep_blank_values=True)), extra, payload_hash,
+            self.access_key_id, self.access_key_secret, self.region, now
+        )
+        if expected != request.headers.get("authorization"):
+            return _error(403, "SignatureDoesNotMatch")
+        return None
+
+    def _verify_presigned(self, request: Request, body: bytes) -> Optional[Response]:
+        """校验预签名 URL（查询参数签名）"""
+        params = request.query_params
+        if params.get("X-Amz-Credential", "").split("/")[0] != self.access_key_id:
+            return _error(403, "InvalidAccessKeyId")
+        now = datetime.strptime(params.get("X-Amz-Date", ""), "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        expires_in = int(params.get("X-Amz-Expires", "0"))
+        if now.timestamp() + expires_in < time.time():
+            return _error(403, "AccessDenied")
+        payload_hash = request.headers.get("x-amz-content-sha256", UNSIGNED_PAYLOAD)
+        if payload_hash != UNSIGNED_PAYLOAD and hashlib.sha256(body).hexdigest() != payload_hash:
+            return _error(400, "XAmzContentSHA256Mismatch")
+
+        headers = {
+            name: request.headers.get(name, "") for name in params.get("X-Amz-SignedHeaders", "").split(";")
+            if name != "host"
+        }
+        expected = presign_v4(
+            request.method, request.headers.get("host", ""), request.scope["raw_path"].decode("latin-1"),
+            headers, payload_hash, self.access_key_id, self.access_key_secret, self.region, now, expires_in
+        )
+        if expected["X-Amz-Signature"] != params.get("X-Amz-Signature"):
+            return _error(403, "SignatureDoesNotMatch")
+        return None
+
+    async def _transfer(self, size: int) -> None:
+        """模拟单连接带宽"""
+        if self.link_mbps > 0:
+            await asyncio.sleep(size / (self.link_mbps * 1e6))
+
+    async def handle(self, request: Request) -> Response:
+        body = await request.body()
+        denied = self._verify(request, body)
+        if denied is not None:
+            return denied
+        await self._transfer(len(body))
+
+        params = request.query_params
+        path = self._object_path(request.path_params["bucket"], request.path_params["key"])
+        method = request.method
+
+        if method == "POST" and "uploads" in params:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = path
+            self.metadata[path] = _object_metadata(request)
+            os.makedirs(self._parts_dir(upload_id), exist_ok=True)
+            return Response(
+                f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>",
+                media_type="application/xml"
+            )
+        if "uploadId" in params:
+            return await self._multipart(method, params, body, path)
+
+        if method == "PUT":
+            await asyncio.to_thread(_write, path, body)
+            self.metadata[path] = _object_metadata(request)
+            return Response(headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if not os.path.isfile(path):
+            return _error(404, "NoSuchKey")
+        if method == "DELETE":
+            os.unlink(path)
+            self.metadata.pop(path, None)
+            return Response(status_code=204)
+        size = os.path.getsize(path)
+        headers = {**self.metadata.get(path, {}), "content-length": str(size)}
+        if method == "HEAD":
+            return Response(headers=headers)
+
+        match = RANGE_PATTERN.fullmatch(request.headers.get("range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if start >= size:
+                return _error(416, "InvalidRange")
+            data = await asyncio.to_thread(_read_range, path, start, end - start + 1)
+            await self._transfer(len(data))
+            return Response(data, status_code=206, headers={
+                **headers, "content-length": str(len(data)), "content-range": f"bytes {start}-{end}/{size}"
+            })
+        await self._transfer(size)
+        return StreamingResponse(_read_chunks(path), headers=headers)
+
+    def _parts_dir(self, upload_id: str) -> str:
+        return os.path.join(self.root, ".multipart", upload_id)
+
+    async def _multipart(self, method: str, params, body: bytes, path: str) -> Response:
+        upload_id = params["uploadId"]
+        if self.uploads.get(upload_id) != path:
+            return _error(404, "NoSuchUpload")
+        parts_dir = self._parts_dir(upload_id)
+
+        if method == "PUT":
+            number = int(params["partNumber"])
+            self.active_parts += 1
+            self.max_active_parts = max(self.max_active_parts, self.active_parts)
+            try:
+                if number == self.fail_part:
+                    return _error(500, "InternalError")
+                await asyncio.to_thread(_write, os.path.join(parts_dir, f"{number:05d}"), body)
+            finally:
+                self.active_parts -= 1
+            return Response(headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+        if method == "DELETE":
+            del self.uploads[upload_id]
+            shutil.rmtree(parts_dir, ignore_errors=True)
+            return Response(status_code=204)
+
+        # CompleteMultipartUpload：按请求中的分片号和 ETag 合并
+        requested = re.findall(r"<PartNumber>(\d+)</PartNumber><ETag>([^<]*)</ETag>", body.decode("utf-8"))
+        part_paths = []
+        for number, etag in requested:
+            part_path = os.path.join(parts_dir, f"{int(number):05d}")
+            if not os.path.isfile(part_path):
+                return _error(400, "InvalidPart")
+            with open(part_path, "rb") as f:
+                if f'"{hashlib.md5(f.read()).hexdigest()}"' != etag.replace("&quot;", '"'):
+                    return _error(400, "InvalidPart")
+            part_paths.append(part_path)
+        await asyncio.to_thread(_concatenate, part_paths, path)
+        del self.uploads[upload_id]
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return Response("<CompleteMultipartUploadResult/>", media_type="application/xml")
+
+
+def _object_metadata(request: Request) -> Dict[str, str]:
+    """PUT / CreateMultipartUpload 时随对象保存的请求头"""
+    return {
+        name: value for name, value in request.headers.items()
+        if name in ("content-type", "cache-control") or name.startswith("x-amz-meta-")
+    }
+
+
+def _read_range(path: str, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        return os.pread(f.fileno(), length, start)
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _concatenate(part_paths, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as out:
+        for part_path in part_paths:
+            with open(part_path, "rb") as f:
+                shutil.copyfileobj(f, out)
+
+
+async def _read_chunks(path: str, chunk_size: int = 256 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 S3 兼容存储替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--root", default=".s3", help="对象保存目录")
+    parser.add_argument("--access-key-id", default="standin")
+    parser.add_argument("--access-key-secret", default="standin-secret")
+    parser.add_argument("--region", default="oss-cn-hangzhou")
+    parser.add_argument("--link-mbps", type=float, default=0.0, help="模拟的单连接带宽（MB/s），0 表示不模拟")
+    args = parser.parse_args()
+
+    import uvicorn
+    standin = S3StandIn(args.root, args.access_key_id, args.access_key_secret, args.region, args.link_mbps)
+    uvicorn.run(standin.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+训练本地知识点分类器
+
+从 exams 表的 parsed_result（或导出的 JSONL）读取已标注 knowledge_tags 的题目，
+按题目指纹去重后在训练集上训练、在验证集上打印各置信度阈值下的覆盖率
+（省去的 LLM 调用比例）与准确率，最后用全部数据训练并写入模型文件。
+
+JSONL 每行一道题：{"subject": "数学", "question_text": "...", "knowledge_tags": [...]}，
+其余字段同 Question。
+
+用法：
+    python -m scripts.train_knowledge_classifier --holdout 0.1
+    python -m scripts.train_knowledge_classifier --from-jsonl questions.jsonl --output models/kp.json.gz
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+from typing import List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.schemas.parser import Question
+from app.services.knowledge_classifier import KnowledgePointModel, evaluate
+from app.services.question_cache import question_fingerprint
+
+logger = logging.getLogger(__name__)
+
+Example = Tuple[Optional[str], Question]
+
+THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8)
+
+
+def load_jsonl(path: str) -> List[Example]:
+    """读取 JSONL 导出的题目"""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("question_id", f"Q{index + 1}")
+            item.setdefault("question_type", "objective")
+            try:
+                examples.append((item.pop("subject", None), Question(**item)))
+            except ValidationError:
+                continue
+    return examples
+
+
+async def load_from_db(batch_size: int, subject: Optional[str]) -> List[Example]:
+    """从 exams 表读取已标注的题目"""
+    from app.core.database import engine
+    from scripts.exam_questions import iter_parsed_results, parse_questions
+
+    examples = []
+    async for row_subject, parsed_result in iter_parsed_results(batch_size, subject):
+        exam_subject, questions = parse_questions(row_subject, parsed_result)
+        examples.extend((exam_subject, q) for q in questions)
+    await engine.dispose()
+    return examples
+
+
+def deduplicate(examples: List[Example]) -> List[Example]:
+    """按 (科目, 题目指纹) 去重，避免重复上传的试卷同时落入训练集和验证集"""
+    unique = {}
+    for subject, question in examples:
+        if question.knowledge_tags:
+            unique.setdefault((subject, question_fingerprint(question)), (subject, question))
+    return list(unique.values())
+
+
+def split(examples: List[Example], holdout: float, seed: int) -> Tuple[List[Example], List[Example]]:
+    """随机划分训练集 / 验证集"""
+    shuffled = examples[:]
+    random.Random(seed).shuffle(shuffled)
+    count = int(len(shuffled) * holdout)
+    return shuffled[count:], shuffled[:count]
+
+
+def print_report(report: List[dict]):
+    """打印评估结果"""
+    print(f"{'threshold':>10}{'coverage':>10}{'precision':>11}{'recall':>9}{'exact':>8}")
+    for row in report:
+        print(
+            f"{row['threshold']:>10.2f}{row['coverage']:>10.1%}{row['precision']:>11.1%}"
+            f"{row['recall']:>9.1%}{row['exact']:>8.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练本地知识点分类器")
+    parser.add_argument("--from-jsonl", default=None, help="从 JSONL 读取题目（默认读取 exams 表）")
+    parser.add_argument("--subject", default=None, help="只使用指定科目（读取 exams 表时）")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批读取的试卷数")
+    parser.add_argument("--holdout", type=float, default=0.1, help="验证集比例")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--min-df", type=int, default=2)
+    parser.add_argument("--min-label-count", type=int, default=3)
+    parser.add_argument("--output", default=settings.KNOWLEDGE_CLASSIFIER_PATH, help="模型文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.from_jsonl:
+        examples = load_jsonl(args.from_jsonl)
+    else:
+        examples = asyncio.run(load_from_db(args.batch_size, args.subject))
+    examples = deduplicate(examples)
+    train, holdout = split(examples, args.holdout, args.seed)
+    print(f"examples={len(examples)} train={len(train)} holdout={len(holdout)}")
+
+    params = {"min_df": args.min_df, "min_label_count": args.min_label_count}
+    if holdout:
+        print_report(evaluate(KnowledgePointModel.train(train, **params), holdout, THRESHOLDS))
+
+    # 评估后用全部数据训练最终模型
+    model = KnowledgePointModel.train(examples, **params)
+    model.save(args.output)
+    print(f"saved {args.output} version={model.version} subjects={sorted(model.subjects)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 
 from app.core.config import settings
 from app.core.database import Base
+from app.schemas.parser import Question
 
 
 # 测试数据库 URL
@@ -52,3 +53,121 @@ async def db_session(test_engine) -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         yield session
         await session.rollback()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def local_storage(tmp_path_factory):
+    """测试使用临时目录作为本地对象存储，不写入工作目录"""
+    from app.services.storage import set_storage
+    from app.services.storage.local import LocalStorageBackend
+    storage = LocalStorageBackend(root=str(tmp_path_factory.mktemp("storage")))
+    set_storage(storage)
+    yield storage
+    set_storage(None)
+
+
+def build_question(
+    text: str,
+    question_id: str = "Q1",
+    question_type: str = "objective",
+    options=None,
+    tags=None
+) -> Question:
+    """构造题目"""
+    return Question(
+        question_id=question_id, question_type=question_type, question_text=text,
+        options=options, knowledge_tags=tags or []
+    )
+
+
+class FakePipeline:
+    """记录命令并在 execute 时依次执行"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return command
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """内存 Redis：实现缓存、租约、健康统计和近似重复索引所用的命令（字符串 / 集合在 data，哈希在 hashes）"""
+
+    def __init__(self):
+        self.data = {}
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.hashes.pop(key, None)
+
+    async def eval(self, script, numkeys, key, token):
+        # 仅支持租约释放脚本：持有者一致时删除
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+    async def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    async def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = str(int(fields.get(field, 0)) + amount)
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """用内存 Redis 替代 get_redis"""
+    redis = FakeRedis()
+
+    async def get_fake_redis():
+        return redis
+
+    monkeypatch.setattr("app.core.redis_client.get_redis", get_fake_redis)
+    return redis
+
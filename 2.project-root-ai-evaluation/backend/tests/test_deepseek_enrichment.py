@@ -0,0 +1,145 @@
+"""
+DeepSeek 批量题目丰富测试
+"""
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from hypothesis import given, strategies as st, settings as hypothesis_settings
+
+from app.core.config import settings
+from app.schemas.parser import Question
+from app.services.deepseek_service import DeepSeekService
+
+
+def build_questions(count: int, text: str = "已知函数f(x)=x²+1，求f(2)的值") -> list:
+    """构造题目列表"""
+    return [
+        Question(
+            question_id=f"Q{i + 1}",
+            question_type="objective" if i % 2 == 0 else "subjective",
+            question_text=text
+        )
+        for i in range(count)
+    ]
+
+
+def api_response(content, finish_reason: str = "stop") -> dict:
+    """构造 chat/completions 响应"""
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return {"choices": [{"message": {"content": content}, "finish_reason": finish_reason}]}
+
+
+def answer_all(messages, **kwargs) -> dict:
+    """按提示词中出现的题目编号返回结果"""
+    prompt = messages[-1]["content"]
+    ids = [part.split("]")[0] for part in prompt.split("[")[1:] if part.split("]")[0].startswith("Q")]
+    return api_response({
+        "results": [
+            {"id": qid, "knowledge_points": ["函数求值"], "difficulty": 0.4} for qid in ids
+        ]
+    })
+
+
+class TestQuestionChunking:
+    """测试按 token 预算分组"""
+
+    @pytest.mark.property
+    @given(lengths=st.lists(st.integers(min_value=1, max_value=600), max_size=40))
+    @hypothesis_settings(max_examples=100)
+    def test_chunks_respect_budget_and_order(self, lengths):
+        """分组保持顺序，且每组不超过预算和题目数上限（单题超预算时独占一组）"""
+        service = DeepSeekService()
+        questions = [
+            Question(question_id=f"Q{i}", question_type="objective", question_text="题" * n)
+            for i, n in enumerate(lengths)
+        ]
+        chunks = service._chunk_questions(questions)
+
+        assert [q for chunk in chunks for q in chunk] == questions
+        for chunk in chunks:
+            assert len(chunk) <= settings.DEEPSEEK_ENRICH_BATCH_MAX_QUESTIONS
+            cost = sum(
+                service._estimate_tokens(q.question_text) + service.ENRICH_QUESTION_OVERHEAD
+                for q in chunk
+            )
+            assert len(chunk) == 1 or cost <= settings.DEEPSEEK_ENRICH_BATCH_TOKENS
+
+
+class TestBatchEnrichment:
+    """测试批量丰富"""
+
+    @pytest.mark.unit
+    async def test_one_call_per_chunk(self):
+        """25 道题按分组调用，每组一次返回知识点和难度"""
+        service = DeepSeekService()
+        questions = build_questions(25)
+        expected_calls = len(service._chunk_questions(questions))
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=answer_all)) as call_api, \
+                patch.object(service, "enrich_question", AsyncMock()) as fallback:
+            result = await service.enrich_questions_batch(questions, subject="数学")
+
+        assert call_api.await_count == expected_calls < 25
+        fallback.assert_not_awaited()
+        assert [q.question_id for q in result] == [f"Q{i + 1}" for i in range(25)]
+        assert all(q.knowledge_tags == ["函数求值"] and q.difficulty == 0.4 for q in result)
+
+    @pytest.mark.unit
+    async def test_unparseable_batch_falls_back_per_question(self):
+        """批量 JSON 无法解析时逐题回退"""
+        service = DeepSeekService()
+        questions = build_questions(3)
+
+        with patch.object(service, "_call_api", AsyncMock(return_value=api_response("抱歉，我无法回答"))), \
+                patch.object(service, "enrich_question", AsyncMock()) as fallback:
+            await service.enrich_questions_batch(questions)
+
+        assert fallback.await_count == 3
+
+    @pytest.mark.unit
+    async def test_partial_results_fall_back_for_missing(self):
+        """缺失或格式错误的条目单独回退，其余直接采用"""
+        service = DeepSeekService()
+        questions = build_questions(3)
+        content = "```json\n" + json.dumps({
+            "results": [
+                {"id": "Q1", "knowledge_points": ["集合"], "difficulty": 1.7},
+                {"id": "Q2", "knowledge_points": "集合", "difficulty": 0.5},
+            ]
+        }) + "\n```"
+
+        with patch.object(service, "_call_api", AsyncMock(return_value=api_response(content))), \
+                patch.object(service, "enrich_question", AsyncMock()) as fallback:
+            result = await service.enrich_questions_batch(questions)
+
+        assert result[0].knowledge_tags == ["集合"]
+        assert result[0].difficulty == 1.0
+        assert [c.args[0].question_id for c in fallback.await_args_list] == ["Q2", "Q3"]
+
+    @pytest.mark.unit
+    async def test_truncated_output_splits_chunk(self):
+        """输出被截断时对半拆分重试"""
+        service = DeepSeekService()
+        questions = build_questions(4)
+        responses = iter([api_response('{"results": [', finish_reason="length")])
+
+        def respond(messages, **kwargs):
+            return next(responses, None) or answer_all(messages)
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=respond)) as call_api:
+            result = await service.enrich_questions_batch(questions)
+
+        assert call_api.await_count == 3
+        assert all(q.difficulty == 0.4 for q in result)
+
+    @pytest.mark.unit
+    async def test_api_failure_keeps_original_questions(self):
+        """API 调用失败时保留原始题目"""
+        service = DeepSeekService()
+        questions = build_questions(2)
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=Exception("down"))):
+            result = await service.enrich_questions_batch(questions)
+
+        assert [q.difficulty for q in result] == [None, None]
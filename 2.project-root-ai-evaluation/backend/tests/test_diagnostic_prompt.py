@@ -0,0 +1,96 @@
+"""
+诊断提示词压缩测试
+"""
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from app.schemas.analysis import AnswerEvidence, QuestionAnalysis
+from app.schemas.parser import Question
+from app.services.diagnostic_prompt import DiagnosticPromptCompactor, estimate_tokens, format_id_ranges
+from benchmarks.bench_diagnostic_prompt import evidence_ok, expand_ids, make_paper, verbose_summary
+
+
+def build_analysis(question_id: str, is_correct: bool, error_reason: str = None,
+                   answer: str = "A") -> QuestionAnalysis:
+    """构造题目分析"""
+    return QuestionAnalysis(
+        question_id=question_id,
+        student_answer=answer,
+        correct_answer="B",
+        is_correct=is_correct,
+        confidence=0.9,
+        error_reason=error_reason,
+        review_status="ai_confident",
+        evidence=AnswerEvidence(answer_bbox={"x": 0, "y": 0, "width": 10, "height": 10}, ocr_confidence=0.9)
+    )
+
+
+class TestFormatIdRanges:
+    """测试题号区间"""
+
+    @pytest.mark.unit
+    def test_consecutive_ids_merged(self):
+        assert format_id_ranges(["Q1", "Q2", "Q3", "Q5", "Q6", "附加题", "Q8"]) == "Q1-Q3, Q5-Q6, 附加题, Q8"
+
+    @pytest.mark.property
+    @given(numbers=st.lists(st.integers(min_value=1, max_value=200), unique=True, max_size=60))
+    @settings(max_examples=100)
+    def test_ranges_expand_to_same_ids(self, numbers):
+        """区间展开后与原题号集合一致"""
+        ids = [f"Q{n}" for n in sorted(numbers)]
+        assert expand_ids(format_id_ranges(ids)) == set(ids)
+
+
+class TestDiagnosticPromptCompactor:
+    """测试题目摘要压缩"""
+
+    @pytest.mark.unit
+    def test_groups_and_aggregates(self):
+        """答对题目合并为区间，错题按知识点和错误原因汇总"""
+        analyses = [
+            build_analysis("Q1", True), build_analysis("Q2", True), build_analysis("Q3", True),
+            build_analysis("Q4", False, "计算错误"), build_analysis("Q5", False, "计算错误"),
+        ]
+        questions = [
+            Question(question_id=f"Q{i}", question_type="objective", question_text="题",
+                     knowledge_tags=["二次函数" if i > 2 else "概率"])
+            for i in range(1, 6)
+        ]
+
+        summary = DiagnosticPromptCompactor(token_budget=1000).build_summary(analyses, questions)
+
+        assert "✓ 答对：Q1-Q3" in summary
+        assert "✗ Q4 | 二次函数 | 计算错误" in summary
+        assert "二次函数 错2/3（Q4-Q5）" in summary
+        assert "计算错误（Q4-Q5）" in summary
+
+    @pytest.mark.unit
+    def test_long_answers_truncated(self):
+        summary = DiagnosticPromptCompactor(token_budget=1000, answer_chars=10).build_summary(
+            [build_analysis("Q1", False, "步骤缺失", answer="解" * 300)]
+        )
+
+        assert "答=" + "解" * 10 + "…" in summary
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("size", [20, 80, 160])
+    def test_budget_respected_and_evidence_kept(self, size):
+        """长试卷的摘要不超过预算，错题题号和各知识点错题数保留"""
+        questions, analyses = make_paper(size, wrong_rate=0.3, seed=size)
+        compactor = DiagnosticPromptCompactor(token_budget=1200)
+        summary = compactor.build_summary(analyses, questions)
+
+        assert estimate_tokens(summary) <= 1200
+        assert estimate_tokens(summary) < estimate_tokens(verbose_summary(analyses))
+        assert evidence_ok(summary, questions, analyses)
+
+    @pytest.mark.unit
+    def test_tight_budget_drops_answers_first(self):
+        """预算紧张时先去掉答案和逐题行，错题题号仍保留"""
+        questions, analyses = make_paper(40, wrong_rate=0.3, seed=1)
+        summary = DiagnosticPromptCompactor(token_budget=150).build_summary(analyses, questions)
+
+        assert "答=" not in summary
+        assert estimate_tokens(summary) <= 150
+        wrong_ids = {qa.question_id for qa in analyses if not qa.is_correct}
+        assert wrong_ids <= expand_ids(summary)
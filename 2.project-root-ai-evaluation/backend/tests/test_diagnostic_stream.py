@@ -0,0 +1,243 @@
+"""
+流式诊断测试
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from hypothesis import given, strategies as st, settings
+from prometheus_client import REGISTRY
+
+from app.core.http_client import HTTPClientRegistry
+from app.schemas.analysis import OverallStats
+from app.schemas.diagnostic import DiagnosticReport
+from app.services import deepseek_service as deepseek_module
+from app.services.deepseek_service import DeepSeekService
+from app.services.json_stream import IncrementalJSONParser
+from app.services.llm_limiter import LLMRateLimiter
+
+REPORT = {
+    "capability_dimensions": {
+        "comprehension": 0.7, "application": 0.6, "analysis": 0.5, "synthesis": 0.4, "evaluation": 0.8
+    },
+    "surface_issues": [
+        {"issue": "计算粗心", "severity": "medium", "evidence": ["Q3"], "ai_addressable": True}
+    ],
+    "deep_issues": [
+        {"issue": "函数概念不清", "severity": "high", "evidence": ["Q5"], "root_cause": "定义域理解错误"}
+    ],
+    "target_school_gap": None,
+}
+
+JSON_VALUES = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.floats(allow_nan=False, allow_infinity=False)
+    | st.text(alphabet='ab"\\{}[],: 中文\n', max_size=8),
+    lambda children: st.lists(children, max_size=3)
+    | st.dictionaries(st.text(alphabet='ab"{}', max_size=4), children, max_size=3),
+    max_leaves=8,
+)
+
+
+def split_text(text: str, cuts) -> list:
+    """按给定位置切分文本"""
+    bounds = sorted({c % (len(text) + 1) for c in cuts})
+    pieces, start = [], 0
+    for bound in bounds + [len(text)]:
+        pieces.append(text[start:bound])
+        start = bound
+    return pieces
+
+
+def sse_body(text: str, piece_size: int = 7) -> bytes:
+    """把文本切成若干段，构造 chat/completions 流式响应体"""
+    lines = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": text[i:i + piece_size]}}]}, ensure_ascii=False)
+        for i in range(0, len(text), piece_size)
+    ]
+    return ("\n\n".join(lines + ["data: [DONE]"]) + "\n\n").encode("utf-8")
+
+
+def diagnose_kwargs() -> dict:
+    """diagnose_exam 的最小参数"""
+    return {
+        "exam_id": "E1",
+        "subject": "数学",
+        "grade": "初二",
+        "total_score": 100,
+        "student_score": 72,
+        "question_analyses": [],
+        "overall_stats": OverallStats(
+            total_questions=10, correct_count=7, objective_accuracy=0.8,
+            subjective_accuracy=0.6, pending_review_count=0
+        ),
+    }
+
+
+@pytest.fixture
+async def service(monkeypatch):
+    """使用本地限流器和干净客户端注册表的服务"""
+    HTTPClientRegistry.reset()
+    monkeypatch.setattr(
+        deepseek_module, "deepseek_limiter", LLMRateLimiter("deepseek", backend="local")
+    )
+    instance = DeepSeekService()
+    instance.retry_delays = [0.0, 0.0, 0.0]
+    yield instance
+    await HTTPClientRegistry.close()
+
+
+def use_transport(handler):
+    """让 deepseek 共享客户端走 MockTransport"""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    HTTPClientRegistry._clients["deepseek"] = (client, asyncio.get_running_loop())
+
+
+class TestIncrementalJSONParser:
+    """测试增量 JSON 解析"""
+
+    @pytest.mark.property
+    @given(
+        obj=st.dictionaries(st.text(alphabet='ab"\\中 ', max_size=5), JSON_VALUES, max_size=5),
+        cuts=st.lists(st.integers(min_value=0, max_value=500), max_size=20),
+        prefix=st.sampled_from(["", "```json\n", "好的：\n"])
+    )
+    @settings(max_examples=200)
+    def test_any_chunking_matches_json_loads(self, obj, cuts, prefix):
+        """任意切分输入，得到的成员与 json.loads 一致且按原顺序"""
+        text = prefix + json.dumps(obj, ensure_ascii=False, indent=1) + "\n```"
+        parser = IncrementalJSONParser()
+        members = []
+        for piece in split_text(text, cuts):
+            members.extend(parser.feed(piece))
+
+        assert members == list(obj.items())
+        assert parser.done
+
+    @pytest.mark.unit
+    def test_member_emitted_before_object_closes(self):
+        """数组成员在闭合括号处即返回，标量成员在逗号处返回"""
+        parser = IncrementalJSONParser()
+
+        assert parser.feed('{"a": [1, {"b": "}"}]') == [("a", [1, {"b": "}"}])]
+        assert parser.feed(', "c": 0.5') == []
+        assert parser.feed(',') == [("c", 0.5)]
+        assert not parser.done
+
+
+class TestStreamAPI:
+    """测试 _stream_api"""
+
+    @pytest.mark.unit
+    async def test_yields_delta_content(self, service):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, content=sse_body("你好，世界", piece_size=2))
+
+        use_transport(handler)
+        pieces = [p async for p in service._stream_api([{"role": "user", "content": "hi"}])]
+
+        assert "".join(pieces) == "你好，世界"
+        assert len(pieces) == 3
+        assert requests[0]["stream"] is True
+
+    @pytest.mark.unit
+    async def test_retries_before_first_chunk(self, service):
+        """首段文本之前的错误会重试"""
+        responses = [httpx.Response(503), httpx.Response(200, content=sse_body("ok"))]
+        use_transport(lambda request: responses.pop(0))
+
+        assert [p async for p in service._stream_api([{"role": "user", "content": "hi"}])] == ["ok"]
+        assert not responses
+
+
+def stream_count(stage: str) -> float:
+    """流式诊断耗时直方图中某一阶段的样本数"""
+    return REGISTRY.get_sample_value("diagnostic_stream_latency_seconds_count", {"stage": stage}) or 0.0
+
+
+class TestDiagnoseExamStream:
+    """测试流式诊断"""
+
+    @pytest.mark.unit
+    async def test_sections_in_order_then_report(self, service):
+        use_transport(lambda request: httpx.Response(
+            200, content=sse_body(json.dumps(REPORT, ensure_ascii=False))
+        ))
+
+        events = [event async for event in service.diagnose_exam_stream(**diagnose_kwargs())]
+
+        assert [name for name, _ in events] == [
+            "capability_dimensions", "surface_issues", "deep_issues", "report"
+        ]
+        report = events[-1][1]
+        assert isinstance(report, DiagnosticReport)
+        assert report.capability_dimensions.evaluation == 0.8
+        assert report.deep_issues[0].root_cause == "定义域理解错误"
+        assert report.surface_issues[0].root_cause is None
+
+    @pytest.mark.unit
+    async def test_diagnose_exam_calls_on_section(self, service):
+        """diagnose_exam 每完成一个部分调用一次回调，并返回完整报告"""
+        use_transport(lambda request: httpx.Response(
+            200, content=sse_body(json.dumps(REPORT, ensure_ascii=False))
+        ))
+        seen = []
+
+        async def on_section(name, value):
+            seen.append(name)
+
+        report = await service.diagnose_exam(**diagnose_kwargs(), on_section=on_section)
+
+        assert seen == ["capability_dimensions", "surface_issues", "deep_issues"]
+        assert report.surface_issues[0].issue == "计算粗心"
+
+    @pytest.mark.unit
+    async def test_mid_stream_failure_keeps_received_sections(self, service, monkeypatch):
+        """中途断流时保留已收到的部分，其余部分取默认值"""
+        text = json.dumps(REPORT, ensure_ascii=False)
+        partial = text[:text.index('"deep_issues"') + 5]
+
+        async def broken_stream(*args, **kwargs):
+            yield partial
+            raise httpx.ReadError("connection reset")
+
+        monkeypatch.setattr(service, "_stream_api", broken_stream)
+        before = {stage: stream_count(stage) for stage in ("complete", "partial")}
+        events = [event async for event in service.diagnose_exam_stream(**diagnose_kwargs())]
+        report = events[-1][1]
+
+        assert [name for name, _ in events] == ["capability_dimensions", "surface_issues", "report"]
+        assert report.capability_dimensions.comprehension == 0.7
+        assert report.deep_issues == []
+        # 不完整的报告不计入完成耗时
+        assert stream_count("partial") == before["partial"] + 1
+        assert stream_count("complete") == before["complete"]
+
+    @pytest.mark.unit
+    async def test_truncated_stream_recorded_as_partial(self, service, monkeypatch):
+        """输出未闭合就结束（如被截断）时同样按提前结束记录"""
+        text = json.dumps(REPORT, ensure_ascii=False)
+
+        async def truncated_stream(*args, **kwargs):
+            yield text[:text.index('"deep_issues"') + 5]
+
+        monkeypatch.setattr(service, "_stream_api", truncated_stream)
+        before = stream_count("partial")
+        events = [event async for event in service.diagnose_exam_stream(**diagnose_kwargs())]
+
+        assert [name for name, _ in events] == ["capability_dimensions", "surface_issues", "report"]
+        assert stream_count("partial") == before + 1
+
+    @pytest.mark.unit
+    async def test_failure_before_any_section_returns_default(self, service, monkeypatch):
+        async def failed_stream(*args, **kwargs):
+            raise Exception("down")
+            yield
+
+        monkeypatch.setattr(service, "_stream_api", failed_stream)
+        events = [event async for event in service.diagnose_exam_stream(**diagnose_kwargs())]
+
+        assert [name for name, _ in events] == ["report"]
+        assert events[0][1].exam_id == "E1"
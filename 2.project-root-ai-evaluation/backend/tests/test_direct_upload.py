@@ -0,0 +1,220 @@
+"""
+预签名直传测试（申请 → 直传 → 完成）
+"""
+import hashlib
+import io
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+
+from app.api.dependencies import get_current_user
+from app.core.database import get_db
+from app.services.direct_upload import DirectUploadService
+from app.services.storage import set_storage
+from app.services.storage.s3 import S3StorageBackend
+from scripts.s3_standin import S3StandIn
+
+
+def jpeg_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 100), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class FakeSession:
+    """只记录新增试卷的数据库会话"""
+
+    def __init__(self):
+        self.exams = {}
+
+    async def execute(self, statement):
+        # 只支持按主键查询；去重查询（组合条件）视为没有重复试卷
+        where = statement.whereclause
+        exam = self.exams.get(where.right.value) if hasattr(where, "right") else None
+        return SimpleNamespace(scalar_one_or_none=lambda: exam)
+
+    def add(self, exam):
+        self.exams[exam.exam_id] = exam
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, exam):
+        pass
+
+
+@pytest.fixture
+def user():
+    return SimpleNamespace(user_id=uuid.uuid4())
+
+
+@pytest.fixture
+def db():
+    return FakeSession()
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        "app.tasks.exam_tasks.enqueue_exam_processing",
+        lambda exam_id, preprocess_profile=None: calls.append((exam_id, preprocess_profile))
+    )
+    return calls
+
+
+@pytest.fixture
+async def client(user, db):
+    from main import app
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def presign(client, content: bytes, filename: str = "exam.jpg", **extra) -> dict:
+    response = await client.post("/api/v1/exams/upload/presign", json={
+        "filename": filename, "size": len(content), "sha256": hashlib.sha256(content).hexdigest(), **extra
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+class TestDirectUploadFlow:
+    """测试本地存储下的完整直传流程"""
+
+    @pytest.mark.unit
+    async def test_presign_put_finalize(self, client, db, enqueued, local_storage):
+        content = jpeg_bytes()
+        ticket = await presign(client, content, preprocess_profile="fast")
+
+        put = await client.put(ticket["upload_url"], content=content, headers=ticket["headers"])
+        assert put.status_code == 200
+
+        response = await client.post("/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]})
+        assert response.status_code == 200
+        assert response.json()["exam_id"] == ticket["exam_id"]
+
+        exam = db.exams[uuid.UUID(ticket["exam_id"])]
+        assert exam.original_image_url.startswith(f"/uploads/{ticket['exam_id']}_original_")
+        assert await local_storage.get(local_storage.key_from_url(exam.original_image_url)) == content
+        assert enqueued == [(ticket["exam_id"], "fast")]
+
+        # 重复完成返回同一试卷，不重复入队
+        again = await client.post("/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]})
+        assert again.json()["exam_id"] == ticket["exam_id"]
+        assert len(enqueued) == 1
+
+    @pytest.mark.unit
+    async def test_put_with_other_content_rejected(self, client):
+        ticket = await presign(client, jpeg_bytes())
+
+        response = await client.put(ticket["upload_url"], content=b"x" * 10, headers=ticket["headers"])
+
+        assert response.status_code == 400
+
+    @pytest.mark.unit
+    async def test_put_with_tampered_url_rejected(self, client):
+        content = jpeg_bytes()
+        ticket = await presign(client, content)
+
+        response = await client.put(
+            ticket["upload_url"].replace("_original_", "_processed_"), content=content, headers=ticket["headers"]
+        )
+
+        assert response.status_code == 403
+
+    @pytest.mark.unit
+    async def test_finalize_before_upload_rejected(self, client, db):
+        ticket = await presign(client, jpeg_bytes())
+
+        response = await client.post("/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]})
+
+        assert response.status_code == 400
+        assert "not found" in response.json()["detail"]
+        assert db.exams == {}
+
+    @pytest.mark.unit
+    async def test_finalize_by_other_user_rejected(self, client, user):
+        ticket = await presign(client, jpeg_bytes())
+        user.user_id = uuid.uuid4()
+
+        response = await client.post("/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]})
+
+        assert response.status_code == 403
+
+    @pytest.mark.unit
+    async def test_non_image_rejected_and_deleted(self, client, db, local_storage):
+        content = b"This is not an image"
+        ticket = await presign(client, content)
+        await client.put(ticket["upload_url"], content=content, headers=ticket["headers"])
+
+        response = await client.post("/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]})
+
+        assert response.status_code == 400
+        assert "invalid" in response.json()["detail"].lower()
+        assert db.exams == {}
+        assert not await local_storage.exists(DirectUploadService.parse_token(ticket["upload_token"]).key)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("body", [
+        {"filename": "exam.jpg", "size": 11 * 1024 * 1024},
+        {"filename": "exam.gif", "size": 100},
+        {"filename": "exam.jpg", "size": 100, "preprocess_profile": "ultra"},
+    ])
+    async def test_presign_validation(self, client, body):
+        response = await client.post(
+            "/api/v1/exams/upload/presign", json={**body, "sha256": hashlib.sha256(b"").hexdigest()}
+        )
+
+        assert response.status_code == 400
+
+    @pytest.mark.unit
+    async def test_login_token_not_accepted_as_upload_token(self, client):
+        from app.services.auth_service import AuthService
+
+        response = await client.post(
+            "/api/v1/exams/upload/finalize", json={"upload_token": AuthService.generate_jwt(str(uuid.uuid4()))}
+        )
+
+        assert response.status_code == 400
+
+
+class TestS3DirectUpload:
+    """测试 S3 兼容存储下的直传校验"""
+
+    @pytest.fixture
+    async def s3(self, tmp_path, local_storage):
+        standin = S3StandIn(str(tmp_path / "s3"), "standin", "standin-secret", "oss-cn-hangzhou")
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=standin.app))
+        storage = S3StorageBackend(
+            endpoint="http://s3.test", bucket="exams", access_key_id="standin",
+            access_key_secret="standin-secret", region="oss-cn-hangzhou", path_style=True, public_url="",
+            client=client
+        )
+        set_storage(storage)
+        yield client
+        set_storage(local_storage)
+        await client.aclose()
+
+    @pytest.mark.unit
+    async def test_verified_from_metadata_without_download(self, s3, monkeypatch):
+        content = jpeg_bytes()
+        ticket, presigned, _ = DirectUploadService.create_ticket(
+            "user-1", "exam.jpg", len(content), hashlib.sha256(content).hexdigest()
+        )
+        put = await s3.put(presigned.url, content=content, headers=presigned.headers)
+        assert put.status_code == 200
+
+        async def no_download(key):
+            raise AssertionError("object should not be downloaded")
+        monkeypatch.setattr(DirectUploadService, "_hash_object", no_download)
+
+        url = await DirectUploadService.verify_object(ticket)
+
+        assert url == f"http://s3.test/exams/{ticket.key}"
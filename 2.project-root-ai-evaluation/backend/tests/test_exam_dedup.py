@@ -0,0 +1,387 @@
+"""
+上传去重测试（SHA-256 精确匹配 + dHash 近似匹配 + 跨用户复制结果）
+"""
+import hashlib
+import io
+import json
+import operator
+import random
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from PIL import Image, ImageDraw
+from sqlalchemy.sql import operators
+
+from app.api.dependencies import get_current_user
+from app.core.config import settings
+from app.core.database import get_db
+from app.services.cache_service import CacheService
+from app.models.exam import Exam, ExamStatus
+from app.services.direct_upload import DirectUploadService
+from app.services.exam_dedup import (
+    ImageFingerprint, copy_results, exam_deduplicator, hamming_distance, image_dhash
+)
+
+
+def page(seed: int, size=(1600, 1200), quality: int = 90) -> bytes:
+    """合成试卷照片：随机位置的文本行和方框"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (235, 235, 230))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(0, size[0] - 300), rng.randrange(0, size[1] - 40)
+        draw.rectangle((x, y, x + rng.randrange(80, 300), y + rng.randrange(8, 40)), fill=(30, 30, 30))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def reencode(content: bytes, scale: float = 0.5, quality: int = 60) -> bytes:
+    """模拟客户端重新压缩、缩小后的副本"""
+    image = Image.open(io.BytesIO(content))
+    image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# 内存数据库会话：按 SQLAlchemy 语句的 where / order_by / limit 过滤试卷
+# ---------------------------------------------------------------------------
+
+OPERATORS = {
+    operator.eq: operator.eq, operator.ne: operator.ne, operator.ge: operator.ge,
+    operator.gt: operator.gt, operator.le: operator.le, operator.lt: operator.lt,
+    operators.is_: operator.is_, operators.is_not: operator.is_not,
+    operators.in_op: lambda value, options: value in options,
+    operators.not_in_op: lambda value, options: value not in options,
+}
+LITERALS = {"False_": False, "True_": True, "Null": None}
+
+
+def matches(exam, criterion) -> bool:
+    value = getattr(exam, criterion.left.key)
+    right = criterion.right
+    expected = LITERALS[type(right).__name__] if type(right).__name__ in LITERALS else right.value
+    return OPERATORS[criterion.operator](value, expected)
+
+
+class MemorySession:
+    """只在内存中保存试卷的数据库会话"""
+
+    def __init__(self):
+        self.exams = {}
+
+    async def execute(self, statement):
+        where = statement.whereclause
+        criteria = where.clauses if hasattr(where, "clauses") else [where]
+        rows = [exam for exam in self.exams.values() if all(matches(exam, c) for c in criteria)]
+        for clause in reversed(statement._order_by_clauses):
+            rows.sort(
+                key=lambda exam: getattr(exam, clause.element.key) or datetime.min,
+                reverse=clause.modifier is operators.desc_op
+            )
+        if statement._limit is not None:
+            rows = rows[:statement._limit]
+        return SimpleNamespace(
+            scalar_one_or_none=lambda: rows[0] if rows else None,
+            scalars=lambda: SimpleNamespace(all=lambda: rows)
+        )
+
+    def add(self, exam):
+        exam.exam_id = exam.exam_id or uuid.uuid4()
+        exam.created_at = exam.created_at or datetime.utcnow()
+        exam.status = exam.status or ExamStatus.UPLOADED
+        exam.is_deleted = bool(exam.is_deleted)
+        self.exams[exam.exam_id] = exam
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, exam):
+        pass
+
+    def seed(self, user_id, content: bytes, **fields) -> Exam:
+        """添加一份已上传的试卷"""
+        exam = Exam(
+            user_id=user_id, original_image_url="/uploads/seed.jpg",
+            content_sha256=hashlib.sha256(content).hexdigest(), image_dhash=image_dhash(content), **fields
+        )
+        self.add(exam)
+        return exam
+
+
+def fingerprint_of(content: bytes) -> ImageFingerprint:
+    return ImageFingerprint(hashlib.sha256(content).hexdigest(), image_dhash(content))
+
+
+class TestImageHash:
+    """测试 dHash"""
+
+    @pytest.mark.unit
+    def test_reencoded_copy_is_near(self):
+        original = page(1)
+
+        assert image_dhash(original) == image_dhash(page(1))
+        assert hamming_distance(image_dhash(original), image_dhash(reencode(original))) <= 2
+
+    @pytest.mark.unit
+    def test_different_pages_are_far(self):
+        hashes = [image_dhash(page(seed)) for seed in range(6)]
+
+        distances = [hamming_distance(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+        assert min(distances) > settings.EXAM_DEDUP_MAX_DISTANCE
+
+    @pytest.mark.unit
+    def test_hamming_distance(self):
+        assert hamming_distance("0000000000000000", "0000000000000000") == 0
+        assert hamming_distance("ffffffffffffffff", "0000000000000000") == 64
+        assert hamming_distance("0000000000000003", "0000000000000001") == 1
+
+
+class TestExamDeduplicator:
+    """测试重复试卷查找"""
+
+    @pytest.fixture
+    def db(self):
+        return MemorySession()
+
+    @pytest.mark.unit
+    async def test_same_user_exact_and_near(self, db):
+        user_id = uuid.uuid4()
+        content = page(1)
+        existing = db.seed(user_id, content)
+
+        exact = await exam_deduplicator.lookup(db, user_id, fingerprint_of(content))
+        near = await exam_deduplicator.lookup(db, user_id, fingerprint_of(reencode(content)))
+        other_page = await exam_deduplicator.lookup(db, user_id, fingerprint_of(page(2)))
+
+        assert (exact.exam, exact.result) == (existing, "exact")
+        assert (near.exam, near.result) == (existing, "near")
+        assert other_page is None
+
+    @pytest.mark.unit
+    async def test_near_match_limited_to_recent_uploads(self, db):
+        user_id = uuid.uuid4()
+        content = page(1)
+        db.seed(user_id, content, created_at=datetime.utcnow() - timedelta(days=30))
+
+        assert await exam_deduplicator.lookup(db, user_id, fingerprint_of(reencode(content))) is None
+        assert (await exam_deduplicator.lookup(db, user_id, fingerprint_of(content))).result == "exact"
+
+    @pytest.mark.unit
+    async def test_failed_and_deleted_exams_ignored(self, db):
+        user_id = uuid.uuid4()
+        content = page(1)
+        db.seed(user_id, content, status=ExamStatus.OCR_FAILED)
+        db.seed(user_id, content, is_deleted=True)
+
+        assert await exam_deduplicator.lookup(db, user_id, fingerprint_of(content)) is None
+
+    @pytest.mark.unit
+    async def test_other_users_only_exact_and_completed(self, db):
+        content = page(1)
+        db.seed(uuid.uuid4(), content, status=ExamStatus.OCR_PROCESSING)
+        me = uuid.uuid4()
+
+        assert await exam_deduplicator.lookup(db, me, fingerprint_of(content)) is None
+
+        completed = db.seed(uuid.uuid4(), content, status=ExamStatus.COMPLETED, completed_at=datetime.utcnow())
+        clone = await exam_deduplicator.lookup(db, me, fingerprint_of(content))
+        near = await exam_deduplicator.lookup(db, me, fingerprint_of(reencode(content)))
+
+        assert (clone.exam, clone.result, clone.is_clone) == (completed, "cloned", True)
+        assert near is None
+
+    @pytest.mark.unit
+    async def test_disabled(self, db, monkeypatch):
+        user_id = uuid.uuid4()
+        content = page(1)
+        db.seed(user_id, content, status=ExamStatus.COMPLETED)
+
+        monkeypatch.setattr(settings, "EXAM_DEDUP_CLONE_GLOBAL", False)
+        assert await exam_deduplicator.lookup(db, uuid.uuid4(), fingerprint_of(content)) is None
+
+        monkeypatch.setattr(settings, "EXAM_DEDUP_ENABLED", False)
+        assert await exam_deduplicator.lookup(db, user_id, fingerprint_of(content)) is None
+
+    @pytest.mark.unit
+    def test_copy_results(self):
+        source = Exam(
+            exam_id=uuid.uuid4(), status=ExamStatus.COMPLETED, subject="math", ocr_result={"text": "x"},
+            report_id=uuid.uuid4(), llm_usage={"calls": 3}, image_derivatives={"thumbnail": "/uploads/t.webp"}
+        )
+        target = Exam(exam_id=uuid.uuid4(), status=ExamStatus.UPLOADED)
+
+        copy_results(source, target)
+
+        assert target.status == ExamStatus.COMPLETED
+        assert target.completed_at is not None
+        assert (target.subject, target.ocr_result) == ("math", {"text": "x"})
+        assert target.ocr_result is not source.ocr_result
+        assert target.image_derivatives == source.image_derivatives
+        assert target.report_id is None  # 报告按原试卷渲染，不共用
+        assert target.llm_usage is None  # 复制的试卷没有产生 LLM 调用
+
+    @pytest.mark.unit
+    def test_copy_results_rewrites_exam_id(self):
+        source_id = uuid.uuid4()
+        source = Exam(
+            exam_id=source_id, status=ExamStatus.COMPLETED,
+            diagnostic_report={"exam_id": str(source_id), "surface_issues": [{"description": "计算错误"}]}
+        )
+        target = Exam(exam_id=uuid.uuid4(), status=ExamStatus.UPLOADED)
+
+        copy_results(source, target)
+
+        assert target.diagnostic_report["exam_id"] == str(target.exam_id)
+        assert target.diagnostic_report["surface_issues"] == source.diagnostic_report["surface_issues"]
+        assert source.diagnostic_report["exam_id"] == str(source_id)
+
+
+class TestUploadDedup:
+    """测试上传接口的去重"""
+
+    @pytest.fixture
+    def db(self):
+        return MemorySession()
+
+    @pytest.fixture
+    def user(self):
+        return SimpleNamespace(user_id=uuid.uuid4())
+
+    @pytest.fixture
+    def enqueued(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            "app.tasks.exam_tasks.enqueue_exam_processing",
+            lambda exam_id, preprocess_profile=None: calls.append(exam_id)
+        )
+        return calls
+
+    @pytest.fixture
+    async def client(self, user, db, local_storage):
+        from main import app
+        app.dependency_overrides[get_current_user] = lambda: user
+        app.dependency_overrides[get_db] = lambda: db
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            yield ac
+        app.dependency_overrides.clear()
+
+    @staticmethod
+    async def upload(client, content: bytes) -> dict:
+        response = await client.post(
+            "/api/v1/exams/upload", files={"file": ("exam.jpg", content, "image/jpeg")}
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    @pytest.mark.unit
+    async def test_retry_returns_existing_exam(self, client, db, enqueued):
+        content = page(1)
+
+        first = await self.upload(client, content)
+        retry = await self.upload(client, content)
+        recompressed = await self.upload(client, reencode(content))
+
+        assert first["deduplicated"] is False
+        assert retry["exam_id"] == recompressed["exam_id"] == first["exam_id"]
+        assert retry["deduplicated"] and recompressed["deduplicated"]
+        assert len(db.exams) == 1
+        assert enqueued == [first["exam_id"]]
+
+    @pytest.mark.unit
+    async def test_other_users_completed_results_cloned(self, client, db, user, enqueued):
+        content = page(1)
+        source = db.seed(
+            uuid.uuid4(), content, status=ExamStatus.COMPLETED, completed_at=datetime.utcnow(),
+            ocr_result={"text": "1. x=2"}, report_id=uuid.uuid4()
+        )
+        source.diagnostic_report = {"exam_id": str(source.exam_id), "summary": "ok"}
+
+        response = await self.upload(client, content)
+
+        exam = db.exams[uuid.UUID(response["exam_id"])]
+        assert exam.exam_id != source.exam_id
+        assert exam.user_id == user.user_id
+        assert response["status"] == "completed" and response["deduplicated"]
+        assert exam.ocr_result == source.ocr_result
+        assert exam.diagnostic_report == {"exam_id": str(exam.exam_id), "summary": "ok"}
+        assert exam.report_id is None
+        # 新试卷不含原试卷的任何引用
+        columns = {prop.key: getattr(exam, prop.key) for prop in Exam.__mapper__.column_attrs}
+        assert str(source.exam_id) not in json.dumps(columns, default=str)
+        assert str(source.report_id) not in json.dumps(columns, default=str)
+        assert exam.original_image_url.startswith(f"/uploads/{exam.exam_id}_original_")
+        assert enqueued == []
+
+    @pytest.fixture
+    def duplicate_records(self, monkeypatch):
+        """用内存字典替代 Redis 中的直传去重记录"""
+        records = {}
+
+        async def get_record(upload_exam_id):
+            return records.get(upload_exam_id)
+
+        async def set_record(upload_exam_id, exam_id):
+            records[upload_exam_id] = exam_id
+
+        monkeypatch.setattr(CacheService, "get_direct_upload_duplicate", get_record)
+        monkeypatch.setattr(CacheService, "set_direct_upload_duplicate", set_record)
+        return records
+
+    @staticmethod
+    async def direct_upload(client, content: bytes, declared: bytes = None) -> dict:
+        """申请直传凭证并上传（declared 为客户端声明哈希所对应的内容）"""
+        declared = declared or content
+        ticket = (await client.post("/api/v1/exams/upload/presign", json={
+            "filename": "exam.jpg", "size": len(declared), "sha256": hashlib.sha256(declared).hexdigest()
+        })).json()
+        await client.put(ticket["upload_url"], content=content, headers=ticket["headers"])
+        return ticket
+
+    @pytest.mark.unit
+    async def test_direct_upload_duplicate_returns_existing_exam(
+        self, client, db, enqueued, local_storage, duplicate_records
+    ):
+        content = page(1)
+        first = await self.upload(client, content)
+
+        ticket = await self.direct_upload(client, content)
+        key = DirectUploadService.parse_token(ticket["upload_token"]).key
+
+        for _ in range(2):  # 重复完成同样返回已有试卷
+            response = await client.post(
+                "/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]}
+            )
+            assert response.json()["exam_id"] == first["exam_id"]
+            assert response.json()["deduplicated"] is True
+
+        assert not await local_storage.exists(key)
+        assert len(db.exams) == 1
+        assert enqueued == [first["exam_id"]]
+
+    @pytest.mark.unit
+    async def test_direct_upload_declared_hash_not_trusted(
+        self, client, db, enqueued, local_storage, duplicate_records
+    ):
+        """声明的 SHA-256 与已有试卷相同、上传内容却不同时，不返回已有试卷"""
+        content = page(1)
+        await self.upload(client, content)
+        different = content[:-3] + bytes(b ^ 0xFF for b in content[-3:])
+
+        ticket = await self.direct_upload(client, different, declared=content)
+        # 绕过上传地址的校验，直接写入存储（模拟存储端未核对校验值）
+        await local_storage.put(DirectUploadService.parse_token(ticket["upload_token"]).key, different, "image/jpeg")
+        response = await client.post("/api/v1/exams/upload/finalize", json={"upload_token": ticket["upload_token"]})
+
+        assert response.status_code == 400
+        assert "SHA-256" in response.json()["detail"]
+        assert len(db.exams) == 1
+        assert duplicate_records == {}
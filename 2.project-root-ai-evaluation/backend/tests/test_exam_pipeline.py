@@ -0,0 +1,194 @@
+"""
+试卷处理流水线测试（express 模式与分阶段模式共享的阶段实现）
+"""
+import pytest
+from uuid import UUID, uuid4
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app.models.exam import ExamStatus
+from app.schemas.ocr import OCRResult, TextRegion, BoundingBox
+from app.services.deepseek_service import deepseek_service
+from app.services.exam_pipeline import exam_pipeline
+from app.services.parser_service import ParserService
+from app.tasks import exam_tasks
+
+
+def build_ocr_result() -> OCRResult:
+    """构造一份简单试卷的 OCR 结果"""
+    lines = [
+        "2024学年期末考试 数学试卷",
+        "年级：高一 总分：100分",
+        "1. 已知集合A={1,2}，B={2,3}，则A∩B=（ ）(5分)",
+        "A. {1} B. {2} C. {3} D. ∅",
+        "2. 函数f(x)=x²的最小值为______(5分)",
+    ]
+    regions = [
+        TextRegion(
+            text=line,
+            bbox=BoundingBox(x=50, y=100 + i * 40, width=800, height=30),
+            confidence=0.95,
+            type="printed"
+        )
+        for i, line in enumerate(lines)
+    ]
+    return OCRResult(
+        text_regions=regions,
+        overall_confidence=0.95,
+        processing_time=0.1,
+        provider="mock"
+    )
+
+
+class TestExamPipelineSerialization:
+    """测试阶段结果与数据库 JSON 之间的转换"""
+
+    @pytest.mark.unit
+    def test_parsed_and_analysis_round_trip(self):
+        """解析结果和分析结果序列化后应能无损还原"""
+        ocr_result = build_ocr_result()
+        parsed_exam = exam_pipeline.load_parsed(
+            "exam-1",
+            exam_pipeline.dump_parsed(ParserService.parse_exam(ocr_result))
+        )
+        assert parsed_exam.exam_id == "exam-1"
+
+        analyses, stats = exam_pipeline.run_analysis(parsed_exam, ocr_result)
+        loaded_analyses, loaded_stats = exam_pipeline.load_analysis(
+            exam_pipeline.dump_analysis(analyses, stats)
+        )
+
+        assert loaded_analyses == analyses
+        assert loaded_stats == stats
+
+
+class TestExpressMode:
+    """测试 express 模式串联执行"""
+
+    @pytest.mark.unit
+    async def test_express_runs_all_stages_in_memory(self):
+        """express 模式应只加载一次试卷，并按顺序写入各阶段状态"""
+        exam_uuid = uuid4()
+        exam = SimpleNamespace(
+            processed_image_url=None,
+            image_derivatives=None,
+            original_image_url="/uploads/a.jpg",
+            handwriting_metrics=None,
+            llm_usage=None
+        )
+        statuses = []
+
+        async def record_status(_, status, **kwargs):
+            statuses.append((status, set(kwargs)))
+
+        default_report = deepseek_service._build_default_diagnostic_report(str(exam_uuid))
+
+        with patch.object(exam_tasks, "get_exam", AsyncMock(return_value=exam)) as get_exam, \
+                patch.object(exam_tasks, "update_exam_status", side_effect=record_status), \
+                patch.object(exam_tasks, "_run_derivatives", AsyncMock(return_value={"ocr": "/uploads/o.jpg"})), \
+                patch.object(exam_pipeline, "run_ocr", AsyncMock(return_value=build_ocr_result())) as run_ocr, \
+                patch.object(exam_pipeline, "run_diagnostic", AsyncMock(return_value=default_report)), \
+                patch.object(deepseek_service, "api_key", ""):
+            report_result = await exam_tasks._run_express(exam_uuid)
+
+        assert get_exam.await_count == 1
+        assert run_ocr.await_args.args[0] == "/uploads/o.jpg"
+        assert [s for s, _ in statuses] == [
+            ExamStatus.OCR_PROCESSING,
+            ExamStatus.PARSING,
+            ExamStatus.PARSED,
+            ExamStatus.DIAGNOSING,
+            ExamStatus.REPORT_GENERATING,
+            ExamStatus.COMPLETED,
+        ]
+        assert "ocr_result" in statuses[1][1]
+        assert "parsed_result" in statuses[2][1]
+        assert "analysis_result" in statuses[3][1]
+        assert "diagnostic_report" in statuses[4][1]
+        assert "llm_usage" in statuses[2][1] and "llm_usage" in statuses[4][1]
+        assert {"report_id", "completed_at"} <= statuses[5][1]
+        assert report_result["report_id"]
+
+    @pytest.mark.unit
+    async def test_express_stage_failure_carries_status(self):
+        """阶段失败时应抛出带有对应失败状态的异常"""
+        exam = SimpleNamespace(
+            processed_image_url=None,
+            image_derivatives=None,
+            original_image_url="/uploads/a.jpg",
+            handwriting_metrics=None,
+            llm_usage=None
+        )
+
+        with patch.object(exam_tasks, "get_exam", AsyncMock(return_value=exam)), \
+                patch.object(exam_tasks, "update_exam_status", AsyncMock()), \
+                patch.object(exam_tasks, "_run_derivatives", AsyncMock(return_value={"ocr": "/uploads/o.jpg"})), \
+                patch.object(exam_pipeline, "run_ocr", AsyncMock(side_effect=RuntimeError("timeout"))):
+            with pytest.raises(exam_tasks.ExpressStageError) as exc_info:
+                await exam_tasks._run_express(uuid4())
+
+        assert exc_info.value.failed_status == ExamStatus.OCR_FAILED
+
+    @pytest.mark.unit
+    def test_express_unexpected_error_marks_exam_failed(self):
+        """阶段之外的异常（如加载试卷失败）同样记录失败状态"""
+        exam_id = str(uuid4())
+        update = AsyncMock()
+
+        with patch.object(exam_tasks, "get_exam", AsyncMock(side_effect=RuntimeError("db down"))), \
+                patch.object(exam_tasks, "update_exam_status", update):
+            with pytest.raises(RuntimeError):
+                exam_tasks.process_exam_express(exam_id)
+
+        update.assert_awaited_once_with(UUID(exam_id), ExamStatus.FAILED, error_message="db down")
+
+    @pytest.mark.unit
+    def test_enqueue_respects_mode(self):
+        """批量上传应走分阶段任务链，单份上传走 express"""
+        with patch.object(exam_tasks.process_exam_express, "delay") as express, \
+                patch.object(exam_tasks.process_exam_ocr, "delay") as staged, \
+                patch.object(exam_tasks.generate_exam_derivatives, "delay") as derivatives:
+            exam_tasks.enqueue_exam_processing("e1", express=True)
+            exam_tasks.enqueue_exam_processing("e2", express=False)
+
+        express.assert_called_once_with("e1")
+        staged.assert_called_once_with("e2")
+        derivatives.assert_not_called()  # 派生图由 OCR 阶段生成
+
+    @pytest.mark.unit
+    async def test_ocr_always_reads_ocr_derivative(self):
+        """OCR 阶段先生成 OCR 灰度派生图再读取它；已生成时直接使用"""
+        pending = SimpleNamespace(
+            processed_image_url=None, image_derivatives=None, original_image_url="/uploads/a.jpg"
+        )
+        ready = SimpleNamespace(
+            processed_image_url=None, image_derivatives={"ocr": "/uploads/ready.jpg"},
+            original_image_url="/uploads/b.jpg"
+        )
+        generate = AsyncMock(return_value={"thumbnail": "/uploads/t.webp", "ocr": "/uploads/o.jpg"})
+
+        with patch.object(exam_tasks, "_run_derivatives", generate):
+            first = await exam_tasks._prepare_ocr_image(uuid4(), pending)
+            second = await exam_tasks._prepare_ocr_image(uuid4(), ready)
+
+        assert (first, second) == ("/uploads/o.jpg", "/uploads/ready.jpg")
+        assert generate.await_count == 1
+        assert pending.image_derivatives["thumbnail"] == "/uploads/t.webp"
+
+    @pytest.mark.unit
+    async def test_derivative_failure_fails_ocr_stage(self):
+        """派生图生成失败时 OCR 阶段失败，不退回原图"""
+        exam = SimpleNamespace(
+            processed_image_url=None, image_derivatives=None, original_image_url="/uploads/a.jpg",
+            handwriting_metrics=None, llm_usage=None
+        )
+
+        with patch.object(exam_tasks, "get_exam", AsyncMock(return_value=exam)), \
+                patch.object(exam_tasks, "update_exam_status", AsyncMock()), \
+                patch.object(exam_tasks, "_run_derivatives", AsyncMock(side_effect=OSError("storage down"))), \
+                patch.object(exam_pipeline, "run_ocr", AsyncMock()) as run_ocr:
+            with pytest.raises(exam_tasks.ExpressStageError) as exc_info:
+                await exam_tasks._run_express(uuid4())
+
+        assert exc_info.value.failed_status == ExamStatus.OCR_FAILED
+        run_ocr.assert_not_awaited()
@@ -0,0 +1,86 @@
+"""
+出站 HTTP 客户端管理测试
+"""
+import asyncio
+import httpx
+import pytest
+
+from app.core.http_client import HTTPClientRegistry, get_http_client
+from app.services import deepseek_service as deepseek_module
+from app.services.deepseek_service import DeepSeekService
+from app.services.llm_limiter import LLMRateLimiter
+
+
+@pytest.fixture
+async def registry():
+    """每个测试使用干净的客户端注册表"""
+    HTTPClientRegistry.reset()
+    yield HTTPClientRegistry
+    await HTTPClientRegistry.close()
+
+
+class TestHTTPClientRegistry:
+    """测试共享客户端的生命周期"""
+
+    @pytest.mark.unit
+    async def test_client_reused_per_upstream(self, registry):
+        """同一上游复用同一个客户端，不同上游相互独立"""
+        await registry.start()
+
+        deepseek = get_http_client("deepseek")
+        assert get_http_client("deepseek") is deepseek
+        assert get_http_client("baidu") is not deepseek
+        assert deepseek.timeout.connect == 5.0
+
+    @pytest.mark.unit
+    async def test_close_and_recreate(self, registry):
+        """关闭后再次获取会创建新客户端"""
+        client = get_http_client("baidu")
+        await registry.close()
+
+        assert client.is_closed
+        assert get_http_client("baidu") is not client
+
+    @pytest.mark.unit
+    def test_recreated_on_other_event_loop(self, registry):
+        """连接池绑定事件循环，换循环后重新创建"""
+        async def current_client():
+            return get_http_client("aliyun")
+
+        clients = []
+        for _ in range(2):
+            loop = asyncio.new_event_loop()
+            clients.append(loop.run_until_complete(current_client()))
+            loop.close()
+        first, second = clients
+
+        assert first is not second
+
+
+class TestPooledCalls:
+    """测试服务通过共享客户端发起请求"""
+
+    @pytest.mark.unit
+    async def test_deepseek_uses_shared_client(self, registry, monkeypatch):
+        """DeepSeek 调用复用注册表中的客户端"""
+        monkeypatch.setattr(
+            deepseek_module, "deepseek_limiter", LLMRateLimiter("deepseek", backend="local")
+        )
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        registry._clients["deepseek"] = (client, asyncio.get_running_loop())
+
+        service = DeepSeekService()
+        service.api_key = "test-key"
+        for _ in range(2):
+            await service._call_api([{"role": "user", "content": "hi"}])
+
+        assert len(requests) == 2
+        assert requests[0].url.path.endswith("/chat/completions")
+        assert requests[0].headers["Authorization"] == "Bearer test-key"
+        assert not client.is_closed
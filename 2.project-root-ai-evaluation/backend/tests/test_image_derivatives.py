@@ -0,0 +1,138 @@
+"""
+派生图测试（缩略图 / 预览图 / OCR 灰度图）
+"""
+import hashlib
+import io
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+
+from app.core.config import settings
+from app.services import image_derivatives
+from app.services.image_derivatives import (
+    derivative_key, derivative_specs, image_derivative_service, ocr_image_url, render_derivatives,
+    thumbnail_url, web_format
+)
+
+
+def photo(width: int = 3000, height: int = 2000, orientation: int = 1) -> bytes:
+    """带 EXIF 方向的彩色 JPEG"""
+    image = Image.new("RGB", (width, height), "white")
+    image.paste((200, 30, 30), (0, 0, width // 2, height // 2))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def open_bytes(content: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(content))
+
+
+class TestRenderDerivatives:
+    """测试派生图生成"""
+
+    @pytest.mark.unit
+    def test_sizes_and_formats(self):
+        rendered = render_derivatives(photo(), derivative_specs())
+
+        thumbnail = open_bytes(rendered["thumbnail"])
+        preview = open_bytes(rendered["preview"])
+        ocr = open_bytes(rendered["ocr"])
+        assert (thumbnail.format, thumbnail.size) == ("WEBP", (320, 213))
+        assert (preview.format, preview.size) == ("WEBP", (1280, 853))
+        assert (ocr.format, ocr.mode, ocr.size) == ("JPEG", "L", (3000, 2000))
+        assert len(rendered["thumbnail"]) < len(rendered["preview"]) < len(rendered["ocr"])
+
+    @pytest.mark.unit
+    def test_exif_orientation_applied(self):
+        """派生图按 EXIF 方向转正（OCR 灰度图的坐标与转正后的原图一致）"""
+        rendered = render_derivatives(photo(orientation=6), derivative_specs())
+
+        assert open_bytes(rendered["thumbnail"]).size == (213, 320)
+        assert open_bytes(rendered["ocr"]).size == (2000, 3000)
+
+    @pytest.mark.unit
+    def test_small_image_not_upscaled(self):
+        rendered = render_derivatives(photo(200, 100), derivative_specs())
+
+        assert open_bytes(rendered["thumbnail"]).size == (200, 100)
+        assert open_bytes(rendered["preview"]).size == (200, 100)
+
+    @pytest.mark.unit
+    def test_avif_falls_back_to_webp_when_unsupported(self, monkeypatch):
+        monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_FORMAT", "avif")
+        monkeypatch.setattr(image_derivatives.features, "check", lambda feature: False)
+
+        assert web_format() == "WEBP"
+
+    @pytest.mark.unit
+    def test_unknown_format_rejected(self, monkeypatch):
+        monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_FORMAT", "gif")
+
+        with pytest.raises(ValueError, match="Unknown derivative format"):
+            derivative_specs()
+
+
+class TestDerivativeService:
+    """测试派生图存储"""
+
+    @pytest.mark.unit
+    async def test_content_addressed_and_reused(self, local_storage, monkeypatch):
+        content = photo(800, 600)
+        source_sha256 = hashlib.sha256(content).hexdigest()
+
+        urls = await image_derivative_service.generate(content)
+
+        for spec in derivative_specs():
+            key = derivative_key(source_sha256, spec)
+            assert urls[spec.name] == local_storage.url_for(key)
+            assert await local_storage.exists(key)
+
+        # 同一张照片再次上传：不重新解码和编码
+        def no_render(*args):
+            raise AssertionError("derivatives should be reused")
+        monkeypatch.setattr(image_derivatives, "render_derivatives", no_render)
+        assert await image_derivative_service.generate(content) == urls
+
+    @pytest.mark.unit
+    async def test_served_with_long_lived_cache_headers(self, local_storage):
+        from main import app
+        urls = await image_derivative_service.generate(photo(800, 600))
+        await local_storage.put("exam-1_original.jpg", b"original", "image/jpeg")
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            thumbnail = await client.get(urls["thumbnail"])
+            original = await client.get("/uploads/exam-1_original.jpg")
+            missing = await client.get("/uploads/derivatives/missing.webp")
+
+        assert thumbnail.status_code == 200
+        assert thumbnail.headers["content-type"] == "image/webp"
+        assert thumbnail.headers["cache-control"] == settings.IMAGE_DERIVATIVE_CACHE_CONTROL
+        assert original.content == b"original"
+        assert "cache-control" not in original.headers
+        assert missing.status_code == 404
+
+
+class TestExamImageUrls:
+    """测试试卷图像 URL 的选择"""
+
+    @pytest.mark.unit
+    def test_derivatives_preferred(self):
+        exam = SimpleNamespace(
+            original_image_url="/uploads/a.jpg", processed_image_url=None,
+            image_derivatives={"thumbnail": "/uploads/t.webp", "ocr": "/uploads/o.jpg"}
+        )
+
+        assert thumbnail_url(exam) == "/uploads/t.webp"
+        assert ocr_image_url(exam) == "/uploads/o.jpg"
+
+    @pytest.mark.unit
+    def test_falls_back_to_original(self):
+        exam = SimpleNamespace(original_image_url="/uploads/a.jpg", processed_image_url=None, image_derivatives=None)
+
+        assert thumbnail_url(exam) == "/uploads/a.jpg"
+        assert ocr_image_url(exam) == "/uploads/a.jpg"
@@ -0,0 +1,103 @@
+"""
+图像一次解码测试
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from app.services.image_ingest import ingest_image
+from app.services.image_preprocess import PROFILES
+from app.services.image_service import ImageService
+
+
+def encode(image: Image.Image, image_format: str = "PNG", orientation: int = 1) -> bytes:
+    """编码图像，写入 EXIF 方向"""
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def asymmetric_image(width: int = 60, height: int = 40) -> Image.Image:
+    """各方向都不对称的测试图像"""
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :, 0] = np.arange(width, dtype=np.uint8)[None, :] * 4
+    pixels[:, :, 1] = np.arange(height, dtype=np.uint8)[:, None] * 6
+    pixels[:5, :10, 2] = 255
+    return Image.fromarray(pixels)
+
+
+class TestIngestImage:
+    """测试一次解码"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("orientation", range(1, 9))
+    def test_orientation_matches_exif_transpose(self, orientation):
+        """按 EXIF 方向转正的结果与 PIL exif_transpose 一致"""
+        content = encode(asymmetric_image(), orientation=orientation)
+
+        image = ingest_image(content)
+
+        expected = np.asarray(ImageOps.exif_transpose(Image.open(io.BytesIO(content))).convert("RGB"))
+        assert image.orientation == orientation
+        assert np.array_equal(cv2.cvtColor(image.pixels, cv2.COLOR_BGR2RGB), expected)
+
+    @pytest.mark.unit
+    def test_grayscale_decode_shares_buffer(self):
+        """直接解码为灰度时 gray 即像素缓冲区本身"""
+        image = ingest_image(encode(asymmetric_image(), "JPEG", orientation=6), grayscale=True)
+
+        assert image.pixels.ndim == 2
+        assert image.gray is image.pixels
+        assert (image.width, image.height) == (40, 60)
+
+    @pytest.mark.unit
+    def test_color_gray_computed_once(self):
+        image = ingest_image(encode(asymmetric_image()))
+
+        assert image.gray is image.gray
+        assert image.format == "PNG"
+
+    @pytest.mark.unit
+    def test_invalid_content_rejected(self):
+        with pytest.raises(ValueError):
+            ingest_image(b"not an image")
+        with pytest.raises(ValueError):
+            ingest_image(encode(asymmetric_image()), filename="exam.gif")
+
+
+class TestSharedBufferConsumers:
+    """测试质量检查和预处理复用解码结果"""
+
+    @pytest.mark.unit
+    def test_quality_blur_score_unchanged(self):
+        """16 位 Laplacian 的方差与原 float64 实现一致"""
+        rng = np.random.default_rng(0)
+        gray = cv2.GaussianBlur((rng.random((1080, 1920)) * 255).astype(np.uint8), (0, 0), 3)
+        expected = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+        result = ImageService.validate_image_quality(gray)
+
+        assert "blur score" in result.reason
+        assert f"{expected:.2f}" in result.reason
+
+    @pytest.mark.unit
+    async def test_preprocess_for_ocr_upright_grayscale(self, monkeypatch):
+        """识别用图像按 EXIF 转正，编码为单通道"""
+        monkeypatch.setattr("app.services.image_preprocess.settings.IMAGE_PREPROCESS_EXECUTOR", "thread")
+        from app.services.image_preprocess import ImagePreprocessor
+        monkeypatch.setattr("app.services.image_service.image_preprocessor", ImagePreprocessor())
+        content = encode(asymmetric_image(3200, 1000), "JPEG", orientation=8)
+        # 全分辨率质量检查不在事件循环上执行（由上传质量门负责）
+        monkeypatch.setattr(ImageService, "validate_image_quality", None)
+
+        processed, scale = await ImageService.preprocess_for_ocr(content, PROFILES["fast"])
+
+        decoded = cv2.imdecode(np.frombuffer(processed, np.uint8), cv2.IMREAD_UNCHANGED)
+        assert decoded.ndim == 2
+        assert decoded.shape == (1600, 500)
+        assert scale == pytest.approx(0.5)
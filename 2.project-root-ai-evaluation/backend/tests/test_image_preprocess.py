@@ -0,0 +1,191 @@
+"""
+图像预处理档位测试
+"""
+import asyncio
+import multiprocessing
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.schemas.ocr import BoundingBox, OCRResult, TextRegion
+from app.services.image_preprocess import (
+    PROFILES, ImagePreprocessor, apply_profile, resolve_profile, restore_coordinates
+)
+from app.services.image_service import ImageService
+
+
+def make_page(width: int = 640, height: int = 480, seed: int = 0) -> np.ndarray:
+    """带噪声的合成试卷页面（BGR）"""
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width, 3), 235, dtype=np.uint8)
+    for row in range(40, height - 20, 40):
+        cv2.putText(page, "1. x + 2 = 5, x = 3", (20, row), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (30, 30, 30), 2)
+    noise = rng.normal(0, 12, page.shape)
+    return np.clip(page + noise, 0, 255).astype(np.uint8)
+
+
+def _run_in_daemon(queue):
+    """守护进程中执行：模拟 Celery prefork worker 的子进程"""
+    preprocessor = ImagePreprocessor(executor="process", workers=1)
+    page = make_page(320, 240)
+    try:
+        result, scale = asyncio.run(preprocessor.run(page, PROFILES["fast"]))
+        again, _ = asyncio.run(preprocessor.run(page, PROFILES["fast"]))
+        expected, _ = apply_profile(page, PROFILES["fast"])
+        queue.put((np.array_equal(result, expected), np.array_equal(again, expected), preprocessor.executor))
+    except Exception as e:  # 把子进程中的异常带回测试进程
+        queue.put(repr(e))
+
+
+class TestProfiles:
+    """测试档位处理"""
+
+    @pytest.mark.unit
+    def test_quality_matches_original_pipeline(self):
+        """quality 档位与原 preprocess_image 的全分辨率去噪 + CLAHE 结果一致"""
+        page = make_page(200, 150)
+        gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+        expected = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(
+            cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        )
+
+        processed = ImageService.preprocess_image(page)
+
+        assert processed.shape == page.shape
+        assert np.array_equal(processed[:, :, 0], expected)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("name", ["fast", "balanced"])
+    def test_fast_profiles_downscale_long_side(self, name):
+        profile = PROFILES[name]
+        page = make_page(profile.max_side * 2, profile.max_side)
+
+        processed, scale = apply_profile(page, profile)
+
+        assert scale == pytest.approx(0.5)
+        assert processed.shape == (profile.max_side // 2, profile.max_side, 3)
+
+    @pytest.mark.unit
+    def test_small_image_not_upscaled(self):
+        processed, scale = apply_profile(make_page(320, 240)[:, :, 0], PROFILES["fast"])
+
+        assert scale == 1.0
+        assert processed.shape == (240, 320)
+
+    @pytest.mark.unit
+    def test_resolve_profile(self, monkeypatch):
+        monkeypatch.setattr(settings, "IMAGE_PREPROCESS_PROFILE", "balanced")
+
+        assert resolve_profile(None) is PROFILES["balanced"]
+        assert resolve_profile("Fast") is PROFILES["fast"]
+        assert resolve_profile("none") is None
+        assert resolve_profile("") is None
+        with pytest.raises(ValueError):
+            resolve_profile("ultra")
+
+
+class TestImagePreprocessor:
+    """测试事件循环之外的执行"""
+
+    @pytest.mark.unit
+    async def test_process_pool_matches_inline(self):
+        """进程池 + 共享内存的结果与同进程处理一致"""
+        preprocessor = ImagePreprocessor(executor="process", workers=1)
+        page = make_page(900, 700)
+        try:
+            for name in ("fast", "quality"):
+                result, scale = await preprocessor.run(page, PROFILES[name])
+                expected, expected_scale = apply_profile(page, PROFILES[name])
+                assert scale == expected_scale
+                assert np.array_equal(result, expected)
+        finally:
+            preprocessor.shutdown()
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("executor", ["process", "thread"])
+    async def test_event_loop_not_blocked(self, executor):
+        """全分辨率去噪期间事件循环仍能及时调度其他协程"""
+        preprocessor = ImagePreprocessor(executor=executor, workers=1)
+        page = make_page(1600, 1200)
+        gaps = []
+
+        async def heartbeat():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        ticker = asyncio.create_task(heartbeat())
+        try:
+            await preprocessor.run(page, PROFILES["quality"])
+        finally:
+            ticker.cancel()
+            preprocessor.shutdown()
+
+        assert len(gaps) > 5
+        assert max(gaps) < 0.25
+
+    @pytest.mark.unit
+    def test_daemon_process_falls_back_to_threads(self):
+        """守护进程中不能创建子进程，退回线程执行并记住该决定"""
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        daemon = context.Process(target=_run_in_daemon, args=(queue,), daemon=True)
+        daemon.start()
+        try:
+            outcome = queue.get(timeout=60)
+        finally:
+            daemon.join(timeout=10)
+
+        assert outcome == (True, True, "thread")
+
+    @pytest.mark.unit
+    async def test_submit_failure_falls_back_to_threads(self):
+        """进程池在提交时才启动子进程，此时失败同样退回线程执行"""
+        class DaemonPool:
+            submits = 0
+
+            def submit(self, *args):
+                DaemonPool.submits += 1
+                raise AssertionError("daemonic processes are not allowed to have children")
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                pass
+
+        preprocessor = ImagePreprocessor(executor="process", workers=1)
+        preprocessor._pool = DaemonPool()
+        page = make_page(320, 240)
+        expected, _ = apply_profile(page, PROFILES["fast"])
+
+        for _ in range(2):
+            result, _ = await preprocessor.run(page, PROFILES["fast"])
+            assert np.array_equal(result, expected)
+
+        assert DaemonPool.submits == 1
+        assert preprocessor.executor == "thread"
+        assert preprocessor._pool is None
+
+
+class TestRestoreCoordinates:
+    """测试坐标换算"""
+
+    @pytest.mark.unit
+    def test_bbox_mapped_back_to_original(self):
+        result = OCRResult(
+            text_regions=[TextRegion(
+                text="1.", bbox=BoundingBox(x=10, y=20, width=50, height=8), confidence=0.9, type="printed"
+            )],
+            overall_confidence=0.9,
+            processing_time=0.1,
+            provider="mock"
+        )
+
+        restored = restore_coordinates(result, 0.5)
+
+        assert restored.text_regions[0].bbox == BoundingBox(x=20, y=40, width=100, height=16)
+        assert result.text_regions[0].bbox.x == 10
@@ -0,0 +1,132 @@
+"""
+上传快速质量门测试
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services.image_quality import QualityGate, compute_scores, decode_reduced, estimate_skew
+from app.services.image_service import ImageService
+
+LINES = ["1. 3x + 5 = 20, x = 5", "2. f(x) = x^2 - 4x + 3", "3. P(A) = 0.25, P(B) = 0.4",
+         "4. sin 30 + cos 60 = 1", "5. (a + b)^2 = a^2 + 2ab + b^2"]
+
+
+def make_page(width: int = 4000, height: int = 3000, blur: float = 0.3, angle: float = 0.0) -> np.ndarray:
+    """合成试卷照片（灰度，14 行文字）"""
+    page = np.full((height, width), 185, dtype=np.uint8)
+    scale = width / 1000
+    for i in range(14):
+        cv2.putText(page, LINES[i % len(LINES)], (int(width * 0.08), int(height * (0.1 + i * 0.057))),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8 * scale, 20, max(1, int(2 * scale)))
+    if angle:
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        page = cv2.warpAffine(page, matrix, (width, height), borderValue=185)
+    page = cv2.GaussianBlur(page, (0, 0), blur).astype(np.float32)
+    page += np.random.default_rng(0).normal(0, 2, page.shape).astype(np.float32)
+    return np.clip(page, 0, 255).astype(np.uint8)
+
+
+def to_jpeg(gray: np.ndarray, orientation: int = 1) -> bytes:
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.fromarray(gray).save(buffer, format="JPEG", quality=92, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def sharp_page() -> bytes:
+    return to_jpeg(make_page())
+
+
+class TestDecodeReduced:
+    """测试缩小解码"""
+
+    @pytest.mark.unit
+    def test_reduced_to_working_size(self, sharp_page):
+        gray, size = decode_reduced(sharp_page, 1024)
+
+        assert size == (4000, 3000)
+        assert max(gray.shape) <= 1024
+        assert max(gray.shape) >= 768
+
+    @pytest.mark.unit
+    def test_exif_rotation_applied_to_size_and_pixels(self):
+        gray, size = decode_reduced(to_jpeg(make_page(2400, 1800), orientation=6), 1024)
+
+        assert size == (1800, 2400)
+        assert gray.shape[0] > gray.shape[1]
+
+    @pytest.mark.unit
+    def test_brightness_matches_full_resolution(self, sharp_page):
+        full = cv2.imdecode(np.frombuffer(sharp_page, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+        scores = QualityGate().score(sharp_page)
+
+        assert scores.brightness == pytest.approx(float(np.mean(full)), abs=1.0)
+
+
+class TestQualityGate:
+    """测试判定"""
+
+    @pytest.mark.unit
+    def test_sharp_page_accepted(self, sharp_page):
+        gate = QualityGate()
+
+        assert gate.evaluate(gate.score(sharp_page)) is None
+
+    @pytest.mark.unit
+    def test_blurry_page_rejected(self):
+        gate = QualityGate()
+
+        failure = gate.evaluate(gate.score(to_jpeg(make_page(blur=8.0))))
+
+        assert failure[0] == "blur"
+
+    @pytest.mark.unit
+    def test_low_resolution_rejected(self):
+        gate = QualityGate()
+
+        failure = gate.evaluate(gate.score(to_jpeg(make_page(1280, 960))))
+
+        assert failure[0] == "resolution"
+
+    @pytest.mark.unit
+    def test_glare_rejected(self):
+        page = make_page()
+        cv2.circle(page, (2000, 1500), 900, 255, -1)
+        gate = QualityGate()
+
+        failure = gate.evaluate(gate.score(to_jpeg(page)))
+
+        assert failure[0] == "glare"
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("angle", [-25.0, -6.0, 0.0, 6.0, 25.0])
+    def test_skew_estimated(self, angle):
+        """倾斜角估计误差在 2 度以内，超过上限时拒绝"""
+        gray, size = decode_reduced(to_jpeg(make_page(angle=angle)), 1024)
+
+        skew = estimate_skew(gray)
+        failure = QualityGate().evaluate(compute_scores(gray, size))
+
+        assert abs(abs(skew) - abs(angle)) < 2.0
+        assert (failure is not None and failure[0] == "skew") == (abs(angle) > settings.IMAGE_QUALITY_GATE_MAX_SKEW)
+
+    @pytest.mark.unit
+    def test_upload_check_modes(self, monkeypatch, sharp_page):
+        blurry = to_jpeg(make_page(blur=8.0))
+
+        monkeypatch.setattr(settings, "IMAGE_QUALITY_GATE", "off")
+        assert ImageService.check_upload_quality(blurry).is_valid
+
+        monkeypatch.setattr(settings, "IMAGE_QUALITY_GATE", "fast")
+        assert ImageService.check_upload_quality(sharp_page).is_valid
+        result = ImageService.check_upload_quality(blurry)
+        assert not result.is_valid
+        assert "blurry" in result.reason
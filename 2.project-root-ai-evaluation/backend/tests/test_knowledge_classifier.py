@@ -0,0 +1,207 @@
+"""
+本地知识点分类器测试
+"""
+import gzip
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services import deepseek_service as deepseek_module
+from app.services.deepseek_service import DeepSeekService
+from app.services.knowledge_classifier import (
+    KnowledgePointClassifier, KnowledgePointModel, evaluate
+)
+from app.services.near_duplicate import NearDuplicateIndex
+from app.services.question_cache import QuestionProfileCache
+from scripts.train_knowledge_classifier import deduplicate, load_jsonl
+from tests.conftest import build_question
+
+TEMPLATES = {
+    "勾股定理": "直角三角形的两条直角边分别为{a}和{b}，求斜边的长",
+    "概率": "袋中有{a}个红球和{b}个白球，从中任取一个，取到红球的概率是",
+    "一元二次方程": "解关于x的一元二次方程：x²-{a}x+{b}=0",
+}
+
+
+def training_examples():
+    """每个知识点 10 道仅数字不同的题目"""
+    return [
+        ("数学", build_question(template.format(a=a, b=a + 3), f"Q{a}", tags=[label]))
+        for label, template in TEMPLATES.items()
+        for a in range(1, 11)
+    ]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return KnowledgePointModel.train(training_examples())
+
+
+class TestKnowledgePointModel:
+    """测试训练与预测"""
+
+    @pytest.mark.unit
+    def test_predicts_template_label(self, model):
+        prediction = model.predict(build_question("直角三角形的两条直角边分别为12和35，求斜边的长"), "数学")
+
+        assert prediction.knowledge_points == ["勾股定理"]
+        assert prediction.confidence > 0.6
+
+    @pytest.mark.unit
+    def test_unseen_text_low_confidence(self, model):
+        """与训练题型无关的题目置信度低，未训练的科目无结果"""
+        prediction = model.predict(build_question("Read the passage and choose the best answer"), "数学")
+
+        assert prediction is None or prediction.confidence < 0.3
+        assert model.predict(build_question("直角三角形的两条直角边分别为3和4"), "物理") is None
+
+    @pytest.mark.unit
+    def test_save_load_roundtrip(self, model, tmp_path):
+        """模型文件读写后预测一致，格式版本不一致时拒绝加载"""
+        path = str(tmp_path / "model.json.gz")
+        model.save(path)
+        loaded = KnowledgePointModel.load(path)
+        question = build_question("袋中有7个红球和2个白球，从中任取一个，取到红球的概率是")
+
+        assert loaded.version == model.version
+        assert loaded.predict(question, "数学").knowledge_points == ["概率"]
+        assert loaded.predict(question, "数学").confidence == pytest.approx(
+            model.predict(question, "数学").confidence, abs=1e-3
+        )
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        data["format_version"] = 0
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        with pytest.raises(ValueError):
+            KnowledgePointModel.load(path)
+
+    @pytest.mark.unit
+    def test_evaluate_coverage_decreases_with_threshold(self, model):
+        holdout = [
+            ("数学", build_question("直角三角形的两条直角边分别为20和21，求斜边的长", tags=["勾股定理"])),
+            ("数学", build_question("Read the passage", tags=["阅读理解"])),
+        ]
+        report = evaluate(model, holdout, (0.0, 0.5, 0.99))
+
+        assert [row["coverage"] for row in report] == sorted((row["coverage"] for row in report), reverse=True)
+        assert report[1]["coverage"] == 0.5
+        assert report[1]["precision"] == 1.0
+
+
+class TestKnowledgePointClassifier:
+    """测试分类服务"""
+
+    @pytest.mark.unit
+    async def test_missing_model_falls_back(self, tmp_path):
+        classifier = KnowledgePointClassifier(path=str(tmp_path / "missing.json.gz"))
+
+        assert await classifier.predict(build_question("1+1=?"), "数学") is None
+        assert classifier.model is None
+
+    @pytest.mark.unit
+    async def test_lazy_load_once_and_threshold(self, model, tmp_path):
+        """模型只加载一次，置信度低于阈值时不采用"""
+        path = str(tmp_path / "model.json.gz")
+        model.save(path)
+        classifier = KnowledgePointClassifier(path=path, min_confidence=0.6)
+        question = build_question("解关于x的一元二次方程：x²-20x+23=0")
+
+        with patch.object(KnowledgePointModel, "load", wraps=KnowledgePointModel.load) as load:
+            assert await classifier.predict(question, "数学") == ["一元二次方程"]
+            assert await classifier.predict(build_question("Read the passage"), "数学") is None
+
+        assert load.call_count == 1
+
+
+class TestDeepSeekClassifier:
+    """测试 tag_knowledge_points 接入本地分类器"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        monkeypatch.setattr(deepseek_module, "question_cache", QuestionProfileCache())
+        monkeypatch.setattr(
+            deepseek_module, "near_duplicate_index", NearDuplicateIndex(backend="disk", path="")
+        )
+        return DeepSeekService()
+
+    @pytest.mark.unit
+    async def test_confident_prediction_skips_llm(self, service, monkeypatch):
+        classifier = KnowledgePointClassifier(path="unused")
+        monkeypatch.setattr(classifier, "predict", AsyncMock(return_value=["勾股定理"]))
+        monkeypatch.setattr(deepseek_module, "knowledge_classifier", classifier)
+
+        with patch.object(service, "_call_api", AsyncMock()) as call_api:
+            points = await service.tag_knowledge_points(build_question("直角三角形…"), "数学")
+
+        call_api.assert_not_awaited()
+        assert points == ["勾股定理"]
+
+    @pytest.mark.unit
+    async def test_low_confidence_calls_llm(self, service, monkeypatch):
+        classifier = KnowledgePointClassifier(path="unused")
+        monkeypatch.setattr(classifier, "predict", AsyncMock(return_value=None))
+        monkeypatch.setattr(deepseek_module, "knowledge_classifier", classifier)
+        response = {"choices": [{"message": {"content": json.dumps({"knowledge_points": ["阅读理解"]})}}]}
+
+        with patch.object(service, "_call_api", AsyncMock(return_value=response)) as call_api:
+            points = await service.tag_knowledge_points(build_question("Read the passage"), "英语")
+
+        assert call_api.await_count == 1
+        assert points == ["阅读理解"]
+
+    @pytest.mark.unit
+    async def test_batch_sends_only_low_confidence_questions_to_llm(self, service, monkeypatch):
+        """批量丰富先走本地分类器：高置信度题目只请求难度，其余请求知识点和难度"""
+        classifier = KnowledgePointClassifier(path="unused")
+        monkeypatch.setattr(classifier, "predict", AsyncMock(
+            side_effect=lambda question, subject: ["勾股定理"] if "直角" in question.question_text else None
+        ))
+        monkeypatch.setattr(deepseek_module, "knowledge_classifier", classifier)
+        questions = [
+            build_question("直角三角形的两条直角边分别为3和4，求斜边的长", question_id="Q1"),
+            build_question("Read the passage and answer", question_id="Q2"),
+            build_question("直角三角形的两条直角边分别为5和12，求斜边的长", question_id="Q3"),
+        ]
+        prompts = []
+
+        def respond(messages, **kwargs):
+            prompt = messages[-1]["content"]
+            prompts.append(prompt)
+            if "knowledge_points" in prompt:
+                results = [{"id": "Q2", "knowledge_points": ["阅读理解"], "difficulty": 0.5}]
+            else:
+                results = [{"id": "Q1", "difficulty": 0.2}, {"id": "Q3", "difficulty": 0.3}]
+            return {"choices": [{"message": {"content": json.dumps({"results": results})}}]}
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=respond)) as call_api:
+            result = await service.enrich_questions_batch(questions, "数学")
+
+        assert call_api.await_count == 2
+        full, difficulty = sorted(prompts, key=lambda prompt: "knowledge_points" not in prompt)
+        assert "Read the passage" in full and "直角" not in full
+        assert "Q1" in difficulty and "Q3" in difficulty and "Read the passage" not in difficulty
+        assert [(q.knowledge_tags, q.difficulty) for q in result] == [
+            (["勾股定理"], 0.2), (["阅读理解"], 0.5), (["勾股定理"], 0.3)
+        ]
+
+
+class TestTrainingData:
+    """测试训练数据准备"""
+
+    @pytest.mark.unit
+    def test_load_jsonl_and_deduplicate(self, tmp_path):
+        """JSONL 读取后按指纹去重，未标注的题目被丢弃"""
+        path = tmp_path / "questions.jsonl"
+        rows = [
+            {"subject": "数学", "question_text": "1 + 1 = ?", "knowledge_tags": ["加法"]},
+            {"subject": "数学", "question_text": "1+1=?", "knowledge_tags": ["加法"]},
+            {"subject": "数学", "question_text": "2×3=?"},
+            {"subject": "数学"},
+        ]
+        path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in rows), encoding="utf-8")
+
+        examples = load_jsonl(str(path))
+        assert len(examples) == 3
+        assert [q.question_text for _, q in deduplicate(examples)] == ["1 + 1 = ?"]
@@ -0,0 +1,189 @@
+"""
+LLM 调用限流测试
+"""
+import asyncio
+import time
+import httpx
+import pytest
+from email.utils import formatdate
+from hypothesis import given, strategies as st, settings
+
+from app.core.http_client import HTTPClientRegistry
+from app.services import deepseek_service as deepseek_module
+from app.services.deepseek_service import DeepSeekService
+from app.services.llm_limiter import (
+    LLMRateLimiter, PrioritySemaphore, backoff_delay, parse_retry_after,
+    LANE_INTERACTIVE, LANE_BACKGROUND
+)
+
+
+def http_error(status: int, headers: dict = None) -> httpx.HTTPStatusError:
+    """构造 HTTP 状态码错误"""
+    request = httpx.Request("POST", "https://api.example.com")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class TestPrioritySemaphore:
+    """测试优先级并发控制"""
+
+    @pytest.mark.unit
+    async def test_interactive_served_first(self):
+        """释放名额时优先唤醒 interactive 通道"""
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(LANE_BACKGROUND)
+        order = []
+
+        async def worker(lane):
+            await semaphore.acquire(lane)
+            order.append(lane)
+            semaphore.release(lane)
+
+        tasks = [
+            asyncio.create_task(worker(LANE_BACKGROUND)),
+            asyncio.create_task(worker(LANE_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        semaphore.release(LANE_BACKGROUND)
+        await asyncio.gather(*tasks)
+
+        assert order == [LANE_INTERACTIVE, LANE_BACKGROUND]
+        assert semaphore.in_use == 0
+
+    @pytest.mark.unit
+    async def test_background_limit_reserves_slots(self):
+        """background 通道达到上限时 interactive 仍可获取名额"""
+        semaphore = PrioritySemaphore(3, {LANE_BACKGROUND: 2})
+        await semaphore.acquire(LANE_BACKGROUND)
+        await semaphore.acquire(LANE_BACKGROUND)
+
+        blocked = asyncio.create_task(semaphore.acquire(LANE_BACKGROUND))
+        await asyncio.wait_for(semaphore.acquire(LANE_INTERACTIVE), timeout=1)
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        blocked.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocked
+        assert not semaphore._waiters[LANE_BACKGROUND]
+
+
+class TestTokenBuckets:
+    """测试速率限流"""
+
+    @pytest.mark.unit
+    async def test_local_request_bucket_throttles(self):
+        """超出突发容量后按请求速率放行，并记录排队时间"""
+        limiter = LLMRateLimiter(
+            "test", backend="local", max_concurrency=10,
+            requests_per_second=20, request_burst=2, tokens_per_minute=10 ** 6
+        )
+        start = time.perf_counter()
+        for _ in range(4):
+            async with limiter.acquire(LANE_BACKGROUND, tokens=10):
+                pass
+
+        assert time.perf_counter() - start >= 0.09
+
+    @pytest.mark.unit
+    async def test_local_token_bucket_throttles(self):
+        """token 预算耗尽时等待补充"""
+        limiter = LLMRateLimiter(
+            "test", backend="local", requests_per_second=1000,
+            request_burst=1000, tokens_per_minute=6000
+        )
+        async with limiter.acquire(tokens=6000):
+            pass
+
+        assert await limiter._reserve(50) == pytest.approx(0.5, abs=0.05)
+
+    @pytest.mark.unit
+    async def test_redis_bucket_wait(self, monkeypatch):
+        """Redis 令牌桶返回等待时间时重试，直到扣减成功"""
+        calls = []
+
+        class FakeRedis:
+            async def eval(self, script, numkeys, *args):
+                calls.append(args)
+                return "0.01" if len(calls) == 1 else "0"
+
+            async def get(self, key):
+                return None
+
+        async def get_fake_redis():
+            return FakeRedis()
+
+        monkeypatch.setattr("app.core.redis_client.get_redis", get_fake_redis)
+        limiter = LLMRateLimiter("deepseek", backend="redis")
+
+        async with limiter.acquire(LANE_INTERACTIVE, tokens=1200):
+            pass
+
+        assert len(calls) == 2
+        assert calls[0][:2] == ("llm_limit:deepseek:requests", "llm_limit:deepseek:tokens")
+        assert calls[0][-1] == 1200
+
+    @pytest.mark.unit
+    async def test_penalize_pauses_callers(self):
+        """上游限流后暂停发送直到冷却结束"""
+        limiter = LLMRateLimiter("test", backend="local")
+        await limiter.penalize(0.1)
+
+        start = time.perf_counter()
+        async with limiter.acquire():
+            pass
+
+        assert time.perf_counter() - start >= 0.09
+
+
+class TestBackoff:
+    """测试重试退避"""
+
+    @pytest.mark.unit
+    def test_parse_retry_after(self):
+        assert parse_retry_after(http_error(429, {"Retry-After": "3"})) == 3.0
+        assert parse_retry_after(http_error(503, {"Retry-After": formatdate(time.time() + 60, usegmt=True)})) > 50
+        assert parse_retry_after(http_error(500, {"Retry-After": "3"})) is None
+        assert parse_retry_after(http_error(429)) is None
+        assert parse_retry_after(ValueError()) is None
+
+    @pytest.mark.property
+    @given(attempt=st.integers(min_value=0, max_value=10))
+    @settings(max_examples=50)
+    def test_jittered_delay_within_bounds(self, attempt):
+        """无 Retry-After 时在 [delay/2, delay] 内随机"""
+        delays = [1, 2, 4]
+        cap = delays[min(attempt, len(delays) - 1)]
+        delay = backoff_delay(attempt, ValueError(), delays)
+
+        assert cap / 2 <= delay <= cap
+
+    @pytest.mark.unit
+    def test_retry_after_takes_precedence(self):
+        assert backoff_delay(0, http_error(429, {"Retry-After": "7"}), [1]) == 7.0
+
+
+class TestDeepSeekRateLimited:
+    """测试 DeepSeek 调用接入限流"""
+
+    @pytest.mark.unit
+    async def test_call_api_honors_retry_after(self, monkeypatch):
+        """429 响应按 Retry-After 等待后重试成功"""
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "0.05"}),
+            httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]}),
+        ]
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        HTTPClientRegistry._clients["deepseek"] = (client, asyncio.get_running_loop())
+        monkeypatch.setattr(
+            deepseek_module, "deepseek_limiter", LLMRateLimiter("deepseek", backend="local")
+        )
+
+        service = DeepSeekService()
+        start = time.perf_counter()
+        result = await service._call_api([{"role": "user", "content": "hi"}])
+
+        assert result["choices"][0]["message"]["content"] == "{}"
+        assert time.perf_counter() - start >= 0.05
+        assert not responses
+        await HTTPClientRegistry.close()
@@ -0,0 +1,167 @@
+"""
+LLM 调用计量测试
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+
+from app.core.http_client import HTTPClientRegistry
+from app.services import deepseek_service as deepseek_module
+from app.services.cache_service import CacheService
+from app.services.deepseek_service import DeepSeekService
+from app.services.llm_limiter import LLMRateLimiter
+from app.services.llm_usage import (
+    CALL_DIAGNOSIS, CALL_TAGGING, LLMUsage, estimate_cost, track_llm_usage
+)
+from app.services.single_flight import SingleFlight
+
+USAGE = {"prompt_tokens": 1200, "completion_tokens": 300, "prompt_cache_hit_tokens": 200}
+
+
+def sample(name: str, **labels) -> float:
+    """读取指标当前值（未出现过时为 0）"""
+    return REGISTRY.get_sample_value(name, {"provider": "deepseek", **labels}) or 0.0
+
+
+@pytest.fixture
+async def service(monkeypatch):
+    """本地限流、本地合并、内存响应缓存的服务"""
+    HTTPClientRegistry.reset()
+    monkeypatch.setattr(
+        deepseek_module, "deepseek_limiter", LLMRateLimiter("deepseek", backend="local")
+    )
+    store = {}
+
+    async def get_llm_response(key):
+        return store.get(key)
+
+    async def set_llm_response(key, value):
+        store[key] = value
+
+    instance = DeepSeekService()
+    instance.retry_delays = [0.0, 0.0, 0.0]
+    instance.single_flight = SingleFlight("deepseek", backend="local")
+    with patch.object(CacheService, "get_llm_response", side_effect=get_llm_response), \
+            patch.object(CacheService, "set_llm_response", side_effect=set_llm_response):
+        yield instance
+    await HTTPClientRegistry.close()
+
+
+def use_responses(responses):
+    """deepseek 共享客户端依次返回给定响应"""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+    HTTPClientRegistry._clients["deepseek"] = (client, asyncio.get_running_loop())
+
+
+def completion() -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}], "usage": USAGE})
+
+
+class TestEstimateCost:
+    """测试费用估算"""
+
+    @pytest.mark.unit
+    def test_cache_hit_tokens_billed_at_cache_price(self, monkeypatch):
+        monkeypatch.setattr(deepseek_module.settings, "DEEPSEEK_PRICE_PROMPT_PER_MILLION", 2.0)
+        monkeypatch.setattr(deepseek_module.settings, "DEEPSEEK_PRICE_PROMPT_CACHE_HIT_PER_MILLION", 0.5)
+        monkeypatch.setattr(deepseek_module.settings, "DEEPSEEK_PRICE_COMPLETION_PER_MILLION", 8.0)
+
+        assert estimate_cost(USAGE) == pytest.approx((1000 * 2 + 200 * 0.5 + 300 * 8) / 1e6)
+        assert estimate_cost({}) == 0
+
+
+class TestCallAccounting:
+    """测试 _call_api 计量"""
+
+    @pytest.mark.unit
+    async def test_api_call_and_cache_hit_recorded(self, service):
+        """实际调用记录 token 和重试，相同请求再次调用记为缓存命中"""
+        use_responses([httpx.Response(503), completion()])
+        messages = [{"role": "user", "content": "计量测试题"}]
+        before = {
+            "api": sample("llm_calls_total", call_type=CALL_TAGGING, source="api"),
+            "cache": sample("llm_calls_total", call_type=CALL_TAGGING, source="cache"),
+            "prompt": sample("llm_tokens_total", call_type=CALL_TAGGING, kind="prompt"),
+            "retries": sample("llm_retries_total", call_type=CALL_TAGGING),
+        }
+
+        with track_llm_usage() as usage:
+            await service._call_api(messages, call_type=CALL_TAGGING)
+            await service._call_api(messages, call_type=CALL_TAGGING)
+
+        assert sample("llm_calls_total", call_type=CALL_TAGGING, source="api") - before["api"] == 1
+        assert sample("llm_calls_total", call_type=CALL_TAGGING, source="cache") - before["cache"] == 1
+        assert sample("llm_tokens_total", call_type=CALL_TAGGING, kind="prompt") - before["prompt"] == 1200
+        assert sample("llm_retries_total", call_type=CALL_TAGGING) - before["retries"] == 1
+
+        rollup = usage.to_dict()
+        assert rollup["calls"] == 2 and rollup["cache_hits"] == 1 and rollup["retries"] == 1
+        assert rollup["by_type"][CALL_TAGGING]["completion_tokens"] == 300
+        assert rollup["cost"] == pytest.approx(estimate_cost(USAGE), abs=1e-6)
+
+    @pytest.mark.unit
+    async def test_failed_call_recorded_as_error(self, service):
+        use_responses([httpx.Response(500)] * 3)
+
+        with track_llm_usage() as usage:
+            with pytest.raises(Exception):
+                await service._call_api([{"role": "user", "content": "失败"}], use_cache=False)
+
+        assert usage.to_dict()["errors"] == 1
+        assert usage.to_dict()["retries"] == 2
+
+    @pytest.mark.unit
+    async def test_gathered_calls_share_rollup(self, service):
+        """asyncio.gather 创建的子任务累加到同一份汇总"""
+        use_responses([completion(), completion()])
+
+        with track_llm_usage() as usage:
+            await asyncio.gather(
+                service._call_api([{"role": "user", "content": "甲"}]),
+                service._call_api([{"role": "user", "content": "乙"}])
+            )
+
+        assert usage.to_dict()["prompt_tokens"] == 2400
+
+    @pytest.mark.unit
+    async def test_stream_usage_recorded(self, service):
+        """流式调用读取最后一个数据块中的 usage"""
+        body = "\n\n".join([
+            "data: " + json.dumps({"choices": [{"delta": {"content": "{}"}}]}),
+            "data: " + json.dumps({"choices": [], "usage": USAGE}),
+            "data: [DONE]",
+        ]) + "\n\n"
+        use_responses([httpx.Response(200, content=body.encode())])
+
+        with track_llm_usage() as usage:
+            chunks = [
+                c async for c in service._stream_api(
+                    [{"role": "user", "content": "x"}], call_type=CALL_DIAGNOSIS
+                )
+            ]
+
+        assert chunks == ["{}"]
+        assert usage.to_dict()["by_type"][CALL_DIAGNOSIS]["prompt_tokens"] == 1200
+
+
+class TestLLMUsage:
+    """测试按试卷汇总"""
+
+    @pytest.mark.unit
+    def test_merged_into_accumulates_stages(self):
+        """多个阶段的汇总逐阶段累加，总计由分类型结果重新计算"""
+        parsing = LLMUsage()
+        parsing.add("enrichment", calls=2, prompt_tokens=500, cost=0.001)
+        diagnostic = LLMUsage()
+        diagnostic.add("diagnosis", calls=1, prompt_tokens=900, cost=0.002)
+        diagnostic.add("enrichment", calls=1, cache_hits=1)
+
+        merged = diagnostic.merged_into(parsing.merged_into(None))
+
+        assert merged["calls"] == 4
+        assert merged["prompt_tokens"] == 1400
+        assert merged["cost"] == pytest.approx(0.003)
+        assert merged["by_type"]["enrichment"]["calls"] == 3
@@ -0,0 +1,129 @@
+"""
+近似重复题目索引测试
+"""
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from hypothesis import given, strategies as st, settings
+
+from app.services import deepseek_service as deepseek_module
+from app.services.cache_service import CacheService
+from app.services.deepseek_service import DeepSeekService
+from app.services.near_duplicate import (
+    NearDuplicateIndex, NUM_BANDS, band_keys, minhash_signature, shingles
+)
+from app.services.question_cache import QuestionProfileCache
+from scripts.build_near_duplicate_index import index_exam
+from tests.conftest import build_question
+
+QUESTION_TEXT = "已知二次函数y=x²-4x+3的图像与x轴交于A、B两点，求线段AB的长度"
+# OCR 把 "x轴" 识别成 "x袖"
+OCR_VARIANT = "已知二次函数y=x²-4x+3的图像与x袖交于A、B两点，求线段AB的长度"
+
+
+class TestMinHash:
+    """测试签名与分段"""
+
+    @pytest.mark.unit
+    def test_signature_deterministic(self):
+        signature = minhash_signature(shingles(QUESTION_TEXT))
+
+        assert signature == minhash_signature(shingles(QUESTION_TEXT))
+        assert len(band_keys(signature)) == NUM_BANDS
+
+    @pytest.mark.property
+    @given(text=st.text(alphabet="已知函数求值的是和为xy0123456789+-=", min_size=1, max_size=60))
+    @settings(max_examples=50)
+    def test_identical_text_shares_all_bands(self, text):
+        """相同文本的所有桶键一致"""
+        assert band_keys(minhash_signature(shingles(text))) == band_keys(minhash_signature(shingles(text)))
+
+
+class TestNearDuplicateIndex:
+    """测试索引查询与存储"""
+
+    @pytest.mark.unit
+    async def test_ocr_variant_matches(self):
+        """一字之差的题目命中，不同科目和无关题目不命中"""
+        index = NearDuplicateIndex(backend="disk", path="")
+        await index.add(build_question(QUESTION_TEXT), "数学", knowledge_points=["二次函数"], difficulty=0.5)
+
+        match = await index.lookup(build_question(OCR_VARIANT), "数学")
+        assert match is not None
+        assert match.knowledge_points == ["二次函数"]
+        assert match.difficulty == 0.5
+        assert 0.8 <= match.similarity < 1.0
+
+        assert await index.lookup(build_question(OCR_VARIANT), "物理") is None
+        assert await index.lookup(build_question("Read the passage and answer the questions"), "数学") is None
+
+    @pytest.mark.unit
+    async def test_disk_index_persisted(self, tmp_path):
+        """磁盘索引写回文件后可被新实例加载"""
+        path = str(tmp_path / "index.json")
+        await NearDuplicateIndex(backend="disk", path=path).add(
+            build_question(QUESTION_TEXT), "数学", knowledge_points=["二次函数"]
+        )
+
+        match = await NearDuplicateIndex(backend="disk", path=path).lookup(build_question(OCR_VARIANT), "数学")
+        assert match.knowledge_points == ["二次函数"]
+        assert match.difficulty is None
+
+    @pytest.mark.unit
+    async def test_redis_backend_merges_fields(self, fake_redis):
+        """Redis 后端按指纹合并字段"""
+        index = NearDuplicateIndex(backend="redis")
+        await index.add(build_question(QUESTION_TEXT), "数学", knowledge_points=["二次函数"])
+        await index.add(build_question(QUESTION_TEXT), "数学", difficulty=0.6)
+
+        entries = [json.loads(v) for k, v in fake_redis.data.items() if ":e:" in k]
+        assert len(entries) == 1
+        assert entries[0]["knowledge_points"] == ["二次函数"] and entries[0]["difficulty"] == 0.6
+
+        match = await index.lookup(build_question(OCR_VARIANT), "数学")
+        assert match.difficulty == 0.6
+
+
+class TestDeepSeekNearDuplicate:
+    """测试 DeepSeek 调用复用近似重复结果"""
+
+    @pytest.mark.unit
+    async def test_tag_and_difficulty_reused(self, monkeypatch):
+        """近似重复命中时不调用 API，并写回精确缓存"""
+        index = NearDuplicateIndex(backend="disk", path="")
+        await index.add(build_question(QUESTION_TEXT), "数学", knowledge_points=["二次函数"], difficulty=0.5)
+        monkeypatch.setattr(deepseek_module, "near_duplicate_index", index)
+        monkeypatch.setattr(deepseek_module, "question_cache", QuestionProfileCache())
+        service = DeepSeekService()
+
+        with patch.object(CacheService, "get_question_profile", AsyncMock(return_value=None)), \
+                patch.object(CacheService, "set_question_profile", AsyncMock()) as set_profile, \
+                patch.object(service, "_call_api", AsyncMock()) as call_api:
+            points = await service.tag_knowledge_points(build_question(OCR_VARIANT), "数学")
+            difficulty = await service.estimate_difficulty(build_question(OCR_VARIANT), "数学")
+
+        call_api.assert_not_awaited()
+        assert points == ["二次函数"]
+        assert difficulty == 0.5
+        assert set_profile.await_count == 2
+
+
+class TestOfflineBuilder:
+    """测试离线构建"""
+
+    @pytest.mark.unit
+    async def test_index_exam_parsed_result(self):
+        """只索引带知识点或难度的题目，科目缺省时取 exam_meta"""
+        index = NearDuplicateIndex(backend="disk", path="")
+        parsed_result = {
+            "exam_meta": {"subject": "数学"},
+            "questions": [
+                {"question_id": "Q1", "question_type": "subjective", "question_text": QUESTION_TEXT,
+                 "knowledge_tags": ["二次函数"], "difficulty": 0.5},
+                {"question_id": "Q2", "question_type": "objective", "question_text": "1+1=?"},
+                {"question_id": "Q3"},
+            ]
+        }
+
+        assert await index_exam(index, None, parsed_result) == 1
+        assert (await index.lookup(build_question(OCR_VARIANT), "数学")).difficulty == 0.5
@@ -0,0 +1,211 @@
+"""
+OCR 结果缓存测试
+"""
+import os
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from app.schemas.ocr import OCRResult, TextRegion, BoundingBox
+from app.services.ocr.base import OCRProvider
+from app.services.ocr.ocr_cache import OCRResultCache
+from app.services.ocr.ocr_service import OCRService
+from app.services.ocr.provider_health import ProviderHealthRouter
+
+
+@st.composite
+def ocr_result_strategy(draw):
+    """生成 OCR 结果"""
+    regions = [
+        TextRegion(
+            text=draw(st.text(min_size=1, max_size=30)),
+            bbox=BoundingBox(
+                x=draw(st.integers(min_value=0, max_value=2000)),
+                y=draw(st.integers(min_value=0, max_value=2000)),
+                width=draw(st.integers(min_value=1, max_value=500)),
+                height=draw(st.integers(min_value=1, max_value=200))
+            ),
+            confidence=draw(st.floats(min_value=0.0, max_value=1.0)),
+            type=draw(st.sampled_from(["printed", "handwritten"]))
+        )
+        for _ in range(draw(st.integers(min_value=0, max_value=5)))
+    ]
+    return OCRResult(
+        text_regions=regions,
+        overall_confidence=draw(st.floats(min_value=0.0, max_value=1.0)),
+        processing_time=draw(st.floats(min_value=0.0, max_value=10.0)),
+        provider=draw(st.sampled_from(["baidu", "tencent", "aliyun"]))
+    )
+
+
+def build_result(text: str = "1. 计算 1+1=（ ）") -> OCRResult:
+    """构造单区域 OCR 结果"""
+    return OCRResult(
+        text_regions=[
+            TextRegion(
+                text=text,
+                bbox=BoundingBox(x=10, y=20, width=300, height=30),
+                confidence=0.9,
+                type="printed"
+            )
+        ],
+        overall_confidence=0.9,
+        processing_time=0.5,
+        provider="stub"
+    )
+
+
+class StubOCRProvider(OCRProvider):
+    """记录调用次数的测试提供商"""
+
+    def __init__(self):
+        super().__init__("key")
+        self.calls = 0
+
+    async def recognize(self, image_bytes: bytes) -> OCRResult:
+        self.calls += 1
+        return build_result()
+
+    async def recognize_printed(self, image_bytes: bytes) -> OCRResult:
+        return await self.recognize(image_bytes)
+
+    async def recognize_handwritten(self, image_bytes: bytes) -> OCRResult:
+        return await self.recognize(image_bytes)
+
+
+class NamedOCRProvider(StubOCRProvider):
+    """以自身名称标记结果、可设为失败的测试提供商"""
+
+    def __init__(self, name: str, fail: bool = False):
+        super().__init__()
+        self.provider_name = name
+        self.fail = fail
+
+    async def recognize(self, image_bytes: bytes) -> OCRResult:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.provider_name} failed")
+        return build_result().model_copy(update={"provider": self.provider_name})
+
+
+class TestOCRCacheEncoding:
+    """测试缓存键与编码"""
+
+    @pytest.mark.property
+    @given(result=ocr_result_strategy())
+    @settings(max_examples=100)
+    def test_encode_decode_round_trip(self, result):
+        """紧凑编码应能无损还原 OCRResult"""
+        assert OCRResultCache.decode(OCRResultCache.encode(result)) == result
+
+    @pytest.mark.unit
+    def test_key_depends_on_content_and_mode(self):
+        """相同字节得到相同键，模式不同则键不同"""
+        key = OCRResultCache.make_key(b"image", "general")
+
+        assert key == OCRResultCache.make_key(b"image", "general")
+        assert key != OCRResultCache.make_key(b"image2", "general")
+        assert key != OCRResultCache.make_key(b"image", "printed")
+
+
+class TestOCRCacheTiers:
+    """测试两级缓存"""
+
+    @pytest.mark.unit
+    async def test_local_lru_eviction(self):
+        """L1 超出容量时淘汰最久未使用的条目"""
+        cache = OCRResultCache(backend="none", local_size=2)
+        await cache.set("a", build_result("a"))
+        await cache.set("b", build_result("b"))
+        await cache.get("a")
+        await cache.set("c", build_result("c"))
+
+        assert await cache.get("b") is None
+        assert (await cache.get("a")).text_regions[0].text == "a"
+        assert (await cache.get("c")).text_regions[0].text == "c"
+
+    @pytest.mark.unit
+    async def test_redis_tier_backfills_local(self, fake_redis):
+        """L2 命中后应回填 L1"""
+        writer = OCRResultCache(backend="redis")
+        key = writer.make_key(b"image", "general")
+        await writer.set(key, build_result())
+
+        reader = OCRResultCache(backend="redis")
+        assert await reader.get(key) == build_result()
+        assert await reader.get(key) == build_result()
+        assert reader.stats == {"local_hits": 1, "remote_hits": 1, "misses": 0}
+        assert reader.hit_rate() == 1.0
+
+    @pytest.mark.unit
+    async def test_disk_tier_with_ttl(self, tmp_path):
+        """磁盘缓存跨实例共享，过期条目被删除"""
+        key = OCRResultCache.make_key(b"image", "general")
+        writer = OCRResultCache(backend="disk", local_size=0, ttl=60, cache_dir=str(tmp_path))
+        await writer.set(key, build_result())
+
+        reader = OCRResultCache(backend="disk", local_size=0, ttl=60, cache_dir=str(tmp_path))
+        assert await reader.get(key) == build_result()
+
+        path = reader._disk_path(key)
+        os.utime(path, (0, 0))
+        assert await reader.get(key) is None
+        assert not os.path.exists(path)
+
+    @pytest.mark.unit
+    async def test_redis_failure_is_a_miss(self, monkeypatch):
+        """Redis 不可用时按未命中处理，不影响识别"""
+        async def broken_redis():
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr("app.core.redis_client.get_redis", broken_redis)
+        cache = OCRResultCache(backend="redis")
+
+        await cache.set("k", build_result())
+        cache._local.clear()
+        assert await cache.get("k") is None
+
+
+class TestOCRServiceCaching:
+    """测试 OCRService 接入缓存"""
+
+    @pytest.mark.unit
+    async def test_repeated_image_skips_provider(self):
+        """同一图像第二次识别应直接返回缓存结果"""
+        service = OCRService()
+        provider = StubOCRProvider()
+        service.providers = {"stub": provider}
+        service.default_provider = "stub"
+        service.cache = OCRResultCache(backend="none")
+        service.health = ProviderHealthRouter(backend="local")
+
+        first = await service.recognize(b"same image")
+        second = await service.recognize(b"same image")
+        await service.recognize(b"same image", use_cache=False)
+        await service.recognize_printed(b"same image")
+
+        assert first == second
+        assert provider.calls == 3
+
+    @pytest.mark.unit
+    async def test_failover_result_shared_across_providers(self, monkeypatch):
+        """故障转移产出的结果按图像缓存，之后无论选中哪个提供商都命中，并保留实际提供商"""
+        monkeypatch.setattr("app.services.ocr.ocr_service.settings.OCR_HEDGE_ENABLED", False)
+        primary, backup = NamedOCRProvider("primary", fail=True), NamedOCRProvider("backup")
+        service = OCRService()
+        service.providers = {"primary": primary, "backup": backup}
+        service.default_provider = "primary"
+        service.cache = OCRResultCache(backend="none")
+        service.health = ProviderHealthRouter(backend="local")
+
+        first = await service.recognize(b"image")
+        primary.fail = False
+        second = await service.recognize(b"image")
+        third = await service.recognize(b"image", provider_name="backup")
+
+        assert first.provider == second.provider == third.provider == "backup"
+        assert (primary.calls, backup.calls) == (1, 1)
+
+        # 指定提供商时不接受其他提供商的缓存结果
+        explicit = await service.recognize(b"image", provider_name="primary")
+        assert explicit.provider == "primary"
+        assert primary.calls == 2
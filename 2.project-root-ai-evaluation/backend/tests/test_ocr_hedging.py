@@ -0,0 +1,164 @@
+"""
+OCR 对冲请求测试
+"""
+import asyncio
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from app.schemas.ocr import OCRResult
+from app.services.ocr.base import OCRProvider
+from app.services.ocr.hedging import LatencyTracker, HedgeBudget
+from app.services.ocr.ocr_service import OCRService
+from app.services.ocr.provider_health import ProviderHealthRouter
+
+
+class DelayedOCRProvider(OCRProvider):
+    """按固定延迟返回的测试提供商"""
+
+    def __init__(self, name: str, delay: float, fail: bool = False):
+        super().__init__("key")
+        self.provider_name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = False
+
+    async def recognize(self, image_bytes: bytes) -> OCRResult:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.provider_name} failed")
+        return OCRResult(
+            text_regions=[],
+            overall_confidence=1.0,
+            processing_time=self.delay,
+            provider=self.provider_name
+        )
+
+    async def recognize_printed(self, image_bytes: bytes) -> OCRResult:
+        return await self.recognize(image_bytes)
+
+    async def recognize_handwritten(self, image_bytes: bytes) -> OCRResult:
+        return await self.recognize(image_bytes)
+
+
+def build_service(*providers: DelayedOCRProvider) -> OCRService:
+    """构造只包含测试提供商、不带缓存的 OCRService"""
+    service = OCRService()
+    service.providers = {p.provider_name: p for p in providers}
+    service.default_provider = providers[0].provider_name
+    service.cache = None
+    service.health = ProviderHealthRouter(backend="local")
+    service.latency = LatencyTracker(min_samples=1, default_delay=0.05, min_delay=0.01)
+    service.hedge_budget = HedgeBudget(max_ratio=0.5, burst=1)
+    return service
+
+
+class TestLatencyTracker:
+    """测试延迟统计"""
+
+    @pytest.mark.unit
+    def test_hedge_delay_uses_percentile(self):
+        """样本不足时使用默认值，足够后使用 p90"""
+        tracker = LatencyTracker(window=100, percentile=0.9, min_samples=10,
+                                 default_delay=5.0, min_delay=0.1)
+        assert tracker.hedge_delay("baidu") == 5.0
+
+        for i in range(1, 11):
+            tracker.record("baidu", float(i))
+
+        assert tracker.percentile("baidu", 0.9) == 9.0
+        assert tracker.hedge_delay("baidu") == 9.0
+        assert tracker.hedge_delay("tencent") == 5.0
+
+    @pytest.mark.unit
+    def test_window_keeps_recent_samples(self):
+        """只保留最近 window 个样本"""
+        tracker = LatencyTracker(window=5, min_samples=1, min_delay=0.0)
+        for latency in [10.0] * 5 + [1.0] * 5:
+            tracker.record("baidu", latency)
+
+        assert tracker.sample_count("baidu") == 5
+        assert tracker.hedge_delay("baidu") == 1.0
+
+
+class TestHedgeBudget:
+    """测试对冲预算"""
+
+    @pytest.mark.property
+    @given(
+        requests=st.integers(min_value=0, max_value=500),
+        ratio=st.floats(min_value=0.0, max_value=1.0)
+    )
+    @settings(max_examples=100)
+    def test_hedges_bounded_by_ratio(self, requests, ratio):
+        """对冲次数不超过 请求数 × 比例 + 突发容量"""
+        budget = HedgeBudget(max_ratio=ratio, burst=2)
+        hedges = 0
+        for _ in range(requests):
+            budget.record_request()
+            if budget.try_acquire():
+                hedges += 1
+
+        assert hedges <= requests * ratio + 2 + 1e-9
+
+
+class TestHedgedRecognize:
+    """测试对冲识别"""
+
+    @pytest.mark.unit
+    async def test_slow_primary_is_hedged(self):
+        """主提供商超时未返回时取备用提供商结果，并取消主请求"""
+        primary = DelayedOCRProvider("primary", delay=1.0)
+        backup = DelayedOCRProvider("backup", delay=0.01)
+        service = build_service(primary, backup)
+
+        result = await service.recognize(b"image")
+        await asyncio.sleep(0)
+
+        assert result.provider == "backup"
+        assert primary.cancelled
+
+    @pytest.mark.unit
+    async def test_fast_primary_is_not_hedged(self):
+        """主提供商及时返回时不发起对冲"""
+        primary = DelayedOCRProvider("primary", delay=0.0)
+        backup = DelayedOCRProvider("backup", delay=0.0)
+        service = build_service(primary, backup)
+
+        result = await service.recognize(b"image")
+
+        assert result.provider == "primary"
+        assert backup.calls == 0
+        assert service.latency.sample_count("primary") == 1
+
+    @pytest.mark.unit
+    async def test_exhausted_budget_waits_for_primary(self):
+        """对冲预算耗尽时继续等待主提供商"""
+        primary = DelayedOCRProvider("primary", delay=0.1)
+        backup = DelayedOCRProvider("backup", delay=0.0)
+        service = build_service(primary, backup)
+        service.hedge_budget = HedgeBudget(max_ratio=0.0, burst=0)
+
+        result = await service.recognize(b"image")
+
+        assert result.provider == "primary"
+        assert backup.calls == 0
+
+    @pytest.mark.unit
+    async def test_failed_hedge_falls_back_to_remaining(self):
+        """主请求和对冲请求都失败时继续故障转移"""
+        primary = DelayedOCRProvider("primary", delay=0.1, fail=True)
+        backup = DelayedOCRProvider("backup", delay=0.1, fail=True)
+        last = DelayedOCRProvider("last", delay=0.0)
+        service = build_service(primary, backup, last)
+        service.latency.record("last", 1.0)
+
+        result = await service.recognize(b"image")
+
+        assert result.provider == "last"
+        assert backup.calls == 1
@@ -0,0 +1,281 @@
+"""
+分块并行 OCR 测试
+"""
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.schemas.ocr import BoundingBox, OCRResult, TextRegion
+from app.services.ocr.base import OCRProvider
+from app.services.ocr.hedging import HedgeBudget, LatencyTracker
+from app.services.ocr.ocr_service import OCRService
+from app.services.ocr.provider_health import ProviderHealthRouter
+from app.services.ocr.tiling import (
+    Tile, TilePlan, detect_columns, plan_tiles, prepare_tiles, split_span, stitch
+)
+
+LINE_HEIGHT = 30
+LINE_PITCH = 60
+
+
+def exam_page(width: int = 3000, height: int = 4200, columns=((150, 1400), (1600, 2850))):
+    """
+    合成试卷页：每栏若干黑色“文本行”，每行宽度唯一（假提供商以宽度作为行文本）
+
+    Returns:
+        Tuple[灰度图, List[(文本, 整页边界框)]]
+    """
+    page = np.full((height, width), 255, np.uint8)
+    lines = []
+    n = 0
+    for left, _ in columns:
+        for y in range(100, height - 100, LINE_PITCH):
+            line_width = 200 + 5 * n
+            page[y:y + LINE_HEIGHT, left:left + line_width] = 0
+            lines.append((f"line{40 + n}", (left, y, line_width, LINE_HEIGHT)))
+            n += 1
+    return page, lines
+
+
+def encode(page: np.ndarray) -> bytes:
+    return cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+
+class LineOCRProvider(OCRProvider):
+    """把图像中的每个黑色矩形识别为一行文本（文本由矩形宽度决定）"""
+
+    def __init__(self, delay: float = 0.01, fail: bool = False):
+        super().__init__("key")
+        self.provider_name = "lines"
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def recognize(self, image_bytes: bytes) -> OCRResult:
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("provider failed")
+            gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+            _, mask = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY_INV)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            regions = []
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                regions.append(TextRegion(
+                    text=f"line{round(w / 5)}", bbox=BoundingBox(x=x, y=y, width=w, height=h),
+                    confidence=0.9, type="printed"
+                ))
+            return OCRResult(text_regions=regions, overall_confidence=0.9, processing_time=self.delay,
+                             provider=self.provider_name)
+        finally:
+            self.active -= 1
+
+    async def recognize_printed(self, image_bytes: bytes) -> OCRResult:
+        return await self.recognize(image_bytes)
+
+    async def recognize_handwritten(self, image_bytes: bytes) -> OCRResult:
+        return await self.recognize(image_bytes)
+
+
+def build_service(provider: OCRProvider) -> OCRService:
+    """构造只包含测试提供商、不带缓存和对冲的 OCRService"""
+    service = OCRService()
+    service.providers = {provider.provider_name: provider}
+    service.default_provider = provider.provider_name
+    service.cache = None
+    service.health = ProviderHealthRouter(backend="local")
+    service.latency = LatencyTracker(min_samples=1, default_delay=5.0, min_delay=1.0)
+    service.hedge_budget = HedgeBudget(max_ratio=0.0, burst=0)
+    return service
+
+
+def assert_lines_match(result: OCRResult, lines):
+    """每一行恰好出现一次，坐标为整页坐标"""
+    texts = [region.text for region in result.text_regions]
+    assert sorted(texts) == sorted(text for text, _ in lines)
+    boxes = {region.text: region.bbox for region in result.text_regions}
+    for text, (x, y, w, h) in lines:
+        box = boxes[text]
+        assert abs(box.x - x) <= 2 and abs(box.y - y) <= 2
+        assert abs(box.width - w) <= 2 and abs(box.height - h) <= 2
+
+
+class TestTilePlanning:
+    """测试分栏检测和条带切分"""
+
+    @pytest.mark.unit
+    def test_split_span_overlaps_and_covers(self):
+        spans = split_span(5000, 2048, 128)
+
+        assert spans[0][0] == 0 and spans[-1][1] == 5000
+        assert all(end - start <= 2048 for start, end in spans)
+        assert all(prev_end - start == 128 for (_, prev_end), (start, _) in zip(spans, spans[1:]))
+        assert split_span(1000, 2048, 128) == [(0, 1000)]
+
+    @pytest.mark.unit
+    def test_split_span_snaps_to_blank(self):
+        blank = np.zeros(5000, bool)
+        blank[1900:1910] = True
+
+        spans = split_span(5000, 2048, 128, blank)
+
+        assert spans[0] == (0, 1910)
+        assert spans[1][0] == 1910 - 128
+
+    @pytest.mark.unit
+    def test_two_columns_detected(self):
+        page, _ = exam_page()
+        ink = (page < 128).astype(np.uint8)
+
+        columns = detect_columns(ink)
+
+        assert len(columns) == 2
+        assert 1100 < columns[0][1] == columns[1][0] < 1600
+
+    @pytest.mark.unit
+    def test_single_column_not_split(self):
+        page, _ = exam_page(width=2000, height=1800, columns=((150, 1800),))
+
+        plan = plan_tiles(page, 2048, 128)
+
+        assert plan.columns == 1
+        assert plan.tiles == [Tile(0, 0, 2000, 1800)]
+
+    @pytest.mark.unit
+    def test_strips_cut_between_lines(self):
+        page, _ = exam_page()
+
+        plan = plan_tiles(page, 2048, 128)
+
+        assert plan.columns == 2
+        assert len(plan.tiles) == 6
+        for tile in plan.tiles:
+            assert tile.height <= 2048
+            bottom = tile.y + tile.height
+            if bottom < plan.height:
+                # 切分边落在行间空白上
+                assert (page[bottom - 1, tile.x:tile.x + tile.width] == 255).all()
+
+    @pytest.mark.unit
+    def test_small_page_not_tiled(self):
+        page, _ = exam_page(width=1600, height=1200, columns=((100, 1500),))
+
+        plan, tiles = prepare_tiles(encode(page), 2048, 128, 95)
+
+        assert len(plan.tiles) == 1
+        assert tiles == []
+
+
+class TestStitch:
+    """测试分块结果拼接"""
+
+    @staticmethod
+    def region(text, x, y, w=100, h=30, confidence=0.9):
+        return TextRegion(text=text, bbox=BoundingBox(x=x, y=y, width=w, height=h),
+                          confidence=confidence, type="printed")
+
+    @staticmethod
+    def result(*regions):
+        return OCRResult(text_regions=list(regions), overall_confidence=0.9, processing_time=0.1, provider="p")
+
+    @pytest.mark.unit
+    def test_overlap_deduplicated_and_translated(self):
+        plan = TilePlan(width=1000, height=3000, columns=1, tiles=[
+            Tile(0, 0, 1000, 2000), Tile(0, 1900, 1000, 1100)
+        ])
+        first = self.result(self.region("第1题", 50, 100), self.region("第2题 x=2", 50, 1950))
+        # 第 2 题在重叠区中也被第二个条带识别（文本略有差异），被切断的第 3 题只保留完整的一份
+        second = self.result(
+            self.region("第2题 x=2", 50, 50), self.region("第3题", 50, 95, h=5), self.region("第4题", 50, 500)
+        )
+        first.text_regions.append(self.region("第3题 y=1", 50, 1985, h=15))
+        second.text_regions[1] = self.region("第3题 y=1", 50, 85, h=30)
+
+        stitched = stitch(plan, [first, second], "p", 1.5)
+
+        assert [r.text for r in stitched.text_regions] == ["第1题", "第2题 x=2", "第3题 y=1", "第4题"]
+        assert [r.bbox.y for r in stitched.text_regions] == [100, 1950, 1985, 2400]
+        assert stitched.text_regions[2].bbox.height == 30
+        assert stitched.processing_time == 1.5
+
+    @pytest.mark.unit
+    def test_columns_ordered_before_rows(self):
+        plan = TilePlan(width=2000, height=1000, columns=2, tiles=[
+            Tile(0, 0, 1000, 1000, column=0), Tile(1000, 0, 1000, 1000, column=1)
+        ])
+
+        stitched = stitch(plan, [
+            self.result(self.region("左下", 10, 800), self.region("左上", 10, 10)),
+            self.result(self.region("右上", 10, 5)),
+        ], "p", 0.1)
+
+        assert [r.text for r in stitched.text_regions] == ["左上", "左下", "右上"]
+        assert stitched.text_regions[2].bbox.x == 1010
+
+
+class TestTiledRecognition:
+    """测试 OCRService 的分块识别"""
+
+    @pytest.fixture(autouse=True)
+    def tiling(self, monkeypatch):
+        monkeypatch.setattr(settings, "OCR_TILE_MODE", "auto")
+        monkeypatch.setattr(settings, "OCR_TILE_CONCURRENCY", 3)
+
+    @pytest.mark.unit
+    async def test_tiles_recognized_concurrently_and_stitched(self):
+        page, lines = exam_page()
+        provider = LineOCRProvider()
+
+        result = await build_service(provider).recognize(encode(page))
+
+        assert provider.calls == 6
+        assert provider.max_active == 3
+        assert_lines_match(result, lines)
+        # 按栏阅读顺序
+        assert result.text_regions[0].text == lines[0][0]
+        assert result.text_regions[-1].text == lines[-1][0]
+
+    @pytest.mark.unit
+    async def test_same_lines_as_whole_page(self, monkeypatch):
+        page, lines = exam_page()
+        monkeypatch.setattr(settings, "OCR_TILE_MODE", "off")
+        provider = LineOCRProvider()
+
+        result = await build_service(provider).recognize(encode(page))
+
+        assert provider.calls == 1
+        assert_lines_match(result, lines)
+
+    @pytest.mark.unit
+    async def test_undecodable_image_recognized_whole(self):
+        provider = LineOCRProvider()
+        provider.recognize = lambda image_bytes: asyncio.sleep(0, OCRResult(
+            text_regions=[], overall_confidence=1.0, processing_time=0.0, provider="lines"
+        ))
+
+        result = await build_service(provider).recognize(b"not an image")
+
+        assert result.text_regions == []
+
+    @pytest.mark.unit
+    async def test_tile_failure_raises(self):
+        page, _ = exam_page()
+
+        with pytest.raises(Exception):
+            await build_service(LineOCRProvider(fail=True)).recognize(encode(page), retry_on_failure=False)
+
+    @pytest.mark.unit
+    async def test_unknown_mode_rejected(self, monkeypatch):
+        monkeypatch.setattr(settings, "OCR_TILE_MODE", "grid")
+
+        with pytest.raises(ValueError, match="Unknown OCR tile mode"):
+            await build_service(LineOCRProvider()).recognize(b"x")
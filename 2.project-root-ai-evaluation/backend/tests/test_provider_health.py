@@ -0,0 +1,177 @@
+"""
+OCR 提供商健康评分与熔断测试
+"""
+import time
+import httpx
+import pytest
+
+from app.services.ocr.provider_health import (
+    ProviderHealthRouter, classify_error,
+    CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN
+)
+from app.services.ocr.ocr_service import OCRService
+from tests.test_ocr_hedging import DelayedOCRProvider
+
+
+def build_router(**kwargs) -> ProviderHealthRouter:
+    """构造小窗口、低阈值的本地路由器"""
+    options = dict(
+        backend="local", window=60, bucket_seconds=10, failure_rate=0.5,
+        min_requests=4, open_seconds=30, ewma_alpha=0.5, latency_ref=1.0,
+        sync_interval=0
+    )
+    options.update(kwargs)
+    return ProviderHealthRouter(**options)
+
+
+def http_error(status: int) -> httpx.HTTPStatusError:
+    """构造 HTTP 状态码错误"""
+    request = httpx.Request("POST", "https://ocr.example.com")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status, request=request)
+    )
+
+
+class TestErrorClassification:
+    """测试错误分类"""
+
+    @pytest.mark.unit
+    def test_classify_error(self):
+        request = httpx.Request("POST", "https://ocr.example.com")
+        assert classify_error(httpx.ReadTimeout("t", request=request)) == "timeout"
+        assert classify_error(http_error(429)) == "rate_limited"
+        assert classify_error(http_error(503)) == "server"
+        assert classify_error(http_error(401)) == "auth"
+        assert classify_error(http_error(400)) == "client"
+        assert classify_error(httpx.ConnectError("c", request=request)) == "network"
+        assert classify_error(ValueError("x")) == "other"
+
+
+class TestCircuitBreaker:
+    """测试熔断状态机"""
+
+    @pytest.mark.unit
+    async def test_opens_after_failure_rate_exceeded(self):
+        """窗口失败率超过阈值后熔断，并按类别计数"""
+        router = build_router()
+        await router.record_success("baidu", 0.5)
+        for _ in range(2):
+            await router.record_failure("baidu", http_error(503))
+        assert router.state("baidu") == CIRCUIT_CLOSED
+
+        await router.record_failure("baidu", http_error(429))
+
+        assert router.state("baidu") == CIRCUIT_OPEN
+        assert not router.is_available("baidu")
+        counts = router.counts("baidu")
+        assert counts["err:server"] == 2
+        assert counts["err:rate_limited"] == 1
+
+    @pytest.mark.unit
+    async def test_half_open_allows_single_probe(self):
+        """冷却结束后只放行一个探测请求，成功则恢复"""
+        router = build_router()
+        for _ in range(4):
+            await router.record_failure("baidu", http_error(503))
+        router.get("baidu").open_until = time.time() - 1
+
+        assert router.state("baidu") == CIRCUIT_HALF_OPEN
+        assert router.is_available("baidu")
+        router.begin_call("baidu")
+        assert not router.is_available("baidu")
+
+        await router.record_success("baidu", 0.2)
+
+        assert router.state("baidu") == CIRCUIT_CLOSED
+        assert router.counts("baidu")["fail"] == 0
+
+    @pytest.mark.unit
+    async def test_failed_probe_reopens(self):
+        """探测失败时重新熔断"""
+        router = build_router()
+        for _ in range(4):
+            await router.record_failure("baidu", http_error(503))
+        router.get("baidu").open_until = time.time() - 1
+        router.begin_call("baidu")
+
+        await router.record_failure("baidu", http_error(503))
+
+        assert router.state("baidu") == CIRCUIT_OPEN
+        assert router.get("baidu").open_until > time.time()
+
+
+class TestHealthRouting:
+    """测试健康评分路由"""
+
+    @pytest.mark.unit
+    async def test_rank_prefers_fast_reliable_provider(self):
+        """评分综合成功率和 EWMA 延迟，熔断中的提供商被排除"""
+        router = build_router()
+        for _ in range(5):
+            await router.record_success("baidu", 3.0)
+            await router.record_success("tencent", 0.3)
+        for _ in range(4):
+            await router.record_failure("aliyun", http_error(500))
+
+        assert router.rank(["baidu", "tencent", "aliyun"]) == ["tencent", "baidu"]
+        assert router.rank(["baidu", "tencent"], preferred="baidu")[0] == "tencent"
+        assert build_router().rank(["a", "b"], preferred="b") == ["b", "a"]
+
+    @pytest.mark.unit
+    async def test_select_provider_skips_open_circuit(self):
+        """默认提供商熔断时路由到其他提供商"""
+        service = OCRService()
+        service.providers = {
+            "baidu": DelayedOCRProvider("baidu", 0.0),
+            "tencent": DelayedOCRProvider("tencent", 0.0),
+        }
+        service.default_provider = "baidu"
+        service.health = build_router()
+
+        assert service.select_provider().provider_name == "baidu"
+        for _ in range(4):
+            await service.health.record_failure("baidu", http_error(503))
+
+        assert service.select_provider().provider_name == "tencent"
+        assert service.select_provider("baidu").provider_name == "tencent"
+
+
+class TestSharedState:
+    """测试通过 Redis 共享状态"""
+
+    @pytest.mark.unit
+    async def test_circuit_shared_across_processes(self, fake_redis):
+        """一个进程触发的熔断和计数在另一个进程同步后可见"""
+        api_process = build_router(backend="redis")
+        worker_process = build_router(backend="redis")
+
+        await worker_process.record_success("baidu", 1.0)
+        for _ in range(4):
+            await worker_process.record_failure("baidu", http_error(503))
+        assert worker_process.state("baidu") == CIRCUIT_OPEN
+
+        await api_process.sync(["baidu"], force=True)
+
+        assert api_process.state("baidu") == CIRCUIT_OPEN
+        assert api_process.counts("baidu")["fail"] == 4
+        assert api_process.get("baidu").ewma_latency == 1.0
+
+        # 探测成功后恢复状态同样共享
+        api_process.get("baidu").open_until = time.time() - 1
+        await api_process.record_success("baidu", 0.5)
+        await worker_process.sync(["baidu"], force=True)
+
+        assert worker_process.state("baidu") == CIRCUIT_CLOSED
+        assert worker_process.counts("baidu")["fail"] == 0
+
+    @pytest.mark.unit
+    async def test_stale_buckets_pruned(self, fake_redis):
+        """同步时删除窗口外的分桶字段"""
+        router = build_router(backend="redis")
+        old_bucket = router._bucket() - 100
+        fake_redis.hashes["ocr_health:baidu"] = {f"{old_bucket}:fail": "9"}
+
+        await router.sync(["baidu"], force=True)
+
+        assert router.counts("baidu")["fail"] == 0
+        assert fake_redis.hashes["ocr_health:baidu"] == {}
@@ -0,0 +1,195 @@
+"""
+题目画像缓存测试
+"""
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from hypothesis import given, strategies as st, settings
+
+from app.services import deepseek_service as deepseek_module
+from app.services.cache_service import CacheService
+from app.services.deepseek_service import DeepSeekService
+from app.services.near_duplicate import NearDuplicateIndex
+from app.services.question_cache import (
+    QuestionProfileCache, SCHEMA_VERSION, normalize_question_text, question_fingerprint
+)
+from tests.conftest import build_question
+
+
+def api_response(data: dict) -> dict:
+    """构造 chat/completions 响应"""
+    return {"choices": [{"message": {"content": json.dumps(data, ensure_ascii=False)}}]}
+
+
+@pytest.fixture
+def profile_store():
+    """用内存字典替代 Redis 中的题目画像缓存"""
+    store = {}
+
+    async def get_profile(subject, fingerprint):
+        return store.get((subject, fingerprint))
+
+    async def set_profile(subject, fingerprint, profile):
+        store[(subject, fingerprint)] = dict(profile)
+
+    with patch.object(CacheService, "get_question_profile", side_effect=get_profile), \
+            patch.object(CacheService, "set_question_profile", side_effect=set_profile):
+        yield store
+
+
+@pytest.fixture
+def cache(monkeypatch, profile_store):
+    """使用独立统计的题目画像缓存"""
+    instance = QuestionProfileCache()
+    monkeypatch.setattr(deepseek_module, "question_cache", instance)
+    monkeypatch.setattr(
+        deepseek_module, "near_duplicate_index", NearDuplicateIndex(backend="disk", path="")
+    )
+    return instance
+
+
+class TestNormalization:
+    """测试题目文本规范化"""
+
+    @pytest.mark.unit
+    def test_ocr_variants_share_fingerprint(self):
+        """空白、全/半角标点和选项顺序不同的同一道题指纹相同"""
+        variants = [
+            build_question("下列函数中，是偶函数的是（  ）A．y=x²  B．y=x³  C．y=2x  D．y=|x|+1"),
+            build_question("下列函数中,是偶函数的是( )\nA.y=2x\nB.y=x²\nC.y=|x|+1\nD.y=x³"),
+            build_question("下列函数中，是偶函数的是（）", options=["A、y=x³", "B、y=x²", "C、y=|x|+1", "D、y=2x"]),
+        ]
+
+        assert len({question_fingerprint(q) for q in variants}) == 1
+        assert len(question_fingerprint(variants[0])) == 64
+
+    @pytest.mark.unit
+    def test_different_questions_differ(self):
+        """内容不同的题目（包括上标与普通数字）指纹不同"""
+        assert normalize_question_text("求 x²+1 的值") != normalize_question_text("求 x2+1 的值")
+        assert normalize_question_text("A.1 B.2") != normalize_question_text("A.1 B.3")
+
+    @pytest.mark.unit
+    def test_text_without_option_sequence_kept(self):
+        """选项标记不从 A 连续出现时不拆分"""
+        assert normalize_question_text("方案 B. 更好") == "方案b.更好"
+
+    @pytest.mark.property
+    @given(
+        stem=st.text(alphabet="已知函数求值的是和为", min_size=1, max_size=20),
+        options=st.lists(
+            st.text(alphabet="xy0123456789+-=", min_size=1, max_size=6),
+            min_size=2, max_size=4, unique=True
+        ),
+        data=st.data()
+    )
+    @settings(max_examples=100)
+    def test_option_order_and_spacing_ignored(self, stem, options, data):
+        """任意打乱选项顺序、插入空白后规范化结果不变"""
+        shuffled = data.draw(st.permutations(options))
+        original = stem + "（ ）" + "".join(f"{chr(65 + i)}．{o}" for i, o in enumerate(options))
+        noisy = stem + "()" + " ".join(f"{chr(65 + i)}. {o} " for i, o in enumerate(shuffled))
+
+        assert normalize_question_text(original) == normalize_question_text(noisy)
+
+
+class TestQuestionProfileCache:
+    """测试缓存记录读写"""
+
+    @pytest.mark.unit
+    async def test_fields_merged_into_one_entry(self, cache, profile_store):
+        """知识点和难度分别写入后合并为一条带版本号的记录"""
+        question = build_question("1+1=?")
+        await cache.update(question, "数学", knowledge_points=["加法"])
+        await cache.update(question, "数学", difficulty=0.2)
+
+        assert list(profile_store.values()) == [
+            {"v": SCHEMA_VERSION, "knowledge_points": ["加法"], "difficulty": 0.2}
+        ]
+        assert await cache.get(question, "数学") == {"knowledge_points": ["加法"], "difficulty": 0.2}
+        assert await cache.get(question, "物理") == {}
+
+    @pytest.mark.unit
+    async def test_other_schema_version_is_miss(self, cache, profile_store):
+        """版本号不一致的记录视为未命中"""
+        question = build_question("1+1=?")
+        profile_store[("数学", question_fingerprint(question))] = {
+            "v": SCHEMA_VERSION - 1, "knowledge_points": ["加法"], "difficulty": 0.2
+        }
+
+        assert await cache.get(question, "数学") == {}
+
+    @pytest.mark.unit
+    async def test_report_counts_saved_calls(self, cache):
+        """命中率报告按字段统计，每次命中计为省去一次调用"""
+        question = build_question("1+1=?")
+        await cache.get(question, "数学")
+        await cache.update(question, "数学", knowledge_points=["加法"], difficulty=0.2)
+        await cache.get(question, "数学")
+        await cache.get(question, "数学", ("difficulty",))
+
+        report = cache.report()
+        assert report["fields"]["knowledge_points"] == {"lookups": 2, "hits": 1, "hit_rate": 0.5}
+        assert report["fields"]["difficulty"]["hits"] == 2
+        assert report["llm_calls_saved"] == 3
+        assert report["hit_rate"] == pytest.approx(0.6)
+
+
+class TestDeepSeekCaching:
+    """测试 DeepSeek 调用接入题目画像缓存"""
+
+    @pytest.mark.unit
+    async def test_variant_question_served_from_cache(self, cache):
+        """带 OCR 噪声的同一道题不再调用 API"""
+        service = DeepSeekService()
+        responses = [api_response({"knowledge_points": ["偶函数"]}), api_response({"difficulty": 0.4})]
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=responses)) as call_api:
+            await service.enrich_question(build_question("下列函数中，是偶函数的是（  ）"), "数学")
+            again = await service.enrich_question(build_question("下列函数中,是偶函数的是( )"), "数学")
+
+        assert call_api.await_count == 2
+        assert again.knowledge_tags == ["偶函数"]
+        assert again.difficulty == 0.4
+        assert cache.report()["llm_calls_saved"] == 2
+
+    @pytest.mark.unit
+    async def test_failed_difficulty_not_cached(self, cache, profile_store):
+        """难度估算失败时的默认值不写入缓存"""
+        service = DeepSeekService()
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=Exception("down"))):
+            assert await service.estimate_difficulty(build_question("1+1=?"), "数学") == 0.5
+
+        assert profile_store == {}
+
+    @pytest.mark.unit
+    async def test_incomplete_response_not_cached(self, cache, profile_store):
+        """响应缺少难度或知识点时返回默认值，不写入缓存"""
+        service = DeepSeekService()
+        responses = [api_response({"reason": "无法判断"}), api_response({"difficulty": "hard"}),
+                     api_response({"points": ["加法"]})]
+
+        with patch.object(service, "_call_api", AsyncMock(side_effect=responses)), \
+                patch.object(deepseek_module.settings, "KNOWLEDGE_CLASSIFIER_ENABLED", False):
+            assert await service.estimate_difficulty(build_question("1+1=?"), "数学") == 0.5
+            assert await service.estimate_difficulty(build_question("1+1=?"), "数学") == 0.5
+            assert await service.tag_knowledge_points(build_question("1+1=?"), "数学") == []
+
+        assert profile_store == {}
+
+    @pytest.mark.unit
+    async def test_batch_skips_cached_questions(self, cache):
+        """批量丰富只为未缓存的题目调用 API"""
+        service = DeepSeekService()
+        cached_question = build_question("1+1=?", question_id="Q1")
+        await cache.update(cached_question, "数学", knowledge_points=["加法"], difficulty=0.1)
+        questions = [build_question("1 + 1 = ?", question_id="Q1"), build_question("2×3=?", question_id="Q2")]
+        response = api_response({"results": [{"id": "Q2", "knowledge_points": ["乘法"], "difficulty": 0.2}]})
+
+        with patch.object(service, "_call_api", AsyncMock(return_value=response)) as call_api:
+            result = await service.enrich_questions_batch(questions, "数学")
+
+        assert call_api.await_count == 1
+        assert "1+1" not in call_api.await_args.args[0][-1]["content"]
+        assert [(q.knowledge_tags, q.difficulty) for q in result] == [(["加法"], 0.1), (["乘法"], 0.2)]
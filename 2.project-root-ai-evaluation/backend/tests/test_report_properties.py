@@ -380,17 +380,17 @@ def test_pdf_generation():
 
 
 # ============================================================================
-# Test: OSS 上传（简化测试）
+# Test: OSS 上传
 # ============================================================================
 
-def test_oss_upload():
-    """测试 OSS 上传功能（简化版本）"""
+async def test_oss_upload(local_storage):
+    """测试报告上传到对象存储"""
     file_content = b"test content"
     filename = "test-report.html"
     
-    url = report_service.upload_to_oss(file_content, filename)
+    url = await report_service.upload_to_oss(file_content, filename)
     
-    # 验证返回的是 URL 字符串
+    # 验证返回的是 URL 字符串，且内容可读回
     assert isinstance(url, str)
-    assert url.startswith("https://")
     assert filename in url
+    assert await local_storage.get(local_storage.key_from_url(url)) == file_content
@@ -0,0 +1,194 @@
+"""
+LLM 请求合并测试
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.schemas.parser import Question
+from app.services.cache_service import CacheService
+from app.services.deepseek_service import DeepSeekService
+from app.services.single_flight import SingleFlight, request_fingerprint
+
+
+@pytest.fixture
+def memory_cache():
+    """用内存字典替代 Redis 中的 LLM 响应缓存，记录写入次数"""
+    store = {}
+    writes = []
+
+    async def get_llm_response(key):
+        return store.get(key)
+
+    async def set_llm_response(key, value):
+        writes.append(key)
+        store[key] = value
+
+    with patch.object(CacheService, "get_llm_response", side_effect=get_llm_response), \
+            patch.object(CacheService, "set_llm_response", side_effect=set_llm_response):
+        yield writes
+
+
+class TestRequestFingerprint:
+    """测试请求指纹"""
+
+    @pytest.mark.unit
+    def test_whitespace_normalized_params_significant(self):
+        messages = [{"role": "user", "content": "题目：1+1=?\n\n  请回答"}]
+        spaced = [{"role": "user", "content": "题目：1+1=? 请回答 "}]
+
+        key = request_fingerprint("deepseek-chat", messages, temperature=0.3, max_tokens=100)
+
+        assert key == request_fingerprint("deepseek-chat", spaced, max_tokens=100, temperature=0.3)
+        assert key != request_fingerprint("deepseek-chat", messages, temperature=0.5, max_tokens=100)
+        assert key != request_fingerprint("deepseek-chat", [{"role": "user", "content": "1+2"}],
+                                          temperature=0.3, max_tokens=100)
+
+
+class TestSingleFlight:
+    """测试进程内与跨进程合并"""
+
+    @pytest.mark.unit
+    async def test_concurrent_identical_requests_call_once(self, memory_cache):
+        """40 个并发相同请求只调用一次上游，结果只写入缓存一次"""
+        flight = SingleFlight("test", backend="local")
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"answer": 42}
+
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(40)))
+
+        assert calls == 1
+        assert all(r == {"answer": 42} for r in results)
+        assert memory_cache == ["k"]
+        assert not flight._inflight
+
+    @pytest.mark.unit
+    async def test_cancelled_waiter_does_not_cancel_others(self, memory_cache):
+        """一个等待者被取消时其他等待者仍拿到结果"""
+        flight = SingleFlight("test", backend="local")
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+
+        first = asyncio.create_task(flight.do("k", call))
+        second = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == {"ok": True}
+
+    @pytest.mark.unit
+    async def test_failure_shared_then_retried(self, memory_cache):
+        """失败传递给所有等待者，之后的请求重新调用"""
+        flight = SingleFlight("test", backend="local")
+        call = AsyncMock(side_effect=[RuntimeError("down"), {"ok": True}])
+
+        results = await asyncio.gather(
+            flight.do("k", call), flight.do("k", call), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+        assert await flight.do("k", call) == {"ok": True}
+        assert call.await_count == 2
+
+    @pytest.mark.unit
+    async def test_invalid_result_not_cached(self, memory_cache):
+        """未通过校验的结果返回给调用方但不写入缓存，下次请求重新调用"""
+        flight = SingleFlight("test", backend="local")
+        call = AsyncMock(side_effect=[{"text": "截断"}, {"text": "{}"}])
+
+        def valid(result):
+            return result["text"] == "{}"
+
+        assert await flight.do("k", call, valid) == {"text": "截断"}
+        assert memory_cache == []
+        assert await flight.do("k", call, valid) == {"text": "{}"}
+        assert await flight.do("k", call, valid) == {"text": "{}"}
+        assert call.await_count == 2
+        assert memory_cache == ["k"]
+
+    @pytest.mark.unit
+    async def test_invalid_cached_result_ignored(self, memory_cache):
+        """缓存中未通过校验的旧结果视为未命中"""
+        flight = SingleFlight("test", backend="local")
+        await CacheService.set_llm_response("k", {"text": "截断"})
+        call = AsyncMock(return_value={"text": "{}"})
+
+        assert await flight.do("k", call, lambda result: result["text"] == "{}") == {"text": "{}"}
+        call.assert_awaited_once()
+
+    @pytest.mark.unit
+    async def test_redis_lease_across_processes(self, memory_cache, fake_redis):
+        """另一个进程持有租约时等待其写入的结果"""
+        api_process = SingleFlight("test", backend="redis", poll_interval=0.01)
+        worker_process = SingleFlight("test", backend="redis", poll_interval=0.01)
+
+        async def slow_call():
+            await asyncio.sleep(0.05)
+            return {"from": "worker"}
+
+        follower_call = AsyncMock(return_value={"from": "api"})
+
+        leader = asyncio.create_task(worker_process.do("k", slow_call))
+        await asyncio.sleep(0.01)
+        result = await api_process.do("k", follower_call)
+
+        assert result == {"from": "worker"}
+        assert await leader == {"from": "worker"}
+        follower_call.assert_not_awaited()
+        assert memory_cache == ["k"]
+        assert "llm_lease:k" not in fake_redis.data
+
+
+class TestDeepSeekCoalescing:
+    """测试 DeepSeek 调用合并"""
+
+    @pytest.mark.unit
+    async def test_same_question_tagged_once(self, memory_cache):
+        """同一题目被并发标注 40 次时只调用一次 API"""
+        service = DeepSeekService()
+        service.single_flight = SingleFlight("deepseek", backend="local")
+        question = Question(question_id="Q1", question_type="objective", question_text="1+1=?")
+        response = {"choices": [{"message": {"content": json.dumps({"knowledge_points": ["加法"]})}}]}
+
+        async def post(payload, lane, call_type):
+            await asyncio.sleep(0.01)
+            return response
+
+        with patch.object(service, "_post_with_retry", AsyncMock(side_effect=post)) as post_mock, \
+                patch.object(CacheService, "get_question_profile", AsyncMock(return_value=None)), \
+                patch.object(CacheService, "set_question_profile", AsyncMock()):
+            results = await asyncio.gather(
+                *(service.tag_knowledge_points(question, "数学") for _ in range(40))
+            )
+
+        assert post_mock.await_count == 1
+        assert all(r == ["加法"] for r in results)
+
+    @pytest.mark.unit
+    async def test_unparseable_response_not_replayed(self, memory_cache):
+        """无法解析的输出不写入响应缓存，重试同一题目时重新调用 API"""
+        service = DeepSeekService()
+        service.single_flight = SingleFlight("deepseek", backend="local")
+        question = Question(question_id="Q1", question_type="objective", question_text="1+1=?")
+        responses = [
+            {"choices": [{"message": {"content": "知识点是加法"}, "finish_reason": "stop"}]},
+            {"choices": [{"message": {"content": '{"knowledge_points": ["加'}, "finish_reason": "length"}]},
+            {"choices": [{"message": {"content": "```json\n{\"knowledge_points\": [\"加法\"]}\n```"}}]},
+        ]
+
+        with patch.object(service, "_post_with_retry", AsyncMock(side_effect=responses)) as post_mock, \
+                patch.object(CacheService, "get_question_profile", AsyncMock(return_value=None)), \
+                patch.object(CacheService, "set_question_profile", AsyncMock()):
+            results = [await service.tag_knowledge_points(question, "数学") for _ in range(3)]
+
+        assert results == [[], [], ["加法"]]
+        assert post_mock.await_count == 3
+        assert len(memory_cache) == 1
@@ -0,0 +1,237 @@
+"""
+主观题评分引擎测试
+"""
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services import subjective_grader as grader_module
+from app.services.cache_service import CacheService
+from app.services.deepseek_service import DeepSeekService
+from app.services.subjective_grader import GradingItem, SubjectiveGrader, grade_fingerprint
+
+LONG_ANSWER = "因为" + "光合作用需要光照和二氧化碳，" * 8
+
+
+def build_item(question_id: str, answer: str = "略", text: str = None, max_score: float = 10) -> GradingItem:
+    """构造待评分题目"""
+    return GradingItem(
+        question_id=question_id,
+        question_text=text or f"简述第{question_id}题的要点",
+        student_answer=answer,
+        max_score=max_score
+    )
+
+
+def grade(ratio: float = 0.8) -> dict:
+    """构造评分结果"""
+    return {"score_ratio": ratio, "is_correct": ratio >= 0.6, "reason": "", "strengths": [], "weaknesses": []}
+
+
+@pytest.fixture
+def grade_store():
+    """用内存字典替代 Redis 中的评分缓存"""
+    store = {}
+
+    async def get_grade(fingerprint):
+        return store.get(fingerprint)
+
+    async def set_grade(fingerprint, value):
+        store[fingerprint] = dict(value)
+
+    with patch.object(CacheService, "get_subjective_grade", side_effect=get_grade), \
+            patch.object(CacheService, "set_subjective_grade", side_effect=set_grade):
+        yield store
+
+
+@pytest.fixture
+def deepseek(monkeypatch):
+    """替换评分引擎使用的 DeepSeek 服务"""
+    service = DeepSeekService()
+    monkeypatch.setattr(grader_module, "deepseek_service", service)
+    return service
+
+
+class TestFingerprint:
+    """测试评分指纹"""
+
+    @pytest.mark.unit
+    def test_spacing_and_punctuation_ignored(self):
+        assert grade_fingerprint(build_item("Q1", "光照， 二氧化碳")) == \
+            grade_fingerprint(build_item("Q1", "光照,二氧化碳"))
+
+    @pytest.mark.unit
+    def test_answer_and_reference_distinguish(self):
+        """学生答案或参考答案不同时指纹不同，满分不影响指纹"""
+        item = build_item("Q1", "光照")
+        assert grade_fingerprint(item) != grade_fingerprint(build_item("Q1", "水"))
+        assert grade_fingerprint(item) == grade_fingerprint(build_item("Q1", "光照", max_score=5))
+        with_reference = build_item("Q1", "光照")
+        with_reference.correct_answer = "光照和二氧化碳"
+        assert grade_fingerprint(item) != grade_fingerprint(with_reference)
+
+
+class TestSubjectiveGrader:
+    """测试并发评分"""
+
+    @pytest.mark.unit
+    async def test_concurrency_bounded(self, grade_store, deepseek):
+        """长答案逐题评分，同时进行的调用不超过上限"""
+        running, peak = 0, 0
+
+        async def slow_grade(*args):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return grade()
+
+        grader = SubjectiveGrader(concurrency=3, timeout=5)
+        items = [build_item(f"Q{i}", LONG_ANSWER + str(i)) for i in range(8)]
+        with patch.object(deepseek, "grade_subjective_answer", side_effect=slow_grade) as single:
+            start = time.perf_counter()
+            grades = await grader.grade(items)
+            elapsed = time.perf_counter() - start
+
+        assert single.await_count == 8
+        assert peak == 3
+        assert elapsed < 0.05 * 8
+        assert all(g["score"] == 8.0 for g in grades.values())
+
+    @pytest.mark.unit
+    async def test_short_answers_batched(self, grade_store, deepseek):
+        """简答按批量大小合并评分"""
+        async def batch(items):
+            return {item["id"]: grade(0.5) for item in items}
+
+        grader = SubjectiveGrader(batch_size=3, short_answer_chars=20)
+        items = [build_item(f"Q{i}", f"答案{i}") for i in range(5)]
+        with patch.object(deepseek, "grade_subjective_batch", side_effect=batch) as batched, \
+                patch.object(deepseek, "grade_subjective_answer", AsyncMock()) as single:
+            grades = await grader.grade(items)
+
+        assert [len(call.args[0]) for call in batched.await_args_list] == [3, 2]
+        single.assert_not_awaited()
+        assert [grades[f"Q{i}"]["score"] for i in range(5)] == [5.0] * 5
+
+    @pytest.mark.unit
+    async def test_missing_batch_result_graded_individually(self, grade_store, deepseek):
+        grader = SubjectiveGrader(batch_size=3)
+        items = [build_item("Q1", "光照"), build_item("Q2", "水")]
+        with patch.object(deepseek, "grade_subjective_batch", AsyncMock(return_value={"Q1": grade(1.0)})), \
+                patch.object(deepseek, "grade_subjective_answer", AsyncMock(return_value=grade(0.2))) as single:
+            grades = await grader.grade(items)
+
+        assert single.await_count == 1
+        assert grades["Q1"]["score_ratio"] == 1.0 and grades["Q2"]["score_ratio"] == 0.2
+
+    @pytest.mark.unit
+    async def test_identical_pairs_reuse_grade(self, grade_store, deepseek):
+        """同一试卷中相同作答只评一次，再次评分时全部命中缓存并按满分换算"""
+        grader = SubjectiveGrader()
+        items = [build_item("Q1", LONG_ANSWER, text="简述光合作用"),
+                 build_item("Q2", LONG_ANSWER, text="简述光合作用", max_score=5)]
+        with patch.object(deepseek, "grade_subjective_answer", AsyncMock(return_value=grade(0.6))) as single:
+            first = await grader.grade(items)
+            second = await grader.grade(items)
+
+        assert single.await_count == 1
+        assert len(grade_store) == 1
+        assert first == second
+        assert (second["Q1"]["score"], second["Q2"]["score"]) == (6.0, 3.0)
+
+    @pytest.mark.unit
+    async def test_timeout_returns_partial_results(self, grade_store, deepseek):
+        """超时的题目结果为 None 且不缓存，其余题目正常返回"""
+        async def grade_answer(question_text, student_answer, correct_answer=None):
+            if "慢" in student_answer:
+                await asyncio.sleep(5)
+            return grade()
+
+        grader = SubjectiveGrader(timeout=0.1)
+        items = [build_item("Q1", LONG_ANSWER), build_item("Q2", LONG_ANSWER + "慢")]
+        with patch.object(deepseek, "grade_subjective_answer", side_effect=grade_answer):
+            start = time.perf_counter()
+            grades = await grader.grade(items)
+
+        assert time.perf_counter() - start < 1
+        assert grades["Q1"]["score_ratio"] == 0.8
+        assert grades["Q2"] is None
+        assert len(grade_store) == 1
+
+    @pytest.mark.unit
+    async def test_fallback_grading_within_concurrency(self, grade_store, deepseek):
+        """批量结果缺失后的逐题补评同样占用并发名额"""
+        running, peak = 0, 0
+
+        async def slow_grade(*args):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return grade()
+
+        grader = SubjectiveGrader(concurrency=2, batch_size=6, timeout=5)
+        items = [build_item(f"Q{i}", f"答案{i}") for i in range(12)]
+        with patch.object(deepseek, "grade_subjective_batch", AsyncMock(return_value={})), \
+                patch.object(deepseek, "grade_subjective_answer", side_effect=slow_grade) as single:
+            grades = await grader.grade(items)
+
+        assert single.await_count == 12
+        assert peak == 2
+        assert all(g["score_ratio"] == 0.8 for g in grades.values())
+
+    @pytest.mark.unit
+    async def test_deadline_covers_whole_grade(self, grade_store, deepseek):
+        """时限作用于整次评分：排队中的调用和补评不会各自重新计时"""
+        async def slow_grade(*args):
+            await asyncio.sleep(0.05)
+            return grade()
+
+        grader = SubjectiveGrader(concurrency=1, timeout=0.12)
+        items = [build_item(f"Q{i}", LONG_ANSWER + str(i)) for i in range(6)]
+        with patch.object(deepseek, "grade_subjective_answer", side_effect=slow_grade):
+            start = time.perf_counter()
+            grades = await grader.grade(items)
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.2
+        assert sum(g is not None for g in grades.values()) == 2
+        assert len(grade_store) == 2
+
+    @pytest.mark.unit
+    async def test_failure_is_none(self, grade_store, deepseek):
+        grader = SubjectiveGrader()
+        with patch.object(deepseek, "grade_subjective_answer", AsyncMock(side_effect=Exception("down"))):
+            assert await grader.grade([build_item("Q1", LONG_ANSWER)]) == {"Q1": None}
+        assert grade_store == {}
+
+
+class TestGradeSubjectiveBatch:
+    """测试批量评分结果解析"""
+
+    @pytest.mark.unit
+    async def test_parse_and_normalize(self):
+        """结果按编号对应，得分比例截断到 [0, 1]，格式错误的条目丢弃"""
+        service = DeepSeekService()
+        content = json.dumps({"results": [
+            {"id": "Q1", "score_ratio": 1.3, "is_correct": True, "reason": "完整"},
+            {"id": "Q2", "score_ratio": "高"},
+            {"id": "Q9", "score_ratio": 0.5},
+        ]}, ensure_ascii=False)
+        response = {"choices": [{"message": {"content": f"```json\n{content}\n```"}}]}
+        items = [
+            {"id": "Q1", "question_text": "题一", "student_answer": "答一", "correct_answer": "参考"},
+            {"id": "Q2", "question_text": "题二", "student_answer": "答二"},
+        ]
+
+        with patch.object(service, "_call_api", AsyncMock(return_value=response)) as call_api:
+            results = await service.grade_subjective_batch(items)
+
+        assert list(results) == ["Q1"]
+        assert results["Q1"]["score_ratio"] == 1.0
+        assert "参考答案：参考" in call_api.await_args.args[0][-1]["content"]
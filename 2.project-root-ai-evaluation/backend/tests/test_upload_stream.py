@@ -0,0 +1,161 @@
+"""
+上传流式接收测试
+"""
+import hashlib
+import io
+import os
+
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+from starlette.requests import Request
+
+from app.api.dependencies import get_current_user
+from app.core.database import get_db
+from app.services.image_service import ImageService
+from app.services.upload_stream import UploadTooLarge, receive_upload
+
+BOUNDARY = "exam-upload-boundary"
+
+
+def multipart_body(content: bytes, filename: str = "exam.jpg", **fields: str) -> bytes:
+    """构造 multipart 请求体"""
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b"\r\n"
+    )
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts)
+
+
+class FakeRequest:
+    """按块发送请求体的 ASGI 请求，记录已被读取的块数"""
+
+    def __init__(self, body: bytes, chunk_size: int = 64 * 1024, content_length: bool = True):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.consumed = 0
+        headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+        if content_length:
+            headers.append((b"content-length", str(len(body)).encode()))
+        self.request = Request({"type": "http", "method": "POST", "headers": headers}, self.receive)
+
+    async def receive(self):
+        chunk = self.chunks[self.consumed]
+        self.consumed += 1
+        return {"type": "http.request", "body": chunk, "more_body": self.consumed < len(self.chunks)}
+
+
+def jpeg_bytes(width: int = 200, height: int = 100) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class TestReceiveUpload:
+    """测试分块接收"""
+
+    @pytest.mark.unit
+    async def test_spools_file_with_incremental_hash(self, tmp_path):
+        content = os.urandom(700 * 1024)
+        fake = FakeRequest(multipart_body(content, preprocess_profile="fast", device_info="iPhone"))
+
+        upload, fields = await receive_upload(fake.request, chunk_size=128 * 1024, spool_dir=str(tmp_path))
+
+        assert upload.filename == "exam.jpg"
+        assert upload.content_type == "image/jpeg"
+        assert upload.size == len(content)
+        assert upload.sha256 == hashlib.sha256(content).hexdigest()
+        assert upload.read_bytes() == content
+        assert os.path.dirname(upload.path) == str(tmp_path)
+        assert fields == {"preprocess_profile": "fast", "device_info": "iPhone"}
+
+        upload.discard()
+        assert not os.path.exists(upload.path)
+
+    @pytest.mark.unit
+    async def test_oversized_stream_aborted_early(self, tmp_path):
+        """未声明 Content-Length 时，超过上限即中止，不再读取剩余请求体"""
+        fake = FakeRequest(multipart_body(b"x" * (4 * 1024 * 1024)), content_length=False)
+
+        with pytest.raises(UploadTooLarge, match="exceeds"):
+            await receive_upload(fake.request, max_size=1024 * 1024, spool_dir=str(tmp_path))
+
+        assert fake.consumed <= 1024 * 1024 // (64 * 1024) + 2
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.unit
+    async def test_declared_length_rejected_before_reading(self, tmp_path):
+        fake = FakeRequest(multipart_body(b"x" * (4 * 1024 * 1024)))
+
+        with pytest.raises(UploadTooLarge):
+            await receive_upload(fake.request, max_size=1024 * 1024, spool_dir=str(tmp_path))
+
+        assert fake.consumed == 0
+
+    @pytest.mark.unit
+    async def test_missing_file_field_rejected(self, tmp_path):
+        body = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="device_info"\r\n\r\nx\r\n--{BOUNDARY}--\r\n'
+        fake = FakeRequest(body.encode())
+
+        with pytest.raises(ValueError, match="missing file"):
+            await receive_upload(fake.request, spool_dir=str(tmp_path))
+
+    @pytest.mark.unit
+    async def test_spooled_upload_validated_and_stored(self, tmp_path, local_storage):
+        content = jpeg_bytes()
+        upload, _ = await receive_upload(FakeRequest(multipart_body(content)).request, spool_dir=str(tmp_path))
+
+        ImageService.validate_upload(upload)
+        with upload.mapped() as mapping:
+            assert ImageService.check_upload_quality(mapping).is_valid
+        url = await ImageService.store_upload(upload, "exam-1", "original")
+
+        assert url.startswith("/uploads/exam-1_original_")
+        assert await ImageService.read_image(url) == content
+        assert not os.path.exists(upload.path)
+
+
+class TestUploadEndpoint:
+    """测试上传接口在创建记录前的拒绝路径"""
+
+    @pytest.fixture
+    async def client(self):
+        from main import app
+        app.dependency_overrides[get_current_user] = lambda: object()
+        app.dependency_overrides[get_db] = lambda: None
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            yield ac
+        app.dependency_overrides.clear()
+
+    @pytest.mark.unit
+    async def test_oversized_upload_rejected(self, client):
+        files = {"file": ("large.jpg", b"x" * (11 * 1024 * 1024), "image/jpeg")}
+
+        response = await client.post("/api/v1/exams/upload", files=files)
+
+        assert response.status_code == 400
+        assert "exceeds" in response.json()["detail"].lower()
+
+    @pytest.mark.unit
+    async def test_invalid_image_rejected(self, client):
+        files = {"file": ("fake.jpg", b"This is not an image", "image/jpeg")}
+
+        response = await client.post("/api/v1/exams/upload", files=files)
+
+        assert response.status_code == 400
+        assert "invalid" in response.json()["detail"].lower()
+
+    @pytest.mark.unit
+    async def test_unknown_profile_rejected(self, client):
+        files = {"file": ("exam.jpg", jpeg_bytes(), "image/jpeg")}
+
+        response = await client.post(
+            "/api/v1/exams/upload", files=files, data={"preprocess_profile": "ultra"}
+        )
+
+        assert response.status_code == 400
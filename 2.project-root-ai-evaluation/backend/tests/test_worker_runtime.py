@@ -0,0 +1,62 @@
+"""
+Worker 异步运行时测试
+"""
+import asyncio
+import pytest
+
+from app.core.worker_runtime import WorkerRuntime, run_async
+
+
+@pytest.fixture
+def runtime():
+    """每个测试使用干净的运行时"""
+    yield WorkerRuntime
+    WorkerRuntime.shutdown()
+    WorkerRuntime._shutdown_hooks.clear()
+
+
+class TestWorkerRuntime:
+    """测试 worker 事件循环复用"""
+
+    @pytest.mark.unit
+    def test_loop_reused_across_tasks(self, runtime):
+        """多次运行协程应复用同一个事件循环"""
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        first = run_async(current_loop())
+        second = run_async(current_loop())
+
+        assert first is second
+        assert not first.is_closed()
+
+    @pytest.mark.unit
+    def test_returns_coroutine_result(self, runtime):
+        """应返回协程结果并传播异常"""
+        async def add(a, b):
+            return a + b
+
+        async def fail():
+            raise ValueError("boom")
+
+        assert run_async(add(1, 2)) == 3
+        with pytest.raises(ValueError):
+            run_async(fail())
+
+    @pytest.mark.unit
+    def test_shutdown_runs_hooks_and_closes_loop(self, runtime):
+        """关闭时应执行钩子并关闭事件循环，之后可重新创建"""
+        calls = []
+
+        async def hook():
+            calls.append("closed")
+
+        runtime.register_shutdown_hook(hook)
+        runtime.register_shutdown_hook(hook)
+        loop = runtime.get_loop()
+
+        runtime.shutdown()
+
+        assert calls == ["closed"]
+        assert loop.is_closed()
+        assert runtime.get_loop() is not loop